@@ -15,13 +15,17 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SkillSwapProject.settings')
 
 # Use Channels ProtocolTypeRouter to route HTTP to Django and WebSocket to
 # our consumers. We import routing from the communication app.
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 import communication.routing
+from communication.auth import TokenAuthMiddlewareStack
+from communication.buffer import lifespan
 
 application = ProtocolTypeRouter(
 	{
 		"http": get_asgi_application(),
-		"websocket": AuthMiddlewareStack(URLRouter(communication.routing.websocket_urlpatterns)),
+		# Signed ?token= handshakes skip the session/user queries; others use the session
+		"websocket": TokenAuthMiddlewareStack(URLRouter(communication.routing.websocket_urlpatterns)),
+		# Servers speaking ASGI lifespan (uvicorn) let buffered chat messages be written on shutdown
+		"lifespan": lifespan,
 	}
 )
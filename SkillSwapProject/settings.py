@@ -52,6 +52,8 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    # First, so it measures the queries of every other middleware too
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -112,6 +114,43 @@ DATABASES = {
 #     }
 # }
 
+# High-concurrency SQLite profile (SQLITE_PROFILE=tuned):
+# - WAL journal and tuned pragmas, run on every new connection;
+# - BEGIN IMMEDIATE, so concurrent writers wait up to `timeout` seconds for
+#   the lock instead of failing with "database is locked";
+# - a read-only 'replica' alias on the same file, used for reads by
+#   core.db.PrimaryReplicaRouter.
+# SQLITE_PATH moves the database file (used by `bench_sqlite`).
+SQLITE_PATH = Path(os.environ.get('SQLITE_PATH') or BASE_DIR / 'db.sqlite3')
+DATABASES['default']['NAME'] = SQLITE_PATH
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+SQLITE_TUNED_PRAGMAS = [
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',  # 64 MB
+    'PRAGMA mmap_size=268435456',  # 256 MB
+    'PRAGMA temp_store=MEMORY',
+]
+if SQLITE_PROFILE == 'tuned':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(['PRAGMA journal_mode=WAL'] + SQLITE_TUNED_PRAGMAS),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    }
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{SQLITE_PATH}?mode=ro',
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_TUNED_PRAGMAS + ['PRAGMA query_only=1']),
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
+
+# Serial writer (core.db.writer): at most this many queued write jobs are
+# committed together in one transaction.
+DB_WRITER_MAX_BATCH = 100
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -164,3 +203,124 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     }
 }
+
+# Several ASGI worker processes on one host: start the hub with
+# `python manage.py channel_hub --path <dir>` and set CHANNEL_LAYER_SOCKET_DIR
+# (and CHANNEL_LAYER_SHARDS, if not the default) for every worker.
+if os.environ.get('CHANNEL_LAYER_SOCKET_DIR'):
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'communication.layers.ShardedSocketChannelLayer',
+        'CONFIG': {
+            'path': os.environ['CHANNEL_LAYER_SOCKET_DIR'],
+            'shards': int(os.environ.get('CHANNEL_LAYER_SHARDS', '4')),
+            'capacity': 100,
+            'group_expiry': 86400,
+        },
+    }
+
+# Chat persistence: messages are buffered per room and written with
+# bulk_create once a room has this many pending messages, or after this many
+# seconds, whichever comes first.
+CHAT_BUFFER_MAX_MESSAGES = 100
+CHAT_BUFFER_MAX_DELAY = 0.5
+
+# Skill search (users.search): share of the final score that comes from the
+# provider's (Bayesian) rating; the rest is text relevance.
+SKILL_SEARCH_RATING_WEIGHT = 0.3
+
+# Cache: Django's local-memory backend works out of the box (one cache per
+# process). For several workers point this to a shared backend (e.g. Redis)
+# so invalidations reach every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skillswap',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Skill-swap matching (services.matching): the in-memory adjacency is patched
+# by signals in this process and fully reloaded this often (seconds) to pick
+# up bulk writes and other processes.
+MATCHING_REFRESH_SECONDS = 300
+
+# Public profile page cache (users.profile_cache)
+PROFILE_CACHE_ALIAS = 'default'
+PROFILE_CACHE_TIMEOUT = 300
+
+# Query instrumentation (core.middleware.QueryBudgetMiddleware). In DEBUG the
+# per-request query count/time go out as X-DB-* headers. Point
+# QUERY_STATS_FILE to a path to log every request and summarize it with
+# `python manage.py query_report`. With QUERY_BUDGET_STRICT a view over its
+# declared query_budget raises instead of logging a warning.
+QUERY_STATS_FILE = os.environ.get('QUERY_STATS_FILE') or None
+QUERY_BUDGET_STRICT = False
+
+# Chat presence (communication.presence): online/typing snapshots are sent at
+# most once per CHAT_PRESENCE_INTERVAL seconds per room; sockets silent for
+# CHAT_PRESENCE_TTL seconds and typing flags older than CHAT_TYPING_TTL expire.
+CHAT_PRESENCE_INTERVAL = 1.0
+CHAT_PRESENCE_TTL = 30
+CHAT_TYPING_TTL = 5
+CHAT_PRESENCE_MAX_LISTED = 100
+
+# Chat rate limiting (communication.throttling): token buckets as
+# (messages per second, burst) per socket, per user and per room. Set a scope
+# to None to disable it.
+CHAT_RATE_LIMITS = {
+    'channel': (5.0, 10),
+    'user': (10.0, 20),
+    'room': (200.0, 400),
+}
+
+# Chat archive (communication.archive, `python manage.py archive_chat`):
+# messages older than the retention window move to compressed segment files.
+CHAT_ARCHIVE_DIR = Path(os.environ.get('CHAT_ARCHIVE_DIR', BASE_DIR / 'chat_archive'))
+CHAT_ARCHIVE_RETENTION_DAYS = 90
+CHAT_ARCHIVE_SEGMENT_SIZE = 2000
+
+# Bulk export (core.export, `python manage.py export_data`, /core/api/export/):
+# rows read from the database per batch.
+EXPORT_CHUNK_SIZE = 2000
+
+# Bulk skill import (users.skill_import): rows validated and written per
+# batch, and the most rows accepted by one POST /users/api/skills/bulk/.
+SKILL_IMPORT_BATCH_SIZE = 1000
+SKILL_IMPORT_MAX_ROWS = 10000
+
+# Provider rankings (services.rankings): weight of ln(1 + completed requests)
+# added to the Bayesian average rating. Run `python manage.py
+# refresh_rankings --loop 3600` to also pick up bulk writes.
+PROVIDER_RANKING_COMPLETED_WEIGHT = 0.5
+
+# Chat room authorization (communication.membership): participants of up to
+# CHAT_MEMBERSHIP_CACHE_SIZE rooms are cached per process for
+# CHAT_MEMBERSHIP_CACHE_TTL seconds (changes made elsewhere show up within it).
+CHAT_MEMBERSHIP_CACHE_SIZE = 10000
+CHAT_MEMBERSHIP_CACHE_TTL = 60
+
+# WebSocket tokens (communication.auth, GET /communication/api/ws-token/):
+# seconds a signed ?token= stays valid for chat handshakes.
+CHAT_TOKEN_MAX_AGE = 300
+
+# Activity feed (services.feed, GET /services/api/feed/): activity of users
+# with up to FEED_FANOUT_LIMIT contacts is copied into each contact's timeline,
+# more connected users are read at query time. Timelines keep their newest
+# FEED_MAX_ENTRIES entries, trimmed on about one insert in FEED_TRIM_EVERY.
+FEED_FANOUT_LIMIT = 500
+FEED_MAX_ENTRIES = 200
+FEED_TRIM_EVERY = 20
+
+# Background job queue (core.jobs, `python manage.py run_jobs`): jobs claimed
+# per batch, retried up to JOBS_MAX_ATTEMPTS times JOBS_RETRY_BASE * 2^n
+# seconds apart (at most JOBS_RETRY_MAX). Jobs RUNNING for longer than
+# JOBS_LOCK_TIMEOUT seconds are requeued; DONE jobs are deleted after
+# JOBS_KEEP_DONE seconds.
+JOBS_BATCH_SIZE = 10
+JOBS_POLL_INTERVAL = 1.0
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE = 5
+JOBS_RETRY_MAX = 3600
+JOBS_LOCK_TIMEOUT = 600
+JOBS_KEEP_DONE = 7 * 86400
+JOBS_MAINTENANCE_INTERVAL = 60
@@ -24,4 +24,6 @@ urlpatterns = [
     # App URL includes
     path("users/", include("users.urls")),
     path("services/", include("services.urls")),
+    path("communication/", include("communication.urls")),
+    path("core/", include("core.urls")),
 ]
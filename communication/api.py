@@ -0,0 +1,123 @@
+from django.db.models import F, OuterRef, Subquery
+from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.pagination import KeysetPagination
+
+from . import archive, auth, unread
+from .models import ChatMessage, ChatRoom
+from .presence import presence
+from .serializers import ChatMessageSerializer, ChatRoomSerializer
+from .throttling import rate_limiter
+
+
+class ChatHistoryPagination(KeysetPagination):
+    """Newest-first history pages plus ``?since=<cursor>`` catch-up for reconnects.
+
+    Pages continue into the archived segments (``communication.archive``) of
+    the view's ``archive_room`` once the rows still in the database run out:
+    archived messages are always older than the room's archive mark, and the
+    rows still in the database newer. ``since`` cursors at or above the mark
+    never open the archive.
+    """
+
+    timestamp_field = "timestamp"
+    since_query_param = "since"
+
+    def extend_rows(self, rows, view):
+        room = getattr(view, "archive_room", None)
+        limit = self.page_size + 1
+        if room is None or room.archived_until is None:
+            return rows
+        if self.forward:
+            if self.position >= (room.archived_until, room.archived_until_id):
+                return rows
+            # Oldest first: archived rows after the cursor come before any hot row
+            return (archive.read(room.pk, limit, after=self.position) + rows)[:limit]
+        if len(rows) >= limit:
+            return rows
+        return rows + archive.read(room.pk, limit - len(rows), before=self.position)
+
+
+class ChatRoomViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ChatRoomSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {"list": 4, "retrieve": 4, "messages": 4, "read": 7}
+
+    def get_queryset(self):
+        # Users only see rooms they take part in; the unread count comes from
+        # the same membership row the filter joins
+        qs = ChatRoom.objects.filter(memberships__user=self.request.user)
+        if self.action == "messages":
+            return qs.order_by("id")
+        newest = ChatMessage.objects.filter(room=OuterRef("pk")).order_by("-id").values("id")[:1]
+        return qs.annotate(
+            unread_count=F("memberships__unread_count"), last_message_id=Subquery(newest)
+        ).order_by(F("last_message_id").desc(nulls_last=True), "-id")
+
+    def _with_last_messages(self, rooms):
+        """Attach ``last_message`` to every room with a single query, and ``online_count`` with none."""
+        ids = [room.last_message_id for room in rooms if room.last_message_id is not None]
+        messages = ChatMessage.objects.select_related("sender").in_bulk(ids) if ids else {}
+        online = presence.online_counts([room.pk for room in rooms])
+        for room in rooms:
+            room.last_message = messages.get(room.last_message_id)
+            room.online_count = online[room.pk]
+        return rooms
+
+    def list(self, request, *args, **kwargs):
+        """Rooms with the newest activity first, each with ``unread_count``, ``last_message`` and ``online_count``."""
+        rooms = self._with_last_messages(list(self.get_queryset()))
+        return Response(self.get_serializer(rooms, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        (room,) = self._with_last_messages([self.get_object()])
+        return Response(self.get_serializer(room).data)
+
+    @action(detail=True, methods=["post"], url_path="read")
+    def read(self, request, pk=None):
+        """Mark the room read up to ``message_id`` (default: its newest message)."""
+        room = self.get_object()
+        message_id = request.data.get("message_id")
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                raise ValidationError({"message_id": "Must be an integer."})
+        try:
+            membership = unread.mark_read(room.pk, request.user.pk, message_id)
+        except ChatMessage.DoesNotExist:
+            raise ValidationError({"message_id": "Not a message of this room."})
+        return Response({"last_read_id": membership.last_read_id, "unread_count": membership.unread_count})
+
+    @action(detail=True, methods=["get"], url_path="messages", pagination_class=ChatHistoryPagination)
+    def messages(self, request, pk=None):
+        room = self.get_object()
+        self.archive_room = room
+        qs = ChatMessage.objects.filter(room=room).select_related("sender")
+        page = self.paginate_queryset(qs)
+        serializer = ChatMessageSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class ChatThrottleStatsView(APIView):
+    """Allowed/throttled chat frame counters of this process (for scraping)."""
+
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 3
+
+    def get(self, request):
+        return Response(rate_limiter.stats())
+
+
+class WebSocketTokenView(APIView):
+    """Short-lived signed token for ``/ws/chat/<room>/?token=`` (see ``communication.auth``)."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request):
+        return Response({"token": auth.issue_token(request.user), "expires_in": auth.token_max_age()})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CommunicationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'communication'
+
+    def ready(self):
+        # Connect signal handlers (unread counters)
+        from . import signals  # noqa: F401
@@ -0,0 +1,218 @@
+"""Cold storage of old chat messages in compressed, append-only segment files.
+
+``archive_messages`` moves every ``ChatMessage`` older than a cutoff out of
+the database, room by room, in segments of at most ``segment_size``
+messages:
+
+- the segment is written first (gzip-compressed JSON lines in
+  ``(timestamp, id)`` order) under ``CHAT_ARCHIVE_DIR/<room_id>/``, to a
+  temporary name that is renamed into place once complete;
+- then, in one transaction, its ``ArchivedSegment`` index row is created and
+  the archived rows are deleted.
+
+A crash in between leaves at most an unreferenced file, which the next run
+overwrites. Segment files are never modified afterwards.
+
+Each room records the ``(timestamp, id)`` key of its newest archived message
+(``ChatRoom.archived_until``, updated with every segment): everything
+archived is older than the mark, everything still in the database newer.
+That lets ``read`` serve archived history as a plain continuation of the hot
+rows, and lets ``communication.api.ChatHistoryPagination`` skip the archive
+for cursors above the mark. Rows inserted below the mark afterwards (raw,
+back-dated writes such as ``seed_demo``) are merged into the segments they
+belong among on the next run, which rewrites those segments under new names.
+Archived messages come back as unsaved ``ChatMessage`` instances, with a
+``sender`` carrying the username recorded at archive time.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ArchivedSegment, ChatMessage, ChatRoom
+
+
+def archive_dir():
+    return Path(getattr(settings, "CHAT_ARCHIVE_DIR", Path(settings.BASE_DIR) / "chat_archive"))
+
+
+def _segment_path(room_id, first_id, last_id, revision=None):
+    suffix = "" if revision is None else f".r{revision}"
+    return f"{room_id}/{first_id}-{last_id}{suffix}.jsonl.gz"
+
+
+def write_segment(room_id, rows, revision=None):
+    """Write ``rows`` (``(id, sender_id, username, content, timestamp)``, ordered) and return the index row."""
+    relative = _segment_path(room_id, rows[0][0], rows[-1][0], revision)
+    target = archive_dir() / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    lines = "".join(
+        json.dumps([pk, sender_id, username, content, timestamp.isoformat()], ensure_ascii=False) + "\n"
+        for pk, sender_id, username, content, timestamp in rows
+    )
+    data = gzip.compress(lines.encode("utf-8"), compresslevel=6, mtime=0)
+    tmp = target.with_name(target.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, target)
+    return ArchivedSegment(
+        room_id=room_id,
+        path=relative,
+        first_id=rows[0][0],
+        last_id=rows[-1][0],
+        first_timestamp=rows[0][4],
+        last_timestamp=rows[-1][4],
+        message_count=len(rows),
+        size_bytes=len(data),
+    )
+
+
+def _after(key):
+    ts, pk = key
+    return Q(timestamp__gt=ts) | Q(timestamp=ts, id__gt=pk)
+
+
+def _ordered_rows(messages):
+    return messages.order_by("timestamp", "id").values_list("id", "sender_id", "sender__username", "content", "timestamp")
+
+
+def archive_room(room_id, before, segment_size=None):
+    """Archive the messages of ``room_id`` older than ``before``; returns how many moved."""
+    if segment_size is None:
+        segment_size = getattr(settings, "CHAT_ARCHIVE_SEGMENT_SIZE", 2000)
+    room = ChatRoom.objects.filter(pk=room_id).values_list("archived_until", "archived_until_id").first()
+    mark = room if room is not None and room[0] is not None else None
+    moved = 0 if mark is None else _merge_late(room_id, mark, segment_size)
+    old = ChatMessage.objects.filter(room_id=room_id, timestamp__lt=before)
+    while True:
+        # Always the oldest rows above the mark; anything landing below it waits for the next run
+        rows = list(_ordered_rows(old if mark is None else old.filter(_after(mark)))[:segment_size])
+        if not rows:
+            return moved
+        segment = write_segment(room_id, rows)
+        mark = (rows[-1][4], rows[-1][0])
+        with transaction.atomic():
+            segment.save()
+            ChatMessage.objects.filter(room_id=room_id, id__in=[row[0] for row in rows]).delete()
+            ChatRoom.objects.filter(pk=room_id).update(archived_until=mark[0], archived_until_id=mark[1])
+        moved += len(rows)
+
+
+def _merge_late(room_id, mark, segment_size):
+    """Move rows still in the database below ``mark`` into the archive; returns how many moved.
+
+    The segments from the oldest late row on are rewritten together with the
+    late rows, under names carrying a revision (the newest replaced segment's
+    id), so the files still indexed are never overwritten; the replaced ones
+    are removed once the swap commits (``communication.signals``).
+    """
+    late = list(_ordered_rows(ChatMessage.objects.filter(room_id=room_id).exclude(_after(mark))))
+    if not late:
+        return 0
+    first = (late[0][4], late[0][0])
+    replaced = list(
+        ArchivedSegment.objects.filter(room_id=room_id).filter(
+            Q(last_timestamp__gt=first[0]) | Q(last_timestamp=first[0], last_id__gt=first[1])
+        )
+    )
+    archived = [
+        (pk, sender_id, username, content, timestamp)
+        for segment in replaced
+        for timestamp, pk, sender_id, username, content in load_segment(segment.path)
+    ]
+    rows = sorted(late + archived, key=lambda row: (row[4], row[0]))
+    revision = max((segment.pk for segment in replaced), default=None)
+    segments = [write_segment(room_id, rows[i : i + segment_size], revision) for i in range(0, len(rows), segment_size)]
+    with transaction.atomic():
+        ArchivedSegment.objects.filter(pk__in=[segment.pk for segment in replaced]).delete()
+        ArchivedSegment.objects.bulk_create(segments)
+        ChatMessage.objects.filter(room_id=room_id, id__in=[row[0] for row in late]).delete()
+    return len(late)
+
+
+def archive_messages(before, room_ids=None, segment_size=None, log=None):
+    """Archive every message older than ``before`` (optionally only in ``room_ids``)."""
+    rooms = ChatMessage.objects.filter(timestamp__lt=before)
+    if room_ids is not None:
+        rooms = rooms.filter(room_id__in=room_ids)
+    room_ids = sorted(set(rooms.values_list("room_id", flat=True)))
+    total = 0
+    for room_id in room_ids:
+        moved = archive_room(room_id, before, segment_size)
+        total += moved
+        if log is not None:
+            log(f"room {room_id}: {moved} messages archived")
+    return total
+
+
+def load_segment(path):
+    """Rows of a segment as ``(timestamp, id, sender_id, username, content)``."""
+    return _read_segment(str(archive_dir() / path))
+
+
+# Segment files never change once written
+@lru_cache(maxsize=256)
+def _read_segment(filename):
+    with open(filename, "rb") as fh:
+        lines = gzip.decompress(fh.read()).decode("utf-8").splitlines()
+    rows = []
+    for line in lines:
+        pk, sender_id, username, content, timestamp = json.loads(line)
+        rows.append((datetime.fromisoformat(timestamp), pk, sender_id, username, content))
+    return rows
+
+
+def _as_message(room_id, row):
+    timestamp, pk, sender_id, username, content = row
+    message = ChatMessage(id=pk, room_id=room_id, sender_id=sender_id, content=content, timestamp=timestamp)
+    message.sender = get_user_model()(id=sender_id, username=username)
+    return message
+
+
+def read(room_id, limit, before=None, after=None):
+    """Up to ``limit`` archived messages of ``room_id``.
+
+    With ``after=(timestamp, id)``: the oldest ones strictly after that key,
+    oldest first. Otherwise the newest ones strictly before ``before`` (or
+    the newest overall), newest first.
+    """
+    segments = ArchivedSegment.objects.filter(room_id=room_id)
+    if after is not None:
+        ts, pk = after
+        segments = segments.filter(Q(last_timestamp__gt=ts) | Q(last_timestamp=ts, last_id__gt=pk))
+        segments = segments.order_by("last_timestamp", "last_id")
+    else:
+        if before is not None:
+            ts, pk = before
+            segments = segments.filter(Q(first_timestamp__lt=ts) | Q(first_timestamp=ts, first_id__lt=pk))
+        segments = segments.order_by("-last_timestamp", "-last_id")
+
+    found = []
+    # Every segment holds at least one message: ``limit`` segments are always enough
+    for path in segments.values_list("path", flat=True)[:limit]:
+        rows = load_segment(path)
+        if after is not None:
+            found += [row for row in rows if row[:2] > after][: limit - len(found)]
+        else:
+            older = [row for row in rows if before is None or row[:2] < before]
+            found += older[::-1][: limit - len(found)]
+        if len(found) >= limit:
+            break
+    return [_as_message(room_id, row) for row in found]
+
+
+def delete_segment_file(path):
+    _read_segment.cache_clear()
+    try:
+        (archive_dir() / path).unlink()
+    except FileNotFoundError:
+        pass
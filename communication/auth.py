@@ -0,0 +1,89 @@
+"""WebSocket authentication without a database round-trip.
+
+``AuthMiddlewareStack`` loads the session and then the user on every
+handshake, two sync queries. Clients that already have a session instead
+fetch a short-lived signed token from ``GET /communication/api/ws-token/``
+and connect with ``?token=<token>``:
+
+- ``issue_token(user)`` signs ``(user id, username)`` with ``SECRET_KEY``
+  (``django.core.signing``); tokens expire after ``CHAT_TOKEN_MAX_AGE``
+  seconds, which also bounds how long a deactivated user keeps connecting;
+- ``TokenAuthMiddleware`` checks the signature and puts a ``TokenUser`` in
+  ``scope["user"]`` (no query);
+- handshakes without a valid token go through the session stack unchanged.
+"""
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = "communication.ws-token"
+
+
+class TokenUser:
+    """The authenticated user of a token handshake: only what consumers read."""
+
+    __slots__ = ("pk", "username")
+
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, pk, username):
+        self.pk = pk
+        self.username = username
+
+    @property
+    def id(self):
+        return self.pk
+
+    def get_username(self):
+        return self.username
+
+    def __str__(self):
+        return self.username
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk and getattr(other, "is_authenticated", False)
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+def token_max_age():
+    return getattr(settings, "CHAT_TOKEN_MAX_AGE", 300)
+
+
+def issue_token(user):
+    return signing.dumps([user.pk, user.get_username()], salt=TOKEN_SALT, compress=False)
+
+
+def user_from_token(token):
+    """The ``TokenUser`` of a valid, unexpired token, else ``None``."""
+    try:
+        pk, username = signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age())
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return TokenUser(pk, username)
+
+
+class TokenAuthMiddleware:
+    """Resolve ``scope["user"]`` from ``?token=``; other handshakes go to ``fallback``."""
+
+    def __init__(self, inner, fallback=None):
+        self.inner = inner
+        self.fallback = AuthMiddlewareStack(inner) if fallback is None else fallback
+
+    async def __call__(self, scope, receive, send):
+        user = None
+        tokens = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+        if tokens:
+            user = user_from_token(tokens[-1])
+        if user is None:
+            return await self.fallback(scope, receive, send)
+        return await self.inner(dict(scope, user=user), receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    return TokenAuthMiddleware(inner)
@@ -0,0 +1,169 @@
+import asyncio
+import atexit
+import logging
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from core.db import writer
+
+from . import unread
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMessageBuffer:
+    """Per-room write buffer for chat messages.
+
+    Messages are kept in memory and written with a single ``bulk_create`` as
+    soon as a room has ``max_messages`` pending rows, or ``max_delay`` seconds
+    after the first pending row was queued, whichever happens first. This keeps
+    the number of INSERT round-trips independent of the message rate.
+
+    Batches go through ``core.db.writer``: one writer thread per process,
+    and flushes of several rooms queued together commit as one transaction.
+
+    Nothing pending is dropped on the way out: a room is flushed when its
+    last socket in the process disconnects (``retain``/``release``),
+    everything on ASGI lifespan shutdown (``lifespan``) or interpreter exit
+    (``drain``). A batch failing with ``OperationalError`` (e.g. "database
+    is locked") is retried, and kept for the next flush if it still fails.
+    Messages are stamped when queued, so stored order matches what clients
+    saw live.
+    """
+
+    writer = writer
+    # Pauses between attempts of a batch failing with OperationalError
+    retry_pauses = (0.01, 0.02, 0.04, 0.08)
+
+    def __init__(self, max_messages=None, max_delay=None):
+        if max_messages is None:
+            max_messages = getattr(settings, "CHAT_BUFFER_MAX_MESSAGES", 100)
+        if max_delay is None:
+            max_delay = getattr(settings, "CHAT_BUFFER_MAX_DELAY", 0.5)
+        self.max_messages = max_messages
+        self.max_delay = max_delay
+        self._pending = defaultdict(list)
+        # room_id -> (loop, TimerHandle) for the scheduled time-based flush
+        self._timers = {}
+        # Keep references to flush tasks so they are not garbage collected
+        self._tasks = set()
+        # room_id -> open sockets of this process
+        self._sockets = Counter()
+
+    def pending_count(self, room_id=None):
+        if room_id is not None:
+            return len(self._pending.get(room_id, ()))
+        return sum(len(batch) for batch in self._pending.values())
+
+    async def add(self, room_id, sender_id, content):
+        """Queue a message; flushes inline when the size threshold is hit."""
+        pending = self._pending[room_id]
+        pending.append(ChatMessage(room_id=room_id, sender_id=sender_id, content=content, timestamp=timezone.now()))
+        if len(pending) >= self.max_messages:
+            await self.flush(room_id)
+            return
+        self._schedule(room_id)
+
+    def retain(self, room_id):
+        """A socket of ``room_id`` opened in this process."""
+        self._sockets[room_id] += 1
+
+    async def release(self, room_id):
+        """A socket of ``room_id`` closed; the last one out flushes the room."""
+        self._sockets[room_id] -= 1
+        if self._sockets[room_id] <= 0:
+            del self._sockets[room_id]
+            await self.flush(room_id)
+
+    def _schedule(self, room_id):
+        loop = asyncio.get_running_loop()
+        timer = self._timers.get(room_id)
+        if timer is None or timer[0] is not loop:
+            handle = loop.call_later(self.max_delay, self._flush_later, room_id)
+            self._timers[room_id] = (loop, handle)
+
+    def _flush_later(self, room_id):
+        self._timers.pop(room_id, None)
+        task = asyncio.ensure_future(self.flush(room_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, room_id):
+        """Write every pending message of ``room_id``; returns the row count."""
+        timer = self._timers.pop(room_id, None)
+        if timer is not None:
+            timer[1].cancel()
+        # Swap the list out before awaiting so new messages go to a fresh batch
+        batch = self._pending.pop(room_id, None)
+        if not batch:
+            return 0
+        for pause in (*self.retry_pauses, None):
+            try:
+                await self.writer.run(self._write, batch)
+                return len(batch)
+            except OperationalError:
+                if pause is None:
+                    logger.exception("Could not persist %d chat messages, keeping them for the next flush", len(batch))
+                    self._pending[room_id][:0] = batch
+                    self._schedule(room_id)
+                    return 0
+                await asyncio.sleep(pause)
+
+    async def flush_all(self):
+        total = 0
+        for room_id in list(self._pending):
+            total += await self.flush(room_id)
+        return total
+
+    def drain(self):
+        """Write everything pending from the calling thread, without the event loop (process exit)."""
+        for room_id in list(self._pending):
+            timer = self._timers.pop(room_id, None)
+            if timer is not None:
+                timer[1].cancel()
+            batch = self._pending.pop(room_id)
+            for pause in (*self.retry_pauses, None):
+                try:
+                    self._write(batch)
+                    break
+                except OperationalError:
+                    if pause is None:
+                        logger.exception("Could not persist %d chat messages at exit", len(batch))
+                        break
+                    time.sleep(pause)
+
+    def _write(self, batch):
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(batch, batch_size=self.max_messages)
+                # bulk_create sends no post_save: count the batch as unread here
+                unread.messages_persisted(batch[0].room_id, Counter(message.sender_id for message in batch))
+        except OperationalError:
+            # Transient (e.g. "database is locked"): the caller retries the batch
+            raise
+        except Exception:
+            # A failed batch (e.g. room deleted meanwhile) must not take the
+            # consumer down; the messages were already delivered live.
+            logger.exception("Failed to persist %d chat messages", len(batch))
+
+
+# Process-wide buffer shared by every ChatConsumer instance.
+message_buffer = ChatMessageBuffer()
+atexit.register(message_buffer.drain)
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan app: persists the buffered messages before the server stops."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await message_buffer.flush_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -1,20 +1,62 @@
 import json
 import re
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from . import wire
+from .buffer import message_buffer
+from .membership import access_group_name, room_access
+from .presence import presence
+from .throttling import rate_limiter
 
-class ChatConsumer(WebsocketConsumer):
-    """Basic WebSocket consumer for chat using Django Channels.
+# Frame types handled by the consumer itself, never broadcast as chat messages
+CONTROL_FRAMES = ("typing", "heartbeat", "presence.subscribe")
+
+# Sent instead of accepting (HTTP 403 during the handshake) or to close a
+# socket whose user left the room
+FORBIDDEN_CLOSE_CODE = 4403
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """Async WebSocket consumer for chat using Django Channels.
 
     - connect: extracts room name from the URL path, joins group and accepts
-    - disconnect: leaves the group
-    - receive: expects JSON with a `message` key, forwards it to the group
+    - authorization: a room name that belongs to a ``ChatRoom`` only admits
+      its participants (checked against the ``room_access`` cache on connect
+      and before every frame); others are refused or closed with code
+      ``FORBIDDEN_CLOSE_CODE``. Sockets of a member removed from the room are
+      closed right away (``membership.members_removed``). Unknown room names
+      stay open, broadcast-only
+    - disconnect: leaves the group; the last socket of a room in this
+      process flushes the room's write buffer
+    - receive_json: expects JSON with a `message` key, forwards it to the group
+      and queues it for persistence in the room's write buffer
     - chat_message: handler invoked for group messages to send JSON to socket
+    - presence: authenticated users are tracked by ``presence``; clients send
+      ``{"type": "typing", "typing": true|false}`` and ``{"type": "heartbeat"}``.
+      After ``{"type": "presence.subscribe"}`` a socket also receives coalesced
+      ``{"type": "presence", ...}`` snapshots (opt-in, so clients that only
+      understand chat frames are unaffected)
+    - throttling: every inbound frame takes a token from the socket's bucket
+      in ``rate_limiter``, and chat messages also from the user and room
+      buckets; excess frames are dropped and the sender gets
+      ``{"type": "error", "code": "rate_limited", "scope": ..., "retry_after": s}``
+
+    - wire format: JSON text frames by default; a client offering the
+      ``skillswap.msgpack`` subprotocol gets (and may send) MessagePack binary
+      frames. Group events carry frames pre-encoded once per send
+      (``communication.wire``), never re-serialized per recipient
+
+    Everything runs on the event loop; the only thread hops are the batched
+    ``bulk_create`` done by ``message_buffer`` and ``room_access`` misses.
     """
 
-    def connect(self):
+    message_buffer = message_buffer
+    presence = presence
+    rate_limiter = rate_limiter
+    room_access = room_access
+
+    async def connect(self):
         # Try to extract room name from the scope's path or url_route kwargs
         scope = getattr(self, "scope", {})
         room = None
@@ -31,50 +73,180 @@ class ChatConsumer(WebsocketConsumer):
 
         self.room_name = room
         self.group_name = f"chat_{self.room_name}"
+        # Messages are only persisted for rooms that exist in the database,
+        # and those rooms are reserved to their participants
+        access = await self.room_access.lookup(self.room_name)
+        self.room_id = access.room_id
+        if not access.allows(scope.get("user")):
+            await self.close(code=FORBIDDEN_CLOSE_CODE)
+            return
 
         # Join room group
-        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        if self.room_id is not None:
+            await self.channel_layer.group_add(access_group_name(self.room_id), self.channel_name)
+
+        # Accept the connection, with the wire format the client asked for
+        self.encoding, subprotocol = wire.negotiate(scope.get("subprotocols"))
+        await self.accept(subprotocol=subprotocol)
 
-        # Accept the connection
-        self.accept()
+        if self.room_id is not None:
+            self.message_buffer.retain(self.room_id)
+            self.buffer_retained = True
 
-    def disconnect(self, close_code):
+        self.presence_subscribed = False
+        self.username = self._username()
+        if self.username is not None:
+            self.presence.join(self.room_name, self.username, self.channel_name, self.room_id)
+
+    async def disconnect(self, close_code):
         # Leave room group
-        async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "room_id", None) is not None:
+            await self.channel_layer.group_discard(access_group_name(self.room_id), self.channel_name)
+        if getattr(self, "username", None) is not None:
+            self.presence.leave(self.room_name, self.username, self.channel_name)
+        if getattr(self, "presence_subscribed", False):
+            await self.channel_layer.group_discard(self.presence.group_name(self.room_name), self.channel_name)
+        self.rate_limiter.forget(self.channel_name)
+        if getattr(self, "buffer_retained", False):
+            self.buffer_retained = False
+            await self.message_buffer.release(self.room_id)
+
+    def _username(self):
+        user = self.scope.get("user")
+        if user and getattr(user, "is_authenticated", False):
+            return str(user.username)
+        return None
+
+    async def subscribe_presence(self):
+        if not self.presence_subscribed:
+            self.presence_subscribed = True
+            await self.channel_layer.group_add(self.presence.group_name(self.room_name), self.channel_name)
+        # Current state right away; later changes arrive coalesced
+        await self.send_payload(self.presence.frame_payload(self.room_name))
+
+    async def send_payload(self, payload):
+        """Encode ``payload`` for this socket and send it."""
+        await self.send_frame(wire.encode(payload, self.encoding))
+
+    async def send_frame(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
 
-    def receive(self, text_data=None, bytes_data=None):
+    async def send_event_frame(self, event, payload):
+        """Send the frame pre-encoded in a group event, or encode ``payload()`` if it has none."""
+        frame = event.get("frames", {}).get(self.encoding)
+        if frame is None:
+            await self.send_payload(payload())
+        else:
+            await self.send_frame(frame)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if not text_data:
+            # Binary frames only carry payloads on MessagePack connections
+            if bytes_data and self.encoding == wire.MSGPACK:
+                try:
+                    content = wire.decode(bytes_data)
+                except wire.WireError:
+                    return
+                if isinstance(content, dict):
+                    await self.receive_json(content)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    @classmethod
+    async def decode_json(cls, text_data):
         # Accept JSON payloads with a `message` field; gracefully handle plain text
         try:
-            data = json.loads(text_data) if text_data else {}
-        except Exception:
+            data = json.loads(text_data)
+        except ValueError:
             data = {"message": text_data}
+        return data if isinstance(data, dict) else {"message": text_data}
 
-        message = data.get("message")
-        if message is None:
-            # nothing to do
+    async def receive_json(self, content, **kwargs):
+        if self.room_id is not None:
+            # A cache hit while the membership is unchanged; removed users lose the socket
+            access = await self.room_access.lookup(self.room_name)
+            if not access.allows(self.scope.get("user")):
+                await self.close(code=FORBIDDEN_CLOSE_CODE)
+                return
+        kind = content.get("type")
+        message = content.get("message")
+        # Raw bytes have no JSON form
+        chat = kind not in CONTROL_FRAMES and message is not None and not isinstance(message, bytes)
+        # Every frame costs a token of the socket's bucket; the user and room buckets only meter chat messages
+        if chat:
+            throttled = self.rate_limiter.check(self.channel_name, self.username, self.room_name)
+        else:
+            throttled = self.rate_limiter.check(self.channel_name, None, None)
+        if throttled is not None:
+            scope, retry_after = throttled
+            await self.send_payload(
+                {"type": "error", "code": "rate_limited", "scope": scope, "retry_after": round(retry_after, 3)}
+            )
+            return
+
+        if self.username is not None:
+            # Any frame counts as a heartbeat
+            self.presence.touch(self.room_name, self.username, self.channel_name, self.room_id)
+            if kind == "typing":
+                self.presence.set_typing(self.room_name, self.username, bool(content.get("typing", True)))
+                return
+        if kind == "presence.subscribe":
+            await self.subscribe_presence()
+            return
+        if not chat:
+            # heartbeat, anonymous typing or nothing to do
             return
+        if self.username is not None:
+            # Sending ends the typing state
+            self.presence.set_typing(self.room_name, self.username, False)
 
-        sender = None
+        # The sender always comes from the session, never from the payload
+        sender = "anonymous"
+        sender_id = None
         user = self.scope.get("user")
         if user and getattr(user, "is_authenticated", False):
-            try:
-                sender = str(user.username)
-            except Exception:
-                sender = str(user)
-        else:
-            sender = data.get("sender", "anonymous")
+            sender_id = user.pk
+            sender = self.username
 
-        # Broadcast message to room group
-        async_to_sync(self.channel_layer.group_send)(
+        # Broadcast message to room group, encoded once for every recipient
+        await self.channel_layer.group_send(
             self.group_name,
             {
                 "type": "chat.message",
                 "message": message,
                 "sender": sender,
+                "frames": wire.encode_frames({"message": message, "sender": sender}),
             },
         )
 
-    def chat_message(self, event):
+        # ChatMessage.sender is mandatory, so only authenticated messages
+        # sent to a known room are persisted.
+        if self.room_id is not None and sender_id is not None:
+            await self.message_buffer.add(self.room_id, sender_id, str(message))
+
+    async def chat_revoke(self, event):
+        # Sent by membership.members_removed once the removal is committed
+        user = self.scope.get("user")
+        user_ids = event.get("user_ids")
+        if user_ids is None or (user is not None and getattr(user, "pk", None) in user_ids):
+            await self.close(code=FORBIDDEN_CLOSE_CODE)
+
+    async def chat_message(self, event):
         # Receive message from group
-        payload = {"message": event.get("message"), "sender": event.get("sender")}
-        self.send(text_data=json.dumps(payload))
+        await self.send_event_frame(event, lambda: {"message": event.get("message"), "sender": event.get("sender")})
+
+    async def presence_update(self, event):
+        await self.send_event_frame(
+            event,
+            lambda: {
+                "type": "presence",
+                "online": event["online"],
+                "online_count": event["online_count"],
+                "typing": event["typing"],
+            },
+        )
@@ -0,0 +1,537 @@
+"""Channel layer shared by several worker processes on one host, without Redis.
+
+``InMemoryChannelLayer`` only works inside a single process. This module
+provides ``ShardedSocketChannelLayer``, whose state lives in a set of shard
+processes (``manage.py channel_hub``) reached over Unix domain sockets:
+
+- Group membership is sharded by a stable hash of the group name, so groups
+  like ``chat_<room>`` spread over the shards and each shard keeps only its
+  part of the membership table.
+- Every worker process connects to every shard and registers a client id.
+  Process-specific channels (``specific.<client id>!<random>``) live in the
+  worker itself; a ``group_send`` is forwarded by the owning shard as one
+  frame per worker process (not per channel) and fanned out locally.
+- Plain named channels (``send``/``receive`` without ``!``) are queued on the
+  shard that owns the channel name.
+- Group memberships expire after ``group_expiry``; all channels of a worker
+  are dropped as soon as its connection closes, and a channel whose message
+  expired unread locally is removed from every group (as in the in-memory
+  layer).
+- Backpressure: a shard stops writing to a worker whose socket buffer is
+  above ``high_water`` bytes (group messages are dropped, direct sends raise
+  ``ChannelFull``), named channel queues hold at most ``capacity`` messages,
+  and local channel queues drop messages beyond their capacity.
+
+Messages are encoded once per send with ``marshal`` (which covers exactly the
+types a channel message may contain); shards only pass the bytes along. The
+sockets are created with ``0600`` permissions: only processes of the same
+user can talk to the hub.
+"""
+import asyncio
+import logging
+import marshal
+import os
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from collections import defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "skillswap-channels")
+
+
+def socket_path(path, index):
+    return os.path.join(path, f"shard-{index}.sock")
+
+
+def shard_for(name, shards):
+    """Stable shard index for a group or channel name (same in every process)."""
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def client_of(channel):
+    """Client id embedded in a process-specific channel name, else ``None``."""
+    if "!" not in channel:
+        return None
+    return channel[: channel.index("!")].rsplit(".", 1)[-1]
+
+
+def encode_frame(obj):
+    payload = marshal.dumps(obj)
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f"Frame of {size} bytes exceeds the limit")
+    return marshal.loads(await reader.readexactly(size))
+
+
+class ChannelShard:
+    """One shard of the hub: a Unix socket server holding part of the state."""
+
+    def __init__(
+        self,
+        index,
+        shards,
+        path=DEFAULT_PATH,
+        capacity=100,
+        expiry=60,
+        group_expiry=86400,
+        high_water=4 * 1024 * 1024,
+        cleanup_interval=5.0,
+    ):
+        self.index = index
+        self.shards = shards
+        self.path = path
+        self.capacity = capacity
+        self.expiry = expiry
+        self.group_expiry = group_expiry
+        self.high_water = high_water
+        self.cleanup_interval = cleanup_interval
+        # group -> {channel: expires_at}
+        self.groups = defaultdict(dict)
+        # client id -> writer, and the (group, channel) pairs it joined
+        self.clients = {}
+        self.memberships = defaultdict(set)
+        # named channel -> deque[(expires_at, payload)] / deque[(writer, request id)]
+        self.queues = defaultdict(deque)
+        self.waiters = defaultdict(deque)
+        self.peers = {}
+        self.dropped = 0
+
+    async def serve(self):
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        address = socket_path(self.path, self.index)
+        if os.path.exists(address):
+            os.unlink(address)
+        server = await asyncio.start_unix_server(self._handle, path=address)
+        os.chmod(address, 0o600)
+        cleanup = asyncio.ensure_future(self._cleanup_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            cleanup.cancel()
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            self.expire()
+
+    def expire(self):
+        now = time.time()
+        for group, members in list(self.groups.items()):
+            for channel, expires_at in list(members.items()):
+                if expires_at < now:
+                    self._discard(group, channel)
+        for channel, queue in list(self.queues.items()):
+            while queue and queue[0][0] < now:
+                queue.popleft()
+            if not queue:
+                del self.queues[channel]
+
+    async def _handle(self, reader, writer):
+        client = None
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame[0]
+                if op == "group_send":
+                    self.group_send(frame[1], frame[2])
+                elif op == "group_add":
+                    self.group_add(frame[1], frame[2], frame[3])
+                    if frame[4]:
+                        self._push(writer, encode_frame(("ack", frame[4], True)), force=True)
+                elif op == "group_discard":
+                    self._discard(frame[1], frame[2])
+                elif op == "send":
+                    ok = self.send(frame[1], frame[2])
+                    if frame[3]:
+                        self._push(writer, encode_frame(("ack", frame[3], ok)), force=True)
+                elif op == "recv":
+                    self.receive(writer, frame[1], frame[2])
+                elif op == "drop_channel":
+                    self.drop_channel(frame[1])
+                elif op == "hello":
+                    client = frame[1]
+                    self.clients[client] = writer
+                elif op == "flush":
+                    self.flush()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if client is not None and self.clients.get(client) is writer:
+                del self.clients[client]
+                # Everything that worker joined is dead now
+                for group, channel in list(self.memberships.pop(client, ())):
+                    self._discard(group, channel)
+            for waiters in self.waiters.values():
+                for waiter in [w for w in waiters if w[0] is writer]:
+                    waiters.remove(waiter)
+            writer.close()
+
+    def _push(self, writer, frame, force=False):
+        if not force and writer.transport.get_write_buffer_size() > self.high_water:
+            self.dropped += 1
+            return False
+        writer.write(frame)
+        return True
+
+    def group_add(self, group, channel, group_expiry):
+        self.groups[group][channel] = time.time() + group_expiry
+        client = client_of(channel)
+        if client is not None:
+            self.memberships[client].add((group, channel))
+
+    def _discard(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        client = client_of(channel)
+        if client is not None:
+            self.memberships.get(client, set()).discard((group, channel))
+
+    def drop_channel(self, channel):
+        client = client_of(channel)
+        for group, member in list(self.memberships.get(client, ())):
+            if member == channel:
+                self._discard(group, channel)
+
+    def group_send(self, group, payload):
+        members = self.groups.get(group)
+        if not members:
+            return
+        now = time.time()
+        by_client = defaultdict(list)
+        named = []
+        for channel, expires_at in list(members.items()):
+            if expires_at < now:
+                self._discard(group, channel)
+                continue
+            client = client_of(channel)
+            if client is None:
+                named.append(channel)
+            else:
+                by_client[client].append(channel)
+        for client, channels in by_client.items():
+            writer = self.clients.get(client)
+            if writer is not None:
+                self._push(writer, encode_frame(("deliver", channels, payload)))
+        for channel in named:
+            self.send(channel, payload)
+
+    def send(self, channel, payload):
+        """Route one message; returns False when the target is full."""
+        client = client_of(channel)
+        if client is not None:
+            writer = self.clients.get(client)
+            if writer is None:
+                # Dead process: the message has nowhere to go
+                return True
+            return self._push(writer, encode_frame(("deliver", [channel], payload)))
+
+        owner = shard_for(channel, self.shards)
+        if owner != self.index:
+            asyncio.ensure_future(self._forward(owner, channel, payload))
+            return True
+
+        waiters = self.waiters.get(channel)
+        while waiters:
+            writer, request_id = waiters.popleft()
+            if not writer.is_closing():
+                self._push(writer, encode_frame(("recv_ok", request_id, channel, payload)), force=True)
+                return True
+        queue = self.queues[channel]
+        if len(queue) >= self.capacity:
+            return False
+        queue.append((time.time() + self.expiry, payload))
+        return True
+
+    async def _forward(self, owner, channel, payload):
+        writer = self.peers.get(owner)
+        if writer is None or writer.is_closing():
+            _, writer = await asyncio.open_unix_connection(socket_path(self.path, owner))
+            self.peers[owner] = writer
+        writer.write(encode_frame(("send", channel, payload, 0)))
+
+    def receive(self, writer, channel, request_id):
+        queue = self.queues.get(channel)
+        now = time.time()
+        while queue:
+            expires_at, payload = queue.popleft()
+            if expires_at >= now:
+                self._push(writer, encode_frame(("recv_ok", request_id, channel, payload)), force=True)
+                return
+        self.waiters[channel].append((writer, request_id))
+
+    def flush(self):
+        self.groups.clear()
+        self.memberships.clear()
+        self.queues.clear()
+
+
+class _Connection:
+    """The links of one worker (per event loop) to every shard."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.client_id = uuid.uuid4().hex
+        self.writers = []
+        self.readers = []
+        self.queues = {}
+        self.pending = {}
+        self.next_request = 1
+        self.lock = asyncio.Lock()
+        self.connected = False
+
+    async def ensure_connected(self):
+        if self.connected:
+            return
+        async with self.lock:
+            if self.connected:
+                return
+            writers, readers = [], []
+            try:
+                for index in range(self.layer.shards):
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_unix_connection(socket_path(self.layer.path, index)),
+                        self.layer.connect_timeout,
+                    )
+                    writer.write(encode_frame(("hello", self.client_id)))
+                    writers.append(writer)
+                    readers.append(asyncio.ensure_future(self._read(reader)))
+            except BaseException:
+                # A shard is down: close the ones already open, the next call starts over
+                for writer in writers:
+                    writer.close()
+                for task in readers:
+                    task.cancel()
+                raise
+            self.writers, self.readers = writers, readers
+            self.connected = True
+
+    async def _read(self, reader):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame[0]
+                if op == "deliver":
+                    self._deliver(frame[1], frame[2])
+                elif op == "ack":
+                    self._resolve(frame[1], frame[2])
+                elif op == "recv_ok":
+                    if not self._resolve(frame[1], frame[3]):
+                        # The receiver gave up meanwhile: put the message back
+                        asyncio.ensure_future(self.layer._send_payload(frame[2], frame[3]))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._lost()
+
+    def _lost(self):
+        if not self.connected:
+            return
+        self.connected = False
+        for writer in self.writers:
+            writer.close()
+        for task in self.readers:
+            task.cancel()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Lost connection to the channel hub"))
+        self.pending.clear()
+
+    def _resolve(self, request_id, value):
+        future = self.pending.pop(request_id, None)
+        if future is None or future.done():
+            return False
+        future.set_result(value)
+        return True
+
+    def queue(self, channel):
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = asyncio.Queue(maxsize=self.layer.get_capacity(channel))
+        return queue
+
+    def _deliver(self, channels, payload):
+        expires_at = time.time() + self.layer.expiry
+        for channel in channels:
+            try:
+                self.queue(channel).put_nowait((expires_at, payload))
+            except asyncio.QueueFull:
+                self.layer.dropped += 1
+
+    def request(self):
+        loop = asyncio.get_running_loop()
+        request_id = self.next_request
+        self.next_request += 1
+        future = loop.create_future()
+        self.pending[request_id] = future
+        return request_id, future
+
+    async def write(self, shard, frame):
+        writer = self.writers[shard]
+        writer.write(encode_frame(frame))
+        await writer.drain()
+
+
+class ShardedSocketChannelLayer(BaseChannelLayer):
+    """Channel layer client talking to the ``channel_hub`` shards.
+
+    CONFIG keys: ``path`` (socket directory), ``shards`` (must match the hub),
+    ``expiry``, ``group_expiry``, ``capacity``, ``channel_capacity`` and
+    ``connect_timeout``.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        path=DEFAULT_PATH,
+        shards=4,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        connect_timeout=5.0,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = str(path)
+        self.shards = int(shards)
+        self.group_expiry = group_expiry
+        self.connect_timeout = connect_timeout
+        self.dropped = 0
+        self._connections = {}
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is None:
+            for stale in [other for other in self._connections if other.is_closed()]:
+                del self._connections[stale]
+            connection = self._connections[loop] = _Connection(self)
+        await connection.ensure_connected()
+        return connection
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific"):
+        connection = await self._connection()
+        return f"{prefix}.{connection.client_id}!{uuid.uuid4().hex}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        await self._send_payload(channel, marshal.dumps(message))
+
+    async def _send_payload(self, channel, payload):
+        connection = await self._connection()
+        client = client_of(channel)
+        if client == connection.client_id:
+            # Our own channel: no round-trip through the hub
+            try:
+                connection.queue(channel).put_nowait((time.time() + self.expiry, payload))
+            except asyncio.QueueFull:
+                raise ChannelFull(channel)
+            return
+        shard = shard_for(client or channel, self.shards)
+        request_id, future = connection.request()
+        await connection.write(shard, ("send", channel, payload, request_id))
+        if not await future:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        if client_of(channel) is None:
+            return await self._receive_named(connection, channel)
+        if client_of(channel) != connection.client_id:
+            raise RuntimeError(f"Channel {channel} does not belong to this process/event loop")
+
+        queue = connection.queue(channel)
+        while True:
+            expires_at, payload = await queue.get()
+            if expires_at >= time.time():
+                break
+            # Nobody read it in time: treat the channel as dead, like the
+            # in-memory layer, and drop it from every group.
+            await self._drop_channel(connection, channel)
+        if queue.empty():
+            connection.queues.pop(channel, None)
+        return marshal.loads(payload)
+
+    async def _receive_named(self, connection, channel):
+        request_id, future = connection.request()
+        await connection.write(shard_for(channel, self.shards), ("recv", channel, request_id))
+        try:
+            return marshal.loads(await future)
+        finally:
+            connection.pending.pop(request_id, None)
+
+    async def _drop_channel(self, connection, channel):
+        for shard in range(self.shards):
+            await connection.write(shard, ("drop_channel", channel))
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        # Wait for the shard so a group_send issued right after (from any
+        # process) already sees the new member
+        request_id, future = connection.request()
+        await connection.write(
+            shard_for(group, self.shards), ("group_add", group, channel, self.group_expiry, request_id)
+        )
+        await future
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        connection = await self._connection()
+        await connection.write(shard_for(group, self.shards), ("group_discard", group, channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        connection = await self._connection()
+        await connection.write(shard_for(group, self.shards), ("group_send", group, marshal.dumps(message)))
+
+    # Flush extension
+
+    async def flush(self):
+        connection = await self._connection()
+        for shard in range(self.shards):
+            await connection.write(shard, ("flush",))
+        connection.queues.clear()
+
+    async def close(self):
+        for connection in self._connections.values():
+            connection._lost()
+        self._connections.clear()
+
+
+def run_shard(index, shards, path=DEFAULT_PATH, **options):
+    """Blocking entry point for one shard process."""
+    shard = ChannelShard(index, shards, path=path, **options)
+    try:
+        asyncio.run(shard.serve())
+    except KeyboardInterrupt:
+        pass
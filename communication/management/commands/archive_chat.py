@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from communication import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move mensagens de chat mais antigas que a retenção para segmentos comprimidos em "
+        "CHAT_ARCHIVE_DIR (communication.archive); com --loop roda continuamente em segundo plano"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=getattr(settings, "CHAT_ARCHIVE_RETENTION_DAYS", 90),
+            help="Mensagens mais antigas que isto (dias) são arquivadas",
+        )
+        parser.add_argument("--room", type=int, action="append", dest="rooms", help="Só esta sala (repetível)")
+        parser.add_argument("--segment-size", type=int, default=None, help="Mensagens por segmento")
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM no SQLite depois de arquivar")
+        parser.add_argument("--loop", type=float, default=None, help="Repete a cada N segundos")
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if options["loop"] is None:
+                return
+            time.sleep(options["loop"])
+
+    def run_once(self, options):
+        before = timezone.now() - timedelta(days=options["days"])
+        log = self.stdout.write if options["verbosity"] > 1 else None
+        size_before = self.database_size()
+        moved = archive.archive_messages(
+            before, room_ids=options["rooms"], segment_size=options["segment_size"], log=log
+        )
+        if options["vacuum"] and moved and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+        size_after = self.database_size()
+        message = f"{moved} messages older than {before:%Y-%m-%d %H:%M} archived"
+        if size_before is not None:
+            message += f"; database {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB"
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def database_size(self):
+        if connection.vendor != "sqlite":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return pages * cursor.fetchone()[0]
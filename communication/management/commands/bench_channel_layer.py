@@ -0,0 +1,130 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import rate
+
+
+def _worker(path, shards, rooms, channels_per_room, expected, ready, results):
+    """One ASGI-like worker process: joins chat_<room> groups and counts deliveries."""
+    from communication.layers import ShardedSocketChannelLayer
+
+    async def main():
+        layer = ShardedSocketChannelLayer(path=path, shards=shards, capacity=100000)
+        channels = []
+        for room in range(rooms):
+            for _ in range(channels_per_room):
+                channel = await layer.new_channel()
+                await layer.group_add(f"chat_room-{room}", channel)
+                channels.append(channel)
+
+        received = 0
+        last = 0.0
+
+        async def drain(channel):
+            nonlocal received, last
+            for _ in range(expected):
+                await layer.receive(channel)
+                received += 1
+                last = time.perf_counter()
+
+        tasks = [asyncio.ensure_future(drain(channel)) for channel in channels]
+        ready.wait()
+        done, pending = await asyncio.wait(tasks, timeout=60)
+        for task in pending:
+            task.cancel()
+        await layer.close()
+        results.put((received, last))
+
+    asyncio.run(main())
+
+
+def _publisher(path, shards, rooms, messages, payload, ready, results):
+    from communication.layers import ShardedSocketChannelLayer
+
+    async def main():
+        layer = ShardedSocketChannelLayer(path=path, shards=shards)
+        await layer._connection()
+        ready.wait()
+        started = time.perf_counter()
+        for seq in range(messages):
+            for room in range(rooms):
+                await layer.group_send(
+                    f"chat_room-{room}", {"type": "chat.message", "message": payload, "sender": str(seq)}
+                )
+        await layer.close()
+        results.put(started)
+
+    asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do channel layer multiprocesso (communication.layers): mede entregas/s de fan-out "
+        "para os grupos chat_<sala> conforme aumenta o número de processos worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", default="1,2,4,8", help="Quantidades de workers a testar")
+        parser.add_argument("--shards", type=int, default=4)
+        parser.add_argument("--rooms", type=int, default=20)
+        parser.add_argument("--sockets", type=int, default=50, help="Sockets por sala em cada worker")
+        parser.add_argument("--messages", type=int, default=100, help="Mensagens por sala")
+        parser.add_argument("--size", type=int, default=64, help="Tamanho do texto de cada mensagem")
+
+    def handle(self, *args, **options):
+        from communication.layers import run_shard
+
+        context = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory() as path:
+            hub = [
+                context.Process(target=run_shard, args=(i, options["shards"], path), kwargs={"capacity": 100000})
+                for i in range(options["shards"])
+            ]
+            for process in hub:
+                process.start()
+            time.sleep(0.5)
+            try:
+                self.stdout.write(f"{'workers':>8}{'sockets':>10}{'deliveries':>12}{'elapsed s':>11}{'deliveries/s':>14}")
+                for workers in [int(n) for n in options["workers"].split(",")]:
+                    self._run(context, path, workers, options)
+            finally:
+                for process in hub:
+                    process.terminate()
+                    process.join()
+
+    def _run(self, context, path, workers, options):
+        rooms, messages = options["rooms"], options["messages"]
+        ready = context.Barrier(workers + 2)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(path, options["shards"], rooms, options["sockets"], messages, ready, results),
+            )
+            for _ in range(workers)
+        ]
+        processes.append(
+            context.Process(
+                target=_publisher,
+                args=(path, options["shards"], rooms, messages, "x" * options["size"], ready, results),
+            )
+        )
+        for process in processes:
+            process.start()
+        ready.wait()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        started = next(value for value in outcomes if isinstance(value, float))
+        counts = [value for value in outcomes if isinstance(value, tuple)]
+        delivered = sum(received for received, _ in counts)
+        elapsed = max(last for _, last in counts) - started
+        sockets = workers * rooms * options["sockets"]
+        self.stdout.write(
+            f"{workers:>8}{sockets:>10}{delivered:>12}{elapsed:>11.2f}{rate(delivered, elapsed):>14.0f}"
+        )
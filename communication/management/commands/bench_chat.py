@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import Timer, isolated_database, percentile, rate
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do chat: abre milhares de sockets em processo via WebsocketCommunicator "
+        "e mede mensagens/s e latência p99 de fan-out (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=2000, help="Total de sockets abertos")
+        parser.add_argument("--rooms", type=int, default=20, help="Número de salas (sockets divididos entre elas)")
+        parser.add_argument("--messages", type=int, default=50, help="Mensagens enviadas por sala")
+        parser.add_argument("--interval", type=float, default=0.0, help="Pausa (s) entre envios de cada sala")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Tempo máximo de espera por entrega")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            result = async_to_sync(self.run_benchmark)(
+                options["sockets"], options["rooms"], options["messages"], options["interval"], options["timeout"]
+            )
+        for label, value in result:
+            self.stdout.write(f"{label:<28} {value}")
+
+    async def run_benchmark(self, sockets, rooms, messages, interval, timeout):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from communication.buffer import message_buffer
+        from communication.consumers import ChatConsumer
+        from communication.models import ChatMessage, ChatRoom
+        from communication.routing import websocket_urlpatterns
+        from communication.throttling import ChatRateLimiter
+
+        # Every publisher is the same user sending as fast as it can: measure
+        # the fan-out, not the rate limiter
+        ChatConsumer.rate_limiter = ChatRateLimiter(limits={})
+
+        user, room_names = await database_sync_to_async(self._create_fixtures)(rooms)
+        application = URLRouter(websocket_urlpatterns)
+
+        # Open every socket, assigning them round-robin to rooms
+        communicators = []
+        for i in range(sockets):
+            room = room_names[i % rooms]
+            communicator = WebsocketCommunicator(application, f"/ws/chat/{room}/")
+            communicator.scope["user"] = user
+            communicators.append((room, communicator))
+
+        with Timer() as connect_timer:
+            results = await asyncio.gather(*(c.connect() for _, c in communicators))
+        connected = sum(1 for ok, _ in results if ok)
+
+        members = {}
+        for room, communicator in communicators:
+            members.setdefault(room, []).append(communicator)
+
+        sent_at = {}
+        last_delivery = {}
+        lost = 0
+
+        async def drain(room, communicator):
+            nonlocal lost
+            for _ in range(messages):
+                try:
+                    frame = await communicator.receive_json_from(timeout=timeout)
+                except asyncio.TimeoutError:
+                    lost += 1
+                    continue
+                key = (room, frame["message"])
+                now = time.perf_counter()
+                if now > last_delivery.get(key, 0.0):
+                    last_delivery[key] = now
+
+        async def publish(room, communicator):
+            for seq in range(messages):
+                sent_at[(room, str(seq))] = time.perf_counter()
+                await communicator.send_json_to({"message": str(seq)})
+                # Yield (or pace) so receivers interleave with the publisher
+                await asyncio.sleep(interval)
+
+        drains = [asyncio.ensure_future(drain(room, c)) for room, c in communicators]
+        with Timer() as send_timer:
+            await asyncio.gather(*(publish(room, comms[0]) for room, comms in members.items()))
+            await asyncio.gather(*drains)
+            persisted_now = await message_buffer.flush_all()
+
+        latencies = [
+            (last_delivery[key] - started) * 1000
+            for key, started in sent_at.items()
+            if key in last_delivery
+        ]
+        total_sent = len(sent_at)
+        delivered = total_sent * (sockets // rooms) - lost if rooms else 0
+        stored = await database_sync_to_async(ChatMessage.objects.count)()
+
+        await asyncio.gather(*(c.disconnect() for _, c in communicators))
+        await database_sync_to_async(ChatRoom.objects.all().delete)()
+
+        return [
+            ("sockets connected", f"{connected}/{sockets} in {connect_timer.elapsed:.2f}s"),
+            ("messages sent", total_sent),
+            ("frames delivered", delivered),
+            ("frames lost/timed out", lost),
+            ("elapsed (s)", f"{send_timer.elapsed:.3f}"),
+            ("messages/sec", f"{rate(total_sent, send_timer.elapsed):.1f}"),
+            ("deliveries/sec", f"{rate(delivered, send_timer.elapsed):.1f}"),
+            ("fan-out latency p50 (ms)", f"{percentile(latencies, 50):.2f}"),
+            ("fan-out latency p99 (ms)", f"{percentile(latencies, 99):.2f}"),
+            ("rows persisted", f"{stored} (final flush wrote {persisted_now})"),
+        ]
+
+    def _create_fixtures(self, rooms):
+        from communication.models import ChatRoom, RoomMembership
+
+        User = get_user_model()
+        user = User.objects.create_user(username="bench-chat", password=None)
+        names = [f"bench-room-{i}" for i in range(rooms)]
+        created = ChatRoom.objects.bulk_create([ChatRoom(name=name) for name in names])
+        # Database rooms only admit their participants
+        RoomMembership.objects.bulk_create([RoomMembership(room=room, user=user) for room in created])
+        return user, names
@@ -0,0 +1,114 @@
+import random
+import tempfile
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.seeding import SeedSizes, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do arquivo de mensagens (communication.archive): redução do banco e latência de "
+        "leitura do histórico em intervalos arquivados (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--rooms", type=int, default=1000)
+        parser.add_argument("--messages-per-room", type=int, default=500)
+        parser.add_argument("--days", type=int, default=365, help="Idade máxima das mensagens geradas")
+        parser.add_argument("--retention", type=float, default=90, help="Dias mantidos no banco")
+        parser.add_argument("--reads", type=int, default=200, help="Páginas lidas por medição")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database(), tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(CHAT_ARCHIVE_DIR=archive_dir):
+                self.run(options)
+
+    def run(self, options):
+        from rest_framework.test import APIClient
+
+        from communication import archive
+        from communication.api import ChatHistoryPagination
+        from communication.models import ArchivedSegment, ChatMessage, ChatRoom
+
+        sizes = SeedSizes(
+            users=options["users"],
+            skills_per_user=1,
+            rooms=options["rooms"],
+            messages_per_room=options["messages_per_room"],
+            days=options["days"],
+        )
+        with Timer() as gen:
+            SyntheticDataGenerator(sizes, seed=options["seed"]).run()
+        self.stdout.write(f"generated {ChatMessage.objects.count()} messages in {gen.elapsed:.1f}s")
+
+        cutoff = timezone.now() - timedelta(days=options["retention"])
+        rng = random.Random(options["seed"])
+        rooms = rng.sample(list(ChatRoom.objects.prefetch_related("participants")), min(options["reads"], options["rooms"]))
+        # One cursor per room, inside the range that is about to be archived
+        targets = []
+        for room in rooms:
+            old = list(ChatMessage.objects.filter(room=room, timestamp__lt=cutoff).order_by("-timestamp", "-id")[:200])
+            if old:
+                cursor = ChatHistoryPagination().encode_cursor(rng.choice(old))
+                targets.append((room, room.participants.all()[0], cursor))
+
+        client = APIClient(SERVER_NAME="localhost")
+
+        def read_pages(with_cursor):
+            timings = []
+            for room, user, cursor in targets:
+                client.force_authenticate(user)
+                url = reverse("communication:communication-api:rooms-messages", args=[room.pk])
+                params = {"page_size": 50, "cursor": cursor} if with_cursor else {"page_size": 50}
+                with Timer() as t:
+                    response = client.get(url, params)
+                assert response.status_code == 200 and response.json()["results"], response.content
+                timings.append(t.elapsed * 1000)
+            return timings
+
+        results = [("newest page (hot)", read_pages(False)), ("old range, in database", read_pages(True))]
+
+        self.vacuum()
+        size_before = self.database_size()
+        with Timer() as archiving:
+            moved = archive.archive_messages(cutoff)
+        self.vacuum()
+        size_after = self.database_size()
+        segment_bytes = sum(ArchivedSegment.objects.values_list("size_bytes", flat=True))
+
+        archive._read_segment.cache_clear()
+        results.append(("old range, archived (cold)", read_pages(True)))
+        results.append(("old range, archived (warm)", read_pages(True)))
+        results.append(("newest page after archiving", read_pages(False)))
+
+        self.stdout.write(
+            f"archived {moved} messages into {ArchivedSegment.objects.count()} segments in {archiving.elapsed:.1f}s"
+        )
+        self.stdout.write(
+            f"database {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB "
+            f"({100 * (1 - size_after / size_before):.0f}% smaller); segments on disk {segment_bytes / 1e6:.1f} MB"
+        )
+        self.stdout.write(f"\n{'history read (50 rows)':<30}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, timings in results:
+            self.stdout.write(f"{label:<30}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}")
+
+    def vacuum(self):
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+    def database_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return pages * cursor.fetchone()[0]
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import Timer, isolated_database, percentile, rate
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da autorização de sockets do chat: uma rajada de conexões (reconexão em massa) "
+        "sem cache, com o cache de participantes frio e quente (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=20000, help="Conexões abertas por rodada")
+        parser.add_argument("--rooms", type=int, default=100, help="Salas (sockets divididos entre elas)")
+        parser.add_argument("--members", type=int, default=50, help="Participantes por sala")
+        parser.add_argument("--concurrency", type=int, default=200, help="Handshakes em andamento ao mesmo tempo")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Tempo máximo de espera por conexão")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            rows = async_to_sync(self.run_benchmark)(
+                options["sockets"], options["rooms"], options["members"], options["concurrency"], options["timeout"]
+            )
+        self.stdout.write(f"\n{'membership check':<34}{'connects/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'loads':>8}")
+        for label, connects_per_second, latencies, loads in rows:
+            self.stdout.write(
+                f"{label:<34}{connects_per_second:>12.0f}{percentile(latencies, 50):>10.1f}"
+                f"{percentile(latencies, 99):>10.1f}{loads:>8}"
+            )
+
+    async def run_benchmark(self, sockets, rooms, members, concurrency, timeout):
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from communication.consumers import ChatConsumer
+        from communication.membership import RoomAccessCache
+        from communication.routing import websocket_urlpatterns
+
+        class Uncached(RoomAccessCache):
+            """What connect would cost querying the room and its participants every time."""
+
+            async def lookup(self, room_name):
+                return await database_sync_to_async(self.load)(room_name)
+
+        fixtures = await database_sync_to_async(self._create_fixtures)(rooms, members)
+        application = URLRouter(websocket_urlpatterns)
+
+        async def storm(room_access):
+            ChatConsumer.room_access = room_access
+            communicators = []
+            for i in range(sockets):
+                room, users = fixtures[i % rooms]
+                communicator = WebsocketCommunicator(application, f"/ws/chat/{room}/")
+                communicator.scope["user"] = users[(i // rooms) % members]
+                communicators.append(communicator)
+            latencies = []
+            # Like a server's accept backlog: a bounded number of handshakes in flight
+            handshakes = asyncio.Semaphore(concurrency)
+            layer = get_channel_layer()
+            closed = 0
+
+            async def connect(communicator):
+                nonlocal closed
+                async with handshakes:
+                    started = time.perf_counter()
+                    connected, _ = await communicator.connect(timeout=timeout)
+                    assert connected
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    # Only the handshake is measured. The in-memory channel layer scans
+                    # every channel it has seen on each call, so closed ones are dropped
+                    await communicator.disconnect()
+                    closed += 1
+                    if closed % concurrency == 0:
+                        layer.channels = {name: queue for name, queue in layer.channels.items() if not queue.empty()}
+
+            loads = room_access.loads
+            with Timer() as timer:
+                await asyncio.gather(*(connect(c) for c in communicators))
+            loads = room_access.loads - loads
+            return rate(sockets, timer.elapsed), latencies, loads
+
+        original = ChatConsumer.room_access
+        try:
+            rows = [("no cache (queries per connect)", *await storm(Uncached()))]
+            cache = RoomAccessCache()
+            rows.append(("cold cache", *await storm(cache)))
+            rows.append(("warm cache", *await storm(cache)))
+        finally:
+            ChatConsumer.room_access = original
+        return rows
+
+    def _create_fixtures(self, rooms, members):
+        from communication.models import ChatRoom, RoomMembership
+
+        User = get_user_model()
+        created = ChatRoom.objects.bulk_create([ChatRoom(name=f"bench-room-{i}") for i in range(rooms)])
+        fixtures = []
+        for room in created:
+            users = User.objects.bulk_create(
+                [User(username=f"bench-{room.pk}-{n}", password="!") for n in range(members)]
+            )
+            RoomMembership.objects.bulk_create([RoomMembership(room=room, user=user) for user in users])
+            fixtures.append((room.name, users))
+        return fixtures
@@ -0,0 +1,111 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.queries import record_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da lista de salas com não lidas (GET /communication/api/rooms/) para um usuário em "
+        "muitas salas, comparada a um COUNT por sala (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=500, help="Salas do usuário medido")
+        parser.add_argument("--messages", type=int, default=50, help="Mensagens por sala")
+        parser.add_argument("--repeat", type=int, default=100, help="Requisições medidas")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from rest_framework.test import APIClient
+
+        from communication.models import ChatMessage, RoomMembership
+
+        rng = random.Random(options["seed"])
+        with Timer() as setup:
+            user = self._create_fixtures(options["rooms"], options["messages"], rng)
+        self.stdout.write(
+            f"{options['rooms']} rooms x {options['messages']} messages created in {setup.elapsed:.1f}s"
+        )
+
+        # "localhost" is always allowed in DEBUG; "testserver" is not outside tests
+        client = APIClient(SERVER_NAME="localhost")
+        client.force_authenticate(user)
+        url = reverse("communication:communication-api:rooms-list")
+        with record_queries() as stats:
+            rooms = client.get(url).json()
+        unread_total = sum(room["unread_count"] for room in rooms)
+
+        timings = []
+        for _ in range(options["repeat"]):
+            with Timer() as t:
+                client.get(url)
+            timings.append(t.elapsed * 1000)
+
+        # What the same badges cost without the counter: one COUNT per room
+        naive = []
+        memberships = list(RoomMembership.objects.filter(user=user).values_list("room_id", "last_read_id"))
+        for _ in range(max(1, options["repeat"] // 10)):
+            with Timer() as t, record_queries() as naive_stats:
+                counted = sum(
+                    ChatMessage.objects.filter(room_id=room_id, id__gt=last_read_id).exclude(sender=user).count()
+                    for room_id, last_read_id in memberships
+                )
+            naive.append(t.elapsed * 1000)
+
+        self.stdout.write(f"\n{'room list':<24}{'queries':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        self.stdout.write(
+            f"{'unread counters':<24}{stats.count:>8}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}"
+        )
+        self.stdout.write(
+            f"{'COUNT per room':<24}{naive_stats.count:>8}{percentile(naive, 50):>10.2f}{percentile(naive, 99):>10.2f}"
+        )
+        self.stdout.write(f"\nunread messages: {unread_total} (COUNT per room: {counted})")
+
+    def _create_fixtures(self, rooms, messages, rng):
+        from communication import unread
+        from communication.models import ChatMessage, ChatRoom, RoomMembership
+        from core.seeding import insert_rows
+
+        User = get_user_model()
+        user = User.objects.create_user(username="bench-rooms", password=None)
+        others = User.objects.bulk_create([User(username=f"bench-peer-{i}") for i in range(rooms)])
+        with transaction.atomic():
+            created = ChatRoom.objects.bulk_create([ChatRoom(name=f"bench-room-{i}") for i in range(rooms)])
+            RoomMembership.objects.bulk_create(
+                [
+                    RoomMembership(room=room, user=member)
+                    for room, other in zip(created, others)
+                    for member in (user, other)
+                ]
+            )
+
+        now = timezone.now()
+
+        def rows():
+            for room, other in zip(created, others):
+                for i in range(messages):
+                    sender = user if rng.random() < 0.3 else other
+                    timestamp = connection.ops.adapt_datetimefield_value(now - timedelta(minutes=messages - i))
+                    yield (room.pk, sender.pk, f"mensagem {i}", timestamp)
+
+        insert_rows(ChatMessage, ("room", "sender", "content", "timestamp"), rows(), 10000)
+
+        # The user has read about half of each room
+        for room in created:
+            ids = list(ChatMessage.objects.filter(room=room).order_by("id").values_list("id", flat=True))
+            if ids:
+                RoomMembership.objects.filter(room=room, user=user).update(last_read_id=ids[len(ids) // 2])
+        unread.rebuild()
+        return user
@@ -0,0 +1,63 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+SAMPLE_MESSAGE = "Oi! Podemos marcar a aula de violão no sábado às 10h? Levo as partituras."
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de CPU por mensagem de fan-out no ChatConsumer: JSON/MessagePack codificados por "
+        "destinatário (formato antigo) contra o frame pré-codificado no evento do grupo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000", help="Tamanhos de sala (sockets), separados por vírgula")
+        parser.add_argument("--messages", type=int, default=200, help="Mensagens por medição")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size]
+        self.stdout.write(
+            f"{'room size':>9} {'encoding':<9} {'frames':<12}{'bytes':>7}{'µs/message':>12}{'µs/delivery':>13}"
+        )
+        for size in sizes:
+            for encoding in ("json", "msgpack"):
+                for pre_encoded in (False, True):
+                    per_message, frame_bytes = async_to_sync(self.measure)(
+                        size, encoding, pre_encoded, options["messages"]
+                    )
+                    self.stdout.write(
+                        f"{size:>9} {encoding:<9} {'pre-encoded' if pre_encoded else 'per socket':<12}"
+                        f"{frame_bytes:>7}{per_message:>12.1f}{per_message / size:>13.2f}"
+                    )
+
+    async def measure(self, size, encoding, pre_encoded, messages):
+        """CPU µs to fan one message out to ``size`` sockets (the socket write itself is a no-op)."""
+        from communication import wire
+        from communication.consumers import ChatConsumer
+
+        sent = []
+
+        async def base_send(message):
+            sent.append(message)
+
+        consumers = []
+        for _ in range(size):
+            consumer = ChatConsumer()
+            consumer.base_send = base_send
+            consumer.encoding = encoding
+            consumers.append(consumer)
+
+        started = time.process_time()
+        for seq in range(messages):
+            event = {"type": "chat.message", "message": f"{SAMPLE_MESSAGE} #{seq}", "sender": "alice"}
+            if pre_encoded:
+                # What ChatConsumer.receive_json does once per send
+                event["frames"] = wire.encode_frames({"message": event["message"], "sender": event["sender"]})
+            for consumer in consumers:
+                await consumer.chat_message(event)
+            sent.clear()
+        elapsed = time.process_time() - started
+        frame = wire.encode({"message": f"{SAMPLE_MESSAGE} #0", "sender": "alice"}, encoding)
+        return elapsed / messages * 1e6, len(frame.encode() if isinstance(frame, str) else frame)
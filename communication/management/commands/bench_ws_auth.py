@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import Timer, isolated_database, percentile, rate
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da autenticação dos handshakes do chat numa rajada de reconexões: sessão "
+        "(AuthMiddlewareStack) contra token assinado (?token=) (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=20000, help="Handshakes por rodada")
+        parser.add_argument("--users", type=int, default=1000, help="Usuários (cada um com uma sessão)")
+        parser.add_argument("--concurrency", type=int, default=200, help="Handshakes em andamento ao mesmo tempo")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Tempo máximo de espera por conexão")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            rows = async_to_sync(self.run_benchmark)(
+                options["sockets"], options["users"], options["concurrency"], options["timeout"]
+            )
+        self.stdout.write(f"\n{'handshake auth':<34}{'connects/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, connects_per_second, latencies in rows:
+            self.stdout.write(
+                f"{label:<34}{connects_per_second:>12.0f}{percentile(latencies, 50):>10.1f}"
+                f"{percentile(latencies, 99):>10.1f}"
+            )
+
+    async def run_benchmark(self, sockets, users, concurrency, timeout):
+        from channels.auth import AuthMiddlewareStack
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from communication.auth import TokenAuthMiddlewareStack
+        from communication.routing import websocket_urlpatterns
+
+        credentials = await database_sync_to_async(self._create_fixtures)(users)
+        layer = get_channel_layer()
+
+        async def sender(application, connection):
+            path, headers = connection(*credentials[0][1:])
+            communicator = WebsocketCommunicator(application, path, headers=headers)
+            await communicator.connect(timeout=timeout)
+            await communicator.send_json_to({"message": "oi"})
+            name = (await communicator.receive_json_from(timeout=timeout))["sender"]
+            await communicator.disconnect()
+            return name
+
+        async def storm(application, connection):
+            # Make sure the handshakes being timed really authenticate
+            assert await sender(application, connection) == credentials[0][0]
+            latencies = []
+            # Like a server's accept backlog: a bounded number of handshakes in flight
+            handshakes = asyncio.Semaphore(concurrency)
+            closed = 0
+
+            async def connect(i):
+                nonlocal closed
+                # An ad-hoc room: the membership check is a cache hit, only auth is measured
+                path, headers = connection(*credentials[i % users][1:])
+                communicator = WebsocketCommunicator(application, path, headers=headers)
+                async with handshakes:
+                    started = time.perf_counter()
+                    connected, _ = await communicator.connect(timeout=timeout)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    assert connected
+                    await communicator.disconnect()
+                    # The in-memory channel layer scans every channel it has seen on each
+                    # call, so closed ones are dropped
+                    closed += 1
+                    if closed % concurrency == 0:
+                        layer.channels = {name: queue for name, queue in layer.channels.items() if not queue.empty()}
+
+            with Timer() as timer:
+                await asyncio.gather(*(connect(i) for i in range(sockets)))
+            return rate(sockets, timer.elapsed), latencies
+
+        def with_cookie(session_key, token):
+            return "/ws/chat/bench-auth/", [(b"cookie", f"sessionid={session_key}".encode())]
+
+        def with_token(session_key, token):
+            return f"/ws/chat/bench-auth/?token={token}", []
+
+        router = URLRouter(websocket_urlpatterns)
+        return [
+            ("session cookie (2 queries)", *await storm(AuthMiddlewareStack(router), with_cookie)),
+            ("signed token (no query)", *await storm(TokenAuthMiddlewareStack(router), with_token)),
+        ]
+
+    def _create_fixtures(self, users):
+        from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+        from django.contrib.sessions.backends.db import SessionStore
+
+        from communication.auth import issue_token
+
+        User = get_user_model()
+        created = User.objects.bulk_create([User(username=f"bench-auth-{n}", password="!") for n in range(users)])
+        credentials = []
+        for user in created:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            credentials.append((user.username, session.session_key, issue_token(user)))
+        return credentials
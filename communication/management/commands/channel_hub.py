@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+
+from communication.layers import DEFAULT_PATH, run_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Inicia os shards do channel layer compartilhado entre processos "
+        "(communication.layers.ShardedSocketChannelLayer), um processo por shard"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=os.environ.get("CHANNEL_LAYER_SOCKET_DIR", DEFAULT_PATH),
+            help="Diretório dos sockets Unix",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=int(os.environ.get("CHANNEL_LAYER_SHARDS", "4")),
+            help="Número de shards (deve ser igual ao CONFIG dos workers)",
+        )
+        parser.add_argument("--shard", type=int, default=None, help="Inicia só este shard (supervisor externo)")
+        parser.add_argument("--capacity", type=int, default=100, help="Capacidade das filas de canais nomeados")
+        parser.add_argument(
+            "--high-water",
+            type=int,
+            default=4 * 1024 * 1024,
+            help="Bytes pendentes num worker a partir dos quais mensagens de grupo são descartadas",
+        )
+
+    def handle(self, *args, **options):
+        shard_options = {"capacity": options["capacity"], "high_water": options["high_water"]}
+        if options["shard"] is not None:
+            run_shard(options["shard"], options["shards"], options["path"], **shard_options)
+            return
+
+        processes = [
+            multiprocessing.Process(
+                target=run_shard,
+                args=(index, options["shards"], options["path"]),
+                kwargs=shard_options,
+                daemon=True,
+            )
+            for index in range(options["shards"])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"{len(processes)} shards listening in {options['path']}")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,179 @@
+"""Who may open a socket on a chat room, cached per process.
+
+``ChatConsumer`` asks ``room_access.lookup(room_name)`` on connect and
+before forwarding each chat message. A room name that matches a
+``ChatRoom`` (the oldest one, as before) admits only its participants;
+any other name is an ad-hoc broadcast-only room open to everyone.
+
+Entries are ``RoomAccess(room_id, member_ids)`` per room name, kept in an
+LRU of ``CHAT_MEMBERSHIP_CACHE_SIZE`` rooms for ``CHAT_MEMBERSHIP_CACHE_TTL``
+seconds. A miss costs two indexed queries for the whole room, and
+concurrent misses for the same room share one load, so a reconnect storm
+of N sockets over R rooms runs at most 2R queries instead of N.
+
+The signals in ``communication.signals`` invalidate a room after a commit
+that changes its participants (``m2m_changed``), its name or its existence.
+Other processes see the change when their entry expires; bulk writes that
+send no signals (``bulk_create`` of ``RoomMembership``) likewise. Removed
+members do not wait for that: ``members_removed`` tells every process,
+through the channel layer, to close their sockets on the room.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .models import ChatRoom, RoomMembership
+
+
+class RoomAccess(NamedTuple):
+    # None: the name is not a database room
+    room_id: object
+    member_ids: frozenset
+
+    def allows(self, user):
+        if self.room_id is None:
+            return True
+        return bool(user and getattr(user, "is_authenticated", False) and user.pk in self.member_ids)
+
+
+class RoomAccessCache:
+    """LRU + TTL map of room name -> ``RoomAccess``.
+
+    ``lookup`` runs on the event loop; ``invalidate`` may be called from any
+    thread (signal handlers run in request or ``sync_to_async`` threads), so
+    the map is guarded by a lock. A load that overlaps an invalidation still
+    answers its callers but is not cached.
+    """
+
+    def __init__(self, max_rooms=None, ttl=None, clock=time.monotonic):
+        if max_rooms is None:
+            max_rooms = getattr(settings, "CHAT_MEMBERSHIP_CACHE_SIZE", 10000)
+        if ttl is None:
+            ttl = getattr(settings, "CHAT_MEMBERSHIP_CACHE_TTL", 60)
+        self.max_rooms = max_rooms
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        # room name -> (expires at, RoomAccess), least recently used first
+        self._entries = OrderedDict()
+        self._names = {}  # room id -> cached room name
+        self._loading = {}  # room name -> (event loop, task)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def get(self, room_name):
+        """The cached access of ``room_name``, or ``None`` if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(room_name)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                self._pop(room_name)
+                return None
+            self._entries.move_to_end(room_name)
+            return entry[1]
+
+    async def lookup(self, room_name):
+        access = self.get(room_name)
+        if access is not None:
+            self.hits += 1
+            return access
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        pending = self._loading.get(room_name)
+        if pending is None or pending[0] is not loop:
+            task = loop.create_task(self._fetch(room_name))
+            pending = self._loading[room_name] = (loop, task)
+            task.add_done_callback(lambda _: self._loaded(room_name, pending))
+        # One waiter being cancelled (its socket went away) must not cancel the others
+        return await asyncio.shield(pending[1])
+
+    def _loaded(self, room_name, pending):
+        if self._loading.get(room_name) is pending:
+            del self._loading[room_name]
+
+    async def _fetch(self, room_name):
+        generation = self._generation
+        access = await database_sync_to_async(self.load)(room_name)
+        self.put(room_name, access, generation)
+        return access
+
+    def load(self, room_name):
+        self.loads += 1
+        room_id = ChatRoom.objects.filter(name=room_name).order_by("id").values_list("id", flat=True).first()
+        if room_id is None:
+            return RoomAccess(None, frozenset())
+        members = RoomMembership.objects.filter(room_id=room_id).values_list("user_id", flat=True)
+        return RoomAccess(room_id, frozenset(members))
+
+    def put(self, room_name, access, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._pop(room_name)
+            self._entries[room_name] = (self.clock() + self.ttl, access)
+            if access.room_id is not None:
+                self._names[access.room_id] = room_name
+            while len(self._entries) > self.max_rooms:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, room_name):
+        entry = self._entries.pop(room_name, None)
+        if entry is not None and self._names.get(entry[1].room_id) == room_name:
+            del self._names[entry[1].room_id]
+
+    def invalidate(self, room_ids=(), names=()):
+        """Forget the rooms with these ids and these names."""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for room_id in room_ids:
+                name = self._names.get(room_id)
+                if name is not None:
+                    self._pop(name)
+            for name in names:
+                self._pop(name)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+            self._names.clear()
+
+    def stats(self):
+        return {
+            "rooms": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+        }
+
+
+room_access = RoomAccessCache()
+
+
+def access_group_name(room_id):
+    """Channel layer group of the sockets open on database room ``room_id``."""
+    return f"room-access.{room_id}"
+
+
+def members_removed(room_id, user_ids=None):
+    """Close the sockets of ``user_ids`` (of everyone for ``None``) on room ``room_id``, in every process."""
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(
+            access_group_name(room_id),
+            {"type": "chat.revoke", "user_ids": None if user_ids is None else list(user_ids)},
+        )
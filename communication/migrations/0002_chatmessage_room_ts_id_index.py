@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'timestamp', 'id'], name='chatmsg_room_ts_id_idx'),
+        ),
+    ]
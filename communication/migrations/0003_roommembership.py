@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Turn ChatRoom.participants into an explicit through model on the same table.
+
+    The auto-created M2M table already has the right columns and indexes, so
+    the model swap is state-only; the read-tracking columns are then added.
+    """
+
+    dependencies = [
+        ('communication', '0002_chatmessage_room_ts_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RoomMembership',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('room', models.ForeignKey(db_column='chatroom_id', on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='communication.chatroom')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'communication_chatroom_participants',
+                        'unique_together': {('room', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chatroom',
+                    name='participants',
+                    field=models.ManyToManyField(blank=True, related_name='chat_rooms', through='communication.RoomMembership', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='roommembership',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='roommembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0003_roommembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('size_bytes', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_segments', to='communication.chatroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'last_timestamp', 'last_id'], name='chatseg_room_last_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def set_marks(apps, schema_editor):
+    """Mark every room with the newest key already in its archived segments."""
+    ChatRoom = apps.get_model('communication', 'ChatRoom')
+    ArchivedSegment = apps.get_model('communication', 'ArchivedSegment')
+    marks = {}
+    segments = ArchivedSegment.objects.order_by('room_id', 'last_timestamp', 'last_id')
+    for room_id, last_timestamp, last_id in segments.values_list('room_id', 'last_timestamp', 'last_id').iterator():
+        marks[room_id] = (last_timestamp, last_id)
+    for room_id, (last_timestamp, last_id) in marks.items():
+        ChatRoom.objects.filter(pk=room_id).update(archived_until=last_timestamp, archived_until_id=last_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0004_archivedsegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='archived_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='archived_until_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_marks, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,19 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class ChatRoom(models.Model):
 	"""Sala de chat que pode ter múltiplos participantes (Users)."""
 	name = models.CharField(max_length=200, blank=True)
 	participants = models.ManyToManyField(
-		settings.AUTH_USER_MODEL, related_name="chat_rooms", blank=True
+		settings.AUTH_USER_MODEL, related_name="chat_rooms", blank=True, through="RoomMembership"
 	)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Marca d'água do arquivo (communication.archive): chave (timestamp, id) da
+	# mensagem mais nova já arquivada; tudo que está no banco vem depois dela.
+	archived_until = models.DateTimeField(null=True, blank=True)
+	archived_until_id = models.BigIntegerField(null=True, blank=True)
 
 	def __str__(self):
 		if self.name:
@@ -16,14 +21,70 @@ class ChatRoom(models.Model):
 		return f"ChatRoom(id={self.id})"
 
 
+class RoomMembership(models.Model):
+	"""Participação de um usuário em uma ChatRoom, com o ponteiro de leitura.
+
+	``unread_count`` é mantido na escrita (communication.unread): cada lote de
+	mensagens persistido incrementa o contador dos outros participantes, e
+	marcar como lida recalcula a partir de ``last_read_id``.
+	"""
+	room = models.ForeignKey(ChatRoom, related_name="memberships", on_delete=models.CASCADE, db_column="chatroom_id")
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="room_memberships", on_delete=models.CASCADE)
+	# id da última ChatMessage lida (0 = nenhuma); não é FK para não prender a mensagem
+	last_read_id = models.BigIntegerField(default=0)
+	unread_count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		# Tabela criada originalmente pelo ManyToManyField automático
+		db_table = "communication_chatroom_participants"
+		unique_together = [("room", "user")]
+
+	def __str__(self):
+		return f"RoomMembership(room_id={self.room_id}, user_id={self.user_id}, unread={self.unread_count})"
+
+
 class ChatMessage(models.Model):
 	"""Mensagem enviada dentro de uma ChatRoom por um usuário."""
 	room = models.ForeignKey(ChatRoom, related_name="messages", on_delete=models.CASCADE)
 	sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="sent_messages", on_delete=models.CASCADE)
 	content = models.TextField()
-	timestamp = models.DateTimeField(auto_now_add=True)
+	# Preenchido na chegada (communication.buffer grava em lotes, depois)
+	timestamp = models.DateTimeField(default=timezone.now, editable=False)
+
+	class Meta:
+		indexes = [
+			# Backs keyset pagination of a room's history (see communication.api)
+			models.Index(fields=["room", "timestamp", "id"], name="chatmsg_room_ts_id_idx"),
+		]
 
 	def __str__(self):
 		# Truncate content for readability
 		summary = (self.content[:47] + "...") if len(self.content) > 50 else self.content
 		return f"Message(id={self.id}, sender={self.sender}, room_id={self.room_id}, content={summary})"
+
+
+class ArchivedSegment(models.Model):
+	"""Arquivo comprimido com mensagens antigas de uma sala (communication.archive).
+
+	Cada segmento guarda mensagens consecutivas em ordem ``(timestamp, id)``;
+	esta tabela é o índice que localiza o segmento de um intervalo de tempo
+	sem abrir os arquivos.
+	"""
+	room = models.ForeignKey(ChatRoom, related_name="archived_segments", on_delete=models.CASCADE)
+	# Caminho relativo a CHAT_ARCHIVE_DIR
+	path = models.CharField(max_length=255)
+	first_id = models.BigIntegerField()
+	last_id = models.BigIntegerField()
+	first_timestamp = models.DateTimeField()
+	last_timestamp = models.DateTimeField()
+	message_count = models.PositiveIntegerField()
+	size_bytes = models.PositiveIntegerField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["room", "last_timestamp", "last_id"], name="chatseg_room_last_idx"),
+		]
+
+	def __str__(self):
+		return f"ArchivedSegment(room_id={self.room_id}, ids={self.first_id}-{self.last_id}, n={self.message_count})"
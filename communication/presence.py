@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import wire
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceTracker:
+    """In-memory online/typing state per chat room, with coalesced broadcasts.
+
+    Each connected socket is a ``(user, channel)`` entry with the time it was
+    last seen (connect, heartbeat or message); entries older than ``ttl``
+    seconds are swept. Typing flags expire after ``typing_ttl`` seconds
+    unless refreshed.
+
+    Changes only mark a room dirty. A room is broadcast at most once per
+    ``interval`` seconds, as one ``presence.update`` message with the full
+    snapshot to the ``presence_<room>`` group (sockets opt in to it), so
+    thousands of keystrokes and joins cost a bounded number of channel layer
+    sends. Repeated "typing" events from someone already
+    typing only refresh the expiry and broadcast nothing.
+
+    State is per process: with several ASGI workers each one reports the
+    sockets it holds. Rooms joined with their ``ChatRoom`` id can also be
+    looked up by it (``online_counts``, used by the room list API).
+    """
+
+    def __init__(self, interval=None, ttl=None, typing_ttl=None, max_listed=None, channel_layer=None):
+        if interval is None:
+            interval = getattr(settings, "CHAT_PRESENCE_INTERVAL", 1.0)
+        if ttl is None:
+            ttl = getattr(settings, "CHAT_PRESENCE_TTL", 30.0)
+        if typing_ttl is None:
+            typing_ttl = getattr(settings, "CHAT_TYPING_TTL", 5.0)
+        if max_listed is None:
+            max_listed = getattr(settings, "CHAT_PRESENCE_MAX_LISTED", 100)
+        self.interval = interval
+        self.ttl = ttl
+        self.typing_ttl = typing_ttl
+        self.max_listed = max_listed
+        self._channel_layer = channel_layer
+        # room -> user -> {channel: last_seen}
+        self._members = defaultdict(dict)
+        # room -> user -> typing expires_at
+        self._typing = defaultdict(dict)
+        # ChatRoom id <-> room name, for the rooms joined with one
+        self._room_names = {}
+        self._room_ids = {}
+        self._last_broadcast = {}
+        # room -> (loop, TimerHandle) of the pending broadcast
+        self._scheduled = {}
+        self._sweeper = None
+        self._tasks = set()
+        self.changes = 0
+        self.broadcasts = 0
+
+    @property
+    def channel_layer(self):
+        if self._channel_layer is None:
+            self._channel_layer = get_channel_layer()
+        return self._channel_layer
+
+    @staticmethod
+    def group_name(room):
+        return f"presence_{room}"
+
+    # -- updates from consumers ----------------------------------------------
+
+    def join(self, room, user, channel, room_id=None):
+        if room_id is not None:
+            self._room_names[room_id] = room
+            self._room_ids[room] = room_id
+        members = self._members[room]
+        is_new = user not in members
+        members.setdefault(user, {})[channel] = time.monotonic()
+        self._ensure_sweeper()
+        if is_new:
+            self._changed(room)
+
+    def touch(self, room, user, channel, room_id=None):
+        """Heartbeat: keeps the socket alive; re-joins a socket that was swept."""
+        channels = self._members.get(room, {}).get(user)
+        if channels is not None and channel in channels:
+            channels[channel] = time.monotonic()
+        else:
+            self.join(room, user, channel, room_id)
+
+    def leave(self, room, user, channel):
+        members = self._members.get(room)
+        if not members or user not in members:
+            return
+        members[user].pop(channel, None)
+        if not members[user]:
+            self._drop_user(room, user)
+            self._changed(room)
+
+    def set_typing(self, room, user, typing=True):
+        if user not in self._members.get(room, {}):
+            return
+        typing_now = self._typing[room]
+        if typing:
+            was_typing = user in typing_now
+            typing_now[user] = time.monotonic() + self.typing_ttl
+            if not was_typing:
+                self._changed(room)
+        elif typing_now.pop(user, None) is not None:
+            self._changed(room)
+
+    def _drop_user(self, room, user):
+        members = self._members.get(room, {})
+        members.pop(user, None)
+        self._typing.get(room, {}).pop(user, None)
+        if not members:
+            self._members.pop(room, None)
+            self._typing.pop(room, None)
+            room_id = self._room_ids.pop(room, None)
+            if room_id is not None:
+                self._room_names.pop(room_id, None)
+
+    # -- queries -------------------------------------------------------------
+
+    def online_counts(self, room_ids):
+        """``{ChatRoom id: users online}`` for a room list; plain dict lookups."""
+        return {
+            room_id: len(self._members.get(self._room_names.get(room_id), ())) for room_id in room_ids
+        }
+
+    def snapshot(self, room):
+        now = time.monotonic()
+        members = self._members.get(room, {})
+        typing = self._typing.get(room, {})
+        online = sorted(members)
+        return {
+            "room": room,
+            "online": online[: self.max_listed],
+            "online_count": len(online),
+            "typing": sorted(user for user, expires_at in typing.items() if expires_at > now),
+        }
+
+    def frame_payload(self, room):
+        """What a subscribed socket receives for ``room``."""
+        snapshot = self.snapshot(room)
+        return {
+            "type": "presence",
+            "online": snapshot["online"],
+            "online_count": snapshot["online_count"],
+            "typing": snapshot["typing"],
+        }
+
+    # -- coalescing ----------------------------------------------------------
+
+    def _changed(self, room):
+        self.changes += 1
+        loop = asyncio.get_running_loop()
+        scheduled = self._scheduled.get(room)
+        if scheduled is not None and scheduled[0] is loop:
+            return
+        last = self._last_broadcast.get(room)
+        delay = 0.0 if last is None else max(0.0, last + self.interval - time.monotonic())
+        self._scheduled[room] = (loop, loop.call_later(delay, self._broadcast_later, room))
+
+    def _broadcast_later(self, room):
+        self._scheduled.pop(room, None)
+        task = asyncio.ensure_future(self.broadcast(room))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def broadcast(self, room):
+        self._last_broadcast[room] = time.monotonic()
+        self.broadcasts += 1
+        try:
+            await self.channel_layer.group_send(
+                self.group_name(room),
+                {
+                    "type": "presence.update",
+                    **self.snapshot(room),
+                    "frames": wire.encode_frames(self.frame_payload(room)),
+                },
+            )
+        except Exception:
+            logger.exception("Presence broadcast for room %s failed", room)
+        if room not in self._members:
+            self._last_broadcast.pop(room, None)
+
+    # -- expiry --------------------------------------------------------------
+
+    def sweep(self):
+        """Drop sockets not seen for ``ttl`` and expired typing flags."""
+        now = time.monotonic()
+        for room in list(self._members):
+            changed = False
+            for user, channels in list(self._members[room].items()):
+                for channel, last_seen in list(channels.items()):
+                    if now - last_seen > self.ttl:
+                        del channels[channel]
+                if not channels:
+                    self._drop_user(room, user)
+                    changed = True
+            for user, expires_at in list(self._typing.get(room, {}).items()):
+                if expires_at <= now:
+                    del self._typing[room][user]
+                    changed = True
+            if changed:
+                self._changed(room)
+
+    def _ensure_sweeper(self):
+        loop = asyncio.get_running_loop()
+        if self._sweeper is None or self._sweeper[0] is not loop:
+            self._sweeper = (loop, loop.call_later(self._sweep_interval(), self._sweep_tick))
+
+    def _sweep_interval(self):
+        return max(0.01, min(self.ttl, self.typing_ttl) / 2)
+
+    def _sweep_tick(self):
+        self._sweeper = None
+        self.sweep()
+        if self._members:
+            self._ensure_sweeper()
+
+    def close(self):
+        for _, handle in self._scheduled.values():
+            handle.cancel()
+        self._scheduled.clear()
+        if self._sweeper is not None:
+            self._sweeper[1].cancel()
+            self._sweeper = None
+
+
+# Shared by every ChatConsumer in this process
+presence = PresenceTracker()
@@ -0,0 +1,41 @@
+from rest_framework import serializers
+
+from .models import ChatMessage, ChatRoom
+
+PREVIEW_LENGTH = 80
+
+
+class LastMessageSerializer(serializers.ModelSerializer):
+    sender = serializers.CharField(source="sender.username", read_only=True)
+    preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChatMessage
+        fields = ("id", "sender", "preview", "timestamp")
+
+    def get_preview(self, message):
+        content = message.content
+        return content if len(content) <= PREVIEW_LENGTH else content[: PREVIEW_LENGTH - 1] + "…"
+
+
+class ChatRoomSerializer(serializers.ModelSerializer):
+    # Annotated by ChatRoomViewSet from the requesting user's RoomMembership
+    unread_count = serializers.IntegerField(read_only=True, default=0)
+    # Loaded by the view in one query for all the rooms listed
+    last_message = LastMessageSerializer(read_only=True, allow_null=True, default=None)
+    # Users with a socket open on the room in this process (communication.presence)
+    online_count = serializers.IntegerField(read_only=True, default=0)
+
+    class Meta:
+        model = ChatRoom
+        fields = ("id", "name", "created_at", "unread_count", "last_message", "online_count")
+
+
+class ChatMessageSerializer(serializers.ModelSerializer):
+    # Flat username instead of a nested user: the history endpoint always
+    # select_related("sender"), so this costs no extra query per row.
+    sender = serializers.CharField(source="sender.username", read_only=True)
+
+    class Meta:
+        model = ChatMessage
+        fields = ("id", "room", "sender", "content", "timestamp")
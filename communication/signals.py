@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import archive, unread
+from .membership import members_removed, room_access
+from .models import ArchivedSegment, ChatMessage, ChatRoom, RoomMembership
+
+
+@receiver(post_save, sender=ChatMessage)
+def count_unread_on_message_save(sender, instance, created, raw=False, **kwargs):
+    # Batches written by ChatMessageBuffer (bulk_create) are counted there
+    if created and not raw:
+        unread.messages_persisted(instance.room_id, {instance.sender_id: 1})
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def mark_history_read_on_join(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        # user.chat_rooms.add(room, ...)
+        for room_id in pk_set:
+            unread.joined(room_id, [instance.pk])
+    else:
+        unread.joined(instance.pk, pk_set)
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def forget_room_access_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        room_ids = [instance.pk]
+    elif pk_set is None:
+        # user.chat_rooms.clear(): the rooms are no longer known
+        transaction.on_commit(room_access.clear)
+        return
+    else:
+        room_ids = list(pk_set)
+    transaction.on_commit(lambda: room_access.invalidate(room_ids=room_ids))
+
+
+@receiver(post_save, sender=RoomMembership)
+def forget_room_access_on_membership_save(sender, instance, created, raw=False, **kwargs):
+    # RoomMembership.objects.create(); participants.add() goes through m2m_changed
+    if created and not raw:
+        room_id = instance.room_id
+        transaction.on_commit(lambda: room_access.invalidate(room_ids=[room_id]))
+
+
+@receiver(post_delete, sender=RoomMembership)
+def close_sockets_on_membership_delete(sender, instance, **kwargs):
+    # participants.remove()/clear() and cascades delete the rows one by one
+    room_id, user_id = instance.room_id, instance.user_id
+
+    def run():
+        room_access.invalidate(room_ids=[room_id])
+        members_removed(room_id, [user_id])
+
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def forget_room_access_on_room_change(sender, instance, raw=False, **kwargs):
+    # A new or renamed room may take over a name cached as unknown
+    if not raw:
+        room_id, name = instance.pk, instance.name
+        transaction.on_commit(lambda: room_access.invalidate(room_ids=[room_id], names=[name]))
+
+
+@receiver(post_delete, sender=ArchivedSegment)
+def remove_segment_file(sender, instance, **kwargs):
+    # Rooms deleted with their archive take the files along, once committed
+    path = instance.path
+    transaction.on_commit(lambda: archive.delete_segment_file(path))
@@ -1,3 +1,999 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from core.queries import QueryBudgetTestMixin
+
+from . import archive, auth, unread, wire
+from .api import ChatHistoryPagination
+from .buffer import ChatMessageBuffer, lifespan
+from .consumers import FORBIDDEN_CLOSE_CODE, ChatConsumer
+from .layers import ChannelShard, ShardedSocketChannelLayer, socket_path
+from .membership import RoomAccess, RoomAccessCache, room_access
+from .models import ArchivedSegment, ChatMessage, ChatRoom, RoomMembership
+from .presence import PresenceTracker
+from .routing import websocket_urlpatterns
+from .throttling import ChatRateLimiter
+
+
+class ChatMessageBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="x")
+        self.room = ChatRoom.objects.create(name="room")
+
+    async def test_flushes_when_size_threshold_is_reached(self):
+        buffer = ChatMessageBuffer(max_messages=3, max_delay=60)
+        for i in range(2):
+            await buffer.add(self.room.id, self.user.id, f"m{i}")
+        self.assertEqual(await sync_to_async(ChatMessage.objects.count)(), 0)
+
+        await buffer.add(self.room.id, self.user.id, "m2")
+        self.assertEqual(await sync_to_async(ChatMessage.objects.count)(), 3)
+        self.assertEqual(buffer.pending_count(), 0)
+
+    async def test_flushes_after_time_threshold(self):
+        buffer = ChatMessageBuffer(max_messages=100, max_delay=0.01)
+        await buffer.add(self.room.id, self.user.id, "hello")
+        self.assertEqual(buffer.pending_count(self.room.id), 1)
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(buffer.pending_count(), 0)
+        contents = await sync_to_async(list)(ChatMessage.objects.values_list("content", flat=True))
+        self.assertEqual(contents, ["hello"])
+
+    async def test_flush_counts_the_batch_as_unread(self):
+        bob = await sync_to_async(get_user_model().objects.create_user)(username="bob", password="x")
+        await sync_to_async(self.room.participants.add)(self.user, bob)
+        buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        for sender, content in ((self.user, "a"), (bob, "b"), (self.user, "c")):
+            await buffer.add(self.room.id, sender.id, content)
+        await buffer.flush_all()
+        counts = await sync_to_async(dict)(RoomMembership.objects.values_list("user__username", "unread_count"))
+        self.assertEqual(counts, {"alice": 1, "bob": 2})
+
+    async def test_messages_keep_their_arrival_time(self):
+        buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        before = timezone.now()
+        await buffer.add(self.room.id, self.user.id, "early")
+        after = timezone.now()
+        await asyncio.sleep(0.05)
+        await buffer.flush_all()
+        (stored,) = await sync_to_async(list)(ChatMessage.objects.values_list("timestamp", flat=True))
+        self.assertTrue(before <= stored <= after)
+
+    async def test_locked_database_is_retried_and_never_drops_the_batch(self):
+        buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        write = buffer._write
+        failures = []
+
+        def flaky(batch):
+            if len(failures) < 2:
+                failures.append(batch)
+                raise OperationalError("database is locked")
+            write(batch)
+
+        buffer._write = flaky
+        await buffer.add(self.room.id, self.user.id, "a")
+        self.assertEqual(await buffer.flush(self.room.id), 1)
+        self.assertEqual(len(failures), 2)
+
+        # Still failing after every retry: kept for the next flush
+        failures.clear()
+        buffer.retry_pauses = ()
+        await buffer.add(self.room.id, self.user.id, "b")
+        with self.assertLogs("communication.buffer", "ERROR"):
+            self.assertEqual(await buffer.flush(self.room.id), 0)
+        self.assertEqual(buffer.pending_count(self.room.id), 1)
+        buffer._write = write
+        self.assertEqual(await buffer.flush(self.room.id), 1)
+        contents = await sync_to_async(list)(ChatMessage.objects.order_by("id").values_list("content", flat=True))
+        self.assertEqual(contents, ["a", "b"])
+
+    async def test_pending_messages_are_written_on_shutdown(self):
+        buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        await buffer.add(self.room.id, self.user.id, "at exit")
+        await sync_to_async(buffer.drain)()
+        self.assertEqual(buffer.pending_count(), 0)
+
+        await buffer.add(self.room.id, self.user.id, "on lifespan shutdown")
+        events = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return events.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with mock.patch("communication.buffer.message_buffer", buffer):
+            await lifespan({"type": "lifespan"}, receive, send)
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        contents = await sync_to_async(list)(ChatMessage.objects.order_by("id").values_list("content", flat=True))
+        self.assertEqual(contents, ["at exit", "on lifespan shutdown"])
+
+
+
+class ChatConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="x")
+        self.bob = get_user_model().objects.create_user(username="bob", password="x")
+        # Ids are reused after each test's flush, which sends no signals
+        room_access.clear()
+        self.room = ChatRoom.objects.create(name="lobby")
+        self.room.participants.add(self.user, self.bob)
+        self.buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        self.addCleanup(setattr, ChatConsumer, "message_buffer", ChatConsumer.message_buffer)
+        ChatConsumer.message_buffer = self.buffer
+        self.presence = PresenceTracker(interval=0.05, ttl=30, typing_ttl=5)
+        self.addCleanup(setattr, ChatConsumer, "presence", ChatConsumer.presence)
+        self.addCleanup(self.presence.close)
+        ChatConsumer.presence = self.presence
+        self.limiter = ChatRateLimiter(limits={"channel": (1.0, 3), "user": (1.0, 5), "room": (100.0, 100)})
+        self.addCleanup(setattr, ChatConsumer, "rate_limiter", ChatConsumer.rate_limiter)
+        ChatConsumer.rate_limiter = self.limiter
+        self.application = URLRouter(websocket_urlpatterns)
+
+    async def _connect(self, room, user=None):
+        communicator = WebsocketCommunicator(self.application, f"/ws/chat/{room}/")
+        if user is not None:
+            communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_broadcasts_and_persists_authenticated_messages(self):
+        sender = await self._connect("lobby", self.user)
+        listener = await self._connect("lobby", self.bob)
+
+        await sender.send_json_to({"message": "oi"})
+        expected = {"message": "oi", "sender": "alice"}
+        self.assertEqual(await sender.receive_json_from(), expected)
+        self.assertEqual(await listener.receive_json_from(), expected)
+
+        self.assertEqual(self.buffer.pending_count(self.room.id), 1)
+        await self.buffer.flush_all()
+        stored = await sync_to_async(list)(ChatMessage.objects.values_list("room_id", "sender_id", "content"))
+        self.assertEqual(stored, [(self.room.id, self.user.id, "oi")])
+
+        await sender.disconnect()
+        await listener.disconnect()
+
+    async def test_last_socket_out_flushes_the_room(self):
+        first = await self._connect("lobby", self.user)
+        second = await self._connect("lobby", self.bob)
+        await first.send_json_to({"message": "bye"})
+        await first.receive_json_from()
+        await first.disconnect()
+        self.assertEqual(self.buffer.pending_count(self.room.id), 1)
+
+        await second.disconnect()
+        self.assertEqual(self.buffer.pending_count(), 0)
+        stored = await sync_to_async(list)(ChatMessage.objects.values_list("content", flat=True))
+        self.assertEqual(stored, ["bye"])
+
+    async def test_plain_text_and_anonymous_messages_are_not_persisted(self):
+        communicator = await self._connect("nowhere")
+        await communicator.send_to(text_data="just text")
+        self.assertEqual(
+            await communicator.receive_json_from(), {"message": "just text", "sender": "anonymous"}
+        )
+        self.assertEqual(self.buffer.pending_count(), 0)
+        await communicator.disconnect()
+
+    async def test_unknown_room_is_broadcast_only(self):
+        communicator = await self._connect("nowhere", self.user)
+        await communicator.send_json_to({"message": "oi"})
+        await communicator.receive_json_from()
+        self.assertEqual(self.buffer.pending_count(), 0)
+        await communicator.disconnect()
+
+    async def test_client_supplied_sender_is_ignored(self):
+        communicator = await self._connect("nowhere")
+        await communicator.send_json_to({"message": "oi", "sender": "admin"})
+        self.assertEqual(await communicator.receive_json_from(), {"message": "oi", "sender": "anonymous"})
+        await communicator.disconnect()
+
+    async def test_flooding_socket_gets_rate_limited(self):
+        flooder = await self._connect("lobby", self.user)
+        listener = await self._connect("lobby", self.bob)
+        for i in range(5):
+            await flooder.send_json_to({"message": f"m{i}"})
+        frames = [await flooder.receive_json_from() for _ in range(5)]
+        self.assertEqual([f["message"] for f in frames if "message" in f], ["m0", "m1", "m2"])
+        errors = [f for f in frames if f.get("type") == "error"]
+        self.assertEqual(len(errors), 2)
+        self.assertEqual((errors[0]["code"], errors[0]["scope"]), ("rate_limited", "channel"))
+        self.assertGreater(errors[0]["retry_after"], 0)
+
+        # Only the allowed messages reached the room
+        received = [(await listener.receive_json_from())["message"] for _ in range(3)]
+        self.assertEqual(received, ["m0", "m1", "m2"])
+        self.assertTrue(await listener.receive_nothing())
+        self.assertEqual(self.limiter.stats()["throttled"], {"channel": 2})
+
+        # The socket's bucket goes away with it
+        self.assertEqual(self.limiter.stats()["buckets"]["channel"], 1)
+        await flooder.disconnect()
+        self.assertEqual(self.limiter.stats()["buckets"]["channel"], 0)
+        await listener.disconnect()
+
+    async def test_control_frames_are_rate_limited_too(self):
+        flooder = await self._connect("lobby", self.user)
+        for typing in (True, False, True, False):
+            await flooder.send_json_to({"type": "typing", "typing": typing})
+        await flooder.send_json_to({"type": "presence.subscribe"})
+        error = await flooder.receive_json_from()
+        self.assertEqual((error["type"], error["scope"]), ("error", "channel"))
+        self.assertEqual((await flooder.receive_json_from())["scope"], "channel")
+        # The subscription was dropped: no snapshot follows
+        self.assertTrue(await flooder.receive_nothing())
+        self.assertEqual(self.limiter.stats()["throttled"], {"channel": 2})
+        # Control frames leave the user and room allowances to chat messages
+        self.assertEqual(self.limiter.stats()["buckets"]["user"], 0)
+        await flooder.disconnect()
+
+    async def test_msgpack_subprotocol_and_frames_encoded_once(self):
+        binary = WebsocketCommunicator(self.application, "/ws/chat/lobby/", subprotocols=["x-other", "skillswap.msgpack"])
+        binary.scope["user"] = self.user
+        connected, subprotocol = await binary.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, "skillswap.msgpack")
+        listeners = [await self._connect("lobby", self.bob) for _ in range(3)]
+
+        with mock.patch.object(wire, "encode_json", wraps=wire.encode_json) as encode_json:
+            await binary.send_to(bytes_data=wire.packb({"message": "olá"}))
+            frame = await binary.receive_from()
+            for listener in listeners:
+                self.assertEqual(await listener.receive_json_from(), {"message": "olá", "sender": "alice"})
+        self.assertEqual(wire.unpackb(frame), {"message": "olá", "sender": "alice"})
+        # One JSON encoding for the whole room, not one per socket
+        self.assertEqual(encode_json.call_count, 1)
+        self.assertEqual(self.buffer.pending_count(self.room.id), 1)
+
+        # Undecodable binary frames are dropped
+        await binary.send_to(bytes_data=b"\xc1garbage")
+        self.assertTrue(await binary.receive_nothing())
+        for communicator in (binary, *listeners):
+            await communicator.disconnect()
+
+    async def test_typing_is_sent_to_presence_subscribers(self):
+        watcher = await self._connect("lobby", self.bob)
+        await watcher.send_json_to({"type": "presence.subscribe"})
+        snapshot = await watcher.receive_json_from()
+        self.assertEqual(snapshot, {"type": "presence", "online": ["bob"], "online_count": 1, "typing": []})
+
+        typist = await self._connect("lobby", self.user)
+        await typist.send_json_to({"type": "typing", "typing": True})
+        update = await watcher.receive_json_from(timeout=2)
+        if not update["typing"]:
+            # The join went out on its own before the typing frame arrived
+            update = await watcher.receive_json_from(timeout=2)
+        self.assertEqual(update["online"], ["alice", "bob"])
+        self.assertEqual(update["typing"], ["alice"])
+
+        # Typing frames are not chat messages
+        self.assertTrue(await typist.receive_nothing())
+        await typist.disconnect()
+        left = await watcher.receive_json_from(timeout=2)
+        self.assertEqual((left["online"], left["typing"]), (["bob"], []))
+        await watcher.disconnect()
+
+    async def test_only_participants_can_join_database_rooms(self):
+        carol = await sync_to_async(get_user_model().objects.create_user)(username="carol", password="x")
+        for user in (carol, None):
+            communicator = WebsocketCommunicator(self.application, "/ws/chat/lobby/")
+            if user is not None:
+                communicator.scope["user"] = user
+            self.assertEqual(await communicator.connect(), (False, FORBIDDEN_CLOSE_CODE))
+        # Ad-hoc rooms stay open to everyone
+        communicator = await self._connect("nowhere", carol)
+        await communicator.disconnect()
+
+    async def test_membership_is_loaded_once_per_room_and_invalidated(self):
+        loads = room_access.loads
+        sockets = await asyncio.gather(*(self._connect("lobby", self.user) for _ in range(20)))
+        # Concurrent misses share one load
+        self.assertEqual(room_access.loads - loads, 1)
+        await sockets[0].send_json_to({"message": "oi"})
+        for socket in sockets:
+            await socket.receive_json_from()
+        self.assertEqual(room_access.loads - loads, 1)
+
+        await sync_to_async(self.room.participants.remove)(self.user)
+        communicator = WebsocketCommunicator(self.application, "/ws/chat/lobby/")
+        communicator.scope["user"] = self.user
+        self.assertEqual(await communicator.connect(), (False, FORBIDDEN_CLOSE_CODE))
+
+        await sync_to_async(self.room.participants.add)(self.user)
+        socket = await self._connect("lobby", self.user)
+
+        def remove_without_signals():
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM communication_chatroom_participants WHERE user_id = %s", [self.user.pk])
+
+        # Sockets that missed their removal are closed on their next frame, whatever it is
+        await sync_to_async(remove_without_signals)()
+        room_access.invalidate(room_ids=[self.room.id])
+        await socket.send_json_to({"type": "typing", "typing": True})
+        self.assertEqual(await socket.receive_output(), {"type": "websocket.close", "code": FORBIDDEN_CLOSE_CODE})
+        self.assertEqual(self.buffer.pending_count(self.room.id), 1)
+        for socket in sockets:
+            await socket.disconnect()
+
+    async def test_removed_members_are_disconnected_at_once(self):
+        alice = await self._connect("lobby", self.user)
+        bob = await self._connect("lobby", self.bob)
+        closed = {"type": "websocket.close", "code": FORBIDDEN_CLOSE_CODE}
+
+        await sync_to_async(self.room.participants.remove)(self.user)
+        self.assertEqual(await alice.receive_output(), closed)
+        await bob.send_json_to({"message": "oi"})
+        self.assertEqual(await bob.receive_json_from(), {"message": "oi", "sender": "bob"})
+
+        await sync_to_async(RoomMembership.objects.filter(user=self.bob).delete)()
+        self.assertEqual(await bob.receive_output(), closed)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_new_room_replaces_cached_unknown_name(self):
+        await (await self._connect("later")).disconnect()
+        room = await sync_to_async(ChatRoom.objects.create)(name="later")
+        communicator = WebsocketCommunicator(self.application, "/ws/chat/later/")
+        self.assertEqual(await communicator.connect(), (False, FORBIDDEN_CLOSE_CODE))
+        await sync_to_async(room.participants.add)(self.bob)
+        await (await self._connect("later", self.bob)).disconnect()
+
+
+class WebSocketTokenAuthTests(QueryBudgetTestMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="x")
+        room_access.clear()
+        self.room = ChatRoom.objects.create(name="lobby")
+        self.room.participants.add(self.user)
+        self.buffer = ChatMessageBuffer(max_messages=100, max_delay=60)
+        self.addCleanup(setattr, ChatConsumer, "message_buffer", ChatConsumer.message_buffer)
+        ChatConsumer.message_buffer = self.buffer
+        self.application = auth.TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def _sender(self, path, **kwargs):
+        communicator = WebsocketCommunicator(self.application, path, **kwargs)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({"message": "oi"})
+        sender = (await communicator.receive_json_from())["sender"]
+        await communicator.disconnect()
+        return sender
+
+    async def test_token_handshake_does_not_load_the_session(self):
+        token = auth.issue_token(self.user)
+        with mock.patch("channels.auth.get_user") as get_user:
+            self.assertEqual(await self._sender(f"/ws/chat/lobby/?token={token}"), "alice")
+        get_user.assert_not_called()
+        # The token user passes the room's participant check and owns the message
+        # (written when the socket, the room's last, disconnected)
+        senders = await sync_to_async(list)(ChatMessage.objects.values_list("sender_id", flat=True))
+        self.assertEqual(senders, [self.user.id])
+
+    async def test_invalid_or_expired_tokens_fall_back_to_the_session(self):
+        token = auth.issue_token(self.user)
+        self.assertEqual(await self._sender(f"/ws/chat/nowhere/?token={token[:-1]}x"), "anonymous")
+        with override_settings(CHAT_TOKEN_MAX_AGE=-1):
+            self.assertEqual(await self._sender(f"/ws/chat/nowhere/?token={token}"), "anonymous")
+
+        await sync_to_async(self.client.force_login)(self.user)
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}".encode()
+        self.assertEqual(await self._sender("/ws/chat/lobby/", headers=[(b"cookie", cookie)]), "alice")
+
+    def test_token_endpoint(self):
+        url = reverse("communication:ws_token")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["expires_in"], 300)
+        user = auth.user_from_token(response.json()["token"])
+        self.assertEqual((user.pk, user.username, user.is_authenticated), (self.user.pk, "alice", True))
+
+
+class RoomAccessCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = RoomAccessCache(max_rooms=2, ttl=10, clock=lambda: self.now)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.put("lobby", RoomAccess(1, frozenset({7})))
+        self.now = 9.9
+        self.assertEqual(self.cache.get("lobby"), (1, frozenset({7})))
+        self.now = 10
+        self.assertIsNone(self.cache.get("lobby"))
+        self.assertEqual(self.cache.stats()["rooms"], 0)
+
+    def test_least_recently_used_room_is_evicted(self):
+        self.cache.put("a", RoomAccess(1, frozenset()))
+        self.cache.put("b", RoomAccess(2, frozenset()))
+        self.cache.get("a")
+        self.cache.put("c", RoomAccess(None, frozenset()))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_invalidate_by_room_id_and_name(self):
+        self.cache.put("a", RoomAccess(1, frozenset()))
+        self.cache.put("b", RoomAccess(None, frozenset()))
+        self.cache.invalidate(room_ids=[1], names=["b"])
+        self.assertEqual((self.cache.get("a"), self.cache.get("b")), (None, None))
+
+    def test_load_overlapping_an_invalidation_is_not_cached(self):
+        generation = self.cache._generation
+        self.cache.invalidate(room_ids=[1])
+        self.cache.put("a", RoomAccess(1, frozenset({7})), generation)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_anonymous_and_non_members_are_refused(self):
+        member = mock.Mock(pk=7, is_authenticated=True)
+        other = mock.Mock(pk=8, is_authenticated=True)
+        access = RoomAccess(1, frozenset({7}))
+        self.assertTrue(access.allows(member))
+        self.assertFalse(access.allows(other))
+        self.assertFalse(access.allows(None))
+        self.assertTrue(RoomAccess(None, frozenset()).allows(None))
+
+
+class WireFormatTests(SimpleTestCase):
+    payload = {
+        "message": "olá " * 20,
+        "sender": "alice",
+        "online": ["a", "b"],
+        "n": [0, 127, 128, 70000, 2**40, -1, -33, -(2**40)],
+        "ok": True,
+        "none": None,
+        "pi": 3.5,
+        "raw": b"\x00\x01",
+        "nested": {str(i): i for i in range(20)},
+    }
+
+    def test_negotiate(self):
+        self.assertEqual(wire.negotiate(None), (wire.JSON, None))
+        self.assertEqual(wire.negotiate(["x", "skillswap.json", "skillswap.msgpack"]), (wire.JSON, "skillswap.json"))
+        self.assertEqual(wire.negotiate(["skillswap.msgpack"]), (wire.MSGPACK, "skillswap.msgpack"))
+
+    def test_msgpack_round_trip_and_bad_frames(self):
+        packed = wire.packb(self.payload)
+        self.assertEqual(wire.decode(packed), self.payload)
+        for data in (packed[:-3], packed + b"\x00", b"\xc1", b"\x81\x91\x01\x01", b"\x91" * 5000 + b"\x01"):
+            with self.subTest(data=data[:8]), self.assertRaises(wire.WireError):
+                wire.decode(data)
+
+    def test_frames_per_encoding(self):
+        frames = wire.encode_frames({"message": "oi", "sender": "alice"})
+        self.assertEqual(frames["json"], '{"message":"oi","sender":"alice"}')
+        self.assertEqual(wire.decode(frames["msgpack"]), {"message": "oi", "sender": "alice"})
+
+
+class ChatRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = ChatRateLimiter(
+            limits={"channel": (2.0, 2), "user": (1.0, 3), "room": None}, prune_every=1000, clock=lambda: self.now
+        )
+
+    def test_buckets_refill_at_their_rate(self):
+        self.assertIsNone(self.limiter.check("c1", "alice", "lobby"))
+        self.assertIsNone(self.limiter.check("c1", "alice", "lobby"))
+        scope, retry_after = self.limiter.check("c1", "alice", "lobby")
+        self.assertEqual(scope, "channel")
+        self.assertAlmostEqual(retry_after, 0.5)
+
+        self.now = 0.5
+        self.assertIsNone(self.limiter.check("c1", "alice", "lobby"))
+        self.assertEqual(self.limiter.stats()["allowed"], 3)
+
+    def test_user_bucket_is_shared_by_every_socket(self):
+        for channel in ("c1", "c2", "c3"):
+            self.assertIsNone(self.limiter.check(channel, "alice", "lobby"))
+        self.assertEqual(self.limiter.check("c4", "alice", "lobby")[0], "user")
+        # A rejected frame costs no channel token, and anonymous sockets have no user bucket
+        self.assertIsNone(self.limiter.check("c4", None, "lobby"))
+        self.assertIsNone(self.limiter.check("c4", None, "lobby"))
+        self.assertEqual(self.limiter.stats()["throttled"], {"user": 1})
+
+    def test_full_buckets_are_pruned(self):
+        self.limiter.check("c1", "alice", "lobby")
+        self.now = 10.0
+        self.limiter.prune()
+        self.assertEqual(self.limiter.stats()["buckets"], {"channel": 1, "user": 0})
+
+
+class CountingLayer:
+    """Channel layer stand-in that only counts group sends per group."""
+
+    def __init__(self):
+        self.sent = {}
+
+    async def group_send(self, group, message):
+        self.sent[group] = self.sent.get(group, 0) + 1
+
+
+class PresenceTrackerTests(TransactionTestCase):
+    def _tracker(self, **kwargs):
+        self.layer = CountingLayer()
+        tracker = PresenceTracker(channel_layer=self.layer, **kwargs)
+        self.addCleanup(tracker.close)
+        return tracker
+
+    async def test_broadcasts_are_coalesced_per_room(self):
+        tracker = self._tracker(interval=0.1, ttl=30, typing_ttl=5)
+        rooms = [f"room{i}" for i in range(10)]
+        clients = [(rooms[i % 10], f"user{i}", f"channel{i}") for i in range(5000)]
+        for room, user, channel in clients:
+            tracker.join(room, user, channel, room_id=rooms.index(room))
+        # ~1s of keystrokes: every client toggles typing on and off repeatedly
+        rounds = 10
+        for n in range(rounds):
+            for room, user, _ in clients:
+                tracker.set_typing(room, user, n % 2 == 0)
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.25)
+
+        self.assertGreater(tracker.changes, 5000 * rounds)
+        self.assertEqual(set(self.layer.sent), {f"presence_{room}" for room in rooms})
+        duration = rounds * 0.1 + 0.25
+        self.assertLessEqual(tracker.broadcasts, len(rooms) * (duration / 0.1 + 2))
+        self.assertEqual(tracker.online_counts(range(11)), {**{i: 500 for i in range(10)}, 10: 0})
+
+    async def test_snapshot_lists_online_and_typing(self):
+        tracker = self._tracker(interval=1, ttl=30, typing_ttl=5, max_listed=2)
+        for user in ("carol", "alice", "bob"):
+            tracker.join("lobby", user, f"ch-{user}", room_id=7)
+        tracker.join("lobby", "alice", "ch-alice-2", room_id=7)
+        tracker.set_typing("lobby", "bob")
+        tracker.set_typing("lobby", "stranger")
+        snapshot = tracker.snapshot("lobby")
+        self.assertEqual(snapshot["online"], ["alice", "bob"])
+        self.assertEqual(snapshot["online_count"], 3)
+        self.assertEqual(snapshot["typing"], ["bob"])
+
+        # One of alice's two sockets closing keeps her online
+        tracker.leave("lobby", "alice", "ch-alice")
+        self.assertEqual(tracker.online_counts([7]), {7: 3})
+
+    async def test_stale_sockets_and_typing_expire(self):
+        tracker = self._tracker(interval=0.01, ttl=0.1, typing_ttl=0.05)
+        tracker.join("lobby", "alice", "ch-a", room_id=7)
+        tracker.join("lobby", "bob", "ch-b", room_id=7)
+        tracker.set_typing("lobby", "alice")
+        await asyncio.sleep(0.07)
+        self.assertEqual(tracker.snapshot("lobby")["typing"], [])
+        tracker.touch("lobby", "alice", "ch-a", room_id=7)
+        await asyncio.sleep(0.08)
+        tracker.sweep()
+        self.assertEqual(tracker.snapshot("lobby")["online"], ["alice"])
+        await asyncio.sleep(0.2)
+        self.assertEqual(tracker.online_counts([7]), {7: 0})
+        # The emptied room forgets its id; a new room with the name does not inherit it
+        tracker.join("lobby", "carol", "ch-c")
+        self.assertEqual(tracker.online_counts([7]), {7: 0})
+
+
+class ChatHistoryApiTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="x")
+        self.bob = User.objects.create_user(username="bob", password="x")
+        self.room = ChatRoom.objects.create(name="alice-bob")
+        self.room.participants.add(self.alice)
+        ChatMessage.objects.bulk_create(
+            [ChatMessage(room=self.room, sender=self.alice, content=f"m{i}") for i in range(7)]
+        )
+        # Force timestamp ties so the id tiebreaker is exercised
+        base = timezone.now() - timedelta(minutes=1)
+        ChatMessage.objects.filter(content__in=["m0", "m1"]).update(timestamp=base - timedelta(seconds=1))
+        ChatMessage.objects.filter(content__in=["m2", "m3", "m4"]).update(timestamp=base)
+        ChatMessage.objects.filter(content__in=["m5", "m6"]).update(timestamp=base + timedelta(seconds=1))
+        self.url = reverse("communication:communication-api:rooms-messages", args=[self.room.id])
+        self.client.force_authenticate(self.alice)
+
+    def _walk(self, url):
+        contents = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            contents += [m["content"] for m in response.data["results"]]
+            url = response.data["next"]
+        return contents
+
+    def test_history_is_newest_first_across_pages(self):
+        contents = self._walk(self.url + "?page_size=2")
+        self.assertEqual(contents, ["m6", "m5", "m4", "m3", "m2", "m1", "m0"])
+
+    def test_since_returns_only_missed_messages(self):
+        response = self.client.get(self.url, {"page_size": 3})
+        latest = response.data["latest"]
+        self.assertEqual([m["content"] for m in response.data["results"]], ["m6", "m5", "m4"])
+
+        ChatMessage.objects.create(room=self.room, sender=self.alice, content="m7")
+        ChatMessage.objects.create(room=self.room, sender=self.alice, content="m8")
+        response = self.client.get(self.url, {"since": latest})
+        self.assertEqual([m["content"] for m in response.data["results"]], ["m7", "m8"])
+        self.assertIsNone(response.data["next"])
+
+    def test_since_pages_forward(self):
+        since = ChatHistoryPagination().encode_cursor(ChatMessage.objects.get(content="m0"))
+        contents = self._walk(self.url + f"?page_size=2&since={since}")
+        self.assertEqual(contents, ["m1", "m2", "m3", "m4", "m5", "m6"])
+
+    def test_page_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"page_size": 5})
+
+    def test_non_participants_cannot_read_history(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "garbage"}).status_code, 404)
+
+
+class RoomListApiTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(username=name, password="x") for name in ("alice", "bob", "carol")
+        )
+        self.with_bob = ChatRoom.objects.create(name="alice-bob")
+        self.with_bob.participants.add(self.alice, self.bob)
+        self.with_carol = ChatRoom.objects.create(name="alice-carol")
+        self.with_carol.participants.add(self.alice, self.carol)
+        self.quiet = ChatRoom.objects.create(name="quiet")
+        self.quiet.participants.add(self.alice)
+        for content in ("b1", "b2", "b3"):
+            ChatMessage.objects.create(room=self.with_bob, sender=self.bob, content=content)
+        ChatMessage.objects.create(room=self.with_bob, sender=self.alice, content="a1")
+        ChatMessage.objects.create(room=self.with_carol, sender=self.carol, content="x" * 200)
+        self.url = reverse("communication:communication-api:rooms-list")
+        self.client.force_authenticate(self.alice)
+
+    def _unread(self):
+        return {room["name"]: room["unread_count"] for room in self.client.get(self.url).data}
+
+    def test_rooms_with_unread_counts_and_last_message(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        rooms = response.data
+        self.assertEqual([room["name"] for room in rooms], ["alice-carol", "alice-bob", "quiet"])
+        self.assertEqual([room["unread_count"] for room in rooms], [1, 3, 0])
+        self.assertEqual(rooms[0]["last_message"]["sender"], "carol")
+        self.assertEqual(len(rooms[0]["last_message"]["preview"]), 80)
+        self.assertEqual(rooms[1]["last_message"]["preview"], "a1")
+        self.assertIsNone(rooms[2]["last_message"])
+
+        url = reverse("communication:communication-api:rooms-detail", args=[self.with_bob.id])
+        room = self.client.get(url).data
+        self.assertEqual((room["unread_count"], room["last_message"]["sender"]), (3, "alice"))
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        for i in range(20):
+            room = ChatRoom.objects.create(name=f"extra{i}")
+            room.participants.add(self.alice, self.bob)
+            ChatMessage.objects.create(room=room, sender=self.bob, content="oi")
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get(self.url).data), 23)
+
+    def test_rooms_list_online_counts(self):
+        tracker = PresenceTracker(channel_layer=CountingLayer())
+        self.addCleanup(tracker.close)
+
+        async def connect():
+            for user, channel in (("alice", "ch-1"), ("bob", "ch-2"), ("bob", "ch-3")):
+                tracker.join(self.with_bob.name, user, channel, room_id=self.with_bob.id)
+
+        async_to_sync(connect)()
+        with mock.patch("communication.api.presence", tracker), self.assertNumQueries(2):
+            rooms = self.client.get(self.url).data
+        self.assertEqual({room["name"]: room["online_count"] for room in rooms},
+                         {"alice-carol": 0, "alice-bob": 2, "quiet": 0})
+
+    def test_mark_read(self):
+        url = reverse("communication:communication-api:rooms-read", args=[self.with_bob.id])
+        b2 = ChatMessage.objects.get(content="b2")
+        response = self.client.post(url, {"message_id": b2.id}, format="json")
+        self.assertEqual(response.data, {"last_read_id": b2.id, "unread_count": 1})
+
+        response = self.client.post(url)
+        self.assertEqual(response.data["unread_count"], 0)
+        # The pointer never moves backwards
+        response = self.client.post(url, {"message_id": b2.id}, format="json")
+        self.assertEqual(response.data["unread_count"], 0)
+        self.assertGreater(response.data["last_read_id"], b2.id)
+
+        ChatMessage.objects.create(room=self.with_bob, sender=self.bob, content="b4")
+        self.assertEqual(self._unread()["alice-bob"], 1)
+        self.assertEqual(self.client.post(url, {"message_id": "x"}, format="json").status_code, 400)
+
+    def test_mark_read_rejects_ids_outside_the_room(self):
+        url = reverse("communication:communication-api:rooms-read", args=[self.with_bob.id])
+        b1 = ChatMessage.objects.get(content="b1")
+        self.client.post(url, {"message_id": b1.id}, format="json")
+        foreign = ChatMessage.objects.get(room=self.with_carol)
+        newest = ChatMessage.objects.latest("id")
+        for message_id in (foreign.id, newest.id + 1000):
+            response = self.client.post(url, {"message_id": message_id}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("message_id", response.data)
+        membership = RoomMembership.objects.get(room=self.with_bob, user=self.alice)
+        self.assertEqual((membership.last_read_id, membership.unread_count), (b1.id, 2))
+        self.assertEqual(self._unread()["alice-bob"], 2)
+
+    def test_new_members_start_with_history_read(self):
+        self.with_bob.participants.add(self.carol)
+        self.carol.chat_rooms.add(self.quiet)
+        self.client.force_authenticate(self.carol)
+        self.assertEqual(self._unread(), {"alice-carol": 0, "alice-bob": 0, "quiet": 0})
+
+    def test_rebuild_repairs_counters(self):
+        RoomMembership.objects.update(unread_count=99)
+        self.assertEqual(unread.rebuild(), 5)
+        self.assertEqual(self._unread(), {"alice-carol": 1, "alice-bob": 3, "quiet": 0})
+
+
+class ChatArchiveTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = tmp.name
+        settings_override = override_settings(CHAT_ARCHIVE_DIR=tmp.name, CHAT_ARCHIVE_SEGMENT_SIZE=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="x")
+        self.bob = User.objects.create_user(username="bob", password="x")
+        self.room = ChatRoom.objects.create(name="alice-bob")
+        self.room.participants.add(self.alice, self.bob)
+        self.base = timezone.now() - timedelta(days=30)
+        for i in range(10):
+            sender = self.alice if i % 2 == 0 else self.bob
+            message = ChatMessage.objects.create(room=self.room, sender=sender, content=f"m{i}")
+            # m2/m3 share a timestamp to exercise the id tiebreaker inside segments
+            day = 2 if i == 3 else i
+            ChatMessage.objects.filter(pk=message.pk).update(timestamp=self.base + timedelta(days=day))
+        self.cutoff = self.base + timedelta(days=6)
+        self.url = reverse("communication:communication-api:rooms-messages", args=[self.room.id])
+        self.client.force_authenticate(self.alice)
+
+    def _walk(self, url):
+        contents = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            contents += [m["content"] for m in response.data["results"]]
+            url = response.data["next"]
+        return contents
+
+    def test_old_messages_move_to_segments(self):
+        self.assertEqual(archive.archive_messages(self.cutoff), 6)
+        self.assertEqual(
+            list(ChatMessage.objects.order_by("id").values_list("content", flat=True)), ["m6", "m7", "m8", "m9"]
+        )
+        segments = list(ArchivedSegment.objects.order_by("first_id"))
+        self.assertEqual([s.message_count for s in segments], [4, 2])
+        for segment in segments:
+            self.assertTrue(os.path.exists(os.path.join(self.archive_dir, segment.path)))
+        # Nothing left below the cutoff: a second run is a no-op
+        self.assertEqual(archive.archive_messages(self.cutoff), 0)
+
+    def test_history_reads_through_the_archive(self):
+        archive.archive_messages(self.cutoff)
+        expected = [f"m{i}" for i in range(9, -1, -1)]
+        self.assertEqual(self._walk(self.url + "?page_size=3"), expected)
+        self.assertEqual(self._walk(self.url + "?page_size=20"), expected)
+
+        page = self.client.get(self.url, {"page_size": 8}).data["results"]
+        self.assertEqual([(m["content"], m["sender"]) for m in page[-2:]], [("m3", "bob"), ("m2", "alice")])
+
+        (m0,) = archive.read(self.room.id, 1, after=(self.base - timedelta(days=1), 0))
+        self.assertEqual(m0.content, "m0")
+        since = ChatHistoryPagination().encode_cursor(m0)
+        contents = self._walk(self.url + f"?page_size=3&since={since}")
+        self.assertEqual(contents, [f"m{i}" for i in range(1, 10)])
+
+    def test_since_above_the_archive_mark_stays_in_the_database(self):
+        archive.archive_messages(self.cutoff)
+        self.room.refresh_from_db()
+        m5 = ArchivedSegment.objects.order_by("-last_id").first()
+        self.assertEqual((self.room.archived_until, self.room.archived_until_id), (m5.last_timestamp, m5.last_id))
+
+        m6 = ChatMessage.objects.get(content="m6")
+        since = ChatHistoryPagination().encode_cursor(m6)
+        with mock.patch.object(archive, "read", wraps=archive.read) as read:
+            self.assertEqual(self._walk(self.url + f"?since={since}"), ["m7", "m8", "m9"])
+            read.assert_not_called()
+            m4 = archive.read(self.room.id, 5)[1]
+            since = ChatHistoryPagination().encode_cursor(m4)
+            self.assertEqual(self._walk(self.url + f"?since={since}"), ["m5", "m6", "m7", "m8", "m9"])
+            self.assertEqual(read.call_count, 2)
+
+    def test_back_dated_rows_are_merged_into_the_archive(self):
+        archive.archive_messages(self.cutoff)
+        old_paths = set(ArchivedSegment.objects.values_list("path", flat=True))
+        late = ChatMessage.objects.create(room=self.room, sender=self.bob, content="late")
+        ChatMessage.objects.filter(pk=late.pk).update(timestamp=self.base + timedelta(days=1, hours=12))
+        expected = ["m9", "m8", "m7", "m6", "m5", "m4", "m3", "m2", "late", "m1", "m0"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive_messages(self.cutoff), 1)
+        self.assertFalse(ChatMessage.objects.filter(pk=late.pk).exists())
+        segments = list(ArchivedSegment.objects.order_by("last_timestamp", "last_id"))
+        self.assertEqual([s.message_count for s in segments], [4, 3])
+        self.assertTrue(old_paths.isdisjoint(s.path for s in segments))
+        for path in old_paths:
+            self.assertFalse(os.path.exists(os.path.join(self.archive_dir, path)))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.archived_until_id, segments[-1].last_id)
+        self.assertEqual(self._walk(self.url + "?page_size=3"), expected)
+
+    def test_deleting_the_room_removes_segment_files(self):
+        archive.archive_messages(self.cutoff)
+        paths = [os.path.join(self.archive_dir, p) for p in ArchivedSegment.objects.values_list("path", flat=True)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.delete()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("archive_chat", days=1, stdout=out)
+        self.assertIn("10 messages", out.getvalue())
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(len(self._walk(self.url)), 10)
+
+
+class ShardedChannelLayerTests(TransactionTestCase):
+    shards = 3
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+
+    @contextlib.asynccontextmanager
+    async def _hub(self, **options):
+        """Runs every shard in the test's event loop; yields the shards."""
+        shards = [ChannelShard(i, self.shards, path=self.path, **options) for i in range(self.shards)]
+        tasks = [asyncio.ensure_future(shard.serve()) for shard in shards]
+        self.layers = []
+        try:
+            while not all(os.path.exists(socket_path(self.path, i)) for i in range(self.shards)):
+                await asyncio.sleep(0.01)
+            yield shards
+        finally:
+            for layer in self.layers:
+                await layer.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _layer(self, **options):
+        layer = ShardedSocketChannelLayer(path=self.path, shards=self.shards, **options)
+        self.layers.append(layer)
+        return layer
+
+    async def _receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), 2)
+
+    async def test_failed_connect_closes_the_shards_already_open(self):
+        async with self._hub():
+            os.unlink(socket_path(self.path, 2))
+            layer = self._layer()
+            opened = []
+            open_unix_connection = asyncio.open_unix_connection
+
+            async def tracking(path):
+                reader, writer = await open_unix_connection(path)
+                opened.append(writer)
+                return reader, writer
+
+            with mock.patch("communication.layers.asyncio.open_unix_connection", tracking):
+                for _ in range(2):
+                    with self.assertRaises(OSError):
+                        await layer.new_channel()
+            self.assertEqual(len(opened), 4)
+            self.assertTrue(all(writer.is_closing() for writer in opened))
+
+    async def test_group_send_reaches_every_process(self):
+        async with self._hub():
+            # Two layer instances stand in for two worker processes
+            first, second = self._layer(), self._layer()
+            members = [(first, await first.new_channel()), (first, await first.new_channel())]
+            members.append((second, await second.new_channel()))
+            for _, channel in members:
+                await first.group_add("chat_lobby", channel)
+            await second.group_add("chat_other", await second.new_channel())
+
+            await second.group_send("chat_lobby", {"type": "chat.message", "message": "oi"})
+            for layer, channel in members:
+                message = await self._receive(layer, channel)
+                self.assertEqual(message, {"type": "chat.message", "message": "oi"})
+
+            channels = [channel for _, channel in members]
+            await first.group_discard("chat_lobby", channels[0])
+            await second.group_send("chat_lobby", {"type": "chat.message", "message": "again"})
+            self.assertEqual((await self._receive(first, channels[1]))["message"], "again")
+            self.assertTrue(first._connections[asyncio.get_running_loop()].queue(channels[0]).empty())
+
+    async def test_named_channels_and_capacity(self):
+        async with self._hub(capacity=2):
+            sender, receiver = self._layer(), self._layer()
+            await sender.send("worker.tasks", {"type": "task", "n": 1})
+            await sender.send("worker.tasks", {"type": "task", "n": 2})
+            with self.assertRaises(ChannelFull):
+                await sender.send("worker.tasks", {"type": "task", "n": 3})
+            self.assertEqual((await self._receive(receiver, "worker.tasks"))["n"], 1)
+            self.assertEqual((await self._receive(receiver, "worker.tasks"))["n"], 2)
+
+            # A waiting receiver gets the next message directly
+            waiting = asyncio.ensure_future(self._receive(receiver, "worker.tasks"))
+            await asyncio.sleep(0.05)
+            await sender.send("worker.tasks", {"type": "task", "n": 4})
+            self.assertEqual((await waiting)["n"], 4)
+
+    async def test_closed_worker_channels_are_removed_from_groups(self):
+        async with self._hub() as shards:
+            worker = self._layer()
+            for room in range(10):
+                await worker.group_add(f"chat_room{room}", await worker.new_channel())
+            await asyncio.sleep(0.05)
+            self.assertEqual(sum(len(shard.groups) for shard in shards), 10)
+            # Groups spread over the shards by hash
+            self.assertGreater(sum(1 for shard in shards if shard.groups), 1)
+
+            await worker.close()
+            await asyncio.sleep(0.05)
+            self.assertEqual(sum(len(shard.groups) for shard in shards), 0)
+
+    async def test_expired_messages_drop_the_channel(self):
+        async with self._hub() as shards:
+            layer = self._layer(expiry=0)
+            channel = await layer.new_channel()
+            await layer.group_add("chat_lobby", channel)
+            await layer.group_send("chat_lobby", {"type": "chat.message"})
+            await asyncio.sleep(0.05)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.2)
+            self.assertFalse(any(shard.groups for shard in shards))
+
+    async def test_chat_consumer_over_sharded_layer(self):
+        # "lobby" may still be cached as another test's room
+        room_access.clear()
+        async with self._hub():
+            config = {"BACKEND": "communication.layers.ShardedSocketChannelLayer"}
+            config["CONFIG"] = {"path": self.path, "shards": self.shards}
+            with override_settings(CHANNEL_LAYERS={"default": config}):
+                application = URLRouter(websocket_urlpatterns)
+                first = WebsocketCommunicator(application, "/ws/chat/lobby/")
+                second = WebsocketCommunicator(application, "/ws/chat/lobby/")
+                self.assertTrue((await first.connect())[0])
+                self.assertTrue((await second.connect())[0])
+                await first.send_json_to({"message": "oi"})
+                self.assertEqual((await second.receive_json_from())["message"], "oi")
+                await first.disconnect()
+                await second.disconnect()
+                await get_channel_layer().close()
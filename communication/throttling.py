@@ -0,0 +1,103 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# scope -> (tokens per second, burst); a missing or None scope is not limited
+DEFAULT_LIMITS = {
+    "channel": (5.0, 10),
+    "user": (10.0, 20),
+    "room": (200.0, 400),
+}
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``burst`` stored."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def retry_after(self):
+        """Seconds until one token is available (after ``refill``)."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Token buckets per socket (``channel``), per authenticated ``user`` and per ``room``.
+
+    ``check`` is O(1): it refills at most three buckets and takes one token
+    from each only if all of them have one, so a frame rejected by the room
+    bucket does not also cost the sender's own allowance. Anonymous sockets
+    have no user bucket; the channel bucket still applies to them.
+
+    Buckets live in memory, per process. Channel buckets are dropped by
+    ``forget`` when the socket disconnects; user and room buckets that have
+    refilled completely are pruned every ``prune_every`` checks.
+    """
+
+    def __init__(self, limits=None, prune_every=10000, clock=time.monotonic):
+        if limits is None:
+            limits = getattr(settings, "CHAT_RATE_LIMITS", DEFAULT_LIMITS)
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self.prune_every = prune_every
+        self.clock = clock
+        self._buckets = {scope: {} for scope in self.limits}
+        self._checks = 0
+        self.allowed = 0
+        self.throttled = Counter()
+
+    def check(self, channel, user, room):
+        """Consume one token for a frame; ``None`` if allowed, else ``(scope, retry_after)``."""
+        now = self.clock()
+        self._checks += 1
+        if self._checks % self.prune_every == 0:
+            self.prune(now)
+        buckets = []
+        for scope, key in (("channel", channel), ("user", user), ("room", room)):
+            if key is None or scope not in self.limits:
+                continue
+            bucket = self._buckets[scope].get(key)
+            if bucket is None:
+                rate, burst = self.limits[scope]
+                bucket = self._buckets[scope][key] = TokenBucket(rate, burst, now)
+            if bucket.refill(now) < 1:
+                self.throttled[scope] += 1
+                return scope, bucket.retry_after()
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket.tokens -= 1
+        self.allowed += 1
+        return None
+
+    def forget(self, channel):
+        self._buckets.get("channel", {}).pop(channel, None)
+
+    def prune(self, now=None):
+        """Drop user/room buckets that are full again (equivalent to a new one)."""
+        now = self.clock() if now is None else now
+        for scope in ("user", "room"):
+            buckets = self._buckets.get(scope, {})
+            for key in [key for key, bucket in buckets.items() if bucket.refill(now) >= bucket.burst]:
+                del buckets[key]
+
+    def stats(self):
+        return {
+            "allowed": self.allowed,
+            "throttled": dict(self.throttled),
+            "buckets": {scope: len(buckets) for scope, buckets in self._buckets.items()},
+        }
+
+
+# Shared by every ChatConsumer in this process
+rate_limiter = ChatRateLimiter()
@@ -0,0 +1,100 @@
+"""Maintenance of ``RoomMembership.unread_count``.
+
+The counter is what room lists read, so it is kept up to date on the write
+side instead of counting messages per room on every request:
+
+- ``messages_persisted`` adds a batch to every member except its senders,
+  with a single UPDATE per room (``ChatMessageBuffer`` calls it after each
+  ``bulk_create``, the ``post_save`` signal for single saves);
+- ``mark_read`` moves a member's ``last_read_id`` forward, to a message of
+  that room, and recomputes that member's counter from the pointer;
+- ``rebuild`` recomputes counters from the pointers, for rows written
+  without signals (seeding, raw SQL) or deleted messages.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, Max, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import ArchivedSegment, ChatMessage, ChatRoom, RoomMembership
+
+
+def _unread_subquery(room_ref, user_ref, last_read_ref):
+    """COUNT of messages after ``last_read`` not sent by the member, as an expression."""
+    counts = (
+        ChatMessage.objects.filter(room_id=room_ref, id__gt=last_read_ref)
+        .exclude(sender_id=user_ref)
+        .order_by()
+        .values("room_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def latest_message_ids(room_ids):
+    """``{room_id: id of its newest message}`` in one query."""
+    rows = ChatMessage.objects.filter(room_id__in=room_ids).values("room_id").annotate(last_id=Max("id")).order_by()
+    return {row["room_id"]: row["last_id"] for row in rows}
+
+
+def messages_persisted(room_id, sender_counts):
+    """Count ``{sender_id: n}`` new messages of ``room_id`` as unread for everybody else."""
+    total = sum(sender_counts.values())
+    if not total:
+        return 0
+    increment = Case(
+        *[When(user_id=sender_id, then=Value(total - n)) for sender_id, n in sender_counts.items()],
+        default=Value(total),
+    )
+    return RoomMembership.objects.filter(room_id=room_id).update(unread_count=F("unread_count") + increment)
+
+
+def mark_read(room_id, user_id, message_id=None):
+    """Move the member's read pointer to ``message_id`` (default: the newest message).
+
+    The pointer never moves backwards. Returns the updated membership, or
+    ``None`` when ``user_id`` is not in the room. Raises
+    ``ChatMessage.DoesNotExist`` when ``message_id`` is not a message of the
+    room, hot or archived: a foreign id would skew the pointer and a future
+    one would hide messages not yet sent.
+    """
+    if message_id is not None and not _in_room(room_id, message_id):
+        raise ChatMessage.DoesNotExist(f"Message {message_id} is not in room {room_id}")
+    if message_id is None:
+        target = Coalesce(
+            Subquery(ChatMessage.objects.filter(room_id=room_id).order_by("-id").values("id")[:1]), Value(0)
+        )
+    else:
+        target = Value(message_id)
+    memberships = RoomMembership.objects.filter(room_id=room_id, user_id=user_id)
+    with transaction.atomic():
+        if not memberships.update(last_read_id=Greatest(F("last_read_id"), target)):
+            return None
+        # Recomputed from the pointer: also repairs any drift of the counter
+        memberships.update(unread_count=_unread_subquery(room_id, user_id, OuterRef("last_read_id")))
+    return memberships.first()
+
+
+def _in_room(room_id, message_id):
+    """Whether ``message_id`` is a message of the room, in the hot table or an archived segment (one query)."""
+    hot = ChatMessage.objects.filter(pk=message_id, room_id=room_id)
+    archived = ArchivedSegment.objects.filter(room_id=room_id, first_id__lte=message_id, last_id__gte=message_id)
+    return ChatRoom.objects.filter(Exists(hot) | Exists(archived), pk=room_id).exists()
+
+
+def joined(room_id, user_ids):
+    """New members start with the existing history marked as read."""
+    latest = latest_message_ids([room_id]).get(room_id, 0)
+    return RoomMembership.objects.filter(room_id=room_id, user_id__in=user_ids).update(
+        last_read_id=latest, unread_count=0
+    )
+
+
+def rebuild(room_ids=None):
+    """Recompute ``unread_count`` from ``last_read_id`` (for all rooms, or only ``room_ids``)."""
+    memberships = RoomMembership.objects.all()
+    if room_ids is not None:
+        memberships = memberships.filter(room_id__in=room_ids)
+    return memberships.update(
+        unread_count=_unread_subquery(OuterRef("room_id"), OuterRef("user_id"), OuterRef("last_read_id"))
+    )
@@ -0,0 +1,15 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+app_name = "communication"
+
+router = DefaultRouter()
+router.register(r"rooms", api.ChatRoomViewSet, basename="rooms")
+
+urlpatterns = [
+    path("api/", include((router.urls, "communication-api"))),
+    path("api/throttle/stats/", api.ChatThrottleStatsView.as_view(), name="throttle_stats"),
+    path("api/ws-token/", api.WebSocketTokenView.as_view(), name="ws_token"),
+]
@@ -0,0 +1,72 @@
+"""Wire encodings of chat frames, negotiated per WebSocket connection.
+
+JSON text frames are the default. A client that offers the
+``skillswap.msgpack`` subprotocol gets binary MessagePack frames instead
+(and may send MessagePack frames itself); ``skillswap.json`` selects JSON
+explicitly.
+
+Group events carry their frames already encoded (``encode_frames``), once
+per send, so fanning a message out to N sockets costs N socket writes and no
+per-recipient serialization.
+"""
+import json
+
+import msgpack
+
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, MSGPACK)
+
+# Subprotocol offered by the client -> encoding
+SUBPROTOCOLS = {
+    "skillswap.msgpack": MSGPACK,
+    "skillswap.json": JSON,
+}
+
+
+class WireError(ValueError):
+    """A binary frame that cannot be decoded."""
+
+
+def negotiate(offered):
+    """``(encoding, subprotocol to accept)`` for the subprotocols a client offered, in its order."""
+    for subprotocol in offered or ():
+        if subprotocol in SUBPROTOCOLS:
+            return SUBPROTOCOLS[subprotocol], subprotocol
+    return JSON, None
+
+
+def encode_json(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode(payload, encoding):
+    """Frame for one socket: ``str`` for JSON, ``bytes`` for MessagePack."""
+    if encoding == MSGPACK:
+        return packb(payload)
+    return encode_json(payload)
+
+
+def encode_frames(payload):
+    """``{encoding: frame}`` for every encoding, to ship inside a group event."""
+    return {encoding: encode(payload, encoding) for encoding in ENCODINGS}
+
+
+def decode(data):
+    """Payload of a binary (MessagePack) frame sent by a client."""
+    try:
+        return unpackb(data)
+    except (ValueError, TypeError) as exc:
+        # Truncated, trailing or malformed data, nesting too deep, unhashable map keys
+        raise WireError(str(exc) or type(exc).__name__) from exc
+
+
+# -- MessagePack ---------------------------------------------------------------
+
+
+def packb(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpackb(data):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
@@ -0,0 +1,28 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from . import export
+
+
+class ExportView(APIView):
+    """Streams a whole table as ``<name>.ndjson`` / ``<name>.csv`` (``.gz`` for gzip)."""
+
+    permission_classes = [permissions.IsAdminUser]
+    # Session + user lookups; the export itself runs while the body streams
+    query_budget = 3
+
+    def get(self, request, name, extension):
+        fmt, _, compression = extension.partition(".")
+        if name not in export.EXPORTS or fmt not in export.FORMATS or compression not in ("", "gz"):
+            raise Http404
+        chunks = export.stream(name, fmt)
+        content_type = ("application/x-ndjson" if fmt == "ndjson" else "text/csv") + "; charset=utf-8"
+        if compression:
+            chunks, content_type = export.gzip_stream(chunks), "application/gzip"
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.aiterate(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{name}.{extension}"'
+        return response
@@ -0,0 +1,48 @@
+"""Shared helpers for the ``bench_*`` management commands.
+
+Benchmarks never touch the development database: they run inside
+``isolated_database()``, which creates the test databases the same way
+``manage.py test`` does and tears them down afterwards.
+"""
+import contextlib
+import math
+import time
+
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextlib.contextmanager
+def isolated_database(verbosity=0):
+    """Create throwaway test databases for the duration of the block."""
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` between 0 and 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Timer:
+    """Context manager measuring wall-clock time in seconds."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def rate(count, seconds):
+    """Operations per second, guarding against zero-length measurements."""
+    return count / seconds if seconds > 0 else float("inf")
@@ -0,0 +1,155 @@
+"""Database plumbing for the high-concurrency SQLite profile (``SQLITE_PROFILE=tuned``).
+
+- ``PrimaryReplicaRouter`` sends reads to the read-only ``replica`` alias
+  and writes to ``default``. Both open the same WAL-mode file, so readers
+  never block the writer and see every committed write immediately; the
+  only reads kept on ``default`` are those inside a transaction there,
+  which must see its own uncommitted changes.
+- ``SerialWriter`` runs write jobs one at a time on a dedicated thread and
+  commits everything queued meanwhile in a single transaction (group
+  commit), so a process never has several of its own writers fighting for
+  the SQLite lock and pays one commit per batch instead of one per job.
+- ``retrying`` re-runs a short write transaction that lost the lock race.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class PrimaryReplicaRouter:
+    replica = "replica"
+
+    def db_for_read(self, model, **hints):
+        if not self.replica_available() or connections["default"].in_atomic_block:
+            return "default"
+        return self.replica
+
+    def replica_available(self):
+        """Whether the replica opens the primary's file.
+
+        Not the case when there is no replica, or while tests run against a
+        test database (the replica is only declared a ``TEST`` mirror).
+        """
+        replica = settings.DATABASES.get(self.replica)
+        if replica is None:
+            return False
+        name = str(replica["NAME"]).removeprefix("file:").split("?")[0]
+        return name == str(settings.DATABASES["default"]["NAME"])
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same database file behind both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class SerialWriter:
+    """Single writer thread with group commit.
+
+    ``submit(func, *args)`` queues ``func`` and returns a
+    ``concurrent.futures.Future``; ``await run(func, *args)`` is the asyncio
+    flavour. The thread takes every queued job (up to ``max_batch``), runs
+    each in its own savepoint inside one ``transaction.atomic`` and resolves
+    the futures once that transaction has committed. A failing job only
+    rolls back its savepoint; the others still commit.
+    """
+
+    def __init__(self, using="default", max_batch=None):
+        if max_batch is None:
+            max_batch = getattr(settings, "DB_WRITER_MAX_BATCH", 100)
+        self.using = using
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.batches = 0
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        self._ensure_thread()
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._serve, name="db-serial-writer", daemon=True)
+                self._thread.start()
+
+    def _serve(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        close_old_connections()
+        outcomes = []
+        try:
+            with transaction.atomic(using=self.using):
+                for future, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic(using=self.using):
+                            outcomes.append((future, True, func(*args, **kwargs)))
+                    except Exception as exc:
+                        outcomes.append((future, False, exc))
+        except Exception as exc:
+            # The commit itself failed: nothing in the batch was written
+            logger.exception("Serial writer batch of %d jobs failed", len(batch))
+            outcomes = [(future, False, exc) for future, *_ in batch if not future.cancelled()]
+        finally:
+            close_old_connections()
+        self.jobs += len(batch)
+        self.batches += 1
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+# Shared by every writer of this process that opts in (e.g. chat persistence)
+writer = SerialWriter()
+
+
+def retrying(func, *args, using="default", **kwargs):
+    """``func(*args, **kwargs)``, run again a few times when it raises ``OperationalError``.
+
+    SQLite without BEGIN IMMEDIATE fails the lock upgrade of a transaction
+    that read first at once ("database is locked") instead of waiting for
+    the busy timeout; a new attempt starts from a fresh snapshot. Inside an
+    atomic block the error has already broken the transaction, so ``func``
+    then runs once.
+    """
+    if connections[using].in_atomic_block:
+        return func(*args, **kwargs)
+    for pause in (0.01, 0.02, 0.04, 0.08):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError:
+            time.sleep(pause)
+    return func(*args, **kwargs)
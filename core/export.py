@@ -0,0 +1,137 @@
+"""Streaming bulk export of the main tables as NDJSON or CSV.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL, ``fetchmany`` on SQLite) and serialized
+one at a time, so memory use does not depend on the table size. ``stream``
+yields text chunks of roughly ``CHUNK_BYTES``; ``gzip_stream`` compresses
+them on the fly. Both back the ``export_data`` command and the admin export
+endpoint (``core.api.ExportView``), which serves them through ``aiterate``
+under ASGI.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+
+FORMATS = ("ndjson", "csv")
+CHUNK_BYTES = 64 * 1024
+
+# name -> (model label, exported columns). Passwords and derived tables are left out.
+EXPORTS = {
+    "users": (
+        settings.AUTH_USER_MODEL,
+        ("id", "username", "email", "first_name", "last_name", "is_active", "is_staff", "date_joined", "last_login"),
+    ),
+    "profiles": ("users.UserProfile", ("id", "user_id", "bio", "location", "created_at")),
+    "skills": ("users.UserSkill", ("id", "user_id", "name", "description", "created_at")),
+    "requests": (
+        "services.ServiceRequest",
+        ("id", "requester_id", "provider_id", "offered_skill_id", "description", "status", "created_at"),
+    ),
+    "reviews": (
+        "services.Review",
+        ("id", "transaction_id", "reviewer_id", "reviewed_user_id", "rating", "comment", "date"),
+    ),
+    "messages": ("communication.ChatMessage", ("id", "room_id", "sender_id", "content", "timestamp")),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def columns(name):
+    try:
+        return EXPORTS[name][1]
+    except KeyError:
+        raise ExportError(f"Unknown export {name!r}; choose from {', '.join(EXPORTS)}") from None
+
+
+def rows(name, chunk_size=None):
+    """Tuples of the exported columns of ``name``, in primary key order."""
+    if chunk_size is None:
+        chunk_size = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    fields = columns(name)
+    model = apps.get_model(EXPORTS[name][0])
+    return model._default_manager.order_by("pk").values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson_lines(name, chunk_size):
+    fields = columns(name)
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default).encode
+    for row in rows(name, chunk_size):
+        yield encode(dict(zip(fields, row))) + "\n"
+
+
+class _Line:
+    """File-like object for ``csv.writer`` that hands back the formatted line."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(name, chunk_size):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns(name))
+    for row in rows(name, chunk_size):
+        yield writer.writerow(value.isoformat() if isinstance(value, (datetime, date)) else value for value in row)
+
+
+def stream(name, fmt="ndjson", chunk_size=None):
+    """Text chunks of about ``CHUNK_BYTES`` holding the whole export of ``name``."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    columns(name)
+    lines = _ndjson_lines(name, chunk_size) if fmt == "ndjson" else _csv_lines(name, chunk_size)
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress an iterable of text chunks incrementally (UTF-8 bytes out)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def aiterate(chunks, batch=4):
+    """Async iterator over ``chunks``, pulled ``batch`` at a time in the request's sync thread.
+
+    Django's ASGI handler reads a sync iterator whole (``sync_to_async(list)``)
+    before sending anything, which would hold the entire export in memory.
+    """
+    iterator = iter(chunks)
+    pull = sync_to_async(lambda: list(islice(iterator, batch)), thread_sensitive=True)
+    try:
+        while parts := await pull():
+            for part in parts:
+                yield part
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # Releases the database cursor in the thread that opened it
+            await sync_to_async(close, thread_sensitive=True)()
@@ -0,0 +1,280 @@
+"""Background job queue stored in the database (no broker).
+
+``enqueue(task, kwargs)`` inserts a ``Job`` row in the caller's transaction,
+so a job only exists if the work that asked for it commits, and returns
+right away; ``python manage.py run_jobs`` claims and runs the jobs in a
+pool of threads or processes.
+
+- Tasks are functions registered with ``@task``; ``kwargs`` must be JSON.
+  Workers import the ``tasks`` module of every installed app.
+- ``enqueue(..., key=...)`` is idempotent: while a job with that key exists
+  (until it is purged) the same job is returned and nothing is added.
+- Claiming: with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL, MySQL 8,
+  Oracle) concurrent workers lock disjoint rows without waiting for each
+  other. SQLite has no row locks, so a claim is a single conditional
+  ``UPDATE ... WHERE id IN (<oldest ready ids>) AND status = 'QUEUED'``
+  stamped with a claim token: SQLite runs one writer at a time, so two
+  claims can never take the same row.
+- The tasks of a claimed batch run outside any transaction, so a slow task
+  never holds the SQLite write lock, and their DONE marks are written
+  together afterwards. Tasks registered with ``atomic=True`` run in a
+  transaction that also marks them DONE: their database writes commit
+  exactly once, and not at all if they fail.
+- Failures are retried with exponential backoff (``JOBS_RETRY_BASE`` doubled
+  per attempt, capped at ``JOBS_RETRY_MAX``, with jitter) up to
+  ``max_attempts``, then the job is FAILED with the traceback.
+- Delivery is at least once: jobs of a crashed worker go back to the queue
+  once their lock is older than ``JOBS_LOCK_TIMEOUT``, so tasks with side
+  effects outside the database should be idempotent.
+- DONE jobs are purged ``JOBS_KEEP_DONE`` seconds after they finish.
+"""
+import logging
+import multiprocessing
+import random
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .db import retrying
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Status = Job.Status
+
+registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(func=None, *, name=None, max_attempts=None, atomic=False):
+    """Register ``func`` as a task (``@task`` or ``@task(name=..., max_attempts=..., atomic=...)``)."""
+
+    def register(func):
+        func.task_name = name or f"{func.__module__}.{func.__qualname__}"
+        func.max_attempts = max_attempts
+        func.atomic = atomic
+        registry[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(task, kwargs=None, *, key=None, queue="default", delay=None, max_attempts=None):
+    """Queue a call of ``task`` (a registered function or its name); returns the ``Job``."""
+    name = getattr(task, "task_name", task)
+    if name not in registry:
+        raise LookupError(f"Unknown task {name!r}")
+    fields = {
+        "queue": queue,
+        "task": name,
+        "payload": kwargs or {},
+        "max_attempts": max_attempts or registry[name].max_attempts or _setting("JOBS_MAX_ATTEMPTS", 5),
+        "run_at": timezone.now() + timedelta(seconds=delay or 0),
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(key=key, defaults=fields)
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that failed ``attempts`` times."""
+    delay = min(_setting("JOBS_RETRY_MAX", 3600), _setting("JOBS_RETRY_BASE", 5) * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(queues=("default",), limit=10):
+    """Mark up to ``limit`` ready jobs as RUNNING for this caller and return them."""
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    ready = Job.objects.filter(status=Status.QUEUED, queue__in=queues, run_at__lte=now).order_by("run_at", "id")
+    changes = {"status": Status.RUNNING, "claim": token, "locked_at": now, "attempts": F("attempts") + 1}
+    # Read back in the same transaction: a failure there cannot leave rows claimed by nobody
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(ready.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**changes)
+        else:
+            Job.objects.filter(pk__in=Subquery(ready.values("pk")[:limit]), status=Status.QUEUED).update(**changes)
+        return list(Job.objects.filter(claim=token, status=Status.RUNNING).order_by("run_at", "id"))
+
+
+def _mark_done(jobs):
+    if jobs:
+        Job.objects.filter(pk__in=[job.pk for job in jobs], claim=jobs[0].claim).update(
+            status=Status.DONE, finished_at=timezone.now(), locked_at=None
+        )
+
+
+def execute(jobs):
+    """Run claimed jobs; returns how many succeeded."""
+    done, failed = [], []
+    for job in jobs:
+        func = registry.get(job.task)
+        try:
+            if func is None:
+                raise LookupError(f"Unknown task {job.task!r}")
+            if func.atomic:
+                with transaction.atomic():
+                    func(**job.payload)
+                    _mark_done([job])
+            else:
+                func(**job.payload)
+                done.append(job)
+        except Exception:
+            logger.warning("Job %s (%s) failed on attempt %d", job.pk, job.task, job.attempts, exc_info=True)
+            failed.append((job, traceback.format_exc()))
+    if not done and not failed:
+        return len(jobs)
+    try:
+        retrying(_finish, done, failed)
+    except OperationalError:
+        # Not recorded: hand them back rather than wait for the lock timeout (they run again)
+        release(done + [job for job, _ in failed])
+        raise
+    return len(jobs) - len(failed)
+
+
+def _finish(done, failed):
+    now = timezone.now()
+    with transaction.atomic():
+        _mark_done(done)
+        for job, error in failed:
+            changes = {"last_error": error, "locked_at": None}
+            if job.attempts < job.max_attempts and job.task in registry:
+                changes.update(status=Status.QUEUED, run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+            else:
+                changes.update(status=Status.FAILED, finished_at=now)
+            Job.objects.filter(pk=job.pk, claim=job.claim).update(**changes)
+
+
+def release(jobs):
+    """Undo the claim of ``jobs`` that were not run (best effort)."""
+    claimed = Job.objects.filter(pk__in=[job.pk for job in jobs], claim=jobs[0].claim, status=Status.RUNNING)
+    try:
+        retrying(claimed.update, status=Status.QUEUED, claim="", locked_at=None, attempts=F("attempts") - 1)
+    except OperationalError:
+        logger.exception("Could not release %d jobs, they will be requeued after the lock timeout", len(jobs))
+
+
+def requeue_stale():
+    """Put back jobs whose worker died (RUNNING longer than ``JOBS_LOCK_TIMEOUT``); returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=_setting("JOBS_LOCK_TIMEOUT", 600))
+    stale = Job.objects.filter(status=Status.RUNNING, locked_at__lt=cutoff)
+    error = "Worker lock expired"
+    with transaction.atomic():
+        failed = stale.filter(attempts__gte=F("max_attempts")).update(
+            status=Status.FAILED, finished_at=timezone.now(), locked_at=None, last_error=error
+        )
+        requeued = stale.update(status=Status.QUEUED, claim="", locked_at=None, last_error=error)
+    return failed + requeued
+
+
+def purge():
+    """Delete DONE jobs older than ``JOBS_KEEP_DONE`` seconds; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=_setting("JOBS_KEEP_DONE", 7 * 86400))
+    return Job.objects.filter(status=Status.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+class Worker:
+    """Runs ``concurrency`` claim/execute loops in threads or (forked) processes.
+
+    ``burst`` loops return as soon as no job is ready; otherwise they poll
+    every ``poll_interval`` seconds until ``stop()``.
+    """
+
+    def __init__(
+        self, queues=("default",), concurrency=1, pool="thread", batch_size=None, poll_interval=None, burst=False
+    ):
+        if pool not in ("thread", "process"):
+            raise ValueError(f"Unknown pool {pool!r}")
+        self.queues = tuple(queues)
+        self.concurrency = max(1, concurrency)
+        self.pool = pool
+        self.batch_size = batch_size or _setting("JOBS_BATCH_SIZE", 10)
+        self.poll_interval = _setting("JOBS_POLL_INTERVAL", 1.0) if poll_interval is None else poll_interval
+        self.burst = burst
+        self._stop = multiprocessing.Event() if pool == "process" else threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Start the loops and wait for them; returns the number of jobs done (threads only)."""
+        autodiscover_modules("tasks")
+        if self.pool == "thread":
+            results = [0] * self.concurrency
+
+            def work(i):
+                results[i] = self.loop(maintenance=i == 0)
+
+            threads = [threading.Thread(target=work, args=(i,), name=f"jobs-{i}") for i in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return sum(results)
+
+        context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        # Children must not share the parent's database connections
+        connections.close_all()
+        processes = [
+            context.Process(target=_process_main, args=(self, i == 0), name=f"jobs-{i}")
+            for i in range(self.concurrency)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return None
+
+    def loop(self, maintenance=False):
+        done = 0
+        next_maintenance = 0.0
+        interval = _setting("JOBS_MAINTENANCE_INTERVAL", 60)
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    if maintenance and time.monotonic() >= next_maintenance:
+                        requeue_stale()
+                        purge()
+                        next_maintenance = time.monotonic() + interval
+                    jobs = claim(self.queues, self.batch_size)
+                    done += execute(jobs)
+                except OperationalError as exc:
+                    # e.g. SQLite "database is locked" under contention: the batch
+                    # was handed back (or rolled back), try again after a pause
+                    logger.warning("Job worker database error: %s", exc)
+                    self._stop.wait(self.poll_interval)
+                    continue
+                if not jobs:
+                    if self.burst:
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+        return done
+
+
+def _process_main(worker, maintenance):
+    import signal
+
+    import django
+
+    django.setup()
+    autodiscover_modules("tasks")
+    # Ctrl-C reaches the whole process group: the parent stops the children
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker.loop(maintenance)
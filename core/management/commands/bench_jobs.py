@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import jobs
+from core.benchmarks import Timer, rate
+
+
+@jobs.task(name="bench_jobs.work")
+def work(n, sleep_ms=0):
+    if sleep_ms:
+        time.sleep(sleep_ms / 1000)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da fila de tarefas no banco (core.jobs): enfileiramento (avulso, com chave de idempotência, "
+        "em uma transação) e vazão dos workers com pools de threads e de processos (usa bancos SQLite temporários)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=5000, help="Tarefas por medição")
+        parser.add_argument(
+            "--single", type=int, default=500, help="Tarefas enfileiradas uma por transação (um commit cada)"
+        )
+        parser.add_argument("--profiles", nargs="+", default=["default", "tuned"], help="Perfis do SQLite comparados")
+        parser.add_argument(
+            "--pools", nargs="+", default=["thread:1", "thread:4", "process:4"], help="Pools de workers (tipo:tamanho)"
+        )
+        parser.add_argument("--batch-size", type=int, default=10, help="Tarefas pegas por vez")
+        parser.add_argument("--work-ms", type=float, default=0, help="Duração de cada tarefa (sleep)")
+        # Internal: run the measurements against the database given by SQLITE_PATH
+        parser.add_argument("--run", action="store_true", help="(interno)")
+
+    def handle(self, *args, **options):
+        if options["run"]:
+            self.run(options)
+            return
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / "manage.py")]
+        arguments = [
+            "--jobs", str(options["jobs"]),
+            "--single", str(options["single"]),
+            "--batch-size", str(options["batch_size"]),
+            "--work-ms", str(options["work_ms"]),
+            "--pools", *options["pools"],
+        ]
+        for profile in options["profiles"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, SQLITE_PROFILE=profile, SQLITE_PATH=str(Path(tmp) / "bench.sqlite3"))
+                subprocess.run(manage + ["migrate", "-v", "0"], env=env, check=True)
+                self.stdout.write(f"\nSQLite profile: {profile}")
+                self.stdout.flush()
+                subprocess.run(manage + ["bench_jobs", "--run"] + arguments, env=env, check=True)
+
+    def run(self, options):
+        from core.models import Job
+
+        count, single = options["jobs"], options["single"]
+        self.stdout.write(f"{'enqueue':<34}{'jobs/s':>10}")
+        for label, enqueue in (
+            ("one per transaction", lambda n: jobs.enqueue(work, {"n": n})),
+            ("one per transaction, with key", lambda n: jobs.enqueue(work, {"n": n}, key=f"work:{n}")),
+            ("same key again (deduplicated)", lambda n: jobs.enqueue(work, {"n": n}, key=f"work:{n}")),
+        ):
+            with Timer() as timer:
+                for n in range(single):
+                    enqueue(n)
+            self.stdout.write(f"{label:<34}{rate(single, timer.elapsed):>10.0f}")
+        Job.objects.all().delete()
+        with Timer() as timer, transaction.atomic():
+            for n in range(count):
+                jobs.enqueue(work, {"n": n})
+        self.stdout.write(f"{'all in one transaction':<34}{rate(count, timer.elapsed):>10.0f}")
+
+        self.stdout.write(
+            f"\n{'worker pool':<34}{'jobs/s':>10}   ({count} jobs, batches of {options['batch_size']}, "
+            f"{options['work_ms']:g} ms each)"
+        )
+        for spec in options["pools"]:
+            pool, _, size = spec.partition(":")
+            Job.objects.all().delete()
+            with transaction.atomic():
+                for n in range(count):
+                    jobs.enqueue(work, {"n": n, "sleep_ms": options["work_ms"]})
+            worker = jobs.Worker(
+                concurrency=int(size or 1), pool=pool, batch_size=options["batch_size"], poll_interval=0.01, burst=True
+            )
+            with Timer() as timer:
+                worker.run()
+            done = Job.objects.filter(status=Job.Status.DONE).count()
+            # A loop may exit while a batch that hit the lock is handed back: drain it
+            leftover = jobs.Worker(batch_size=options["batch_size"], poll_interval=0.01, burst=True).run()
+            runs = Job.objects.filter(attempts__gt=1).count()
+            assert done + leftover == count, (done, leftover, count)
+            note = f"  ({leftover} handed back, {runs} run twice)" if leftover or runs else ""
+            self.stdout.write(f"{spec:<34}{rate(done, timer.elapsed):>10.0f}{note}")
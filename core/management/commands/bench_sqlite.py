@@ -0,0 +1,193 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de carga concorrente no SQLite: processos escritores (persistência do chat) e "
+        "leitores (histórico) no perfil padrão e no perfil SQLITE_PROFILE=tuned (usa bancos temporários)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", nargs="+", default=["default", "tuned"], help="Perfis comparados")
+        parser.add_argument("--writers", type=int, default=4, help="Processos escritores")
+        parser.add_argument("--readers", type=int, default=4, help="Processos leitores")
+        parser.add_argument("--threads", type=int, default=4, help="Threads por processo")
+        parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga")
+        parser.add_argument("--batch", type=int, default=20, help="Mensagens por escrita")
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--rooms", type=int, default=200)
+        parser.add_argument("--messages-per-room", type=int, default=200)
+        # Internal: run one worker process of the benchmark
+        parser.add_argument("--worker", choices=["setup", "write", "read"], help="(interno)")
+        parser.add_argument("--deadline", type=float, help="(interno)")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            self.run_worker(options)
+            return
+        self.stdout.write(
+            f"{options['writers']} writer + {options['readers']} reader processes x {options['threads']} threads, "
+            f"{options['duration']:.0f}s, {options['batch']} messages per write"
+        )
+        self.stdout.write(
+            f"\n{'profile':<10}{'role':<8}{'ops/s':>10}{'msgs/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'locked':>8}{'errors':>8}"
+        )
+        for profile in options["profiles"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                self.run_profile(profile, Path(tmp) / "bench.sqlite3", options)
+
+    # Coordinator
+
+    def run_profile(self, profile, path, options):
+        env = dict(os.environ, SQLITE_PROFILE=profile, SQLITE_PATH=str(path))
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / "manage.py")]
+        subprocess.run(manage + ["migrate", "-v", "0"], env=env, check=True)
+        subprocess.run(manage + ["bench_sqlite", "--worker", "setup"] + self._sizes(options), env=env, check=True)
+
+        common = self._sizes(options) + ["--threads", str(options["threads"]), "--batch", str(options["batch"])]
+        # Give every process time to import Django before the clock starts
+        start = time.time() + 3
+        deadline = start + options["duration"]
+        roles = ["write"] * options["writers"] + ["read"] * options["readers"]
+        procs = [
+            (role, subprocess.Popen(
+                manage + ["bench_sqlite", "--worker", role, "--deadline", str(deadline)] + common,
+                env=env,
+                stdout=subprocess.PIPE,
+                text=True,
+            ))
+            for role in roles
+        ]
+        results = {"write": [], "read": []}
+        for role, proc in procs:
+            out, _ = proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(f"{role} worker exited with {proc.returncode}")
+            results[role].append(json.loads(out.strip().splitlines()[-1]))
+
+        for role in ("write", "read"):
+            stats = results[role]
+            if not stats:
+                continue
+            latencies = [ms for s in stats for ms in s["latencies"]]
+            ops = len(latencies)
+            rows = sum(s["rows"] for s in stats)
+            self.stdout.write(
+                f"{profile:<10}{role:<8}{ops / options['duration']:>10.0f}{rows / options['duration']:>10.0f}"
+                f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}"
+                f"{sum(s['locked'] for s in stats):>8}{sum(s['errors'] for s in stats):>8}"
+            )
+
+    def _sizes(self, options):
+        return [
+            "--users", str(options["users"]),
+            "--rooms", str(options["rooms"]),
+            "--messages-per-room", str(options["messages_per_room"]),
+        ]
+
+    # Workers (one process each; print a JSON summary on the last line)
+
+    def run_worker(self, options):
+        if options["worker"] == "setup":
+            from core.seeding import SeedSizes, SyntheticDataGenerator
+
+            sizes = SeedSizes(
+                users=options["users"],
+                skills_per_user=1,
+                rooms=options["rooms"],
+                messages_per_room=options["messages_per_room"],
+            )
+            SyntheticDataGenerator(sizes, seed=42).run()
+            return
+
+        from communication.models import RoomMembership
+
+        members = {}
+        for room_id, user_id in RoomMembership.objects.values_list("room_id", "user_id"):
+            members.setdefault(room_id, []).append(user_id)
+        target = self.write_loop if options["worker"] == "write" else self.read_loop
+        stats = Counter()
+        latencies = []
+        lock = threading.Lock()
+
+        while time.time() < options["deadline"] - options["duration"]:
+            time.sleep(0.01)
+        threads = [
+            threading.Thread(target=target, args=(i, members, options, stats, latencies, lock))
+            for i in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(json.dumps({
+            "latencies": latencies, "rows": stats["rows"], "locked": stats["locked"], "errors": stats["errors"],
+        }))
+
+    def _measure(self, op, stats, latencies, lock):
+        start = time.perf_counter()
+        try:
+            rows = op()
+        except OperationalError as exc:
+            with lock:
+                stats["locked" if "locked" in str(exc) else "errors"] += 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            stats["rows"] += rows
+
+    def write_loop(self, index, members, options, stats, latencies, lock):
+        from communication import unread
+        from communication.models import ChatMessage
+        from core.db import writer
+
+        rng = random.Random(f"write-{os.getpid()}-{index}")
+        rooms = list(members)
+
+        def write(batch):
+            # Same work as ChatMessageBuffer._write, minus its error swallowing
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(batch)
+                unread.messages_persisted(batch[0].room_id, Counter(m.sender_id for m in batch))
+            return len(batch)
+
+        while time.time() < options["deadline"]:
+            room_id = rng.choice(rooms)
+            batch = [
+                ChatMessage(room_id=room_id, sender_id=rng.choice(members[room_id]), content=f"bench {i}")
+                for i in range(options["batch"])
+            ]
+            self._measure(lambda: writer.submit(write, batch).result(), stats, latencies, lock)
+        connections.close_all()
+
+    def read_loop(self, index, members, options, stats, latencies, lock):
+        from communication.models import ChatMessage
+
+        rng = random.Random(f"read-{os.getpid()}-{index}")
+        rooms = list(members)
+
+        def read(room_id):
+            page = ChatMessage.objects.filter(room_id=room_id).select_related("sender").order_by("-timestamp", "-id")
+            return len(page[:50])
+
+        while time.time() < options["deadline"]:
+            room_id = rng.choice(rooms)
+            self._measure(lambda: read(room_id), stats, latencies, lock)
+        connections.close_all()
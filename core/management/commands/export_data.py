@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta usuários, perfis, skills, pedidos, avaliações e mensagens em NDJSON ou CSV, "
+        "lendo o banco em lotes (memória constante, sem carregar as tabelas inteiras como o dumpdata)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tables", nargs="*", help=f"Tabelas exportadas: {', '.join(export.EXPORTS)} (padrão: todas)"
+        )
+        parser.add_argument("--format", choices=export.FORMATS, default="ndjson")
+        parser.add_argument("--gzip", action="store_true", help="Comprime cada arquivo com gzip")
+        parser.add_argument(
+            "--output", default="export", help="Diretório de saída (um arquivo por tabela) ou '-' para stdout"
+        )
+        parser.add_argument("--chunk-size", type=int, default=None, help="Linhas lidas do banco por lote")
+
+    def handle(self, *args, **options):
+        tables = options["tables"] or list(export.EXPORTS)
+        unknown = set(tables) - set(export.EXPORTS)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}; choose from {', '.join(export.EXPORTS)}")
+        if options["output"] == "-":
+            if len(tables) != 1:
+                raise CommandError("Exporting to stdout takes exactly one table")
+            self.write(tables[0], sys.stdout.buffer, options)
+            return
+
+        directory = Path(options["output"])
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in tables:
+            filename = directory / f"{name}.{options['format']}{'.gz' if options['gzip'] else ''}"
+            with open(filename, "wb") as fh:
+                written = self.write(name, fh, options)
+            self.stdout.write(f"{name}: {written / 1e6:.1f} MB -> {filename}")
+
+    def write(self, name, fh, options):
+        chunks = export.stream(name, options["format"], options["chunk_size"])
+        if options["gzip"]:
+            data = export.gzip_stream(chunks)
+        else:
+            data = (chunk.encode("utf-8") for chunk in chunks)
+        written = 0
+        for block in data:
+            fh.write(block)
+            written += len(block)
+        return written
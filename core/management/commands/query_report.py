@@ -0,0 +1,75 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import percentile
+
+SORT_KEYS = {
+    "queries": lambda row: row["p95_queries"],
+    "time": lambda row: row["p95_ms"],
+    "requests": lambda row: row["requests"],
+    "duplicates": lambda row: row["avg_duplicates"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Resumo por rota do custo de banco registrado pelo QueryBudgetMiddleware em QUERY_STATS_FILE "
+        "(queries, tempo de SQL, queries repetidas e estouros de orçamento)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None, help="Arquivo de estatísticas (padrão: QUERY_STATS_FILE)")
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="queries")
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        path = options["file"] or getattr(settings, "QUERY_STATS_FILE", None)
+        if not path:
+            raise CommandError("Set QUERY_STATS_FILE or pass --file")
+        try:
+            with open(path, encoding="utf-8") as fh:
+                records = [json.loads(line) for line in fh if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"{path} does not exist (no request recorded yet?)")
+
+        by_route = defaultdict(list)
+        for record in records:
+            by_route[record["route"]].append(record)
+
+        rows = []
+        for route, items in by_route.items():
+            queries = [r["queries"] for r in items]
+            timings = [r["sql_ms"] for r in items]
+            budgets = [r["budget"] for r in items if r["budget"] is not None]
+            duplicates = Counter(r["top_duplicate"] for r in items if r["top_duplicate"])
+            rows.append(
+                {
+                    "route": route,
+                    "requests": len(items),
+                    "avg_queries": sum(queries) / len(items),
+                    "p95_queries": percentile(queries, 95),
+                    "max_queries": max(queries),
+                    "p95_ms": percentile(timings, 95),
+                    "avg_duplicates": sum(r["duplicates"] for r in items) / len(items),
+                    "budget": max(budgets) if budgets else None,
+                    "over_budget": sum(1 for r in items if r["budget"] is not None and r["queries"] > r["budget"]),
+                    "top_duplicate": duplicates.most_common(1)[0][0] if duplicates else None,
+                }
+            )
+        rows.sort(key=SORT_KEYS[options["sort"]], reverse=True)
+
+        self.stdout.write(
+            f"{'route':<48}{'reqs':>6}{'avg q':>7}{'p95 q':>7}{'max q':>7}{'p95 ms':>9}{'dups':>7}{'budget':>8}{'over':>6}"
+        )
+        for row in rows[: options["limit"]]:
+            budget = "-" if row["budget"] is None else row["budget"]
+            self.stdout.write(
+                f"{row['route'][:47]:<48}{row['requests']:>6}{row['avg_queries']:>7.1f}{row['p95_queries']:>7}"
+                f"{row['max_queries']:>7}{row['p95_ms']:>9.2f}{row['avg_duplicates']:>7.1f}{budget:>8}{row['over_budget']:>6}"
+            )
+            if row["top_duplicate"]:
+                self.stdout.write(f"    repeated: {row['top_duplicate'][:120]}")
+        self.stdout.write(f"\n{len(records)} requests, {len(rows)} routes")
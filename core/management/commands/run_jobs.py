@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de tarefas no banco (core.jobs): pega lotes de tarefas prontas e as executa "
+        "num pool de threads ou processos, com novas tentativas e backoff em caso de falha"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue", action="append", dest="queues", help="Fila atendida (repetível; padrão: default)"
+        )
+        parser.add_argument("--concurrency", type=int, default=1, help="Laços de execução em paralelo")
+        parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+        parser.add_argument("--batch-size", type=int, default=None, help="Tarefas pegas por vez (JOBS_BATCH_SIZE)")
+        parser.add_argument(
+            "--poll-interval", type=float, default=None, help="Espera com a fila vazia em segundos (JOBS_POLL_INTERVAL)"
+        )
+        parser.add_argument("--burst", action="store_true", help="Sai quando não houver tarefa pronta")
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(
+            queues=options["queues"] or ["default"],
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+        )
+        # Finish the current batches, then exit
+        previous = {
+            signum: signal.signal(signum, lambda *_: worker.stop()) for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            done = worker.run()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        if done is not None:
+            self.stdout.write(self.style.SUCCESS(f"{done} jobs done"))
@@ -3,9 +3,55 @@ from django.contrib.auth import get_user_model
 
 
 class Command(BaseCommand):
-    help = "Popula o banco com dados de demonstração (users, profiles, skills, requests, reviews, chat)"
+    help = (
+        "Popula o banco com dados de demonstração (users, profiles, skills, requests, reviews, chat). "
+        "Com --users e demais tamanhos gera também um conjunto sintético reproduzível (--seed) "
+        "via inserções em lote, para testes de carga"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=0, help="Usuários sintéticos (0 = só os dados de demo)")
+        parser.add_argument("--skills-per-user", type=int, default=3, help="Média de skills por usuário")
+        parser.add_argument("--requests", type=int, default=0, help="ServiceRequests sintéticos")
+        parser.add_argument("--review-ratio", type=float, default=0.7, help="Fração dos pedidos concluídos com review")
+        parser.add_argument("--rooms", type=int, default=0, help="Salas de chat sintéticas (2 participantes cada)")
+        parser.add_argument("--messages-per-room", type=int, default=0, help="Mensagens por sala")
+        parser.add_argument("--days", type=int, default=365, help="Janela de tempo dos timestamps gerados")
+        parser.add_argument("--seed", type=int, default=42, help="Semente do gerador aleatório")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Linhas por lote/transação")
+        parser.add_argument("--prefix", default="seed", help="Prefixo dos usernames sintéticos")
+        parser.add_argument("--password", default="password", help="Senha de todos os usuários sintéticos")
 
     def handle(self, *args, **options):
+        self.seed_demo()
+        if options["users"]:
+            self.seed_synthetic(options)
+
+    def seed_synthetic(self, options):
+        from core.seeding import SeedSizes, SyntheticDataGenerator
+
+        sizes = SeedSizes(
+            users=options["users"],
+            skills_per_user=options["skills_per_user"],
+            requests=options["requests"],
+            review_ratio=options["review_ratio"],
+            rooms=options["rooms"],
+            messages_per_room=options["messages_per_room"],
+            days=options["days"],
+            prefix=options["prefix"],
+        )
+        generator = SyntheticDataGenerator(
+            sizes,
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            password=options["password"],
+            log=self.stdout.write,
+        )
+        result = generator.run()
+        total = sum(result.timings.values())
+        self.stdout.write(self.style.SUCCESS(f"Synthetic data generated in {total:.1f}s"))
+
+    def seed_demo(self):
         User = get_user_model()
 
         # Create users
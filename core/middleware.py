@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from .queries import QueryBudgetExceeded, record_queries, resolve_budget
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """Measure the database cost of every request and check it against the view's budget.
+
+    - ``DEBUG``: ``X-DB-Queries``, ``X-DB-Time-Ms``, ``X-DB-Duplicates`` and
+      ``X-DB-Budget`` response headers.
+    - ``QUERY_STATS_FILE``: one JSON line per request, aggregated per route
+      by ``manage.py query_report``.
+    - Over budget: logged as a warning, or ``QueryBudgetExceeded`` raised when
+      ``QUERY_BUDGET_STRICT`` is on (see ``core.queries.QueryBudgetTestMixin``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with record_queries() as stats:
+            response = self.get_response(request)
+
+        budget = request.query_budget
+        over = budget is not None and stats.count > budget
+        if settings.DEBUG:
+            response["X-DB-Queries"] = str(stats.count)
+            response["X-DB-Time-Ms"] = f"{stats.duration * 1000:.2f}"
+            response["X-DB-Duplicates"] = str(stats.duplicate_count)
+            if budget is not None:
+                response["X-DB-Budget"] = str(budget)
+
+        stats_file = getattr(settings, "QUERY_STATS_FILE", None)
+        if stats_file:
+            self._append(stats_file, request, response, stats, budget)
+
+        if over:
+            message = self._over_budget_message(request, stats, budget)
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = resolve_budget(view_func, request)
+
+    @staticmethod
+    def _route(request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "<unresolved>"
+        return f"{request.method} /{match.route}"
+
+    def _over_budget_message(self, request, stats, budget):
+        lines = [f"{self._route(request)} ran {stats.count} queries (budget {budget})"]
+        for fp, n in sorted(stats.duplicates.items(), key=lambda item: -item[1]):
+            lines.append(f"  {n}x {fp}")
+        return "\n".join(lines)
+
+    def _append(self, path, request, response, stats, budget):
+        record = {
+            "ts": time.time(),
+            "route": self._route(request),
+            "status": response.status_code,
+            "queries": stats.count,
+            "sql_ms": round(stats.duration * 1000, 3),
+            "duplicates": stats.duplicate_count,
+            "budget": budget,
+            "top_duplicate": max(stats.duplicates, key=stats.duplicates.get) if stats.duplicates else None,
+        }
+        try:
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record) + "\n")
+        except OSError:
+            logger.exception("Could not write query stats to %s", path)
@@ -1,3 +1,71 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class TrackedFieldsMixin:
+	"""Guarda os valores lidos do banco para os campos em `tracked_fields`.
+
+	Os signals de pós-gravação usam `previous_values()` para saber o que mudou
+	sem uma consulta extra. Retorna None quando o estado anterior é
+	desconhecido (instância nunca carregada do banco).
+	"""
+	tracked_fields = ()
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		instance._loaded_values = {
+			name: value
+			for name, value in zip(field_names, values)
+			if name in cls.tracked_fields and value is not models.DEFERRED
+		}
+		return instance
+
+	def previous_values(self):
+		return getattr(self, "_loaded_values", None)
+
+	def remember_current_values(self):
+		self._loaded_values = {name: getattr(self, name) for name in self.tracked_fields}
+
+
+class Job(models.Model):
+	"""Tarefa da fila em segundo plano guardada no banco (ver `core.jobs`).
+
+	`task` é o nome registrado com `@jobs.task` e `payload` os argumentos
+	nomeados (JSON). `key`, quando preenchida, torna o enfileiramento
+	idempotente. `claim` identifica o lote do worker que pegou a tarefa.
+	"""
+	class Status(models.TextChoices):
+		QUEUED = "QUEUED", "Queued"
+		RUNNING = "RUNNING", "Running"
+		DONE = "DONE", "Done"
+		FAILED = "FAILED", "Failed"
+
+	queue = models.CharField(max_length=50, default="default")
+	task = models.CharField(max_length=200)
+	payload = models.JSONField(default=dict, blank=True)
+	key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+	status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=5)
+	# Próxima execução: agora ao enfileirar, no futuro depois de uma falha (backoff)
+	run_at = models.DateTimeField(default=timezone.now)
+	claim = models.CharField(max_length=32, blank=True)
+	locked_at = models.DateTimeField(null=True, blank=True)
+	last_error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		# Índices parciais: cada consulta do worker só percorre as linhas do seu status
+		indexes = [
+			models.Index(
+				fields=["queue", "run_at", "id"], condition=models.Q(status="QUEUED"), name="job_ready_idx"
+			),
+			models.Index(fields=["claim"], condition=models.Q(status="RUNNING"), name="job_claim_idx"),
+			models.Index(fields=["locked_at"], condition=models.Q(status="RUNNING"), name="job_locked_idx"),
+			models.Index(fields=["finished_at"], condition=models.Q(status="DONE"), name="job_done_idx"),
+		]
+
+	def __str__(self):
+		return f"Job(id={self.id}, task={self.task}, status={self.status}, attempts={self.attempts})"
@@ -0,0 +1,146 @@
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def bounded_int(value, default, maximum, minimum=1):
+    """``value`` (e.g. a query parameter) as an int clamped to ``[minimum, maximum]``; ``default`` if missing or invalid."""
+    try:
+        return max(minimum, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+class KeysetPagination(BasePagination):
+    """Keyset (cursor) pagination over a ``(timestamp, id)`` pair.
+
+    Unlike offset pagination the cost of a page does not grow with its depth:
+    each page is a range scan that starts right after the last row of the
+    previous one, so it should be backed by an index ending in
+    ``(<timestamp_field>, id)``.
+
+    - ``?cursor=<c>`` walks backwards in time (newest first).
+    - ``?since=<c>`` (only when ``since_query_param`` is set) returns rows
+      strictly newer than the cursor, oldest first, which lets reconnecting
+      clients fetch just what they missed.
+    """
+
+    timestamp_field = "created_at"
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    since_query_param = None
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        since = None
+        if self.since_query_param:
+            since = request.query_params.get(self.since_query_param)
+        self.forward = since is not None
+        cursor = since if self.forward else request.query_params.get(self.cursor_query_param)
+        self.cursor = cursor
+        self.position = self.decode_cursor(cursor) if cursor else None
+
+        ts_field = self.timestamp_field
+        if cursor:
+            ts, pk = self.position
+            # The redundant inclusive bound lets the database seek straight to
+            # the cursor position in the index instead of scanning from the end.
+            if self.forward:
+                queryset = queryset.filter(
+                    Q(**{f"{ts_field}__gte": ts}),
+                    Q(**{f"{ts_field}__gt": ts}) | Q(**{ts_field: ts, "id__gt": pk}),
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f"{ts_field}__lte": ts}),
+                    Q(**{f"{ts_field}__lt": ts}) | Q(**{ts_field: ts, "id__lt": pk}),
+                )
+
+        if self.forward:
+            queryset = queryset.order_by(ts_field, "id")
+        else:
+            queryset = queryset.order_by(f"-{ts_field}", "-id")
+
+        # Fetch one extra row to know whether there is a next page
+        rows = self.extend_rows(list(queryset[: self.page_size + 1]), view)
+        self.has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def extend_rows(self, rows, view):
+        """Hook to merge rows from another source into the page (up to ``page_size + 1``).
+
+        ``rows`` are in page order; ``self.position`` is the decoded cursor
+        (or ``None``) and ``self.forward`` the direction.
+        """
+        return rows
+
+    def get_page_size(self, request):
+        return bounded_int(request.query_params.get(self.page_size_query_param), self.page_size, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        ts = getattr(obj, self.timestamp_field)
+        raw = f"{ts.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")
+            ts, pk = raw.rsplit("|", 1)
+            return datetime.fromisoformat(ts), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_more or not self.page:
+            return None
+        param = self.since_query_param if self.forward else self.cursor_query_param
+        url = self.base_url
+        if self.since_query_param:
+            url = remove_query_param(url, self.since_query_param)
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, param, self.encode_cursor(self.page[-1]))
+
+    def get_latest_cursor(self):
+        """Cursor of the newest row seen, to be sent back as ``since`` later.
+
+        An empty catch-up page echoes the client's cursor so it can keep polling.
+        """
+        if not self.page:
+            return self.cursor if self.forward else None
+        newest = self.page[-1] if self.forward else self.page[0]
+        return self.encode_cursor(newest)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("latest", self.get_latest_cursor()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "latest": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
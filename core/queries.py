@@ -0,0 +1,123 @@
+"""Per-request database cost: query count, SQL time and repeated queries.
+
+``QueryRecorder`` hooks into ``connection.execute_wrapper`` and is used by
+``core.middleware.QueryBudgetMiddleware`` and by tests directly::
+
+    with record_queries() as stats:
+        client.get(url)
+    assert not stats.duplicates
+
+Views declare how many queries a request may cost:
+
+- function views: ``@query_budget(3)``
+- class-based views and viewsets: a ``query_budget`` attribute, either an int
+  or a dict keyed by viewset action (``{"list": 2, "retrieve": 2}``)
+- ``@action(..., query_budget=2)`` on a viewset extra action
+
+The budget covers the whole request (session and user lookups included).
+"""
+import contextlib
+import re
+import time
+from collections import Counter
+
+from django.db import connections
+
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_PARAM_LIST_RE = re.compile(r"%s(?:\s*,\s*%s)+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its declared budget (raised in strict mode)."""
+
+
+def fingerprint(sql):
+    """SQL shape without literals, so queries differing only in values group together.
+
+    ``IN (%s, %s, %s)`` collapses to ``IN (%s+)``: an N+1 loop and a batch of
+    different sizes still produce one fingerprint each.
+    """
+    sql = _PARAM_LIST_RE.sub("%s+", sql)
+    sql = _NUMBER_RE.sub("N", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable accumulating the cost of the queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """``{fingerprint: times}`` for every query shape that ran more than once."""
+        return {fp: n for fp, n in self.fingerprints.items() if n > 1}
+
+    @property
+    def duplicate_count(self):
+        """Queries beyond the first of each shape: the ones an N+1 fix would save."""
+        return sum(n - 1 for n in self.fingerprints.values())
+
+
+@contextlib.contextmanager
+def record_queries(using=None):
+    """Record queries on ``using`` (default: every configured database)."""
+    recorder = QueryRecorder()
+    aliases = [using] if using else list(connections)
+    with contextlib.ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a function view may run."""
+
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+
+    return decorator
+
+
+def resolve_budget(view_func, request):
+    """Budget declared for the view handling ``request``, or ``None``."""
+    budget = getattr(view_func, "query_budget", None)
+    if budget is not None:
+        return budget
+
+    initkwargs = getattr(view_func, "initkwargs", None) or {}
+    if initkwargs.get("query_budget") is not None:
+        return initkwargs["query_budget"]
+
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, "actions", None) or {}
+        return budget.get(actions.get(request.method.lower()))
+    return budget
+
+
+class QueryBudgetTestMixin:
+    """Test case mixin: any request whose view goes over its query budget fails the test."""
+
+    @classmethod
+    def setUpClass(cls):
+        from django.test import override_settings
+
+        strict = override_settings(QUERY_BUDGET_STRICT=True)
+        strict.enable()
+        cls.addClassCleanup(strict.disable)
+        super().setUpClass()
@@ -0,0 +1,298 @@
+"""Synthetic data generator behind ``manage.py seed_demo`` (and benchmarks).
+
+Everything is inserted in chunks, one transaction per chunk:
+
+- users, profiles, skills and rooms with ``bulk_create``;
+- service requests, reviews and chat messages, which need realistic
+  ``auto_now_add`` timestamps spread over time, with a raw ``executemany``
+  (building a million model instances costs more than the INSERTs).
+
+Bulk inserts fire no signals, so derived data (rating stats, the skill
+search index, unread counters, provider rankings, feed contacts, the
+profile cache) is rebuilt at the end.
+
+The same ``seed`` on an empty database always produces the same rows.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+FIRST_NAMES = (
+    "ana bruno carla daniel eduarda felipe gabriela henrique isabela joao julia lucas mariana "
+    "nicolas olivia pedro rafaela samuel tatiana vinicius yasmin alice bob carol"
+).split()
+CITIES = [
+    "São Paulo", "Rio de Janeiro", "Belo Horizonte", "Porto Alegre", "Curitiba", "Recife",
+    "Salvador", "Fortaleza", "Brasília", "Florianópolis", "Manaus", "Goiânia",
+]
+BIOS = [
+    "Dev Python e mentor", "Jardinagem e manutenção", "Designer gráfico freelancer", "Professora de inglês",
+    "Fotógrafo amador", "Músico e professor de violão", "Cozinheira vegana", "Marceneiro nas horas vagas",
+    "Estudante de engenharia", "Tradutora técnica", "Instrutor de yoga", "Eletricista residencial",
+]
+SKILLS = [
+    "Jardinagem", "Programação Python", "Design Gráfico", "Fotografia", "Violão", "Culinária Vegana",
+    "Inglês Conversação", "Matemática", "Marcenaria", "Costura", "Yoga", "Edição de Vídeo",
+    "Contabilidade", "Eletricista", "Encanamento", "Pintura em Tela", "Redação", "Espanhol",
+    "Programação JavaScript", "Manutenção de Bicicletas", "Massagem", "Cerâmica", "Tricô", "Xadrez",
+]
+DESCRIPTION_WORDS = (
+    "aulas particulares para iniciantes avançados online presencial manutenção hortas jardins "
+    "criação logos sites aplicativos receitas saudáveis tradução revisão textos consertos reparos "
+    "instalação elétrica hidráulica ensino prático teórico experiência anos certificado atendimento "
+    "fins de semana noite grupos individual crianças adultos programação análise dados"
+).split()
+MESSAGES = [
+    "Oi, tudo bem?", "Podemos marcar a aula?", "Claro, quando você prefere?", "Pode ser sábado de manhã",
+    "Combinado!", "Obrigado pela aula de hoje", "Você tem material para indicar?", "Vou te mandar o link",
+    "Consegue na quarta à noite?", "Perfeito, até lá", "Desculpe o atraso", "Gostei muito, vamos repetir",
+]
+# (status, weight) of generated requests
+STATUS_WEIGHTS = [("PENDING", 40), ("ACCEPTED", 20), ("COMPLETED", 30), ("CANCELED", 10)]
+
+
+@dataclass
+class SeedSizes:
+    users: int = 0
+    skills_per_user: int = 3
+    requests: int = 0
+    review_ratio: float = 0.7
+    rooms: int = 0
+    messages_per_room: int = 0
+    days: int = 365
+    prefix: str = "seed"
+
+
+@dataclass
+class SeedResult:
+    counts: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_rows(model, fields, rows, chunk_size):
+    """Raw ``executemany`` INSERT of ``rows`` (tuples in ``fields`` order), one transaction per chunk.
+
+    Values are passed as they are: datetimes must already be adapted with
+    ``connection.ops.adapt_datetimefield_value``.
+    """
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    written = 0
+    for chunk in _chunks(rows, chunk_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, chunk)
+        written += len(chunk)
+    return written
+
+
+class SyntheticDataGenerator:
+    def __init__(self, sizes, seed=42, chunk_size=10000, password="password", log=None):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.password = password
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def _timestamp(self):
+        """Adapted DB value of a random moment in the last ``sizes.days`` days."""
+        age = self.rng.uniform(0, self.sizes.days * 86400.0)
+        return connection.ops.adapt_datetimefield_value(self.now - timedelta(seconds=age))
+
+    def run(self):
+        from core.benchmarks import Timer
+
+        result = SeedResult()
+        steps = [
+            ("users", self.create_users),
+            ("skills", self.create_skills),
+            ("requests", self.create_requests),
+            ("reviews", self.create_reviews),
+            ("rooms", self.create_rooms),
+            ("messages", self.create_messages),
+            ("derived data", self.rebuild_derived),
+        ]
+        self.user_ids = []
+        self.skills = []
+        self.completed = []
+        self.room_members = []
+        for name, step in steps:
+            with Timer() as timer:
+                count = step()
+            result.counts[name] = count
+            result.timings[name] = timer.elapsed
+            self.log(f"{name}: {count} in {timer.elapsed:.1f}s")
+        return result
+
+    def create_users(self):
+        from users.models import UserProfile
+
+        User = get_user_model()
+        total = self.sizes.users
+        if not total:
+            return 0
+        # PBKDF2 once: hashing per user would dominate the whole run
+        password = make_password(self.password)
+        start = User.objects.filter(username__startswith=f"{self.sizes.prefix}_").count()
+        for chunk in _chunks(range(start, start + total), self.chunk_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [
+                        User(
+                            username=f"{self.sizes.prefix}_{self.rng.choice(FIRST_NAMES)}{i}",
+                            email=f"{self.sizes.prefix}{i}@example.com",
+                            password=password,
+                        )
+                        for i in chunk
+                    ]
+                )
+                UserProfile.objects.bulk_create(
+                    [
+                        UserProfile(user=user, bio=self.rng.choice(BIOS), location=self.rng.choice(CITIES))
+                        for user in users
+                    ]
+                )
+            self.user_ids += [user.pk for user in users]
+        return total
+
+    def create_skills(self):
+        from users.models import UserSkill
+
+        def rows():
+            for user_id in self.user_ids:
+                count = min(len(SKILLS), self.rng.randint(1, max(1, 2 * self.sizes.skills_per_user - 1)))
+                # Distinct names: (user, name) is unique
+                for name in self.rng.sample(SKILLS, count):
+                    yield UserSkill(
+                        user_id=user_id,
+                        name=name,
+                        description=" ".join(self.rng.choices(DESCRIPTION_WORDS, k=self.rng.randint(4, 12))),
+                    )
+
+        for chunk in _chunks(rows(), self.chunk_size):
+            with transaction.atomic():
+                created = UserSkill.objects.bulk_create(chunk)
+            self.skills += [(skill.pk, skill.user_id) for skill in created]
+        return len(self.skills)
+
+    def create_requests(self):
+        from services.models import ServiceRequest
+
+        if not self.skills or len(self.user_ids) < 2 or not self.sizes.requests:
+            return 0
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        first_id = (ServiceRequest.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+
+        def rows():
+            for _ in range(self.sizes.requests):
+                skill_id, provider_id = self.rng.choice(self.skills)
+                requester_id = self.rng.choice(self.user_ids)
+                while requester_id == provider_id:
+                    requester_id = self.rng.choice(self.user_ids)
+                status = self.rng.choices(statuses, weights)[0]
+                yield (requester_id, provider_id, skill_id, "Gostaria de combinar uma troca", status, self._timestamp())
+
+        fields = ("requester", "provider", "offered_skill", "description", "status", "created_at")
+        written = insert_rows(ServiceRequest, fields, rows(), self.chunk_size)
+        self.completed = list(
+            ServiceRequest.objects.filter(id__gte=first_id, status=ServiceRequest.Status.COMPLETED)
+            .order_by("id")
+            .values_list("id", "requester_id", "provider_id")
+        )
+        return written
+
+    def create_reviews(self):
+        from services.models import Review
+
+        def rows():
+            for request_id, requester_id, provider_id in self.completed:
+                if self.rng.random() < self.sizes.review_ratio:
+                    rating = self.rng.choices((1, 2, 3, 4, 5), (1, 2, 5, 12, 20))[0]
+                    yield (request_id, requester_id, provider_id, rating, "", self._timestamp())
+
+        fields = ("transaction", "reviewer", "reviewed_user", "rating", "comment", "date")
+        return insert_rows(Review, fields, rows(), self.chunk_size)
+
+    def create_rooms(self):
+        from communication.models import ChatRoom, RoomMembership
+
+        if not self.sizes.rooms or len(self.user_ids) < 2:
+            return 0
+        for chunk in _chunks(range(self.sizes.rooms), self.chunk_size):
+            pairs = [tuple(self.rng.sample(self.user_ids, 2)) for _ in chunk]
+            with transaction.atomic():
+                rooms = ChatRoom.objects.bulk_create(
+                    [ChatRoom(name=f"{self.sizes.prefix}-room-{a}-{b}-{i}") for i, (a, b) in zip(chunk, pairs)]
+                )
+                RoomMembership.objects.bulk_create(
+                    [
+                        RoomMembership(room_id=room.pk, user_id=user_id)
+                        for room, pair in zip(rooms, pairs)
+                        for user_id in pair
+                    ]
+                )
+            self.room_members += [(room.pk, pair) for room, pair in zip(rooms, pairs)]
+        return len(self.room_members)
+
+    def create_messages(self):
+        from communication.models import ChatMessage
+
+        per_room = self.sizes.messages_per_room
+        if not per_room:
+            return 0
+
+        def rows():
+            for room_id, members in self.room_members:
+                # A conversation: increasing timestamps a few minutes apart, from a random start in the window
+                gaps = [self.rng.uniform(60.0, 600.0) for _ in range(per_room)]
+                age = self.rng.uniform(sum(gaps), max(sum(gaps), self.sizes.days * 86400.0))
+                for gap in gaps:
+                    yield (
+                        room_id,
+                        self.rng.choice(members),
+                        self.rng.choice(MESSAGES),
+                        connection.ops.adapt_datetimefield_value(self.now - timedelta(seconds=age)),
+                    )
+                    age -= gap
+
+        return insert_rows(ChatMessage, ("room", "sender", "content", "timestamp"), rows(), self.chunk_size)
+
+    def rebuild_derived(self):
+        from communication import unread
+        from services import feed, rankings, skill_counters
+        from users import profile_cache, ratings, search
+
+        rebuilt = 0
+        if self.room_members and self.sizes.messages_per_room:
+            rebuilt += unread.rebuild([room_id for room_id, _ in self.room_members])
+        if self.completed:
+            rebuilt += ratings.rebuild()
+        if self.skills:
+            rebuilt += search.index_skills([pk for pk, _ in self.skills])
+        if self.completed:
+            rebuilt += rankings.refresh()
+        if self.skills and self.sizes.requests:
+            rebuilt += len(skill_counters.check())
+        if self.sizes.requests:
+            rebuilt += feed.rebuild_contacts()
+        if self.user_ids:
+            profile_cache.invalidate_all()
+        return rebuilt
@@ -1,3 +1,471 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import warnings
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path, reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import export, jobs
+from .db import PrimaryReplicaRouter, SerialWriter
+from .models import Job
+from .queries import QueryBudgetExceeded, QueryBudgetTestMixin, fingerprint, query_budget, record_queries
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@query_budget(2)
+def n_plus_one_view(request):
+    # One query for the ids, then one per user
+    for pk in get_user_model().objects.values_list("pk", flat=True):
+        get_user_model().objects.get(pk=pk)
+    return HttpResponse("ok")
+
+
+@query_budget(2)
+def batched_view(request):
+    list(get_user_model().objects.all())
+    return HttpResponse("ok")
+
+
+urlpatterns = [
+    path("n-plus-one/", n_plus_one_view),
+    path("batched/", batched_view),
+]
+
+job_calls = []
+job_calls_lock = threading.Lock()
+
+
+@jobs.task(name="core.tests.create_user")
+def create_user_task(username):
+    get_user_model().objects.create(username=username)
+    with job_calls_lock:
+        job_calls.append(username)
+
+
+@jobs.task(name="core.tests.failing", max_attempts=2, atomic=True)
+def failing_task(username):
+    get_user_model().objects.create(username=username)
+    raise RuntimeError("boom")
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        for i in range(4):
+            get_user_model().objects.create_user(username=f"user{i}", password="x")
+
+    def test_fingerprint_ignores_values_and_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 5'),
+        )
+
+    def test_record_queries_reports_duplicates(self):
+        # The view is over its budget on purpose; keep the middleware's warning out of the test output
+        with record_queries() as stats, self.assertLogs("core.middleware", "WARNING"):
+            self.client.get("/n-plus-one/")
+        self.assertEqual(stats.count, 5)
+        self.assertEqual(stats.duplicate_count, 3)
+        self.assertEqual(list(stats.duplicates.values()), [4])
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get("/batched/")
+        self.assertEqual(response["X-DB-Queries"], "1")
+        self.assertEqual(response["X-DB-Duplicates"], "0")
+        self.assertEqual(response["X-DB-Budget"], "2")
+        self.assertIn("X-DB-Time-Ms", response)
+
+    def test_over_budget_warns_or_fails(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            self.assertEqual(self.client.get("/n-plus-one/").status_code, 200)
+        self.assertIn("ran 5 queries (budget 2)", logs.output[0])
+        self.assertIn("4x SELECT", logs.output[0])
+
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded), self.assertLogs("django.request", "ERROR"):
+                self.client.get("/n-plus-one/")
+            self.client.get("/batched/")
+
+    def test_stats_file_and_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stats_file = os.path.join(tmp, "stats.ndjson")
+            with override_settings(QUERY_STATS_FILE=stats_file), self.assertLogs("core.middleware", "WARNING"):
+                for _ in range(3):
+                    self.client.get("/n-plus-one/")
+                self.client.get("/batched/")
+            with open(stats_file) as fh:
+                records = [json.loads(line) for line in fh]
+            self.assertEqual([r["route"] for r in records], ["GET /n-plus-one/"] * 3 + ["GET /batched/"])
+
+            out = StringIO()
+            call_command("query_report", file=stats_file, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[1].startswith("GET /n-plus-one/"))
+        self.assertEqual(lines[1].split()[-2:], ["2", "3"])
+        self.assertIn("repeated: SELECT", lines[2])
+
+    def test_viewset_action_budgets_are_resolved(self):
+        from django.urls import resolve
+
+        from .queries import resolve_budget
+
+        with override_settings(ROOT_URLCONF="SkillSwapProject.urls"):
+            match = resolve("/services/api/requests/inbox/")
+            request = type("Request", (), {"method": "GET"})()
+            self.assertEqual(resolve_budget(match.func, request), 3)
+            match = resolve("/users/profile/alice/")
+            self.assertEqual(resolve_budget(match.func, request), 6)
+
+
+class SyntheticDataGeneratorTests(TestCase):
+    def _generate(self, prefix, seed=7):
+        from .seeding import SeedSizes, SyntheticDataGenerator
+
+        sizes = SeedSizes(users=30, skills_per_user=2, requests=120, rooms=10, messages_per_room=6, prefix=prefix)
+        return SyntheticDataGenerator(sizes, seed=seed, chunk_size=25).run()
+
+    def test_generates_consistent_dataset(self):
+        from communication.models import ChatMessage
+        from services.models import Review, ServiceRequest
+        from users.models import SkillSearchToken, UserRatingStats, UserSkill
+
+        result = self._generate("load")
+        self.assertEqual(result.counts["users"], 30)
+        self.assertEqual(ServiceRequest.objects.count(), 120)
+        self.assertEqual(ChatMessage.objects.count(), 60)
+        self.assertFalse(ServiceRequest.objects.filter(requester=models.F("provider")).exists())
+        self.assertEqual(
+            ServiceRequest.objects.exclude(offered_skill__user=models.F("provider")).count(), 0
+        )
+        # Timestamps are spread out instead of all being "now"
+        self.assertGreater(ServiceRequest.objects.values("created_at").distinct().count(), 100)
+        # Each room reads as a conversation: ids and timestamps grow together, minutes apart
+        for room_id in ChatMessage.objects.values_list("room_id", flat=True).distinct():
+            stamps = list(ChatMessage.objects.filter(room_id=room_id).order_by("id").values_list("timestamp", flat=True))
+            gaps = [(later - earlier).total_seconds() for earlier, later in zip(stamps, stamps[1:])]
+            self.assertTrue(all(60 <= gap <= 600 for gap in gaps), gaps)
+
+        # Derived tables were rebuilt even though no signal fired
+        reviews = Review.objects.count()
+        self.assertGreater(reviews, 0)
+        self.assertEqual(sum(UserRatingStats.objects.values_list("count", flat=True)), reviews)
+        self.assertEqual(
+            SkillSearchToken.objects.values("skill").distinct().count(), UserSkill.objects.count()
+        )
+
+        user = get_user_model().objects.filter(username__startswith="load_").first()
+        self.assertTrue(user.check_password("password"))
+
+    def test_same_seed_same_data(self):
+        from users.models import UserSkill
+
+        self._generate("first")
+        self._generate("second")
+        first = list(UserSkill.objects.filter(user__username__startswith="first_").order_by("id").values_list("name", "description"))
+        second = list(UserSkill.objects.filter(user__username__startswith="second_").order_by("id").values_list("name", "description"))
+        self.assertEqual(first, second)
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    databases = {"default"}
+
+    def test_reads_go_to_a_replica_of_the_same_file(self):
+        router = PrimaryReplicaRouter()
+        User = get_user_model()
+        self.assertEqual(router.db_for_read(User), "default")
+
+        replica = {"replica": {"NAME": "file:/srv/skillswap.sqlite3?mode=ro"}}
+        with mock.patch.dict(settings.DATABASES["default"], {"NAME": "/srv/skillswap.sqlite3"}), \
+                mock.patch.dict(settings.DATABASES, replica):
+            self.assertEqual(router.db_for_read(User), "replica")
+            self.assertEqual(router.db_for_write(User), "default")
+            self.assertTrue(router.allow_migrate("default", "users"))
+            self.assertFalse(router.allow_migrate("replica", "users"))
+            # Inside a transaction reads must see its uncommitted writes
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(User), "default")
+
+        # A replica of another file (e.g. the real one while tests use a test database) is ignored
+        with mock.patch.dict(settings.DATABASES, replica):
+            self.assertEqual(router.db_for_read(User), "default")
+
+
+class SerialWriterTests(TransactionTestCase):
+    def test_queued_jobs_share_one_commit(self):
+        User = get_user_model()
+        writer = SerialWriter(max_batch=50)
+        release = threading.Event()
+        blocker = writer.submit(release.wait, 5)
+
+        def create(name):
+            return User.objects.create(username=name).username
+
+        def fail():
+            User.objects.create(username="rolled_back")
+            raise ValueError("boom")
+
+        futures = [writer.submit(create, f"user{i}") for i in range(10)]
+        failing = writer.submit(fail)
+        futures.append(writer.submit(create, "after_failure"))
+        release.set()
+
+        self.assertTrue(blocker.result(timeout=5))
+        self.assertEqual([f.result(timeout=5) for f in futures], [f"user{i}" for i in range(10)] + ["after_failure"])
+        with self.assertRaisesMessage(ValueError, "boom"):
+            failing.result(timeout=5)
+        # The blocker ran alone; everything queued behind it went in one batch
+        self.assertEqual((writer.jobs, writer.batches), (13, 2))
+        self.assertEqual(User.objects.count(), 11)
+        self.assertFalse(User.objects.filter(username="rolled_back").exists())
+
+
+class ExportTests(QueryBudgetTestMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from communication.models import ChatMessage, ChatRoom
+
+        User = get_user_model()
+        cls.admin = User.objects.create_user("admin", password="x", is_staff=True)
+        cls.alice = User.objects.create_user("alice", password="x")
+        cls.room = ChatRoom.objects.create(name="r")
+        ChatMessage.objects.create(room=cls.room, sender=cls.alice, content='olá, "mundo"\nsegunda linha')
+
+    def url(self, filename):
+        name, extension = filename.split(".", 1)
+        return reverse("core:export", args=[name, extension])
+
+    def test_ndjson_csv_and_gzip_downloads(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url("messages.ndjson"))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        [line] = b"".join(response.streaming_content).decode().splitlines()
+        row = json.loads(line)
+        self.assertEqual(row["content"], 'olá, "mundo"\nsegunda linha')
+        self.assertEqual(row["sender_id"], self.alice.pk)
+
+        response = self.client.get(self.url("users.csv"))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,username,email,first_name,last_name,is_active,is_staff,date_joined,last_login")
+        self.assertEqual(len(lines), 3)
+        self.assertNotIn("password", lines[0])
+
+        response = self.client.get(self.url("users.ndjson.gz"))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="users.ndjson.gz"')
+        rows = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(r)["username"] for r in rows], ["admin", "alice"])
+
+        self.assertEqual(self.client.get(self.url("users.xml")).status_code, 404)
+        self.assertEqual(self.client.get(self.url("passwords.csv")).status_code, 404)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get(self.url("users.csv")).status_code, 403)
+
+    def test_command_writes_one_file_per_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                "export_data", "users", "messages", "--format", "csv", "--gzip", "--output", directory, stdout=StringIO()
+            )
+            self.assertEqual(sorted(os.listdir(directory)), ["messages.csv.gz", "users.csv.gz"])
+            with gzip.open(os.path.join(directory, "messages.csv.gz"), "rt", newline="") as fh:
+                header, row = csv.reader(fh)
+        self.assertEqual(header, ["id", "room_id", "sender_id", "content", "timestamp"])
+        self.assertEqual(row[3], 'olá, "mundo"\nsegunda linha')
+
+    @skipIf(resource is None, "needs the resource module")
+    def test_memory_stays_flat_for_a_million_rows(self):
+        rows = 1_000_000
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %s)
+                INSERT INTO communication_chatmessage (room_id, sender_id, content, timestamp)
+                SELECT %s, %s, 'message number ' || i, '2025-01-01 00:00:00' FROM seq
+                """,
+                [rows - 1, self.room.pk, self.alice.pk],
+            )
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+        lines = size = 0
+        for chunk in export.stream("messages", "ndjson"):
+            lines += chunk.count("\n")
+            size += len(chunk)
+        growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        self.assertEqual(lines, rows)
+        # The export is over 80 MB of text; holding it (or the rows) would grow the peak far beyond this
+        self.assertGreater(size, 80_000_000)
+        self.assertLess(growth, 20_000)
+
+
+class ExportAsgiTests(TransactionTestCase):
+    """The export endpoint as served in production, through the ASGI application."""
+
+    def test_chunks_are_sent_while_the_export_is_read(self):
+        from asgiref.sync import async_to_sync
+
+        from communication.models import ChatMessage, ChatRoom
+        from SkillSwapProject.asgi import application
+
+        admin = get_user_model().objects.create_user("admin", password="x", is_staff=True)
+        room = ChatRoom.objects.create(name="r")
+        ChatMessage.objects.bulk_create(
+            [ChatMessage(room=room, sender=admin, content=f"message {i}") for i in range(300)]
+        )
+        self.client.force_login(admin)
+        path = reverse("core:export", args=["messages", "ndjson"])
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"cookie", f"sessionid={self.client.cookies['sessionid'].value}".encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        produced, messages, requests = [0], [], [{"type": "http.request", "body": b"", "more_body": False}]
+        stream = export.stream
+
+        def counting_stream(*args, **kwargs):
+            for chunk in stream(*args, **kwargs):
+                produced[0] += 1
+                yield chunk
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()  # never disconnects
+
+        async def send(message):
+            messages.append((message, produced[0]))
+
+        with mock.patch.object(export, "CHUNK_BYTES", 1024), mock.patch.object(export, "stream", counting_stream):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")  # "must consume synchronous iterators"
+                async_to_sync(application)(scope, receive, send)
+
+        start, *bodies = [message for message, _ in messages]
+        self.assertEqual(start["status"], 200)
+        lines = b"".join(message.get("body", b"") for message in bodies).decode().splitlines()
+        self.assertEqual(len(lines), 300)
+        sent_after = [count for message, count in messages[1:] if message.get("body")]
+        # The first bytes left before most of the export was even read
+        self.assertGreater(produced[0], 10)
+        self.assertLess(sent_after[0], produced[0] / 2)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        job_calls.clear()
+
+    def test_enqueue_is_idempotent_per_key(self):
+        first = jobs.enqueue(create_user_task, {"username": "ana"}, key="welcome:ana")
+        again = jobs.enqueue("core.tests.create_user", {"username": "other"}, key="welcome:ana")
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(again.payload, {"username": "ana"})
+        jobs.enqueue(create_user_task, {"username": "bia"})
+        jobs.enqueue(create_user_task, {"username": "bia"})
+        self.assertEqual(Job.objects.count(), 3)
+        with self.assertRaises(LookupError):
+            jobs.enqueue("core.tests.missing")
+
+    def test_claims_do_not_overlap(self):
+        for i in range(25):
+            jobs.enqueue(create_user_task, {"username": f"user{i}"})
+        jobs.enqueue(create_user_task, {"username": "later"}, delay=60)
+        jobs.enqueue(create_user_task, {"username": "mail"}, queue="mail")
+
+        batches = [jobs.claim(limit=10) for _ in range(4)]
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5, 0])
+        claimed = [job.payload["username"] for batch in batches for job in batch]
+        self.assertEqual(claimed, [f"user{i}" for i in range(25)])
+        self.assertTrue(all(job.status == Job.Status.RUNNING and job.attempts == 1 for job in batches[0]))
+        self.assertEqual([job.payload["username"] for job in jobs.claim(["mail"])], ["mail"])
+
+        self.assertEqual(jobs.execute(batches[0]), 10)
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 10)
+        self.assertEqual(sorted(job_calls), sorted(f"user{i}" for i in range(10)))
+
+    @override_settings(JOBS_RETRY_BASE=10)
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        failing = jobs.enqueue(failing_task, {"username": "rolled_back"})
+        jobs.enqueue(create_user_task, {"username": "kept"})
+        started = timezone.now()
+        with self.assertLogs("core.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.execute(jobs.claim()), 1)
+        self.assertIn("failed on attempt 1", logs.output[0])
+
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn("RuntimeError: boom", failing.last_error)
+        self.assertGreaterEqual(failing.run_at, started + timedelta(seconds=5))
+        self.assertLessEqual(failing.run_at, timezone.now() + timedelta(seconds=10))
+        # The failing atomic task left nothing behind
+        self.assertEqual(list(get_user_model().objects.values_list("username", flat=True)), ["kept"])
+        self.assertEqual(jobs.claim(), [])
+
+        Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.assertEqual(jobs.execute(jobs.claim()), 0)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.Status.FAILED, 2))
+        self.assertIsNotNone(failing.finished_at)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60, JOBS_KEEP_DONE=3600)
+    def test_stale_jobs_are_requeued_and_old_ones_purged(self):
+        for name in ("crashed", "exhausted", "done"):
+            jobs.enqueue(create_user_task, {"username": name}, max_attempts=1 if name == "exhausted" else None)
+        claimed = jobs.claim()
+        jobs.execute([job for job in claimed if job.payload["username"] == "done"])
+        long_ago = timezone.now() - timedelta(hours=2)
+        Job.objects.filter(status=Job.Status.RUNNING).update(locked_at=long_ago)
+        Job.objects.filter(status=Job.Status.DONE).update(finished_at=long_ago)
+
+        self.assertEqual(jobs.requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list("payload__username", "status"))
+        self.assertEqual(
+            statuses, {"crashed": Job.Status.QUEUED, "exhausted": Job.Status.FAILED, "done": Job.Status.DONE}
+        )
+        self.assertEqual(jobs.purge(), 1)
+        self.assertEqual(Job.objects.count(), 2)
+
+
+class JobWorkerTests(TransactionTestCase):
+    def test_run_jobs_command(self):
+        job_calls.clear()
+        for i in range(30):
+            jobs.enqueue(create_user_task, {"username": f"user{i}"})
+        jobs.enqueue(create_user_task, {"username": "other queue"}, queue="mail")
+        out = StringIO()
+        # One thread: the in-memory test database does not let concurrent connections wait for its locks
+        call_command("run_jobs", "--burst", "--batch-size", "7", stdout=out)
+        self.assertIn("30 jobs done", out.getvalue())
+        self.assertEqual(job_calls, [f"user{i}" for i in range(30)])
+        self.assertEqual(get_user_model().objects.count(), 30)
+        self.assertEqual(Job.objects.filter(status=Job.Status.QUEUED).get().queue, "mail")
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import api
+
+app_name = "core"
+
+urlpatterns = [
+    path("api/export/<slug:name>.<str:extension>", api.ExportView.as_view(), name="export"),
+]
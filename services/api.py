@@ -0,0 +1,251 @@
+import base64
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import ListAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.pagination import KeysetPagination, bounded_int
+
+from . import feed, matching, rankings
+from .models import ProviderRanking, ServiceRequest
+from .serializers import (
+    BulkTransitionSerializer,
+    FeedEntrySerializer,
+    ProviderRankingSerializer,
+    ServiceRequestBoxSerializer,
+    ServiceRequestSerializer,
+)
+
+Status = ServiceRequest.Status
+
+# action -> (target status, who may perform it)
+ACTIONS = {
+    "accept": (Status.ACCEPTED, "provider"),
+    "complete": (Status.COMPLETED, "provider"),
+    "cancel": (Status.CANCELED, "party"),
+}
+
+
+class ServiceRequestBoxPagination(KeysetPagination):
+    page_size = 25
+    timestamp_field = "created_at"
+
+
+class FeedPagination(KeysetPagination):
+    page_size = 25
+    timestamp_field = "created_at"
+
+
+class ProviderRankingPagination(KeysetPagination):
+    """Keyset pages over ``(score, id)``, best first."""
+
+    page_size = 25
+    timestamp_field = "score"
+
+    def encode_cursor(self, obj):
+        raw = f"{obj.score!r}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")
+            score, pk = raw.rsplit("|", 1)
+            return float(score), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ServiceRequestViewSet(
+    mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """Service requests the user takes part in; status only changes through the transition actions."""
+
+    serializer_class = ServiceRequestSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # bulk_transition: at most two source statuses (SELECT + UPDATE each),
+    # savepoints and the rejected lookup, whatever the batch size
+    query_budget = {"list": 3, "retrieve": 3, "inbox": 3, "outbox": 3, "bulk_transition": 11}
+
+    def get_queryset(self):
+        user = self.request.user
+        return (
+            ServiceRequest.objects.filter(Q(requester=user) | Q(provider=user))
+            .select_related("requester", "provider")
+            .order_by("-created_at", "-id")
+        )
+
+    def perform_create(self, serializer):
+        skill = serializer.validated_data["offered_skill"]
+        serializer.save(requester=self.request.user, provider=skill.user)
+
+    def _actionable(self, name):
+        """Requests the user may apply ``name`` to (regardless of current status)."""
+        user = self.request.user
+        qs = ServiceRequest.objects.all()
+        if ACTIONS[name][1] == "provider":
+            return qs.filter(provider=user)
+        return qs.filter(Q(requester=user) | Q(provider=user))
+
+    def _transition_one(self, request, pk, name):
+        instance = self.get_object()
+        actionable = self._actionable(name).filter(pk=instance.pk)
+        if not actionable.exists():
+            return Response({"detail": f"Only the provider can {name} this request."}, status=status.HTTP_403_FORBIDDEN)
+        # Conditional UPDATE on the current status: no read-modify-write window
+        if not actionable.transition(ACTIONS[name][0]):
+            instance.refresh_from_db(fields=["status"])
+            return Response(
+                {"detail": f"Cannot {name} a request that is {instance.status}."}, status=status.HTTP_409_CONFLICT
+            )
+        instance.refresh_from_db(fields=["status"])
+        return Response(self.get_serializer(instance).data)
+
+    @action(detail=True, methods=["post"])
+    def accept(self, request, pk=None):
+        return self._transition_one(request, pk, "accept")
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        return self._transition_one(request, pk, "complete")
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        return self._transition_one(request, pk, "cancel")
+
+    def _box(self, request, owner, counterpart):
+        """Requests of one side filtered by ``?status=`` (default PENDING), newest first.
+
+        Served by the ``(<owner>, status, created_at, id)`` indexes: the keyset
+        page is a range scan, and the skill and the other party come from the
+        same query.
+        """
+        status_filter = request.query_params.get("status", Status.PENDING).upper()
+        if status_filter not in Status.values:
+            return Response({"status": [f"Must be one of {', '.join(Status.values)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        qs = ServiceRequest.objects.filter(**{owner: request.user, "status": status_filter}).select_related(
+            "offered_skill", counterpart
+        )
+        paginator = ServiceRequestBoxPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        serializer = ServiceRequestBoxSerializer(page, many=True, context={"request": request, "counterpart": counterpart})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def inbox(self, request):
+        """Requests received as provider; the counterpart is the requester."""
+        return self._box(request, "provider", "requester")
+
+    @action(detail=False, methods=["get"])
+    def outbox(self, request):
+        """Requests made as requester; the counterpart is the provider."""
+        return self._box(request, "requester", "provider")
+
+    @action(detail=False, methods=["post"], url_path="bulk-transition")
+    def bulk_transition(self, request):
+        """Apply one action to many requests in a single transaction.
+
+        Body: ``{"action": "accept" | "complete" | "cancel", "ids": [...]}``.
+        Requests that cannot make the transition are reported in ``rejected``
+        (``not_found`` or their current status) instead of failing the batch.
+        """
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        name = serializer.validated_data["action"]
+        ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+
+        with transaction.atomic():
+            candidates = self._actionable(name).filter(pk__in=ids)
+            moved = candidates.transition(ACTIONS[name][0])
+            updated = sorted(pk for group in moved.values() for pk in group)
+            remaining = set(ids) - set(updated)
+            current = dict(candidates.filter(pk__in=remaining).values_list("pk", "status")) if remaining else {}
+
+        rejected = {str(pk): current.get(pk, "not_found") for pk in ids if pk in remaining}
+        return Response({"action": name, "updated": updated, "rejected": rejected})
+
+
+class ProviderRankingView(ListAPIView):
+    """Top providers: ``?skill=`` (any spelling/accents; all skills when absent) and ``?location=``.
+
+    Served from the materialized ``ProviderRanking`` table through the
+    ``(skill_key, -score, -id)`` / ``(location_key, skill_key, -score, -id)``
+    indexes; see ``services.rankings`` for the score.
+    """
+
+    serializer_class = ProviderRankingSerializer
+    pagination_class = ProviderRankingPagination
+    permission_classes = [permissions.AllowAny]
+    query_budget = 3
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = ProviderRanking.objects.filter(skill_key=rankings.normalize_key(params.get("skill", "")))
+        if params.get("location"):
+            qs = qs.filter(location_key=rankings.normalize_key(params["location"]))
+        return qs.select_related("provider")
+
+
+class FeedView(ListAPIView):
+    """Activity of the current user's contacts, newest first (keyset pages, ``?cursor=``).
+
+    One query per page: the user's own timeline through the ``(owner,
+    created_at, id)`` index plus the entries of the very connected contacts
+    it reads instead of receiving (see ``services.feed``).
+    """
+
+    serializer_class = FeedEntrySerializer
+    pagination_class = FeedPagination
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+
+    def get_queryset(self):
+        return feed.timeline(self.request.user).select_related("actor")
+
+
+class MatchView(APIView):
+    """Swap suggestions for the current user (``?limit=``, ``?cycles=`` caps).
+
+    ``reciprocal``: users who offer what you requested before and requested
+    what you offer. ``cycles``: three-way swaps where you teach B, B teaches
+    C and C teaches you.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    # The engine answers from memory; only the usernames are queried
+    query_budget = 3
+
+    def get(self, request):
+        limit = bounded_int(request.query_params.get("limit"), default=20, maximum=100)
+        max_cycles = bounded_int(request.query_params.get("cycles"), default=10, maximum=50, minimum=0)
+        reciprocal, cycles = matching.find_matches(request.user.pk, limit=limit, cycles=max_cycles)
+
+        user_ids = {other for other, *_ in reciprocal} | {uid for b, c, *_ in cycles for uid in (b, c)}
+        usernames = dict(get_user_model().objects.filter(pk__in=user_ids).values_list("pk", "username"))
+
+        def user(pk):
+            return {"id": pk, "username": usernames.get(pk)}
+
+        return Response(
+            {
+                "reciprocal": [
+                    {"user": user(other), "score": score, "you_get": you_get, "you_give": you_give}
+                    for other, score, you_get, you_give in reciprocal
+                ],
+                "cycles": [
+                    {
+                        "give_to": user(b),
+                        "get_from": user(c),
+                        "you_give": you_give,
+                        "they_swap": b_gives_c,
+                        "you_get": you_get,
+                    }
+                    for b, c, you_give, b_gives_c, you_get in cycles
+                ],
+            }
+        )
@@ -0,0 +1,201 @@
+"""Activity feed: new skills, completed swaps and reviews of the people you swapped with.
+
+Two users become contacts (``FeedContact``, one row per direction) with the
+first request between them. Activity is written when it happens, after the
+commit (the signals in ``services.signals``):
+
+- fan-out on write: one compact ``FeedEntry`` per contact of the actor, so
+  reading a timeline is a range scan of the ``(owner, created_at, id)``
+  index;
+- fan-out on read for actors with more than ``FEED_FANOUT_LIMIT`` contacts:
+  a single ``broadcast`` entry in the actor's own slot of that index, merged
+  into their contacts' timelines by the same query (their ``FeedContact``
+  rows are marked ``pull``), so one activity of a very connected user never
+  writes thousands of rows.
+
+Timelines keep their newest ``FEED_MAX_ENTRIES`` entries. Trimming is
+amortized: about one insert in ``FEED_TRIM_EVERY`` trims its timeline, so a
+timeline may briefly hold a few more. Deleting a skill, request or review
+deletes its entries. Skills created by ``import_skills`` are published
+together, one entry per skill (only the newest ``FEED_MAX_ENTRIES``, the
+rest would be trimmed anyway), in one batch for the whole audience. Rows
+written without signals (``bulk_create``, raw SQL) publish nothing; their
+contacts are recreated by ``rebuild_contacts()`` (``python manage.py
+rebuild_feed``).
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import FeedContact, FeedEntry, ServiceRequest
+
+Verb = FeedEntry.Verb
+
+
+def fanout_limit():
+    return getattr(settings, "FEED_FANOUT_LIMIT", 500)
+
+
+def max_entries():
+    return getattr(settings, "FEED_MAX_ENTRIES", 200)
+
+
+def trim_every():
+    return getattr(settings, "FEED_TRIM_EVERY", 20)
+
+
+def timeline(user):
+    """Feed entries of ``user`` (unordered): its own rows plus the entries of the contacts it pulls."""
+    pulled = FeedContact.objects.filter(user=user, pull=True).values("contact_id")
+    return FeedEntry.objects.filter(Q(owner=user, broadcast=False) | Q(owner_id__in=pulled, broadcast=True))
+
+
+def connect(user_id, other_id):
+    """Make the two users contacts (called for every new request)."""
+    if user_id is None or other_id is None or user_id == other_id:
+        return
+    if FeedContact.objects.filter(user_id=user_id, contact_id=other_id).exists():
+        return
+    FeedContact.objects.bulk_create(
+        [FeedContact(user_id=user_id, contact_id=other_id), FeedContact(user_id=other_id, contact_id=user_id)],
+        ignore_conflicts=True,
+    )
+    for pk in (user_id, other_id):
+        if FeedContact.objects.filter(user_id=pk).count() > fanout_limit():
+            # From now on its activity is read, not copied
+            FeedContact.objects.filter(contact_id=pk, pull=False).update(pull=True)
+
+
+def publish(actor_id, verb, object_id, summary=""):
+    """Write one activity of ``actor_id`` into its contacts' timelines; returns the rows written."""
+    return publish_many(actor_id, verb, [(object_id, summary)])
+
+
+def publish_many(actor_id, verb, objects):
+    """Write activities ``[(object_id, summary)]`` of ``actor_id``, oldest first, in one batch."""
+    audience = list(FeedContact.objects.filter(contact_id=actor_id).values_list("user_id", flat=True))
+    if not audience or not objects:
+        return 0
+    broadcast = len(audience) > fanout_limit()
+    entries = []
+    for object_id, summary in objects:
+        fields = {"actor_id": actor_id, "verb": verb, "object_id": object_id, "summary": summary[:150]}
+        if broadcast:
+            entries.append(FeedEntry(owner_id=actor_id, broadcast=True, **fields))
+        else:
+            entries += [FeedEntry(owner_id=pk, **fields) for pk in audience]
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(entries, batch_size=1000)
+        every = trim_every()
+        sampled = [entry for entry in entries if entry.pk is not None and entry.pk % every == 0]
+        trim(
+            owner_ids={entry.owner_id for entry in sampled if not entry.broadcast},
+            actor_ids=[actor_id] if any(entry.broadcast for entry in sampled) else (),
+        )
+    return len(entries)
+
+
+def _trim(entries):
+    stale = entries.order_by("-created_at", "-id").values("id")[max_entries():]
+    return FeedEntry.objects.filter(id__in=stale).delete()[0]
+
+
+def trim(owner_ids=(), actor_ids=()):
+    """Keep the newest ``FEED_MAX_ENTRIES`` entries of these timelines; returns the rows deleted.
+
+    ``actor_ids`` selects the ``broadcast`` entries of those actors.
+    """
+    removed = 0
+    for owner_id in owner_ids:
+        removed += _trim(FeedEntry.objects.filter(owner_id=owner_id, broadcast=False))
+    for actor_id in actor_ids:
+        removed += _trim(FeedEntry.objects.filter(owner_id=actor_id, broadcast=True))
+    return removed
+
+
+def trim_all():
+    owners = FeedEntry.objects.filter(broadcast=False).order_by().values_list("owner_id", flat=True).distinct()
+    actors = FeedEntry.objects.filter(broadcast=True).order_by().values_list("owner_id", flat=True).distinct()
+    return trim(list(owners), list(actors))
+
+
+def remove(verb, object_id):
+    FeedEntry.objects.filter(verb=verb, object_id=object_id).delete()
+
+
+# -- events (called by services.signals) ------------------------------------
+
+def skill_added(skill):
+    transaction.on_commit(lambda: publish(skill.user_id, Verb.SKILL_ADDED, skill.pk, skill.name))
+
+
+def skills_imported(user_id, skill_ids):
+    """Publish the skills created by one ``import_skills`` call."""
+    skill_ids = list(skill_ids)
+
+    def run():
+        from users.models import UserSkill
+
+        # Older ones would be trimmed from every timeline right away
+        skills = UserSkill.objects.filter(pk__in=skill_ids).order_by("-pk")[: max_entries()]
+        publish_many(user_id, Verb.SKILL_ADDED, list(skills.values_list("pk", "name"))[::-1])
+
+    transaction.on_commit(run)
+
+
+def request_saved(request, created):
+    if created:
+        connect(request.requester_id, request.provider_id)
+    if request.status != ServiceRequest.Status.COMPLETED:
+        return
+    previous = request.previous_values()
+    # Saved without being loaded first: unknown whether it just completed
+    if created or (previous is not None and previous["status"] != request.status):
+        requests_completed([request.pk])
+
+
+def requests_completed(request_ids):
+    """Publish a completed swap for each request, in the provider's name."""
+    request_ids = list(request_ids)
+
+    def run():
+        completed = ServiceRequest.objects.filter(pk__in=request_ids, status=ServiceRequest.Status.COMPLETED)
+        for pk, provider_id, name in completed.values_list("pk", "provider_id", "offered_skill__name"):
+            publish(provider_id, Verb.SWAP_COMPLETED, pk, name)
+
+    transaction.on_commit(run)
+
+
+def review_posted(review):
+    def run():
+        names = ServiceRequest.objects.filter(pk=review.transaction_id).values_list("offered_skill__name", flat=True)
+        name = names.first()
+        if name is not None:
+            publish(review.reviewer_id, Verb.REVIEW_POSTED, review.pk, name)
+
+    transaction.on_commit(run)
+
+
+# -- rebuild ------------------------------------------------------------------
+
+def compute_contacts():
+    """``[(user_id, contact_id, pull)]`` from every request ever made."""
+    pairs = set()
+    requests = ServiceRequest.objects.exclude(requester_id=F("provider_id")).order_by()
+    for requester_id, provider_id in requests.values_list("requester_id", "provider_id").distinct().iterator():
+        pairs.add((requester_id, provider_id))
+        pairs.add((provider_id, requester_id))
+    degree = Counter(user_id for user_id, _ in pairs)
+    limit = fanout_limit()
+    return [(user_id, contact_id, degree[contact_id] > limit) for user_id, contact_id in sorted(pairs)]
+
+
+def rebuild_contacts(batch_size=5000):
+    """Recreate every ``FeedContact`` (and its ``pull`` flag) from the requests; returns rows written."""
+    rows = [FeedContact(user_id=a, contact_id=b, pull=pull) for a, b, pull in compute_contacts()]
+    with transaction.atomic():
+        FeedContact.objects.all().delete()
+        FeedContact.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
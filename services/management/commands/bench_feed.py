@@ -0,0 +1,123 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.seeding import SeedSizes, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do feed de atividades (services.feed) num grafo gerado com alguns usuários muito "
+        "conectados: linhas escritas por atividade e latência da leitura com fan-out na escrita, híbrido "
+        "e fan-out na leitura (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--requests", type=int, default=200000)
+        parser.add_argument("--hubs", type=int, default=20, help="Usuários muito conectados")
+        parser.add_argument("--hub-contacts", type=int, default=5000, help="Contatos de cada um deles")
+        parser.add_argument("--events", type=int, default=2000, help="Atividades publicadas por estratégia")
+        parser.add_argument("--hub-share", type=float, default=0.1, help="Fração das atividades feitas por eles")
+        parser.add_argument("--reads", type=int, default=500, help="Leituras de timeline medidas")
+        parser.add_argument("--limit", type=int, default=500, help="FEED_FANOUT_LIMIT da estratégia híbrida")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        from services import feed
+        from services.models import FeedContact, FeedEntry, ServiceRequest
+        from users.models import UserSkill
+
+        rng = random.Random(options["seed"])
+        sizes = SeedSizes(users=options["users"], skills_per_user=1, requests=options["requests"])
+        with Timer() as gen:
+            SyntheticDataGenerator(sizes, seed=options["seed"]).run()
+            user_ids = list(get_user_model().objects.values_list("pk", flat=True))
+            hubs = rng.sample(user_ids, options["hubs"])
+            skills = dict(UserSkill.objects.filter(user_id__in=hubs).values_list("user_id", "pk"))
+            ServiceRequest.objects.bulk_create(
+                [
+                    ServiceRequest(
+                        requester_id=requester_id, provider_id=hub, offered_skill_id=skills[hub], description="x"
+                    )
+                    for hub in hubs
+                    for requester_id in rng.sample(user_ids, options["hub_contacts"])
+                    if requester_id != hub
+                ],
+                batch_size=5000,
+            )
+            feed.rebuild_contacts()
+        self.stdout.write(
+            f"generated {len(user_ids)} users and {ServiceRequest.objects.count()} requests in {gen.elapsed:.1f}s"
+        )
+
+        hub_set = set(hubs)
+        others = [pk for pk in user_ids if pk not in hub_set]
+        actors = [
+            rng.choice(hubs) if rng.random() < options["hub_share"] else rng.choice(others)
+            for _ in range(options["events"])
+        ]
+        # Half of the readers know at least one of the hubs
+        hub_followers = list(
+            FeedContact.objects.filter(contact_id__in=hubs).values_list("user_id", flat=True).distinct()
+        )
+        readers = [rng.choice(hub_followers) if i % 2 else rng.choice(others) for i in range(options["reads"])]
+
+        client = APIClient(SERVER_NAME="localhost")
+        url = reverse("services:feed")
+        User = get_user_model()
+        users = User.objects.in_bulk(set(readers))
+        strategies = [
+            ("fan-out on write", len(user_ids)),
+            (f"hybrid (limit {options['limit']})", options["limit"]),
+            ("fan-out on read", 0),
+        ]
+        rows = []
+        for label, limit in strategies:
+            FeedEntry.objects.all().delete()
+            with override_settings(FEED_FANOUT_LIMIT=limit):
+                feed.rebuild_contacts()
+                written, writes = 0, []
+                for n, actor_id in enumerate(actors):
+                    with Timer() as t:
+                        written += feed.publish(actor_id, FeedEntry.Verb.SKILL_ADDED, n, "Violão")
+                    writes.append(t.elapsed * 1000)
+
+                reads, queries = [], 0
+                for reader in readers:
+                    client.force_authenticate(users[reader])
+                    # The publish loop filled the capped query log, which breaks the count
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as captured, Timer() as t:
+                        response = client.get(url)
+                    reads.append(t.elapsed * 1000)
+                    assert response.status_code == 200, response.content
+                    queries = max(queries, len(captured))
+            rows.append((label, written / len(actors), writes, reads, queries))
+
+        self.stdout.write(
+            f"\n{len(actors)} activities ({options['hub_share']:.0%} by {len(hubs)} users with "
+            f"~{options['hub_contacts']} contacts), {len(readers)} timeline reads (first page)"
+        )
+        self.stdout.write(
+            f"{'strategy':<26}{'rows/event':>12}{'write p50':>11}{'write p99':>11}{'read p50':>10}{'read p99':>10}"
+            f"{'queries':>9}"
+        )
+        for label, amplification, writes, reads, queries in rows:
+            self.stdout.write(
+                f"{label:<26}{amplification:>12.1f}{percentile(writes, 50):>11.2f}{percentile(writes, 99):>11.2f}"
+                f"{percentile(reads, 50):>10.2f}{percentile(reads, 99):>10.2f}{queries:>9}"
+            )
+        self.stdout.write("(times in ms)")
@@ -0,0 +1,69 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.seeding import SeedSizes, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do motor de matching (services.matching) sobre um conjunto gerado pelo seed_demo: "
+        "tempo de construção e latência por consulta (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--skills-per-user", type=int, default=3)
+        parser.add_argument("--requests", type=int, default=200000)
+        parser.add_argument("--queries", type=int, default=500, help="Usuários consultados")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from services import matching
+
+        sizes = SeedSizes(
+            users=options["users"], skills_per_user=options["skills_per_user"], requests=options["requests"]
+        )
+        with Timer() as gen:
+            SyntheticDataGenerator(sizes, seed=options["seed"]).run()
+        self.stdout.write(f"generated dataset in {gen.elapsed:.1f}s")
+
+        engine = matching.engine
+        engine.clear()
+        with Timer() as build:
+            engine.rebuild()
+        self.stdout.write(
+            f"built adjacency in {build.elapsed:.2f}s "
+            f"({len(engine.offers)} offering users, {len(engine.wants)} requesting users, {len(engine.names)} skills)"
+        )
+
+        rng = random.Random(options["seed"])
+        users = rng.sample(sorted(engine.wants), min(options["queries"], len(engine.wants)))
+        timings = {"reciprocal": [], "cycles": [], "total": []}
+        found = {"reciprocal": 0, "cycles": 0}
+        for user_id in users:
+            with Timer() as total:
+                with Timer() as t:
+                    reciprocal = engine.reciprocal(user_id, limit=20)
+                timings["reciprocal"].append(t.elapsed * 1000)
+                with Timer() as t:
+                    cycles = engine.cycles(user_id, limit=10, exclude=[other for other, *_ in reciprocal])
+                timings["cycles"].append(t.elapsed * 1000)
+            timings["total"].append(total.elapsed * 1000)
+            found["reciprocal"] += bool(reciprocal)
+            found["cycles"] += bool(cycles)
+
+        self.stdout.write(f"\n{'query':<12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, values in timings.items():
+            self.stdout.write(
+                f"{name:<12}{percentile(values, 50):>10.2f}{percentile(values, 99):>10.2f}{max(values):>10.2f}"
+            )
+        self.stdout.write(
+            f"\n{found['reciprocal']}/{len(users)} users with reciprocal matches, {found['cycles']} with 3-way cycles"
+        )
+        engine.clear()
@@ -0,0 +1,119 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Sum
+from django.urls import reverse
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.seeding import SeedSizes, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do ranking de prestadores (services.rankings): recálculo completo, atualização "
+        "incremental por prestador e leitura do leaderboard contra a agregação feita a cada requisição "
+        "(usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--requests", type=int, default=200000)
+        parser.add_argument("--samples", type=int, default=200, help="Prestadores/consultas medidos")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from rest_framework.test import APIClient
+
+        from services import rankings
+        from services.models import ProviderRanking, Review, ServiceRequest
+
+        sizes = SeedSizes(users=options["users"], skills_per_user=3, requests=options["requests"])
+        with Timer() as gen:
+            SyntheticDataGenerator(sizes, seed=options["seed"]).run()
+        self.stdout.write(
+            f"generated {ServiceRequest.objects.count()} requests and {Review.objects.count()} reviews "
+            f"in {gen.elapsed:.1f}s"
+        )
+
+        with Timer() as full:
+            written = rankings.refresh()
+        self.stdout.write(f"full refresh: {written} rows in {full.elapsed:.2f}s")
+
+        rng = random.Random(options["seed"])
+        providers = list(ProviderRanking.objects.filter(skill_key="").values_list("provider_id", flat=True))
+        incremental = []
+        for provider_id in rng.sample(providers, min(options["samples"], len(providers))):
+            with Timer() as t:
+                rankings.refresh([provider_id])
+            incremental.append(t.elapsed * 1000)
+
+        top = list(
+            ProviderRanking.objects.exclude(skill_key="")
+            .values("skill_key", "skill_name")
+            .annotate(n=Count("id"))
+            .order_by("-n")[:10]
+        )
+        # Only (skill, location) pairs that have ranking rows: every page queried is non-empty
+        locations = {}
+        pairs = (
+            ProviderRanking.objects.filter(skill_key__in=[row["skill_key"] for row in top])
+            .exclude(location_key="")
+            .values_list("skill_key", "location")
+            .distinct()
+            .order_by("skill_key", "location")
+        )
+        for skill, location in pairs:
+            locations.setdefault(skill, []).append(location)
+        queries = []
+        for _ in range(options["samples"]):
+            skill = rng.choice(top)["skill_key"]
+            by_location = locations.get(skill) and rng.random() < 0.5
+            queries.append((skill, rng.choice(locations[skill]) if by_location else None))
+
+        client = APIClient(SERVER_NAME="localhost")
+        url = reverse("services:rankings")
+        table = []
+        for skill, location in queries:
+            params = {"skill": skill, "location": location} if location else {"skill": skill}
+            with Timer() as t:
+                response = client.get(url, params)
+            assert response.status_code == 200 and response.json()["results"], response.content
+            table.append(t.elapsed * 1000)
+
+        # What the endpoint would cost without the table: aggregate the
+        # completed requests and reviews of the skill on every request
+        names = {}
+        for name in ServiceRequest.objects.values_list("offered_skill__name", flat=True).distinct():
+            names.setdefault(rankings.normalize_key(name), []).append(name)
+        on_the_fly = []
+        for skill, location in queries:
+            with Timer() as t:
+                completed = ServiceRequest.objects.filter(
+                    status=ServiceRequest.Status.COMPLETED, offered_skill__name__in=names[skill]
+                )
+                reviews = Review.objects.filter(
+                    reviewed_user_id=F("transaction__provider_id"), transaction__offered_skill__name__in=names[skill]
+                )
+                if location:
+                    completed = completed.filter(provider__profile__location=location)
+                    reviews = reviews.filter(reviewed_user__profile__location=location)
+                counts = dict(completed.values("provider_id").annotate(n=Count("id")).values_list("provider_id", "n"))
+                stats = reviews.values("reviewed_user_id").annotate(n=Count("id"), total=Sum("rating"))
+                scores = {pk: rankings.provider_score(0, 0, n) for pk, n in counts.items()}
+                for row in stats:
+                    pk = row["reviewed_user_id"]
+                    scores[pk] = rankings.provider_score(row["n"], row["total"], counts.get(pk, 0))
+                sorted(scores.items(), key=lambda item: -item[1])[:25]
+            on_the_fly.append(t.elapsed * 1000)
+
+        self.stdout.write(f"\n{'operation':<40}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, timings in (
+            ("incremental refresh (1 provider)", incremental),
+            ("leaderboard page from the table", table),
+            ("aggregate per request (no table)", on_the_fly),
+        ):
+            self.stdout.write(f"{label:<40}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from services import skill_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconta os contadores de pedidos e avaliações de cada UserSkill a partir de ServiceRequest/Review "
+        "e corrige as skills divergentes (gravações em massa não disparam os signals)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Só lista as divergências, sem corrigir")
+        parser.add_argument("--show", type=int, default=20, help="Quantas skills divergentes listar")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = skill_counters.check(repair=not options["dry_run"], batch_size=options["batch_size"])
+        for skill_id, diff in drifted[: options["show"]]:
+            fields = ", ".join(f"{field} {stored} -> {expected}" for field, (stored, expected) in diff.items())
+            self.stdout.write(f"skill {skill_id}: {fields}")
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All skill counters are consistent."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} skills have drifted counters (not repaired)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired the counters of {len(drifted)} skills."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services import feed
+
+
+class Command(BaseCommand):
+    help = (
+        "Recria os contatos do feed de atividades (FeedContact e a marcação pull) a partir dos pedidos "
+        "e corta as timelines em FEED_MAX_ENTRIES; use depois de gravações em massa que não disparam signals"
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        contacts = feed.rebuild_contacts()
+        trimmed = feed.trim_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{contacts} feed contacts rebuilt and {trimmed} old entries trimmed "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
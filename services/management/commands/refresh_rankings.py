@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services import rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula do zero o ranking de prestadores (ProviderRanking) a partir de pedidos e avaliações; "
+        "com --loop roda periodicamente para cobrir gravações em massa que não disparam signals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", type=float, default=None, help="Repete a cada N segundos")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            written = rankings.refresh()
+            self.stdout.write(
+                self.style.SUCCESS(f"{written} ranking rows refreshed in {time.perf_counter() - started:.1f}s")
+            )
+            if options["loop"] is None:
+                return
+            time.sleep(options["loop"])
@@ -0,0 +1,286 @@
+"""Skill-swap matching: who should trade with whom.
+
+A user *offers* the skills they registered (``UserSkill``) and *wants* the
+skills they requested before (``ServiceRequest.offered_skill``). Skills are
+compared by normalized name (``users.search.normalize``), so "Programação
+Python" offered by one user matches "programacao python" requested by
+another.
+
+``MatchingEngine`` keeps the adjacency in memory, per process:
+
+- ``offers[user]`` / ``wants[user]``: ``{skill key: count}``
+- ``offerers[key]`` / ``wanters[key]``: sets of users
+
+Queries are set intersections over those structures, so they never touch
+the database (except for loading usernames of the results). The engine is
+built on first use, patched incrementally by signals once a transaction
+commits (``refresh_offers``/``refresh_wants`` reload a single user), and
+rebuilt in the background every ``MATCHING_REFRESH_SECONDS`` to pick up bulk
+writes and changes made by other processes.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from users.search import normalize
+
+logger = logging.getLogger(__name__)
+
+# Three-way swaps are searched through at most this many "C" candidates, the
+# ones covering most of the user's wants first
+CYCLE_CANDIDATES = 50
+
+
+def skill_key(name):
+    return " ".join(normalize(name).split())
+
+
+class MatchingEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._rebuilding = False
+        self._reset()
+
+    def _reset(self):
+        self.offers = defaultdict(dict)
+        self.wants = defaultdict(dict)
+        self.offerers = defaultdict(set)
+        self.wanters = defaultdict(set)
+        self.names = {}
+
+    # -- building ------------------------------------------------------------
+
+    def _load(self):
+        from users.models import UserSkill
+
+        from .models import ServiceRequest
+
+        offers = defaultdict(Counter)
+        wants = defaultdict(Counter)
+        names = {}
+        for user_id, name in UserSkill.objects.values_list("user_id", "name").iterator(chunk_size=10000):
+            key = skill_key(name)
+            names.setdefault(key, name)
+            offers[user_id][key] += 1
+        requests = ServiceRequest.objects.values_list("requester_id", "offered_skill__name")
+        for user_id, name in requests.iterator(chunk_size=10000):
+            key = skill_key(name)
+            names.setdefault(key, name)
+            wants[user_id][key] += 1
+        return offers, wants, names
+
+    def rebuild(self):
+        """Reload everything from the database and swap it in."""
+        offers, wants, names = self._load()
+        offerers = defaultdict(set)
+        wanters = defaultdict(set)
+        for user_id, keys in offers.items():
+            for key in keys:
+                offerers[key].add(user_id)
+        for user_id, keys in wants.items():
+            for key in keys:
+                wanters[key].add(user_id)
+        with self._lock:
+            self.offers = defaultdict(dict, {u: dict(c) for u, c in offers.items()})
+            self.wants = defaultdict(dict, {u: dict(c) for u, c in wants.items()})
+            self.offerers, self.wanters, self.names = offerers, wanters, names
+            self._built_at = time.monotonic()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Matching engine rebuild failed")
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def ensure_fresh(self):
+        """Build on first use; afterwards refresh in the background when older than the TTL."""
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+        ttl = getattr(settings, "MATCHING_REFRESH_SECONDS", 300)
+        if not ttl or time.monotonic() - self._built_at <= ttl:
+            return
+        # Checked and set together: concurrent requests start a single rebuild
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._built_at = None
+
+    # -- incremental updates -------------------------------------------------
+
+    def _replace(self, table, index, user_id, new):
+        old = table.get(user_id, {})
+        for key in old.keys() - new.keys():
+            members = index.get(key)
+            if members is not None:
+                members.discard(user_id)
+                if not members:
+                    del index[key]
+        for key in new.keys() - old.keys():
+            index[key].add(user_id)
+        if new:
+            table[user_id] = new
+        else:
+            table.pop(user_id, None)
+
+    def refresh_offers(self, user_id):
+        """Reload the skills ``user_id`` offers."""
+        from users.models import UserSkill
+
+        if self._built_at is None:
+            return
+        names = UserSkill.objects.filter(user_id=user_id).values_list("name", flat=True)
+        self._apply(self.offers, self.offerers, user_id, names)
+
+    def refresh_wants(self, user_id):
+        """Reload the skills ``user_id`` has requested."""
+        from .models import ServiceRequest
+
+        if self._built_at is None:
+            return
+        names = ServiceRequest.objects.filter(requester_id=user_id).values_list("offered_skill__name", flat=True)
+        self._apply(self.wants, self.wanters, user_id, names)
+
+    def _apply(self, table, index, user_id, names):
+        counts = Counter()
+        labels = {}
+        for name in names:
+            key = skill_key(name)
+            labels.setdefault(key, name)
+            counts[key] += 1
+        with self._lock:
+            for key, name in labels.items():
+                self.names.setdefault(key, name)
+            self._replace(table, index, user_id, dict(counts))
+
+    # -- queries -------------------------------------------------------------
+
+    def _union(self, index, keys):
+        return set().union(*(index[key] for key in keys if key in index))
+
+    def reciprocal(self, user_id, limit=20):
+        """Users who offer what ``user_id`` wants and want what ``user_id`` offers.
+
+        Returns ``[(other_id, score, you_get, you_give)]`` best first, where
+        ``score`` counts the distinct skills traded in both directions.
+        """
+        with self._lock:
+            return self._reciprocal(user_id, limit)
+
+    def _reciprocal(self, user_id, limit):
+        my_offers = self.offers.get(user_id, {})
+        my_wants = self.wants.get(user_id, {})
+        if not my_offers or not my_wants:
+            return []
+        candidates = self._union(self.offerers, my_wants) & self._union(self.wanters, my_offers)
+        candidates.discard(user_id)
+        if not candidates:
+            return []
+        # Count matched keys per candidate with C-level set/Counter operations
+        scores = Counter()
+        for key in my_wants:
+            scores.update(candidates & self.offerers.get(key, set()))
+        for key in my_offers:
+            scores.update(candidates & self.wanters.get(key, set()))
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            (
+                other,
+                score,
+                sorted(self.names[k] for k in my_wants if k in self.offers[other]),
+                sorted(self.names[k] for k in my_offers if k in self.wants[other]),
+            )
+            for other, score in ranked
+        ]
+
+    def cycles(self, user_id, limit=10, exclude=()):
+        """Three-way swaps: ``user_id`` gives to B, B gives to C, C gives to ``user_id``.
+
+        Returns ``[(b_id, c_id, you_give_b, b_gives_c, c_gives_you)]`` with one
+        skill name per leg. Users in ``exclude`` (e.g. reciprocal matches)
+        are not used as C, so the cycles add options instead of repeating them.
+        """
+        with self._lock:
+            return self._cycles(user_id, limit, set(exclude))
+
+    def _cycles(self, user_id, limit, exclude):
+        my_offers = self.offers.get(user_id, {})
+        my_wants = self.wants.get(user_id, {})
+        if not my_offers or not my_wants:
+            return []
+        give_to = self._union(self.wanters, my_offers)
+        give_to.discard(user_id)
+        get_from = self._union(self.offerers, my_wants) - exclude
+        get_from.discard(user_id)
+
+        # Rank C candidates by how many of the user's wants they cover
+        coverage = Counter()
+        for key in my_wants:
+            coverage.update(get_from & self.offerers.get(key, set()))
+        ranked = heapq.nsmallest(CYCLE_CANDIDATES, coverage.items(), key=lambda item: (-item[1], item[0]))
+
+        found = []
+        used = {user_id}
+        # give_to ∩ offerers[key], computed once per key: C candidates mostly
+        # want the same popular skills
+        givers = {}
+        for c, _ in ranked:
+            if len(found) >= limit:
+                break
+            for key in self.wants.get(c, ()):
+                if key not in givers:
+                    givers[key] = give_to & self.offerers.get(key, set())
+                b = next((b for b in givers[key] if b not in used and b != c), None)
+                if b is None:
+                    continue
+                found.append(
+                    (
+                        b,
+                        c,
+                        self._shared(my_offers, self.wants[b]),
+                        self.names[key],
+                        self._shared(my_wants, self.offers[c]),
+                    )
+                )
+                used.update((b, c))
+                break
+        return found
+
+    def _shared(self, left, right):
+        return self.names[min(k for k in left if k in right)]
+
+
+engine = MatchingEngine()
+
+
+def find_matches(user_id, limit=20, cycles=10):
+    """Reciprocal matches and three-way cycles for ``user_id``."""
+    engine.ensure_fresh()
+    reciprocal = engine.reciprocal(user_id, limit=limit)
+    found_cycles = engine.cycles(user_id, limit=cycles, exclude=[other for other, *_ in reciprocal]) if cycles else []
+    return reciprocal, found_cycles
+
+
+def offers_changed(user_id):
+    transaction.on_commit(lambda: engine.refresh_offers(user_id))
+
+
+def wants_changed(user_id):
+    transaction.on_commit(lambda: engine.refresh_wants(user_id))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+        ('users', '0004_skill_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', 'status', 'created_at', 'id'], name='svcreq_provider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['requester', 'status', 'created_at', 'id'], name='svcreq_requester_status_idx'),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:19
+
+import math
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+# services.rankings as of this migration, copied so later changes to it do
+# not change what this migration writes.
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+
+
+def normalize_key(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().strip()
+
+
+def provider_score(review_count, rating_total, completed_count):
+    weight = getattr(settings, "PROVIDER_RANKING_COMPLETED_WEIGHT", 0.5)
+    bayes = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + rating_total) / (RATING_PRIOR_WEIGHT + review_count)
+    return round(bayes + weight * math.log1p(completed_count), 6)
+
+
+def build(completed, reviews, locations):
+    stats = {}
+
+    def slots(provider_id, name):
+        entry = stats.setdefault((provider_id, normalize_key(name)), [name, 0, 0, 0])
+        entry[0] = min(entry[0], name)
+        return entry, stats.setdefault((provider_id, ""), ["", 0, 0, 0])
+
+    for provider_id, name, count in completed:
+        for entry in slots(provider_id, name):
+            entry[3] += count
+    for provider_id, name, count, total in reviews:
+        for entry in slots(provider_id, name):
+            entry[1] += count
+            entry[2] += total
+
+    rows = []
+    for (provider_id, key), (name, review_count, rating_total, completed_count) in stats.items():
+        location = locations.get(provider_id) or ""
+        rows.append(
+            {
+                "provider_id": provider_id,
+                "skill_key": key,
+                "skill_name": name,
+                "location_key": normalize_key(location),
+                "location": location,
+                "review_count": review_count,
+                "rating_total": rating_total,
+                "completed_count": completed_count,
+                "score": provider_score(review_count, rating_total, completed_count),
+            }
+        )
+    return rows
+
+
+def rank_existing_providers(apps, schema_editor):
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+    Review = apps.get_model("services", "Review")
+    UserProfile = apps.get_model("users", "UserProfile")
+    ProviderRanking = apps.get_model("services", "ProviderRanking")
+    completed = (
+        ServiceRequest.objects.filter(status="COMPLETED")
+        .values("provider_id", "offered_skill__name")
+        .annotate(n=Count("id"))
+        .values_list("provider_id", "offered_skill__name", "n")
+    )
+    reviews = (
+        Review.objects.filter(reviewed_user_id=F("transaction__provider_id"))
+        .values("reviewed_user_id", "transaction__offered_skill__name")
+        .annotate(n=Count("id"), total=Sum("rating"))
+        .values_list("reviewed_user_id", "transaction__offered_skill__name", "n", "total")
+    )
+    locations = dict(UserProfile.objects.exclude(location="").values_list("user_id", "location"))
+    rows = build(list(completed), list(reviews), locations)
+    ProviderRanking.objects.bulk_create([ProviderRanking(**fields) for fields in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_servicerequest_box_indexes'),
+        ('users', '0005_userskill_user_name_uniq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skill_key', models.CharField(blank=True, max_length=150)),
+                ('skill_name', models.CharField(blank=True, max_length=150)),
+                ('location_key', models.CharField(blank=True, max_length=150)),
+                ('location', models.CharField(blank=True, max_length=150)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['skill_key', '-score', '-id'], name='ranking_skill_score_idx'), models.Index(fields=['location_key', 'skill_key', '-score', '-id'], name='ranking_location_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'skill_key'), name='ranking_provider_skill_uniq')],
+            },
+        ),
+        migrations.RunPython(rank_existing_providers, migrations.RunPython.noop),
+    ]
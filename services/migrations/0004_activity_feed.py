@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:06
+
+from collections import Counter
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def connect_existing_users(apps, schema_editor):
+    # services.feed.compute_contacts as of this migration
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+    FeedContact = apps.get_model("services", "FeedContact")
+    pairs = set()
+    requests = ServiceRequest.objects.exclude(requester_id=F("provider_id")).order_by()
+    for requester_id, provider_id in requests.values_list("requester_id", "provider_id").distinct().iterator():
+        pairs.add((requester_id, provider_id))
+        pairs.add((provider_id, requester_id))
+    degree = Counter(user_id for user_id, _ in pairs)
+    limit = getattr(settings, "FEED_FANOUT_LIMIT", 500)
+    FeedContact.objects.bulk_create(
+        [FeedContact(user_id=a, contact_id=b, pull=degree[b] > limit) for a, b in sorted(pairs)], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0003_provider_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedContact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pull', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('contact', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed_followers', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed_contacts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['contact', 'pull'], name='feedcontact_contact_pull_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'contact'), name='feedcontact_user_contact_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('broadcast', models.BooleanField(default=False)),
+                ('verb', models.CharField(choices=[('SKILL_ADDED', 'Skill added'), ('SWAP_COMPLETED', 'Swap completed'), ('REVIEW_POSTED', 'Review posted')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('summary', models.CharField(blank=True, max_length=150)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_activity', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'created_at', 'id'], name='feed_owner_created_idx'), models.Index(fields=['verb', 'object_id'], name='feed_object_idx')],
+            },
+        ),
+        migrations.RunPython(connect_existing_users, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,93 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import DatabaseError, connections, router
+from django.db import transaction as db_transaction
+from django.utils import timezone
 
+from core.models import TrackedFieldsMixin
 
-class ServiceRequest(models.Model):
+
+def _update_returns_rows(connection):
+	return connection.vendor == "postgresql" or (
+		connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 35)
+	)
+
+
+class ServiceRequestQuerySet(models.QuerySet):
+	def transition(self, to_status):
+		"""Move the rows of this queryset to ``to_status`` where the state machine allows it.
+
+		One conditional ``UPDATE ... WHERE status=<origem>`` per allowed source
+		status, all in a single transaction; rows in any other status are left
+		untouched. Returns ``{source_status: [ids]}`` for the rows that moved and
+		sends ``request_status_changed`` for each group.
+		"""
+		from .signals import request_status_changed
+
+		sources = [source for source, targets in self.model.TRANSITIONS.items() if to_status in targets]
+		moved = {}
+		with db_transaction.atomic(using=self._write_db()):
+			for source in sources:
+				ids = self._move(source, to_status)
+				if not ids:
+					continue
+				moved[source] = ids
+				request_status_changed.send(
+					sender=self.model, request_ids=ids, from_status=source, to_status=to_status
+				)
+		return moved
+
+	def _write_db(self):
+		return self._db or router.db_for_write(self.model, **self._hints)
+
+	def _move(self, source, to_status):
+		"""Ids of the rows of this queryset moved from ``source`` to ``to_status``.
+
+		With ``UPDATE ... RETURNING`` (PostgreSQL, SQLite 3.35+) it is a single
+		statement, so the ids are exactly the rows it changed and no read comes
+		before the write (on SQLite's deferred transactions, a read followed by
+		a write fails with "database is locked" when another writer got in
+		between). Elsewhere the candidates are locked, read, then updated.
+		"""
+		candidates = self.filter(status=source).order_by()
+		using = self._write_db()
+		connection = connections[using]
+		if _update_returns_rows(connection):
+			qn = connection.ops.quote_name
+			opts = self.model._meta
+			table, pk, status = qn(opts.db_table), qn(opts.pk.column), qn(opts.get_field("status").column)
+			subquery, params = candidates.values("pk").query.get_compiler(using=using).as_sql()
+			sql = f"UPDATE {table} SET {status} = %s WHERE {status} = %s AND {pk} IN ({subquery}) RETURNING {pk}"
+			with connection.cursor() as cursor:
+				cursor.execute(sql, [to_status, source, *params])
+				return [row[0] for row in cursor.fetchall()]
+		ids = list(candidates.using(using).select_for_update().values_list("pk", flat=True))
+		if ids:
+			updated = self.model.objects.using(using).filter(pk__in=ids, status=source).update(status=to_status)
+			if updated != len(ids):
+				raise DatabaseError(f"{len(ids) - updated} requests changed status during the transition")
+		return ids
+
+
+class ServiceRequest(TrackedFieldsMixin, models.Model):
 	class Status(models.TextChoices):
 		PENDING = "PENDING", "Pending"
 		ACCEPTED = "ACCEPTED", "Accepted"
 		COMPLETED = "COMPLETED", "Completed"
 		CANCELED = "CANCELED", "Canceled"
 
+	# Transições permitidas: PENDING -> ACCEPTED -> COMPLETED; cancelamento
+	# enquanto o pedido não foi concluído. COMPLETED e CANCELED são finais.
+	TRANSITIONS = {
+		Status.PENDING: (Status.ACCEPTED, Status.CANCELED),
+		Status.ACCEPTED: (Status.COMPLETED, Status.CANCELED),
+		Status.COMPLETED: (),
+		Status.CANCELED: (),
+	}
+	# Usados pelos contadores por skill (services.skill_counters) para aplicar deltas
+	tracked_fields = ("offered_skill_id", "status")
+
 	requester = models.ForeignKey(
 		settings.AUTH_USER_MODEL,
 		related_name="service_requests_made",
@@ -26,12 +104,37 @@ class ServiceRequest(models.Model):
 	status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	objects = ServiceRequestQuerySet.as_manager()
+
+	class Meta:
+		# Caixa de entrada/saída: filtro por usuário + status, mais recentes
+		# primeiro com desempate por id (paginação keyset)
+		indexes = [
+			models.Index(fields=["provider", "status", "created_at", "id"], name="svcreq_provider_status_idx"),
+			models.Index(fields=["requester", "status", "created_at", "id"], name="svcreq_requester_status_idx"),
+		]
+
+	def save(self, *args, **kwargs):
+		# Pedido e contadores da skill (via signals) gravam na mesma transação
+		with db_transaction.atomic():
+			super().save(*args, **kwargs)
+		self.remember_current_values()
+
+	def delete(self, *args, **kwargs):
+		with db_transaction.atomic():
+			return super().delete(*args, **kwargs)
+
+	def can_transition(self, to_status):
+		return to_status in self.TRANSITIONS.get(self.status, ())
+
 	def __str__(self):
 		return f"ServiceRequest(id={self.id}, requester={self.requester}, provider={self.provider}, status={self.status})"
 
 
-class Review(models.Model):
+class Review(TrackedFieldsMixin, models.Model):
 	RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
+	# Usados pelos agregados de avaliação (users.ratings) para aplicar deltas
+	tracked_fields = ("reviewed_user_id", "rating")
 
 	transaction = models.OneToOneField(
 		ServiceRequest, related_name="review", on_delete=models.CASCADE
@@ -46,5 +149,117 @@ class Review(models.Model):
 	comment = models.TextField(blank=True)
 	date = models.DateTimeField(auto_now_add=True)
 
+	def save(self, *args, **kwargs):
+		# Review e agregados derivados (via signals) gravam na mesma transação
+		with db_transaction.atomic():
+			super().save(*args, **kwargs)
+		self.remember_current_values()
+
+	def delete(self, *args, **kwargs):
+		with db_transaction.atomic():
+			return super().delete(*args, **kwargs)
+
 	def __str__(self):
 		return f"Review(id={self.id}, transaction_id={self.transaction_id}, rating={self.rating})"
+
+
+class ProviderRanking(models.Model):
+	"""Linha materializada do ranking de prestadores (ver `services.rankings`).
+
+	Uma linha por prestador e skill (`skill_key` normalizado, sem acentos e
+	caixa) e uma linha geral por prestador com `skill_key=""`. A nota combina
+	a média bayesiana das avaliações recebidas com o número de pedidos
+	concluídos. Atualizada por prestador pelos signals e recriável com
+	`refresh_rankings`.
+	"""
+	provider = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="rankings", on_delete=models.CASCADE)
+	skill_key = models.CharField(max_length=150, blank=True)
+	skill_name = models.CharField(max_length=150, blank=True)
+	location_key = models.CharField(max_length=150, blank=True)
+	location = models.CharField(max_length=150, blank=True)
+	review_count = models.PositiveIntegerField(default=0)
+	rating_total = models.PositiveIntegerField(default=0)
+	completed_count = models.PositiveIntegerField(default=0)
+	score = models.FloatField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["provider", "skill_key"], name="ranking_provider_skill_uniq"),
+		]
+		indexes = [
+			# Leaderboards: por skill, e por skill dentro de uma cidade (paginação keyset por nota)
+			models.Index(fields=["skill_key", "-score", "-id"], name="ranking_skill_score_idx"),
+			models.Index(fields=["location_key", "skill_key", "-score", "-id"], name="ranking_location_score_idx"),
+		]
+
+	def __str__(self):
+		return f"ProviderRanking(provider_id={self.provider_id}, skill={self.skill_key!r}, score={self.score:.3f})"
+
+
+class FeedContact(models.Model):
+	"""Aresta do grafo de interações usado pelo feed de atividades (ver `services.feed`).
+
+	Uma linha por direção (`user` vê a atividade de `contact`), criada no
+	primeiro pedido entre os dois. `pull` marca os contatos com mais de
+	`FEED_FANOUT_LIMIT` contatos: a atividade deles não é copiada para cada
+	timeline e é lida das entradas `broadcast` de `FeedEntry`.
+	"""
+	# Os índices de cada FK seriam redundantes com os compostos abaixo
+	user = models.ForeignKey(
+		settings.AUTH_USER_MODEL, related_name="feed_contacts", on_delete=models.CASCADE, db_index=False
+	)
+	contact = models.ForeignKey(
+		settings.AUTH_USER_MODEL, related_name="feed_followers", on_delete=models.CASCADE, db_index=False
+	)
+	pull = models.BooleanField(default=False)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=["user", "contact"], name="feedcontact_user_contact_uniq"),
+		]
+		indexes = [
+			# Público de uma atividade e marcação em massa de `pull`
+			models.Index(fields=["contact", "pull"], name="feedcontact_contact_pull_idx"),
+		]
+
+	def __str__(self):
+		return f"FeedContact(user_id={self.user_id}, contact_id={self.contact_id}, pull={self.pull})"
+
+
+class FeedEntry(models.Model):
+	"""Entrada compacta do feed: quem (`actor`) fez o quê (`verb`, `object_id`).
+
+	Normalmente é uma cópia na timeline de um contato (`owner`, fan-out na
+	escrita). Para atores com muitos contatos é uma única entrada `broadcast`
+	com `owner = actor`, juntada às timelines dos contatos na leitura, pelo
+	mesmo índice. `summary` guarda o nome da skill no momento da atividade
+	para a listagem não precisar de joins.
+	"""
+	class Verb(models.TextChoices):
+		SKILL_ADDED = "SKILL_ADDED", "Skill added"
+		SWAP_COMPLETED = "SWAP_COMPLETED", "Swap completed"
+		REVIEW_POSTED = "REVIEW_POSTED", "Review posted"
+
+	# Indexado por feed_owner_created_idx: um índice a menos por linha do fan-out
+	owner = models.ForeignKey(
+		settings.AUTH_USER_MODEL, related_name="feed_entries", on_delete=models.CASCADE, db_index=False
+	)
+	actor = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="feed_activity", on_delete=models.CASCADE)
+	broadcast = models.BooleanField(default=False)
+	verb = models.CharField(max_length=20, choices=Verb.choices)
+	# UserSkill, ServiceRequest ou Review, conforme `verb`
+	object_id = models.PositiveBigIntegerField()
+	summary = models.CharField(max_length=150, blank=True)
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		indexes = [
+			# Timeline: mais recentes primeiro com desempate por id (paginação keyset)
+			models.Index(fields=["owner", "created_at", "id"], name="feed_owner_created_idx"),
+			# Remoção das entradas de um objeto apagado
+			models.Index(fields=["verb", "object_id"], name="feed_object_idx"),
+		]
+
+	def __str__(self):
+		return f"FeedEntry(owner_id={self.owner_id}, actor_id={self.actor_id}, verb={self.verb}, object_id={self.object_id})"
@@ -0,0 +1,165 @@
+"""Provider leaderboards materialized in ``ProviderRanking``.
+
+For every provider and skill (grouped by ``users.search.normalize(name)``,
+so "Violão" and "violao" are one skill) the table keeps the reviews the
+provider received for requests of that skill, the completed requests and
+the resulting score; a row with ``skill_key=""`` sums all of the
+provider's skills. The location comes from ``UserProfile.location``.
+
+score = Bayesian average rating (same prior as the skill search)
+        + PROVIDER_RANKING_COMPLETED_WEIGHT * ln(1 + completed requests)
+
+Only reviews written about the request's provider count, and only
+providers with at least one completed request or review are listed.
+
+The signals in ``services.signals`` call ``providers_changed`` and each
+affected provider is recomputed from scratch after the commit (a handful of
+indexed queries), so incremental updates always equal a full ``refresh()``;
+``refresh_rankings`` runs the full recompute periodically to catch bulk
+writes that send no signals.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from core.db import retrying
+from users.search import RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT, normalize
+
+from .models import ProviderRanking, Review, ServiceRequest
+
+RANKING_FIELDS = (
+    "skill_name", "location_key", "location", "review_count", "rating_total", "completed_count", "score",
+)
+
+
+def provider_score(review_count, rating_total, completed_count):
+    weight = getattr(settings, "PROVIDER_RANKING_COMPLETED_WEIGHT", 0.5)
+    bayes = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + rating_total) / (RATING_PRIOR_WEIGHT + review_count)
+    return round(bayes + weight * math.log1p(completed_count), 6)
+
+
+def normalize_key(text):
+    return normalize(text).strip()
+
+
+def build(completed, reviews, locations):
+    """Ranking rows (field dicts) from aggregate rows.
+
+    ``completed``: ``(provider_id, skill_name, count)``; ``reviews``:
+    ``(provider_id, skill_name, count, rating_total)``; ``locations``:
+    ``{provider_id: location}``.
+    """
+    stats = {}
+
+    def slots(provider_id, name):
+        key = normalize_key(name)
+        entry = stats.setdefault((provider_id, key), [name, 0, 0, 0])
+        # The same skill under differently written names: keep one display name
+        entry[0] = min(entry[0], name)
+        return entry, stats.setdefault((provider_id, ""), ["", 0, 0, 0])
+
+    for provider_id, name, count in completed:
+        for entry in slots(provider_id, name):
+            entry[3] += count
+    for provider_id, name, count, total in reviews:
+        for entry in slots(provider_id, name):
+            entry[1] += count
+            entry[2] += total
+
+    rows = []
+    for (provider_id, key), (name, review_count, rating_total, completed_count) in stats.items():
+        location = locations.get(provider_id) or ""
+        rows.append(
+            {
+                "provider_id": provider_id,
+                "skill_key": key,
+                "skill_name": name,
+                "location_key": normalize_key(location),
+                "location": location,
+                "review_count": review_count,
+                "rating_total": rating_total,
+                "completed_count": completed_count,
+                "score": provider_score(review_count, rating_total, completed_count),
+            }
+        )
+    return rows
+
+
+def compute(provider_ids=None):
+    """Ranking rows of ``provider_ids`` (every provider when ``None``) from the source tables."""
+    from users.models import UserProfile
+
+    completed = ServiceRequest.objects.filter(status=ServiceRequest.Status.COMPLETED)
+    reviews = Review.objects.filter(reviewed_user_id=F("transaction__provider_id"))
+    if provider_ids is not None:
+        completed = completed.filter(provider_id__in=provider_ids)
+        reviews = reviews.filter(reviewed_user_id__in=provider_ids)
+    completed = completed.values("provider_id", "offered_skill__name").annotate(n=Count("id"))
+    reviews = reviews.values("reviewed_user_id", "transaction__offered_skill__name").annotate(
+        n=Count("id"), total=Sum("rating")
+    )
+    completed = list(completed.values_list("provider_id", "offered_skill__name", "n"))
+    reviews = list(reviews.values_list("reviewed_user_id", "transaction__offered_skill__name", "n", "total"))
+
+    profiles = UserProfile.objects.exclude(location="")
+    if provider_ids is not None:
+        profiles = profiles.filter(user_id__in=provider_ids)
+    locations = dict(profiles.values_list("user_id", "location"))
+    return build(completed, reviews, locations)
+
+
+def refresh(provider_ids=None, batch_size=1000):
+    """Recompute the rows of ``provider_ids`` (or all) and upsert them; returns rows written.
+
+    Rows keep their id across refreshes; rows that no longer apply are deleted.
+    The transaction reads before it writes, so under SQLite's deferred
+    transactions a concurrent writer can make it fail at once: it is retried
+    (``core.db.retrying``) rather than losing the update.
+    """
+    if provider_ids is not None:
+        provider_ids = list(provider_ids)
+        if not provider_ids:
+            return 0
+    return retrying(_refresh, provider_ids, batch_size)
+
+
+def _refresh(provider_ids, batch_size):
+    with transaction.atomic():
+        existing = ProviderRanking.objects.all()
+        if provider_ids is not None:
+            existing = existing.filter(provider_id__in=provider_ids)
+        # Lock the rows before computing (ignored on SQLite): an overlapping refresh of the same
+        # providers waits for this one to commit instead of writing an older snapshot over it
+        current = list(existing.select_for_update().values_list("pk", "provider_id", "skill_key"))
+        rows = [ProviderRanking(**fields) for fields in compute(provider_ids)]
+        keys = {(row.provider_id, row.skill_key) for row in rows}
+        stale = [pk for pk, *key in current if tuple(key) not in keys]
+        for start in range(0, len(stale), batch_size):
+            ProviderRanking.objects.filter(pk__in=stale[start : start + batch_size]).delete()
+        ProviderRanking.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["provider", "skill_key"],
+            update_fields=RANKING_FIELDS,
+        )
+    return len(rows)
+
+
+def providers_changed(*provider_ids):
+    """Recompute these providers once the current transaction commits."""
+    ids = {pk for pk in provider_ids if pk is not None}
+    if ids:
+        transaction.on_commit(lambda: refresh(ids))
+
+
+def requests_completed(request_ids):
+    """Like ``providers_changed`` for the providers of ``request_ids`` (bulk transitions)."""
+    request_ids = list(request_ids)
+
+    def run():
+        refresh(set(ServiceRequest.objects.filter(pk__in=request_ids).values_list("provider_id", flat=True)))
+
+    transaction.on_commit(run)
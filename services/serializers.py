@@ -0,0 +1,76 @@
+from rest_framework import serializers
+
+from users.models import UserSkill
+
+from .models import FeedEntry, ProviderRanking, ServiceRequest
+
+
+class ServiceRequestSerializer(serializers.ModelSerializer):
+    requester = serializers.CharField(source="requester.username", read_only=True)
+    provider = serializers.CharField(source="provider.username", read_only=True)
+    offered_skill = serializers.PrimaryKeyRelatedField(queryset=UserSkill.objects.select_related("user"))
+
+    class Meta:
+        model = ServiceRequest
+        fields = ("id", "requester", "provider", "offered_skill", "description", "status", "created_at")
+        read_only_fields = ("status", "created_at")
+
+    def validate_offered_skill(self, skill):
+        if skill.user_id == self.context["request"].user.pk:
+            raise serializers.ValidationError("You cannot request your own skill.")
+        return skill
+
+
+class BoxSkillSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserSkill
+        fields = ("id", "name")
+
+
+class ServiceRequestBoxSerializer(serializers.ModelSerializer):
+    """Inbox/outbox row: the skill and the other party, both select_related()."""
+
+    offered_skill = BoxSkillSerializer(read_only=True)
+    counterpart = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ServiceRequest
+        fields = ("id", "offered_skill", "counterpart", "description", "status", "created_at")
+
+    def get_counterpart(self, obj):
+        user = getattr(obj, self.context["counterpart"])
+        return {"id": user.pk, "username": user.username}
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["accept", "complete", "cancel"])
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+
+
+class ProviderRankingSerializer(serializers.ModelSerializer):
+    provider = serializers.SerializerMethodField()
+    skill = serializers.CharField(source="skill_name")
+    average_rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProviderRanking
+        fields = ("provider", "skill", "location", "score", "average_rating", "review_count", "completed_count")
+
+    def get_provider(self, obj):
+        return {"id": obj.provider_id, "username": obj.provider.username}
+
+    def get_average_rating(self, obj):
+        if not obj.review_count:
+            return None
+        return round(obj.rating_total / obj.review_count, 2)
+
+
+class FeedEntrySerializer(serializers.ModelSerializer):
+    actor = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FeedEntry
+        fields = ("id", "actor", "verb", "object_id", "summary", "created_at")
+
+    def get_actor(self, obj):
+        return {"id": obj.actor_id, "username": obj.actor.username}
@@ -0,0 +1,168 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from users.signals import skills_imported
+
+from . import feed, matching, rankings, skill_counters
+from .models import Review, ServiceRequest
+
+# Sent by ServiceRequestQuerySet.transition() after a conditional UPDATE
+# (which bypasses post_save), once per source status, inside the transaction:
+# sender=ServiceRequest, request_ids=[...], from_status, to_status.
+request_status_changed = Signal()
+
+
+# -- matching engine (services.matching) ------------------------------------
+
+@receiver(post_save, sender="users.UserSkill")
+def update_offers_on_skill_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "name" not in update_fields):
+        return
+    matching.offers_changed(instance.user_id)
+    if not created:
+        # A renamed skill also changes what its past requesters wanted
+        requesters = ServiceRequest.objects.filter(offered_skill=instance).values_list("requester_id", flat=True)
+        for user_id in set(requesters):
+            matching.wants_changed(user_id)
+
+
+@receiver(skills_imported)
+def update_offers_on_skill_import(sender, user_id, created, **kwargs):
+    # Updates only touch descriptions, which matching ignores
+    if created:
+        matching.offers_changed(user_id)
+
+
+@receiver(post_delete, sender="users.UserSkill")
+def update_offers_on_skill_delete(sender, instance, **kwargs):
+    matching.offers_changed(instance.user_id)
+
+
+@receiver(post_save, sender=ServiceRequest)
+def update_wants_on_request_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        matching.wants_changed(instance.requester_id)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def update_wants_on_request_delete(sender, instance, **kwargs):
+    matching.wants_changed(instance.requester_id)
+
+
+# -- provider rankings (services.rankings) ----------------------------------
+
+@receiver([post_save, post_delete], sender=Review)
+def update_rankings_on_review_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.previous_values() or {}
+    rankings.providers_changed(instance.reviewed_user_id, previous.get("reviewed_user_id"))
+
+
+@receiver(post_save, sender=ServiceRequest)
+def update_rankings_on_request_save(sender, instance, created, raw=False, **kwargs):
+    # New requests are pending: they only count once completed
+    if not raw and (not created or instance.status == ServiceRequest.Status.COMPLETED):
+        rankings.providers_changed(instance.provider_id)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def update_rankings_on_request_delete(sender, instance, **kwargs):
+    rankings.providers_changed(instance.provider_id)
+
+
+@receiver(request_status_changed)
+def update_rankings_on_transition(sender, request_ids, to_status, **kwargs):
+    if to_status == ServiceRequest.Status.COMPLETED:
+        rankings.requests_completed(request_ids)
+
+
+@receiver(post_save, sender="users.UserSkill")
+def update_rankings_on_skill_rename(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created or (update_fields is not None and "name" not in update_fields):
+        return
+    rankings.providers_changed(instance.user_id)
+
+
+@receiver(post_save, sender="users.UserProfile")
+def update_rankings_on_location_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rankings.providers_changed(instance.user_id)
+
+
+# -- per-skill counters (services.skill_counters) ---------------------------
+
+@receiver(post_save, sender=ServiceRequest)
+def update_skill_counters_on_request_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata: run check_skill_counters afterwards
+        return
+    skill_counters.request_saved(instance, created)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def update_skill_counters_on_request_delete(sender, instance, **kwargs):
+    skill_counters.request_deleted(instance)
+
+
+@receiver(request_status_changed)
+def update_skill_counters_on_transition(sender, request_ids, from_status, to_status, **kwargs):
+    skill_counters.requests_transitioned(request_ids, from_status, to_status)
+
+
+@receiver(post_save, sender=Review)
+def update_skill_counters_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        skill_counters.review_saved(instance, created)
+
+
+@receiver(post_delete, sender=Review)
+def update_skill_counters_on_review_delete(sender, instance, **kwargs):
+    skill_counters.review_deleted(instance)
+
+
+# -- activity feed (services.feed) ------------------------------------------
+
+@receiver(post_save, sender="users.UserSkill")
+def publish_skill_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.skill_added(instance)
+
+
+@receiver(skills_imported)
+def publish_imported_skills(sender, user_id, created_ids=(), **kwargs):
+    if created_ids:
+        feed.skills_imported(user_id, created_ids)
+
+
+@receiver(post_delete, sender="users.UserSkill")
+def remove_skill_from_feed(sender, instance, **kwargs):
+    feed.remove(feed.Verb.SKILL_ADDED, instance.pk)
+
+
+@receiver(post_save, sender=ServiceRequest)
+def update_feed_on_request_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        feed.request_saved(instance, created)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def remove_request_from_feed(sender, instance, **kwargs):
+    feed.remove(feed.Verb.SWAP_COMPLETED, instance.pk)
+
+
+@receiver(request_status_changed)
+def publish_completed_swaps(sender, request_ids, to_status, **kwargs):
+    if to_status == ServiceRequest.Status.COMPLETED:
+        feed.requests_completed(request_ids)
+
+
+@receiver(post_save, sender=Review)
+def publish_review_posted(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.review_posted(instance)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_feed(sender, instance, **kwargs):
+    feed.remove(feed.Verb.REVIEW_POSTED, instance.pk)
@@ -0,0 +1,180 @@
+"""Request and review counters stored on ``users.UserSkill``.
+
+``request_count`` and one ``<status>_count`` per ``ServiceRequest.Status``
+count the requests made for a skill; ``review_count``/``rating_total`` the
+reviews its provider received for them (as in the rankings, only reviews
+written about the request's provider count).
+
+The signals in ``services.signals`` turn every request creation, save,
+transition and delete, and every review change, into ``F()`` deltas applied
+in the writer's transaction, so concurrent writers never lose updates and
+listings read plain columns. Decrements stop at zero instead of failing a
+delete. Writes that send no signals (``bulk_create``, raw ``update()``) are
+caught by ``check()`` (``python manage.py check_skill_counters``), which
+recounts from the source tables and repairs the skills that drifted.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest
+
+from users.models import UserSkill
+
+from .models import Review, ServiceRequest
+
+STATUS_FIELDS = {status.value: f"{status.value.lower()}_count" for status in ServiceRequest.Status}
+COUNTER_FIELDS = ("request_count", *STATUS_FIELDS.values(), "review_count", "rating_total")
+
+
+def apply_deltas(skill_id, deltas):
+    """Add ``{field: n}`` to the counters of ``skill_id``."""
+    updates = {
+        field: F(field) + n if n > 0 else Greatest(F(field) + n, 0)
+        for field, n in deltas.items()
+        if n
+    }
+    if skill_id is not None and updates:
+        UserSkill.objects.filter(pk=skill_id).update(**updates)
+
+
+def _request_deltas(status, sign):
+    deltas = {"request_count": sign}
+    if status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[status]] = sign
+    return deltas
+
+
+def request_saved(request, created):
+    previous = request.previous_values()
+    if created:
+        apply_deltas(request.offered_skill_id, _request_deltas(request.status, 1))
+    elif previous is None:
+        # Saved without being loaded first: no delta to compute
+        check([request.offered_skill_id])
+    elif previous["offered_skill_id"] != request.offered_skill_id:
+        # Its review moves along too: recount both skills
+        check([previous["offered_skill_id"], request.offered_skill_id])
+    elif previous["status"] != request.status:
+        deltas = _request_deltas(request.status, 1)
+        for field, n in _request_deltas(previous["status"], -1).items():
+            deltas[field] = deltas.get(field, 0) + n
+        apply_deltas(request.offered_skill_id, deltas)
+
+
+def request_deleted(request):
+    # Prefer what is stored in the database over unsaved in-memory edits
+    previous = request.previous_values() or {}
+    apply_deltas(
+        previous.get("offered_skill_id", request.offered_skill_id),
+        _request_deltas(previous.get("status", request.status), -1),
+    )
+
+
+def requests_transitioned(request_ids, from_status, to_status):
+    """Counters for ``ServiceRequestQuerySet.transition()``: one ``UPDATE`` whatever the number of skills."""
+    requests = ServiceRequest.objects.filter(pk__in=request_ids)
+    moved = Subquery(
+        requests.filter(offered_skill_id=OuterRef("pk"))
+        .order_by()
+        .values("offered_skill_id")
+        .annotate(n=Count("id"))
+        .values("n"),
+        output_field=IntegerField(),
+    )
+    source, target = STATUS_FIELDS[from_status], STATUS_FIELDS[to_status]
+    UserSkill.objects.filter(pk__in=requests.values("offered_skill_id")).update(
+        **{source: Greatest(F(source) - moved, 0), target: F(target) + moved}
+    )
+
+
+def _review_deltas(provider_id, reviewed_user_id, rating, sign):
+    if reviewed_user_id is None or reviewed_user_id != provider_id or rating is None:
+        return {}
+    return {"review_count": sign, "rating_total": sign * rating}
+
+
+def review_saved(review, created):
+    request = ServiceRequest.objects.filter(pk=review.transaction_id).values("offered_skill_id", "provider_id").first()
+    if request is None:
+        return
+    skill_id, provider_id = request["offered_skill_id"], request["provider_id"]
+    previous = review.previous_values()
+    if created:
+        apply_deltas(skill_id, _review_deltas(provider_id, review.reviewed_user_id, review.rating, 1))
+    elif previous is None:
+        check([skill_id])
+    else:
+        deltas = _review_deltas(provider_id, review.reviewed_user_id, review.rating, 1)
+        for field, n in _review_deltas(provider_id, previous["reviewed_user_id"], previous["rating"], -1).items():
+            deltas[field] = deltas.get(field, 0) + n
+        apply_deltas(skill_id, deltas)
+
+
+def review_deleted(review):
+    # Reviews are deleted before their request in a cascade, so it is still there
+    request = ServiceRequest.objects.filter(pk=review.transaction_id).values("offered_skill_id", "provider_id").first()
+    if request is None:
+        return
+    previous = review.previous_values() or {}
+    apply_deltas(
+        request["offered_skill_id"],
+        _review_deltas(
+            request["provider_id"],
+            previous.get("reviewed_user_id", review.reviewed_user_id),
+            previous.get("rating", review.rating),
+            -1,
+        ),
+    )
+
+
+def compute(skill_ids=None):
+    """``{skill_id: {field: value}}`` recounted from the source tables (skills with requests only)."""
+    requests = ServiceRequest.objects.all()
+    reviews = Review.objects.filter(reviewed_user_id=F("transaction__provider_id"))
+    if skill_ids is not None:
+        requests = requests.filter(offered_skill_id__in=skill_ids)
+        reviews = reviews.filter(transaction__offered_skill_id__in=skill_ids)
+
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    by_status = requests.values("offered_skill_id", "status").annotate(n=Count("id")).order_by()
+    for skill_id, status, n in by_status.values_list("offered_skill_id", "status", "n"):
+        for field, value in _request_deltas(status, n).items():
+            counters[skill_id][field] += value
+    by_skill = reviews.values("transaction__offered_skill_id").annotate(n=Count("id"), total=Sum("rating")).order_by()
+    for skill_id, n, total in by_skill.values_list("transaction__offered_skill_id", "n", "total"):
+        counters[skill_id]["review_count"] = n
+        counters[skill_id]["rating_total"] = total
+    return counters
+
+
+def check(skill_ids=None, repair=True, batch_size=1000):
+    """Compare the stored counters of ``skill_ids`` (or all) with a recount.
+
+    Returns ``[(skill_id, {field: (stored, expected)})]`` for the skills that
+    drifted and, with ``repair``, writes the expected values. The recount and
+    the repair run in one transaction so concurrent deltas are not lost.
+    """
+    if skill_ids is not None:
+        skill_ids = [pk for pk in skill_ids if pk is not None]
+        if not skill_ids:
+            return []
+    zero = dict.fromkeys(COUNTER_FIELDS, 0)
+    with transaction.atomic():
+        expected = compute(skill_ids)
+        stored = UserSkill.objects.order_by("pk")
+        if skill_ids is not None:
+            stored = stored.filter(pk__in=skill_ids)
+        drifted = []
+        for pk, *values in stored.values_list("pk", *COUNTER_FIELDS).iterator(chunk_size=batch_size):
+            want = expected.get(pk, zero)
+            diff = {
+                field: (value, want[field]) for field, value in zip(COUNTER_FIELDS, values) if value != want[field]
+            }
+            if diff:
+                drifted.append((pk, diff))
+        if repair and drifted:
+            UserSkill.objects.bulk_update(
+                [UserSkill(pk=pk, **expected.get(pk, zero)) for pk, _ in drifted], COUNTER_FIELDS, batch_size=batch_size
+            )
+    return drifted
@@ -1,3 +1,734 @@
-from django.test import TestCase
+import random
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.queries import QueryBudgetTestMixin
+from users.models import UserProfile, UserSkill
+
+from . import feed, matching, rankings, skill_counters
+from .models import FeedContact, FeedEntry, ProviderRanking, Review, ServiceRequest
+from .signals import request_status_changed
+
+Status = ServiceRequest.Status
+
+
+def make_requests(requester, provider, skill, count):
+    return ServiceRequest.objects.bulk_create(
+        [ServiceRequest(requester=requester, provider=provider, offered_skill=skill, description="x") for _ in range(count)]
+    )
+
+
+class ServiceRequestTransitionTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.requester = User.objects.create_user(username="req", password="x")
+        self.provider = User.objects.create_user(username="prov", password="x")
+        self.skill = UserSkill.objects.create(user=self.provider, name="Violão")
+
+    def test_only_allowed_sources_move(self):
+        pending, accepted, completed = make_requests(self.requester, self.provider, self.skill, 3)
+        ServiceRequest.objects.filter(pk=accepted.pk).update(status=Status.ACCEPTED)
+        ServiceRequest.objects.filter(pk=completed.pk).update(status=Status.COMPLETED)
+
+        events = []
+        handler = lambda sender, **kwargs: events.append((kwargs["from_status"], kwargs["to_status"], kwargs["request_ids"]))
+        request_status_changed.connect(handler)
+        self.addCleanup(request_status_changed.disconnect, handler)
+
+        moved = ServiceRequest.objects.all().transition(Status.CANCELED)
+        self.assertEqual(moved, {Status.PENDING: [pending.pk], Status.ACCEPTED: [accepted.pk]})
+        self.assertEqual(
+            events,
+            [(Status.PENDING, Status.CANCELED, [pending.pk]), (Status.ACCEPTED, Status.CANCELED, [accepted.pk])],
+        )
+        completed.refresh_from_db()
+        self.assertEqual(completed.status, Status.COMPLETED)
+        # Final states never move again
+        self.assertEqual(ServiceRequest.objects.all().transition(Status.ACCEPTED), {})
+
+    def test_stale_instance_cannot_overwrite(self):
+        (request,) = make_requests(self.requester, self.provider, self.skill, 1)
+        stale = ServiceRequest.objects.get(pk=request.pk)
+        ServiceRequest.objects.filter(pk=request.pk).transition(Status.CANCELED)
+        # The stale copy still says PENDING, but the conditional UPDATE sees CANCELED
+        self.assertTrue(stale.can_transition(Status.ACCEPTED))
+        self.assertEqual(ServiceRequest.objects.filter(pk=stale.pk).transition(Status.ACCEPTED), {})
+
+
+class ServiceRequestApiTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.requester = User.objects.create_user(username="req", password="x")
+        self.provider = User.objects.create_user(username="prov", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        self.skill = UserSkill.objects.create(user=self.provider, name="Violão")
+        self.bulk_url = reverse("services:services-api:requests-bulk-transition")
+
+    def _action_url(self, request, name):
+        return reverse(f"services:services-api:requests-{name}", args=[request.pk])
+
+    def test_create_sets_parties_from_skill(self):
+        self.client.force_authenticate(self.requester)
+        response = self.client.post(
+            reverse("services:services-api:requests-list"), {"offered_skill": self.skill.pk, "description": "Aulas"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["provider"], response.data["status"]), ("prov", Status.PENDING))
+
+        self.client.force_authenticate(self.provider)
+        response = self.client.post(
+            reverse("services:services-api:requests-list"), {"offered_skill": self.skill.pk, "description": "x"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_transitions(self):
+        (request,) = make_requests(self.requester, self.provider, self.skill, 1)
+        self.client.force_authenticate(self.requester)
+        self.assertEqual(self.client.post(self._action_url(request, "accept")).status_code, 403)
+
+        self.client.force_authenticate(self.provider)
+        response = self.client.post(self._action_url(request, "accept"))
+        self.assertEqual((response.status_code, response.data["status"]), (200, Status.ACCEPTED))
+        self.assertEqual(self.client.post(self._action_url(request, "accept")).status_code, 409)
+        self.assertEqual(self.client.post(self._action_url(request, "complete")).data["status"], Status.COMPLETED)
+
+        self.client.force_authenticate(self.requester)
+        self.assertEqual(self.client.post(self._action_url(request, "cancel")).status_code, 409)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.post(self._action_url(request, "cancel")).status_code, 404)
+
+    def test_bulk_accept_in_constant_queries(self):
+        requests = make_requests(self.requester, self.provider, self.skill, 300)
+        ServiceRequest.objects.filter(pk=requests[0].pk).update(status=Status.CANCELED)
+        foreign = make_requests(self.provider, self.other, UserSkill.objects.create(user=self.other, name="Yoga"), 1)
+
+        self.client.force_authenticate(self.provider)
+        ids = [r.pk for r in requests] + [foreign[0].pk, 999999]
+        # 2 savepoints, one UPDATE ... RETURNING for the one source status, the
+        # skill counters' UPDATE, rejected lookup: independent of how many
+        # requests are in the batch
+        with self.assertNumQueries(7):
+            response = self.client.post(self.bulk_url, {"action": "accept", "ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], sorted(r.pk for r in requests[1:]))
+        self.assertEqual(
+            response.data["rejected"],
+            {str(requests[0].pk): Status.CANCELED, str(foreign[0].pk): "not_found", "999999": "not_found"},
+        )
+        self.assertEqual(ServiceRequest.objects.filter(status=Status.ACCEPTED).count(), 299)
+
+        # Either party may cancel: the provider's own outgoing request is included
+        response = self.client.post(self.bulk_url, {"action": "cancel", "ids": ids}, format="json")
+        self.assertEqual(len(response.data["updated"]), 300)
+        self.assertIn(foreign[0].pk, response.data["updated"])
+
+    def test_transition_reports_exactly_the_rows_it_moved(self):
+        requests = make_requests(self.requester, self.provider, self.skill, 4)
+        ServiceRequest.objects.filter(pk=requests[0].pk).update(status=Status.ACCEPTED)
+        ServiceRequest.objects.filter(pk=requests[1].pk).update(status=Status.COMPLETED)
+        for returning in (True, False):
+            with self.subTest(returning=returning), transaction.atomic():
+                signalled = []
+
+                def receiver(sender, request_ids, from_status, **kwargs):
+                    signalled.append((from_status, request_ids))
+
+                request_status_changed.connect(receiver)
+                try:
+                    with mock.patch("services.models._update_returns_rows", return_value=returning):
+                        moved = ServiceRequest.objects.filter(pk__in=[r.pk for r in requests]).transition(
+                            Status.CANCELED
+                        )
+                finally:
+                    request_status_changed.disconnect(receiver)
+                self.assertEqual(
+                    {source: sorted(ids) for source, ids in moved.items()},
+                    {Status.PENDING: [requests[2].pk, requests[3].pk], Status.ACCEPTED: [requests[0].pk]},
+                )
+                self.assertEqual(sorted(signalled), sorted(moved.items()))
+                self.assertEqual(ServiceRequest.objects.get(pk=requests[1].pk).status, Status.COMPLETED)
+                transaction.set_rollback(True)
+
+    def test_bulk_rejects_bad_payload(self):
+        self.client.force_authenticate(self.provider)
+        response = self.client.post(self.bulk_url, {"action": "delete", "ids": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class ServiceRequestBoxTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.provider = User.objects.create_user(username="prov", password="x")
+        self.requesters = [User.objects.create_user(username=f"req{i}", password="x") for i in range(6)]
+        self.skills = [UserSkill.objects.create(user=self.provider, name=f"Skill {i}") for i in range(3)]
+        for i in range(30):
+            make_requests(self.requesters[i % 6], self.provider, self.skills[i % 3], 1)
+        ServiceRequest.objects.filter(pk__in=ServiceRequest.objects.order_by("id").values("pk")[:5]).update(
+            status=Status.ACCEPTED
+        )
+        self.inbox_url = reverse("services:services-api:requests-inbox")
+
+    def _walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_inbox_pages_newest_first_by_status(self):
+        self.client.force_authenticate(self.provider)
+        pending = list(
+            ServiceRequest.objects.filter(status=Status.PENDING).order_by("-created_at", "-id").values_list("pk", flat=True)
+        )
+        self.assertEqual(self._walk(self.inbox_url, {"page_size": 7}), pending)
+        self.assertEqual(len(self._walk(self.inbox_url, {"status": "accepted"})), 5)
+        self.assertEqual(self.client.get(self.inbox_url, {"status": "bogus"}).status_code, 400)
+
+        row = self.client.get(self.inbox_url, {"page_size": 1}).data["results"][0]
+        request = ServiceRequest.objects.get(pk=row["id"])
+        self.assertEqual(row["counterpart"]["username"], request.requester.username)
+        self.assertEqual(row["offered_skill"]["name"], request.offered_skill.name)
+
+    def test_outbox_shows_the_provider(self):
+        self.client.force_authenticate(self.requesters[0])
+        response = self.client.get(reverse("services:services-api:requests-outbox"))
+        # req0 made 5 requests; the oldest one was accepted
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual({row["counterpart"]["username"] for row in response.data["results"]}, {"prov"})
+
+    def test_page_query_count_does_not_grow_with_page_size(self):
+        self.client.force_authenticate(self.provider)
+        for page_size in (1, 25):
+            with self.assertNumQueries(1):
+                response = self.client.get(self.inbox_url, {"page_size": page_size})
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_box_queries_use_composite_indexes(self):
+        for owner in ("provider", "requester"):
+            plan = (
+                ServiceRequest.objects.filter(**{owner: self.provider, "status": Status.PENDING})
+                .order_by("-created_at", "-id")
+                .explain()
+            )
+            self.assertIn(f"svcreq_{owner}_status_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+
+class MatchingTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        matching.engine.clear()
+        self.addCleanup(matching.engine.clear)
+        User = get_user_model()
+        names = ("alice", "bob", "dave", "erin", "frank")
+        self.users = {name: User.objects.create_user(username=name, password="x") for name in names}
+        self.skills = {
+            "python": self._skill("alice", "Python"),
+            "violao": self._skill("bob", "Violão"),
+            "violao2": self._skill("dave", "violao"),
+            "ceramica": self._skill("erin", "Cerâmica"),
+            "xadrez": self._skill("frank", "Xadrez"),
+        }
+        # alice <-> bob trade directly; alice -> erin -> frank -> alice is a cycle
+        self._request("alice", "violao")
+        self._request("bob", "python")
+        self._request("erin", "python")
+        self._request("frank", "ceramica")
+        self._request("alice", "xadrez")
+
+    def _skill(self, username, name):
+        return UserSkill.objects.create(user=self.users[username], name=name)
+
+    def _request(self, username, skill):
+        skill = self.skills[skill]
+        return ServiceRequest.objects.create(
+            requester=self.users[username], provider=skill.user, offered_skill=skill, description="x"
+        )
+
+    def _uid(self, name):
+        return self.users[name].pk
+
+    def test_reciprocal_and_cycles(self):
+        reciprocal, cycles = matching.find_matches(self._uid("alice"))
+        self.assertEqual(reciprocal, [(self._uid("bob"), 2, ["Violão"], ["Python"])])
+        self.assertEqual(cycles, [(self._uid("erin"), self._uid("frank"), "Python", "Cerâmica", "Xadrez")])
+        # frank gets nothing from alice directly, so no reciprocal match there
+        self.assertEqual(matching.find_matches(self._uid("frank"))[0], [])
+
+    def test_incremental_updates(self):
+        matching.find_matches(self._uid("alice"))
+        # dave (offers "violao", accent-insensitive) starts wanting Python
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request("dave", "python")
+        reciprocal, _ = matching.find_matches(self._uid("alice"))
+        self.assertEqual([other for other, *_ in reciprocal], [self._uid("bob"), self._uid("dave")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skills["python"].delete()
+        self.assertEqual(matching.find_matches(self._uid("alice")), ([], []))
+
+        # Incremental state equals a full rebuild
+        offers, wants = dict(matching.engine.offers), dict(matching.engine.wants)
+        matching.engine.rebuild()
+        self.assertEqual((offers, wants), (dict(matching.engine.offers), dict(matching.engine.wants)))
+
+    def test_cycles_rank_candidates_by_coverage_not_id(self):
+        engine = matching.MatchingEngine()
+
+        def user(user_id, offers, wants):
+            engine._apply(engine.offers, engine.offerers, user_id, offers)
+            engine._apply(engine.wants, engine.wanters, user_id, wants)
+
+        user(1, ["python"], ["xadrez", "violao"])
+        user(2, ["ceramica"], ["python"])
+        # More low-id providers of a wanted skill than the candidate cap, none closing a cycle
+        for other in range(10, 10 + matching.CYCLE_CANDIDATES + 5):
+            user(other, ["xadrez"], ["tricô"])
+        user(1000, ["xadrez", "violao"], ["ceramica"])
+        self.assertEqual(engine.cycles(1), [(2, 1000, "python", "ceramica", "violao")])
+
+    def test_background_rebuild_starts_once(self):
+        matching.engine.rebuild()
+        matching.engine._built_at -= 3600
+        with mock.patch("services.matching.threading.Thread") as thread:
+            matching.engine.ensure_fresh()
+            matching.engine.ensure_fresh()
+        thread.assert_called_once()
+        matching.engine._rebuilding = False
+
+    def test_matches_api(self):
+        self.client.force_authenticate(self.users["alice"])
+        response = self.client.get(reverse("services:matches"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["reciprocal"][0]["user"]["username"], "bob")
+        cycle = response.data["cycles"][0]
+        self.assertEqual((cycle["give_to"]["username"], cycle["get_from"]["username"]), ("erin", "frank"))
+        self.assertEqual(self.client.get(reverse("services:matches"), {"cycles": 0}).data["cycles"], [])
+
+
+class ProviderRankingRetryTests(TransactionTestCase):
+    def test_locked_database_is_retried(self):
+        User = get_user_model()
+        provider, requester = (User.objects.create_user(username=name, password="x") for name in ("ana", "bia"))
+        skill = UserSkill.objects.create(user=provider, name="Violão")
+        ServiceRequest.objects.create(
+            requester=requester, provider=provider, offered_skill=skill, description="x", status=Status.COMPLETED
+        )
+        ProviderRanking.objects.all().delete()
+        compute = rankings.compute
+        calls = []
+
+        def locked_once(provider_ids=None):
+            calls.append(provider_ids)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return compute(provider_ids)
+
+        with mock.patch.object(rankings, "compute", locked_once), mock.patch("core.db.time.sleep"):
+            written = rankings.refresh([provider.pk])
+        self.assertEqual(len(calls), 2)
+        self.assertGreater(written, 0)
+        self.assertEqual(ProviderRanking.objects.filter(provider=provider).count(), written)
+
+
+class ProviderRankingTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f"user{i}", password="x") for i in range(6)]
+        cities = ["São Paulo", "Recife", "sao paulo"]
+        self.profiles = [
+            UserProfile.objects.create(user=user, location=cities[i % 3]) for i, user in enumerate(self.users)
+        ]
+        names = ["Violão", "violao", "Python", "Xadrez"]
+        self.skills = [UserSkill.objects.create(user=user, name=names[i % 4]) for i, user in enumerate(self.users)]
+
+    def _snapshot(self):
+        fields = ("provider_id", "skill_key") + rankings.RANKING_FIELDS
+        return sorted(ProviderRanking.objects.values_list(*fields))
+
+    def _complete(self, requester, skill, rating=None):
+        request = ServiceRequest.objects.create(
+            requester=requester, provider=skill.user, offered_skill=skill, description="x"
+        )
+        ServiceRequest.objects.filter(pk=request.pk).transition(Status.ACCEPTED)
+        ServiceRequest.objects.filter(pk=request.pk).transition(Status.COMPLETED)
+        if rating is not None:
+            Review.objects.create(transaction=request, reviewer=requester, reviewed_user=skill.user, rating=rating)
+        return request
+
+    def test_incremental_updates_match_full_recompute(self):
+        rng = random.Random(7)
+        requests, reviews = [], []
+        for step in range(60):
+            op = rng.choice(["complete", "complete", "review", "rerate", "unreview", "rename", "move", "delete"])
+            with self.captureOnCommitCallbacks(execute=True):
+                if op == "complete":
+                    skill = rng.choice(self.skills)
+                    requester = rng.choice([u for u in self.users if u != skill.user])
+                    requests.append(self._complete(requester, skill))
+                elif op == "review" and requests:
+                    request = rng.choice(requests)
+                    if not hasattr(request, "review"):
+                        reviews.append(
+                            Review.objects.create(
+                                transaction=request, reviewer=request.requester, reviewed_user=request.provider,
+                                rating=rng.randint(1, 5),
+                            )
+                        )
+                elif op == "rerate" and reviews:
+                    review = Review.objects.get(pk=rng.choice(reviews).pk)
+                    review.rating = rng.randint(1, 5)
+                    review.save()
+                elif op == "unreview" and reviews:
+                    Review.objects.get(pk=reviews.pop(rng.randrange(len(reviews))).pk).delete()
+                elif op == "rename":
+                    skill = rng.choice(self.skills)
+                    skill.name = rng.choice(["Violão", "Python", "Xadrez", "Cerâmica"])
+                    if not UserSkill.objects.filter(user=skill.user, name=skill.name).exclude(pk=skill.pk).exists():
+                        skill.save()
+                elif op == "move":
+                    profile = rng.choice(self.profiles)
+                    profile.location = rng.choice(["Recife", "Natal", ""])
+                    profile.save()
+                elif op == "delete" and requests:
+                    request = requests.pop(rng.randrange(len(requests)))
+                    reviews = [r for r in reviews if r.transaction_id != request.pk]
+                    request.delete()
+            incremental = self._snapshot()
+            rankings.refresh()
+            self.assertEqual(incremental, self._snapshot(), f"step {step} ({op})")
+        self.assertTrue(ProviderRanking.objects.exists())
+
+    def test_review_about_the_requester_is_not_counted(self):
+        provider, requester = self.users[0], self.users[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            request = self._complete(requester, self.skills[0])
+            Review.objects.create(transaction=request, reviewer=provider, reviewed_user=requester, rating=1)
+        row = ProviderRanking.objects.get(provider=provider, skill_key="violao")
+        self.assertEqual((row.review_count, row.completed_count), (0, 1))
+        self.assertFalse(ProviderRanking.objects.filter(provider=requester).exists())
+
+    def test_leaderboard_api(self):
+        # user0 "Violão" (São Paulo), user1 "violao" and user4 "Violão" (both Recife) share a skill
+        with self.captureOnCommitCallbacks(execute=True):
+            for rating in (5, 5, 4):
+                self._complete(self.users[2], self.skills[0], rating)
+            self._complete(self.users[2], self.skills[1], 5)
+            self._complete(self.users[3], self.skills[4], 2)
+            self._complete(self.users[0], self.skills[2], 3)
+
+        url = reverse("services:rankings")
+        response = self.client.get(url, {"skill": "VIOLAO"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["provider"]["username"] for r in results], ["user0", "user1", "user4"])
+        self.assertEqual(results[0]["average_rating"], 4.67)
+        self.assertEqual(results[0]["completed_count"], 3)
+
+        response = self.client.get(url, {"skill": "violão", "location": "recife"})
+        self.assertEqual([r["provider"]["username"] for r in response.json()["results"]], ["user1", "user4"])
+        # "São Paulo" (user0) and "sao paulo" (user2) are the same place
+        response = self.client.get(url, {"location": "SAO PAULO"})
+        self.assertEqual([r["provider"]["username"] for r in response.json()["results"]], ["user0", "user2"])
+
+        # No skill: one overall row per provider
+        response = self.client.get(url, {"page_size": 2})
+        body = response.json()
+        self.assertEqual([r["provider"]["username"] for r in body["results"]], ["user0", "user1"])
+        self.assertEqual(body["results"][0]["completed_count"], 3)
+        page = self.client.get(body["next"]).json()
+        self.assertEqual([r["provider"]["username"] for r in page["results"]], ["user2", "user4"])
+        self.assertIsNone(page["next"])
+        self.assertEqual(self.client.get(url, {"cursor": "nonsense"}).status_code, 404)
+
+
+class SkillCounterTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f"user{i}", password="x") for i in range(4)]
+        self.skills = [
+            UserSkill.objects.create(user=self.users[i % 2], name=name)
+            for i, name in enumerate(["Violão", "Python", "Xadrez", "Cerâmica"])
+        ]
+
+    def _counters(self, skill):
+        return UserSkill.objects.filter(pk=skill.pk).values(*skill_counters.COUNTER_FIELDS).get()
+
+    def test_incremental_counters_match_recount(self):
+        rng = random.Random(11)
+        ops = ["create", "create", "transition", "save", "move", "review", "rerate", "unreview", "delete"]
+        reviewed_steps = 0
+        for step in range(80):
+            op = rng.choice(ops)
+            requests = list(ServiceRequest.objects.all())
+            if op == "create":
+                skill = rng.choice(self.skills)
+                requester = rng.choice([u for u in self.users if u.pk != skill.user_id])
+                ServiceRequest.objects.create(
+                    requester=requester, provider=skill.user, offered_skill=skill, description="x"
+                )
+            elif op == "transition" and requests:
+                ids = [r.pk for r in rng.sample(requests, rng.randint(1, len(requests)))]
+                target = rng.choice([Status.ACCEPTED, Status.COMPLETED, Status.CANCELED])
+                ServiceRequest.objects.filter(pk__in=ids).transition(target)
+            elif op == "save" and requests:
+                request = rng.choice(requests)
+                request.status = rng.choice(Status.values)
+                request.save()
+            elif op == "move" and requests:
+                request = rng.choice(requests)
+                request.offered_skill = rng.choice([s for s in self.skills if s.user_id == request.provider_id])
+                request.save()
+            elif op == "review" and requests:
+                request = rng.choice(requests)
+                if not Review.objects.filter(transaction=request).exists():
+                    # Reviews about the requester do not count for the skill
+                    reviewed = rng.choice([request.provider, request.provider, request.requester])
+                    Review.objects.create(
+                        transaction=request, reviewer=request.requester, reviewed_user=reviewed,
+                        rating=rng.randint(1, 5),
+                    )
+            elif op == "rerate" and Review.objects.exists():
+                review = rng.choice(list(Review.objects.select_related("transaction")))
+                review.rating = rng.randint(1, 5)
+                review.reviewed_user_id = rng.choice([review.transaction.provider_id, review.transaction.requester_id])
+                review.save()
+            elif op == "unreview" and Review.objects.exists():
+                rng.choice(list(Review.objects.all())).delete()
+            elif op == "delete" and requests:
+                rng.choice(requests).delete()
+            self.assertEqual(skill_counters.check(repair=False), [], f"step {step} ({op})")
+            reviewed_steps += UserSkill.objects.filter(review_count__gt=0).exists()
+        self.assertGreater(reviewed_steps, 0)
+
+    def test_editing_a_skill_keeps_concurrent_counter_deltas(self):
+        from users.serializers import UserSkillSerializer
+
+        def new_request():
+            ServiceRequest.objects.create(
+                requester=self.users[2], provider=self.users[0], offered_skill=self.skills[0], description="x"
+            )
+
+        skill = UserSkill.objects.get(pk=self.skills[0].pk)
+        # A request lands between loading the skill and saving the edit
+        new_request()
+        skill.description = "edited"
+        skill.save()
+        self.assertEqual(self._counters(skill)["request_count"], 1)
+        self.assertEqual(UserSkill.objects.get(pk=skill.pk).description, "edited")
+
+        update = UserSkillSerializer.update
+
+        def update_after_a_request(serializer, instance, validated_data):
+            new_request()
+            return update(serializer, instance, validated_data)
+
+        self.client.force_authenticate(self.users[0])
+        url = reverse("users:users-api:skills-detail", args=[skill.pk])
+        with mock.patch.object(UserSkillSerializer, "update", update_after_a_request):
+            response = self.client.patch(url, {"description": "again"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._counters(skill)["request_count"], 2)
+        self.assertEqual(skill_counters.check(repair=False), [])
+
+    def test_transition_moves_counts_between_statuses(self):
+        requests = [
+            ServiceRequest.objects.create(
+                requester=self.users[2], provider=skill.user, offered_skill=skill, description="x"
+            )
+            for skill in [self.skills[0]] * 3 + [self.skills[1]] * 2
+        ]
+        ServiceRequest.objects.filter(pk__in=[r.pk for r in requests[1:]]).transition(Status.ACCEPTED)
+        counters = self._counters(self.skills[0])
+        self.assertEqual((counters["request_count"], counters["pending_count"], counters["accepted_count"]), (3, 1, 2))
+        counters = self._counters(self.skills[1])
+        self.assertEqual((counters["pending_count"], counters["accepted_count"]), (0, 2))
+
+    def test_check_command_repairs_drift(self):
+        # bulk_create sends no signals
+        make_requests(self.users[2], self.users[0], self.skills[0], 3)
+        UserSkill.objects.filter(pk=self.skills[1].pk).update(completed_count=7)
+
+        out = StringIO()
+        call_command("check_skill_counters", "--dry-run", stdout=out)
+        self.assertIn(f"skill {self.skills[0].pk}: request_count 0 -> 3, pending_count 0 -> 3", out.getvalue())
+        self.assertIn("2 skills have drifted counters (not repaired)", out.getvalue())
+        self.assertEqual(self._counters(self.skills[0])["request_count"], 0)
+
+        call_command("check_skill_counters", stdout=StringIO())
+        self.assertEqual(self._counters(self.skills[0])["request_count"], 3)
+        self.assertEqual(self._counters(self.skills[1])["completed_count"], 0)
+        out = StringIO()
+        call_command("check_skill_counters", stdout=out)
+        self.assertIn("consistent", out.getvalue())
+
+    def test_listing_exposes_counters_and_orders_by_them(self):
+        for skill, completed in ((self.skills[0], 1), (self.skills[2], 2)):
+            for _ in range(completed):
+                request = ServiceRequest.objects.create(
+                    requester=self.users[3], provider=skill.user, offered_skill=skill, description="x"
+                )
+                ServiceRequest.objects.filter(pk=request.pk).transition(Status.ACCEPTED)
+                ServiceRequest.objects.filter(pk=request.pk).transition(Status.COMPLETED)
+                Review.objects.create(transaction=request, reviewer=self.users[3], reviewed_user=skill.user, rating=4)
+        Review.objects.filter(transaction__offered_skill=self.skills[2]).first().delete()
+
+        url = reverse("users:users-api:skills-list")
+        response = self.client.get(url, {"ordering": "-completed_count"})
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        self.assertEqual([r["name"] for r in rows[:2]], ["Xadrez", "Violão"])
+        self.assertEqual(
+            {key: rows[0][key] for key in ("request_count", "completed_count", "review_count", "rating_average")},
+            {"request_count": 2, "completed_count": 2, "review_count": 1, "rating_average": 4.0},
+        )
+        self.assertIsNone(rows[-1]["rating_average"])
+        self.assertEqual(self.client.get(url, {"ordering": "rating_total"}).status_code, 400)
+
+        # Counters are read-only
+        self.client.force_authenticate(self.users[0])
+        response = self.client.patch(
+            reverse("users:users-api:skills-detail", args=[self.skills[0].pk]), {"request_count": 99}, format="json"
+        )
+        self.assertEqual(response.json()["request_count"], 1)
+
+
+class FeedTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.ana, self.bia, self.caio, self.davi = (
+            User.objects.create_user(username=name, password="x") for name in ("ana", "bia", "caio", "davi")
+        )
+        self.violao = UserSkill.objects.create(user=self.ana, name="Violão")
+
+    def _request(self, requester, skill):
+        return ServiceRequest.objects.create(
+            requester=requester, provider=skill.user, offered_skill=skill, description="x"
+        )
+
+    def _feed(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse("services:feed"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _verbs(self, user):
+        return [(e["actor"]["username"], e["verb"], e["summary"]) for e in self._feed(user)["results"]]
+
+    def test_activity_reaches_contacts_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            request = self._request(self.bia, self.violao)
+            self._request(self.caio, self.violao)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSkill.objects.create(user=self.ana, name="Xadrez")
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceRequest.objects.filter(pk=request.pk).transition(Status.ACCEPTED)
+            ServiceRequest.objects.filter(pk=request.pk).transition(Status.COMPLETED)
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(transaction=request, reviewer=self.bia, reviewed_user=self.ana, rating=5)
+
+        self.assertEqual(
+            self._verbs(self.bia),
+            [("ana", "SWAP_COMPLETED", "Violão"), ("ana", "SKILL_ADDED", "Xadrez")],
+        )
+        self.assertEqual(self._verbs(self.ana), [("bia", "REVIEW_POSTED", "Violão")])
+        # caio only knows ana; davi never interacted with anyone
+        self.assertEqual(len(self._verbs(self.caio)), 2)
+        self.assertEqual(self._verbs(self.davi), [])
+
+        review.delete()
+        self.assertEqual(self._verbs(self.ana), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            request.delete()
+        self.assertEqual(self._verbs(self.bia), [("ana", "SKILL_ADDED", "Xadrez")])
+
+    def test_imported_skills_are_published(self):
+        from users.skill_import import import_skills
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.bia, self.violao)
+            self._request(self.caio, self.violao)
+        rows = [{"name": "Xadrez"}, {"name": "Cerâmica"}, {"name": "Violão", "description": "Só updates"}]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_skills(self.ana, rows)
+        self.assertEqual((result.created, result.updated), (2, 1))
+        self.assertEqual(FeedEntry.objects.filter(actor=self.ana).count(), 4)
+        for user in (self.bia, self.caio):
+            self.assertEqual(
+                self._verbs(user), [("ana", "SKILL_ADDED", "Cerâmica"), ("ana", "SKILL_ADDED", "Xadrez")]
+            )
+
+    def test_keyset_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.bia, self.violao)
+        for n in range(5):
+            with self.captureOnCommitCallbacks(execute=True):
+                UserSkill.objects.create(user=self.ana, name=f"Skill {n}")
+        page = self._feed(self.bia, page_size=2)
+        names = [e["summary"] for e in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            names += [e["summary"] for e in page["results"]]
+        self.assertEqual(names, [f"Skill {n}" for n in reversed(range(5))])
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_very_connected_actor_is_read_not_copied(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.bia, self.violao)
+            self._request(self.caio, self.violao)
+        self.assertFalse(FeedContact.objects.filter(pull=True).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.davi, self.violao)
+        # Over the limit: ana's contacts now read her activity
+        self.assertEqual(
+            set(FeedContact.objects.filter(pull=True).values_list("user__username", "contact__username")),
+            {("bia", "ana"), ("caio", "ana"), ("davi", "ana")},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSkill.objects.create(user=self.ana, name="Xadrez")
+            UserSkill.objects.create(user=self.bia, name="Cerâmica")
+        self.assertEqual(FeedEntry.objects.filter(actor=self.ana).count(), 1)
+        for user in (self.bia, self.caio, self.davi):
+            self.assertIn(("ana", "SKILL_ADDED", "Xadrez"), self._verbs(user))
+        # bia is still copied into ana's timeline, which excludes ana's own broadcast
+        self.assertEqual(self._verbs(self.ana), [("bia", "SKILL_ADDED", "Cerâmica")])
+
+    @override_settings(FEED_MAX_ENTRIES=3, FEED_TRIM_EVERY=1)
+    def test_timelines_are_capped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.bia, self.violao)
+        for n in range(6):
+            with self.captureOnCommitCallbacks(execute=True):
+                UserSkill.objects.create(user=self.ana, name=f"Skill {n}")
+        self.assertEqual([summary for _, _, summary in self._verbs(self.bia)], ["Skill 5", "Skill 4", "Skill 3"])
+        self.assertEqual(FeedEntry.objects.filter(owner=self.bia).count(), 3)
+
+    def test_rebuild_recreates_contacts_from_requests(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request(self.bia, self.violao)
+            self._request(self.bia, self.violao)
+        make_requests(self.caio, self.ana, self.violao, 2)
+
+        def contacts():
+            return set(FeedContact.objects.values_list("user__username", "contact__username", "pull"))
+
+        self.assertEqual(contacts(), {("ana", "bia", False), ("bia", "ana", False)})
+        out = StringIO()
+        call_command("rebuild_feed", stdout=out)
+        self.assertIn("4 feed contacts rebuilt", out.getvalue())
+        self.assertEqual(
+            contacts(),
+            {("ana", "bia", False), ("bia", "ana", False), ("ana", "caio", False), ("caio", "ana", False)},
+        )
 
-# Create your tests here.
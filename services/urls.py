@@ -1,5 +1,16 @@
-from django.urls import path
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+app_name = "services"
+
+router = DefaultRouter()
+router.register(r"requests", api.ServiceRequestViewSet, basename="requests")
 
 urlpatterns = [
-    # Add services app URL patterns here (e.g. requests, offers)
+    path("api/", include((router.urls, "services-api"))),
+    path("api/matches/", api.MatchView.as_view(), name="matches"),
+    path("api/rankings/", api.ProviderRankingView.as_view(), name="rankings"),
+    path("api/feed/", api.FeedView.as_view(), name="feed"),
 ]
@@ -1,11 +1,18 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from core.pagination import bounded_int
+
+from . import profile_cache, skill_import
+from . import search as skill_search
 from .models import UserProfile, UserSkill
-from .serializers import UserProfileSerializer, UserSkillSerializer
+from .serializers import UserProfileSerializer, UserSkillSearchResultSerializer, UserSkillSerializer
 
 User = get_user_model()
 
@@ -21,9 +28,12 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 
 
 class UserProfileViewSet(viewsets.ModelViewSet):
-    queryset = UserProfile.objects.select_related("user").all()
+    queryset = UserProfile.objects.select_related("user", "user__rating_stats").all()
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    # Session + user lookups plus one query: the nested user and rating come
+    # from select_related, so a missing join shows up as a budget failure
+    query_budget = {"list": 3, "retrieve": 3}
 
     def perform_create(self, serializer):
         # Attach the logged user if possible
@@ -34,10 +44,39 @@ class UserSkillViewSet(viewsets.ModelViewSet):
     queryset = UserSkill.objects.select_related("user").all()
     serializer_class = UserSkillSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    query_budget = {"list": 3, "retrieve": 3, "mine": 3, "search": 4, "autocomplete": 3}
+    # ?ordering=<field> or -<field> on list and mine (ties broken by id)
+    ordering_fields = ("name", "created_at", "request_count", "completed_count", "review_count")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        ordering = self.request.query_params.get("ordering")
+        if ordering and self.action in ("list", "mine"):
+            if ordering.lstrip("-") not in self.ordering_fields:
+                choices = ", ".join(self.ordering_fields)
+                raise ValidationError({"ordering": [f"Choose one of {choices} (- for descending)."]})
+            queryset = queryset.order_by(ordering, "-id" if ordering.startswith("-") else "id")
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["post"], url_path="bulk", permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """Create or update many of the caller's skills: a JSON list of ``{"name", "description"}``.
+
+        Invalid rows are listed in ``errors`` (by position) and skipped; the
+        others are saved. The query count grows with the number of batches,
+        so this action has no fixed budget.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of skills."]})
+        max_rows = getattr(settings, "SKILL_IMPORT_MAX_ROWS", 10000)
+        if len(rows) > max_rows:
+            raise ValidationError({"non_field_errors": [f"At most {max_rows} skills per request."]})
+        return Response(skill_import.import_skills(request.user, rows).as_dict())
+
     @action(detail=False, methods=["get"], url_path="mine")
     def mine(self, request):
         qs = self.get_queryset().filter(user=request.user)
@@ -47,3 +86,27 @@ class UserSkillViewSet(viewsets.ModelViewSet):
             return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """Ranked skill search: ``?q=<text>&limit=<n>`` (last term matches as a prefix)."""
+        query = request.query_params.get("q", "")
+        limit = bounded_int(request.query_params.get("limit"), default=20, maximum=100)
+        results = skill_search.search(query, limit=limit)
+        serializer = UserSkillSearchResultSerializer(results, many=True)
+        return Response({"query": query, "results": serializer.data})
+
+    @action(detail=False, methods=["get"], url_path="autocomplete")
+    def autocomplete(self, request):
+        """Indexed terms starting with ``?q=`` (accent-insensitive), most common first."""
+        limit = bounded_int(request.query_params.get("limit"), default=10, maximum=50)
+        return Response({"suggestions": skill_search.autocomplete(request.query_params.get("q", ""), limit=limit)})
+
+
+class ProfileCacheStatsView(APIView):
+    """Hit/miss/eviction counters of the profile page cache (for scraping)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(profile_cache.stats())
@@ -0,0 +1,104 @@
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from core.benchmarks import Timer, isolated_database, percentile, rate
+
+from .bench_skill_search import DESCRIPTION_WORDS, SKILLS
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da importação de skills: POST /users/api/skills/bulk/ em lotes contra um POST por skill "
+        "(usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000, help="Skills importadas pelo endpoint em massa")
+        parser.add_argument(
+            "--single-rows", type=int, default=2000, help="Skills criadas um POST por vez (extrapolado para --rows)"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from rest_framework.test import APIClient
+
+        from users.models import SkillSearchToken, UserSkill
+
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        bulk_user = User.objects.create_user("bulk_partner")
+        single_user = User.objects.create_user("single_partner")
+
+        def catalog(count):
+            return [
+                {
+                    "name": f"{rng.choice(SKILLS)} {i}",
+                    "description": " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(4, 12))),
+                }
+                for i in range(count)
+            ]
+
+        # "localhost" is always allowed in DEBUG; "testserver" is not outside tests
+        client = APIClient(SERVER_NAME="localhost")
+
+        client.force_authenticate(single_user)
+        url = reverse("users:users-api:skills-list")
+        single = []
+        with Timer() as single_total:
+            for row in catalog(options["single_rows"]):
+                with Timer() as t:
+                    response = client.post(url, row, format="json")
+                assert response.status_code == 201, response.content
+                single.append(t.elapsed * 1000)
+
+        client.force_authenticate(bulk_user)
+        url = reverse("users:users-api:skills-bulk")
+        per_request = getattr(settings, "SKILL_IMPORT_MAX_ROWS", 10000)
+        rows = catalog(options["rows"])
+        requests = []
+        sizes = []
+        with Timer() as bulk_total:
+            for start in range(0, len(rows), per_request):
+                batch = rows[start : start + per_request]
+                with Timer() as t:
+                    response = client.post(url, batch, format="json")
+                assert response.status_code == 200 and not response.json()["errors"], response.content[:500]
+                requests.append(t.elapsed * 1000)
+                sizes.append(len(batch))
+        # Re-importing the same catalog with new descriptions exercises the update path
+        for row in rows:
+            row["description"] += " atualizado"
+        with Timer() as update_total:
+            for start in range(0, len(rows), per_request):
+                client.post(url, rows[start : start + per_request], format="json")
+
+        assert UserSkill.objects.filter(user=bulk_user).count() == options["rows"]
+        indexed = SkillSearchToken.objects.filter(skill__user=bulk_user).values("skill").distinct().count()
+        assert indexed == options["rows"], indexed
+
+        single_rate = rate(len(single), single_total.elapsed)
+        self.stdout.write(f"\n{'path':<36}{'rows':>9}{'seconds':>10}{'rows/s':>10}")
+        self.stdout.write(
+            f"{'one POST per skill':<36}{len(single):>9}{single_total.elapsed:>10.1f}{single_rate:>10.0f}"
+            f"   (p50 {percentile(single, 50):.1f} ms, p99 {percentile(single, 99):.1f} ms per POST)"
+        )
+        self.stdout.write(
+            f"{'  extrapolated':<36}{options['rows']:>9}{options['rows'] / single_rate:>10.1f}{single_rate:>10.0f}"
+        )
+        for label, timer in (("bulk endpoint, new skills", bulk_total), ("bulk endpoint, updates", update_total)):
+            self.stdout.write(
+                f"{label:<36}{options['rows']:>9}{timer.elapsed:>10.1f}{rate(options['rows'], timer.elapsed):>10.0f}"
+            )
+        size = f"{sizes[0]}" if min(sizes) == max(sizes) else f"{min(sizes)}-{max(sizes)}"
+        self.stdout.write(
+            f"\nbulk: {len(requests)} requests of {size} rows, p50 {percentile(requests, 50):.0f} ms each; "
+            f"{rate(options['rows'], bulk_total.elapsed) / single_rate:.0f}x faster than one POST per skill"
+        )
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q, Sum
+from django.urls import reverse
+
+from core.benchmarks import Timer, isolated_database, percentile
+from core.seeding import SeedSizes, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da listagem de skills com contadores de pedidos/avaliações: colunas mantidas em UserSkill "
+        "contra agrupar ServiceRequest/Review a cada listagem (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--requests", type=int, default=200000)
+        parser.add_argument("--samples", type=int, default=20, help="Listagens medidas por variante")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from rest_framework.test import APIClient
+
+        from services.models import ServiceRequest
+        from services.skill_counters import COUNTER_FIELDS, STATUS_FIELDS
+        from users.models import UserSkill
+        from users.serializers import UserSkillSerializer
+
+        sizes = SeedSizes(users=options["users"], skills_per_user=3, requests=options["requests"])
+        with Timer() as gen:
+            SyntheticDataGenerator(sizes, seed=options["seed"]).run()
+        skills = UserSkill.objects.count()
+        self.stdout.write(
+            f"generated {skills} skills and {ServiceRequest.objects.count()} requests in {gen.elapsed:.1f}s"
+        )
+
+        # What UserSkillViewSet.list would run without the stored counters
+        aggregates = {"live_requests": Count("service_requests", distinct=True)}
+        for status, field in STATUS_FIELDS.items():
+            aggregates[f"live_{field}"] = Count(
+                "service_requests", filter=Q(service_requests__status=status), distinct=True
+            )
+        counted = Q(service_requests__review__reviewed_user_id=F("service_requests__provider_id"))
+        aggregates["live_review_count"] = Count("service_requests__review", filter=counted)
+        aggregates["live_rating_total"] = Sum("service_requests__review__rating", filter=counted)
+
+        def on_the_fly():
+            rows = list(
+                UserSkill.objects.select_related("user").annotate(**aggregates).order_by("-live_requests", "-id")
+            )
+            for skill in rows:
+                skill.request_count = skill.live_requests
+                for field in COUNTER_FIELDS[1:]:
+                    setattr(skill, field, getattr(skill, f"live_{field}") or 0)
+            return UserSkillSerializer(rows, many=True).data
+
+        def stored():
+            rows = UserSkill.objects.select_related("user").order_by("-request_count", "-id")
+            return UserSkillSerializer(rows, many=True).data
+
+        # Both variants must agree before timing them
+        assert [dict(r) for r in on_the_fly()] == [dict(r) for r in stored()]
+
+        client = APIClient(SERVER_NAME="localhost")
+        url = reverse("users:users-api:skills-list")
+        timings = {"aggregate per listing (no counters)": [], "stored counters": [], "GET ?ordering=-request_count": []}
+        for _ in range(options["samples"]):
+            for label, run in (
+                ("aggregate per listing (no counters)", on_the_fly),
+                ("stored counters", stored),
+                ("GET ?ordering=-request_count", lambda: client.get(url, {"ordering": "-request_count"})),
+            ):
+                with Timer() as t:
+                    run()
+                timings[label].append(t.elapsed * 1000)
+
+        self.stdout.write(f"\nlisting all {skills} skills, most requested first")
+        self.stdout.write(f"{'variant':<40}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, values in timings.items():
+            self.stdout.write(f"{label:<40}{percentile(values, 50):>10.1f}{percentile(values, 99):>10.1f}")
+
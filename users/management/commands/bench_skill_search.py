@@ -0,0 +1,110 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.benchmarks import Timer, isolated_database, percentile
+
+SKILLS = [
+    "Jardinagem", "Programação Python", "Design Gráfico", "Fotografia", "Violão", "Culinária Vegana",
+    "Inglês Conversação", "Matemática", "Marcenaria", "Costura", "Yoga", "Edição de Vídeo",
+    "Contabilidade", "Eletricista", "Encanamento", "Pintura em Tela", "Redação", "Espanhol",
+    "Programação JavaScript", "Manutenção de Bicicletas", "Massagem", "Cerâmica", "Tricô", "Xadrez",
+]
+DESCRIPTION_WORDS = (
+    "aulas particulares para iniciantes avançados online presencial manutenção hortas jardins "
+    "criação logos sites aplicativos receitas saudáveis tradução revisão textos consertos reparos "
+    "instalação elétrica hidráulica ensino prático teórico experiência anos certificado atendimento "
+    "fins de semana noite grupos individual crianças adultos programação análise dados"
+).split()
+QUERIES = [
+    "jardinagem", "programacao", "programação python", "design", "foto", "jard", "aulas violao",
+    "ingles", "manutencao bicicleta", "receitas", "edicao video", "python dados", "xad", "ceramica",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da busca de skills: índice invertido (users.search) contra filtro icontains "
+        "ingênuo (usa um banco de teste descartável)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skills", type=int, default=200000)
+        parser.add_argument("--skills-per-user", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5, help="Execuções de cada consulta")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.run(options)
+
+    def run(self, options):
+        from users import search
+        from users.models import UserSkill
+
+        rng = random.Random(options["seed"])
+        with Timer() as gen:
+            self._generate(rng, options["skills"], options["skills_per_user"])
+        with Timer() as build:
+            postings = search.rebuild_index()
+        self.stdout.write(f"generated {options['skills']} skills in {gen.elapsed:.1f}s")
+        self.stdout.write(f"built index ({postings} postings) in {build.elapsed:.1f}s\n")
+
+        def naive(query):
+            cond = Q()
+            for term in query.split():
+                cond &= Q(name__icontains=term) | Q(description__icontains=term)
+            return list(UserSkill.objects.filter(cond).select_related("user").order_by("-created_at")[:20])
+
+        engines = [("inverted index", lambda q: search.search(q, limit=20)), ("icontains", naive)]
+        self.stdout.write(f"{'query':<24}{'engine':<16}{'hits':>6}{'p50 ms':>10}{'p99 ms':>10}")
+        totals = {name: [] for name, _ in engines}
+        for query in QUERIES:
+            for name, engine in engines:
+                timings = []
+                for _ in range(options["repeat"]):
+                    with Timer() as t:
+                        hits = len(engine(query))
+                    timings.append(t.elapsed * 1000)
+                totals[name] += timings
+                self.stdout.write(
+                    f"{query:<24}{name:<16}{hits:>6}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}"
+                )
+        self.stdout.write("")
+        for name, timings in totals.items():
+            self.stdout.write(
+                f"{name:<16} overall p50 {percentile(timings, 50):.2f} ms, p99 {percentile(timings, 99):.2f} ms"
+            )
+
+    def _generate(self, rng, total, per_user):
+        from users.models import UserSkill
+
+        User = get_user_model()
+        n_users = max(1, total // per_user)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=f"bench{i}", password="!") for i in range(n_users)], batch_size=2000
+            )
+            user_ids = list(User.objects.filter(username__startswith="bench").values_list("id", flat=True))
+            batch = []
+            taken = set()
+            for i in range(total):
+                user_id, name = user_ids[i % n_users], rng.choice(SKILLS)
+                if (user_id, name) in taken:
+                    # (user, name) is unique
+                    name = f"{name} {i}"
+                taken.add((user_id, name))
+                batch.append(
+                    UserSkill(
+                        user_id=user_id,
+                        name=name,
+                        description=" ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(4, 12))),
+                    )
+                )
+                if len(batch) >= 5000:
+                    UserSkill.objects.bulk_create(batch)
+                    batch = []
+            UserSkill.objects.bulk_create(batch)
@@ -0,0 +1,52 @@
+import csv
+import json
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users import skill_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa (cria ou atualiza) skills de um usuário a partir de um arquivo CSV ou NDJSON com as "
+        "colunas name e description, validando e gravando em lotes (users.skill_import)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo .csv ou .ndjson/.jsonl")
+        parser.add_argument("--user", required=True, help="Dono das skills (username)")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Padrão: pela extensão do arquivo")
+        parser.add_argument("--batch-size", type=int, default=None, help="Linhas por lote")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']!r}") from None
+        path = Path(options["path"])
+        fmt = options["format"] or ("csv" if path.suffix.lower() == ".csv" else "ndjson")
+
+        with open(path, encoding="utf-8", newline="") as fh:
+            rows = csv.DictReader(fh) if fmt == "csv" else self.ndjson_rows(fh)
+            result = skill_import.import_skills(user, rows, batch_size=options["batch_size"])
+
+        for error in result.errors[:20]:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        if len(result.errors) > 20:
+            self.stderr.write(f"... and {len(result.errors) - 20} more invalid rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} created, {result.updated} updated, {result.unchanged} unchanged, "
+            f"{len(result.errors)} invalid"
+        ))
+
+    def ndjson_rows(self, fh):
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Reported as an invalid row by the serializer
+                yield line
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users import profile_cache, ratings
+
+
+class Command(BaseCommand):
+    help = "Recria do zero os agregados de avaliação (UserRatingStats) a partir de services.Review"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = ratings.rebuild(batch_size=options["batch_size"])
+        profile_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating stats for {count} users."))
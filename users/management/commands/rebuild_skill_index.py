@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users import search
+
+
+class Command(BaseCommand):
+    help = "Recria do zero o índice invertido de busca de skills (SkillSearchToken/SkillSearchTerm)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed skills ({written} postings)."))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_stats(apps, schema_editor):
+    Review = apps.get_model("services", "Review")
+    UserRatingStats = apps.get_model("users", "UserRatingStats")
+    star_counts = {f"stars_{star}": Count("id", filter=Q(rating=star)) for star in range(1, 6)}
+    rows = (
+        Review.objects.values("reviewed_user_id")
+        .annotate(count=Count("id"), total=Sum("rating"), **star_counts)
+        .order_by()
+    )
+    UserRatingStats.objects.bulk_create(
+        [
+            UserRatingStats(user_id=row.pop("reviewed_user_id"), **row)
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_userprofile'),
+        ('services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRatingStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_rating_stats, migrations.RunPython.noop),
+    ]
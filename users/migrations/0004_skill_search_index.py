@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:13
+
+import re
+import unicodedata
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Tokenizer of users.search as of this migration, copied so later changes to
+# it do not change what this migration writes.
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+MAX_TOKEN_LENGTH = 64
+MAX_WEIGHT = 32767
+STOPWORDS = frozenset(
+    "a o as os e de da do das dos em no na nos nas um uma uns umas para por com sem ao aos "
+    "the and of for to in on with".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall(normalize(text)) if token not in STOPWORDS]
+
+
+def skill_token_weights(name, description):
+    weights = Counter()
+    for token in tokenize(name):
+        weights[token] += NAME_WEIGHT
+    for token in tokenize(description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return {token: min(weight, MAX_WEIGHT) for token, weight in weights.items()}
+
+
+def index_existing_skills(apps, schema_editor):
+    UserSkill = apps.get_model("users", "UserSkill")
+    SkillSearchToken = apps.get_model("users", "SkillSearchToken")
+    SkillSearchTerm = apps.get_model("users", "SkillSearchTerm")
+    terms = Counter()
+    postings = []
+    for pk, name, description in UserSkill.objects.values_list("pk", "name", "description").iterator():
+        for token, weight in skill_token_weights(name, description).items():
+            postings.append(SkillSearchToken(token=token, skill_id=pk, weight=weight))
+            terms[token] += 1
+    SkillSearchToken.objects.bulk_create(postings, batch_size=5000)
+    SkillSearchTerm.objects.bulk_create(
+        [SkillSearchTerm(token=token, skill_count=n) for token, n in terms.items()], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_userratingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillSearchTerm',
+            fields=[
+                ('token', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('skill_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SkillSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='users.userskill')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', '-weight', 'skill'], name='skilltoken_token_weight_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:14
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_skills(apps, schema_editor):
+    """Keep the oldest skill of each (user, name) and point the others' requests at it."""
+    UserSkill = apps.get_model("users", "UserSkill")
+    SkillSearchToken = apps.get_model("users", "SkillSearchToken")
+    SkillSearchTerm = apps.get_model("users", "SkillSearchTerm")
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+
+    duplicates = (
+        UserSkill.objects.values("user_id", "name")
+        .annotate(n=models.Count("id"), keep=models.Min("id"))
+        .filter(n__gt=1)
+    )
+    for group in duplicates:
+        extra = list(
+            UserSkill.objects.filter(user_id=group["user_id"], name=group["name"])
+            .exclude(pk=group["keep"])
+            .values_list("pk", flat=True)
+        )
+        ServiceRequest.objects.filter(offered_skill_id__in=extra).update(offered_skill_id=group["keep"])
+        # Postings go with the cascade; the vocabulary counts must follow
+        removed = Counter(SkillSearchToken.objects.filter(skill_id__in=extra).values_list("token", flat=True))
+        for token, n in removed.items():
+            SkillSearchTerm.objects.filter(token=token).update(skill_count=models.F("skill_count") - n)
+        SkillSearchTerm.objects.filter(skill_count__lte=0).delete()
+        UserSkill.objects.filter(pk__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_skill_search_index'),
+        ('services', '0002_servicerequest_box_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_skills, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userskill',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='userskill_user_name_uniq'),
+        ),
+    ]
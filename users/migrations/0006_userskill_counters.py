@@ -0,0 +1,93 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:55
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+# services.skill_counters as of this migration, copied so later changes to it
+# do not change what this migration writes.
+STATUS_FIELDS = {
+    "PENDING": "pending_count",
+    "ACCEPTED": "accepted_count",
+    "COMPLETED": "completed_count",
+    "CANCELED": "canceled_count",
+}
+COUNTER_FIELDS = ("request_count", *STATUS_FIELDS.values(), "review_count", "rating_total")
+
+
+def count_existing_requests(apps, schema_editor):
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+    Review = apps.get_model("services", "Review")
+    UserSkill = apps.get_model("users", "UserSkill")
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    by_status = ServiceRequest.objects.values("offered_skill_id", "status").annotate(n=Count("id")).order_by()
+    for skill_id, status, n in by_status.values_list("offered_skill_id", "status", "n"):
+        counters[skill_id]["request_count"] += n
+        if status in STATUS_FIELDS:
+            counters[skill_id][STATUS_FIELDS[status]] += n
+    reviews = Review.objects.filter(reviewed_user_id=F("transaction__provider_id"))
+    by_skill = reviews.values("transaction__offered_skill_id").annotate(n=Count("id"), total=Sum("rating")).order_by()
+    for skill_id, n, total in by_skill.values_list("transaction__offered_skill_id", "n", "total"):
+        counters[skill_id]["review_count"] = n
+        counters[skill_id]["rating_total"] = total
+    UserSkill.objects.bulk_update(
+        [UserSkill(pk=pk, **fields) for pk, fields in counters.items()], COUNTER_FIELDS, batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_userskill_user_name_uniq'),
+        ('services', '0003_provider_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userskill',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='canceled_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='request_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userskill',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userskill',
+            index=models.Index(fields=['request_count', 'id'], name='userskill_requests_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userskill',
+            index=models.Index(fields=['completed_count', 'id'], name='userskill_completed_idx'),
+        ),
+        migrations.RunPython(count_existing_requests, migrations.RunPython.noop),
+    ]
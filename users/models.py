@@ -2,8 +2,6 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
-from django.db.models import Avg
-
 
 class UserSkill(models.Model):
 	"""Habilidade associada a um usuário. Modelagem mínima para integração com `services`.
@@ -14,6 +12,50 @@ class UserSkill(models.Model):
 	name = models.CharField(max_length=150)
 	description = models.TextField(blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Contadores dos pedidos feitos para a skill (total e por status) e das
+	# avaliações que o prestador recebeu por eles. Mantidos com F() pelos
+	# signals de `services` (ver `services.skill_counters`); o comando
+	# `check_skill_counters` os reconta e corrige divergências.
+	request_count = models.PositiveIntegerField(default=0)
+	pending_count = models.PositiveIntegerField(default=0)
+	accepted_count = models.PositiveIntegerField(default=0)
+	completed_count = models.PositiveIntegerField(default=0)
+	canceled_count = models.PositiveIntegerField(default=0)
+	review_count = models.PositiveIntegerField(default=0)
+	rating_total = models.PositiveIntegerField(default=0)
+
+	counter_fields = (
+		"request_count", "pending_count", "accepted_count", "completed_count", "canceled_count", "review_count",
+		"rating_total",
+	)
+
+	class Meta:
+		constraints = [
+			# Chave do upsert da importação em massa (users.skill_import)
+			models.UniqueConstraint(fields=["user", "name"], name="userskill_user_name_uniq"),
+		]
+		indexes = [
+			# Ordenação da listagem por popularidade (?ordering=-request_count)
+			models.Index(fields=["request_count", "id"], name="userskill_requests_idx"),
+			models.Index(fields=["completed_count", "id"], name="userskill_completed_idx"),
+		]
+
+	def save(self, *args, **kwargs):
+		# Uma edição não regrava os contadores lidos com a instância por cima dos
+		# deltas F() gravados nesse meio-tempo: só são salvos se listados em update_fields
+		if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+			kwargs["update_fields"] = [
+				field.name
+				for field in self._meta.concrete_fields
+				if not field.primary_key and field.name not in self.counter_fields
+			]
+		super().save(*args, **kwargs)
+
+	@property
+	def rating_average(self):
+		if not self.review_count:
+			return None
+		return float(round(self.rating_total / self.review_count, 2))
 
 	def __str__(self):
 		return f"{self.name} — {self.user}"
@@ -33,6 +75,69 @@ class UserProfile(models.Model):
 		return f"Profile({self.user.username})"
 
 
+class UserRatingStats(models.Model):
+	"""Agregados de avaliação recebidos pelo usuário (contagem, soma e histograma 1–5).
+
+	Mantidos transacionalmente pelos signals de `services.Review` (ver `users.ratings`),
+	para que perfis, listagens e rankings leiam a média sem `Avg()` por chamada.
+	Podem ser recriados com o comando `rebuild_rating_stats`.
+	"""
+	user = models.OneToOneField(
+		settings.AUTH_USER_MODEL, related_name="rating_stats", on_delete=models.CASCADE, primary_key=True
+	)
+	count = models.PositiveIntegerField(default=0)
+	total = models.PositiveIntegerField(default=0)
+	stars_1 = models.PositiveIntegerField(default=0)
+	stars_2 = models.PositiveIntegerField(default=0)
+	stars_3 = models.PositiveIntegerField(default=0)
+	stars_4 = models.PositiveIntegerField(default=0)
+	stars_5 = models.PositiveIntegerField(default=0)
+
+	@property
+	def average(self):
+		if not self.count:
+			return 0.0
+		return float(round(self.total / self.count, 2))
+
+	@property
+	def histogram(self):
+		return {star: getattr(self, f"stars_{star}") for star in range(1, 6)}
+
+	def __str__(self):
+		return f"RatingStats(user_id={self.user_id}, count={self.count}, average={self.average})"
+
+
+class SkillSearchTerm(models.Model):
+	"""Vocabulário do índice de busca de skills: token normalizado e em quantas skills aparece.
+
+	Serve para o autocomplete por prefixo e para o IDF do ranking (ver `users.search`).
+	"""
+	token = models.CharField(max_length=64, primary_key=True)
+	skill_count = models.PositiveIntegerField(default=0)
+
+	def __str__(self):
+		return f"{self.token} ({self.skill_count})"
+
+
+class SkillSearchToken(models.Model):
+	"""Entrada (posting) do índice invertido: token -> skill, com peso por campo.
+
+	Mantido pelos signals de `UserSkill`; recriável com `rebuild_skill_index`.
+	"""
+	token = models.CharField(max_length=64)
+	skill = models.ForeignKey(UserSkill, related_name="search_tokens", on_delete=models.CASCADE)
+	weight = models.PositiveSmallIntegerField(default=1)
+
+	class Meta:
+		indexes = [
+			# Índice de cobertura: a busca lê (token, weight, skill) sem tocar a tabela
+			models.Index(fields=["token", "-weight", "skill"], name="skilltoken_token_weight_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.token} -> skill {self.skill_id} ({self.weight})"
+
+
 # Adiciona método `get_average_rating` diretamente ao modelo de usuário ativo.
 # Utilizamos `get_user_model()` para suportar tanto o User padrão quanto um custom user.
 User = get_user_model()
@@ -41,11 +146,14 @@ User = get_user_model()
 def get_average_rating(self):
 	"""Retorna a média das avaliações (float) recebidas pelo usuário.
 
-	Usa o related_name `reviews_received` definido no modelo `Review` (services).
-	Retorna 0.0 se não houver avaliações.
+	Lê os agregados mantidos em `UserRatingStats` (uma consulta, ou nenhuma com
+	`select_related("rating_stats")`). Retorna 0.0 se não houver avaliações.
 	"""
-	avg = self.reviews_received.aggregate(avg=Avg("rating"))["avg"]
-	return float(round(avg or 0.0, 2))
+	try:
+		stats = self.rating_stats
+	except UserRatingStats.DoesNotExist:
+		return 0.0
+	return stats.average
 
 
 # Anexa o método à classe de usuário ativa.
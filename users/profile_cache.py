@@ -0,0 +1,164 @@
+"""Read-through cache for the public profile page context.
+
+The assembled context (user, profile, skills and average rating) is cached
+per user and stamped with a version number. Anything that changes what the
+page shows bumps the version after the transaction commits (see
+``users.signals``), so the next read rebuilds it from the database. Stale
+entries are never served and are simply overwritten.
+
+Versions start from ``time.time_ns()`` instead of 1, so a version key that
+was evicted and recreated can never match an entry stamped before it.
+
+Hit/miss/eviction counters live in the same cache and are exposed by
+``ProfileCacheStatsView``.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+
+from .models import UserProfile, UserSkill
+
+KEY_PREFIX = "profile"
+# Global generation, part of every stamp; bumping it invalidates all profiles
+GENERATION_KEY = f"{KEY_PREFIX}:gen"
+COUNTERS = ("hits", "misses", "stale", "evictions", "invalidations")
+
+
+def _cache():
+    return caches[getattr(settings, "PROFILE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "PROFILE_CACHE_TIMEOUT", 300)
+
+
+def _uid_key(username):
+    return f"{KEY_PREFIX}:uid:{username}"
+
+
+def _version_key(user_id):
+    return f"{KEY_PREFIX}:ver:{user_id}"
+
+
+def _context_key(user_id):
+    return f"{KEY_PREFIX}:ctx:{user_id}"
+
+
+def _count(name):
+    cache = _cache()
+    key = f"{KEY_PREFIX}:stats:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def stats():
+    """Current counter values, e.g. for scraping."""
+    cache = _cache()
+    values = cache.get_many([f"{KEY_PREFIX}:stats:{name}" for name in COUNTERS])
+    return {name: values.get(f"{KEY_PREFIX}:stats:{name}", 0) for name in COUNTERS}
+
+
+def reset_stats():
+    _cache().delete_many([f"{KEY_PREFIX}:stats:{name}" for name in COUNTERS])
+
+
+def _build_context(user_id):
+    User = get_user_model()
+    user = User.objects.select_related("rating_stats").filter(pk=user_id).first()
+    if user is None:
+        raise Http404("No user matches the given query.")
+    profile = UserProfile.objects.filter(user=user).values("bio", "location").first()
+    if profile is None:
+        raise Http404("No UserProfile matches the given query.")
+    return {
+        "profile_user": {"id": user.pk, "username": user.username},
+        "profile": profile,
+        "offered_skills": list(UserSkill.objects.filter(user=user).order_by("id").values("name", "description")),
+        "average_rating": user.get_average_rating(),
+    }
+
+
+def get_profile_context(username):
+    """Profile page context for ``username``, from cache when it is current.
+
+    Raises ``Http404`` like the uncached view when the user or profile is missing.
+    """
+    cache = _cache()
+    user_id = cache.get(_uid_key(username))
+    if user_id is not None:
+        values = cache.get_many([GENERATION_KEY, _version_key(user_id), _context_key(user_id)])
+        stamp = (values.get(GENERATION_KEY), values.get(_version_key(user_id)))
+        entry = values.get(_context_key(user_id))
+        if entry is not None and None not in stamp and entry[0] == stamp:
+            context = entry[1]
+            # A renamed user keeps its id; make sure the entry is still theirs
+            if context["profile_user"]["username"] == username:
+                _count("hits")
+                return context
+        _count("misses")
+        if entry is not None:
+            _count("stale")
+        elif stamp[1] is not None:
+            _count("evictions")
+    else:
+        _count("misses")
+
+    if user_id is None:
+        user_id = get_user_model().objects.filter(username=username).values_list("pk", flat=True).first()
+        if user_id is None:
+            raise Http404("No user matches the given query.")
+
+    # Read the stamp before the rows so a change committed while we build
+    # makes this entry stale instead of silently current.
+    stamp = _current_stamp(user_id)
+    context = _build_context(user_id)
+    if context["profile_user"]["username"] != username:
+        # Stale username -> id mapping after a rename
+        cache.delete(_uid_key(username))
+        raise Http404("No user matches the given query.")
+    cache.set_many(
+        {_uid_key(username): user_id, _context_key(user_id): (stamp, context)},
+        timeout=_timeout(),
+    )
+    return context
+
+
+def _current_value(key):
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _current_stamp(user_id):
+    return (_current_value(GENERATION_KEY), _current_value(_version_key(user_id)))
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Nothing was cached against this key; start a fresh series
+        cache.set(key, time.time_ns(), timeout=None)
+    _count("invalidations")
+
+
+def invalidate(*user_ids):
+    """Invalidate the cached profile of ``user_ids`` once the transaction commits."""
+    for user_id in {uid for uid in user_ids if uid is not None}:
+        transaction.on_commit(lambda uid=user_id: _bump(_version_key(uid)))
+
+
+def invalidate_all():
+    """Invalidate every cached profile (e.g. after ``rebuild_rating_stats``)."""
+    transaction.on_commit(lambda: _bump(GENERATION_KEY))
@@ -0,0 +1,85 @@
+"""Maintenance of the denormalized ``UserRatingStats`` aggregates.
+
+Every change to a ``services.Review`` is turned into deltas (remove the old
+rating, add the new one) applied with ``F()`` expressions, so concurrent
+reviews never lose updates and reads stay O(1).
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import UserRatingStats
+
+STAR_FIELDS = {star: f"stars_{star}" for star in range(1, 6)}
+
+
+def apply_delta(user_id, rating, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) one ``rating`` for ``user_id``."""
+    if user_id is None or rating not in STAR_FIELDS:
+        return
+    with transaction.atomic():
+        if sign > 0:
+            UserRatingStats.objects.get_or_create(user_id=user_id)
+        # Removing never creates a row: the user may be in the middle of a
+        # cascade delete, in which case there is nothing left to update.
+        UserRatingStats.objects.filter(user_id=user_id).update(
+            count=F("count") + sign,
+            total=F("total") + sign * rating,
+            **{STAR_FIELDS[rating]: F(STAR_FIELDS[rating]) + sign},
+        )
+
+
+def review_saved(review, created):
+    previous = review.previous_values()
+    if created:
+        apply_delta(review.reviewed_user_id, review.rating, 1)
+    elif previous is None:
+        # Saved without being loaded first: we cannot compute a delta, so
+        # rebuild the affected user from the source of truth.
+        rebuild(user_ids=[review.reviewed_user_id])
+    elif (previous["reviewed_user_id"], previous["rating"]) != (review.reviewed_user_id, review.rating):
+        with transaction.atomic():
+            apply_delta(previous["reviewed_user_id"], previous["rating"], -1)
+            apply_delta(review.reviewed_user_id, review.rating, 1)
+
+
+def review_deleted(review):
+    # Prefer what is stored in the database over unsaved in-memory edits
+    previous = review.previous_values() or {}
+    apply_delta(
+        previous.get("reviewed_user_id", review.reviewed_user_id),
+        previous.get("rating", review.rating),
+        -1,
+    )
+
+
+def aggregate_reviews(queryset):
+    """Stats rows computed from scratch for every user reviewed in ``queryset``."""
+    star_counts = {field: Count("id", filter=Q(rating=star)) for star, field in STAR_FIELDS.items()}
+    rows = queryset.values("reviewed_user_id").annotate(count=Count("id"), total=Sum("rating"), **star_counts)
+    return [
+        UserRatingStats(
+            user_id=row["reviewed_user_id"],
+            count=row["count"],
+            total=row["total"],
+            **{field: row[field] for field in STAR_FIELDS.values()},
+        )
+        for row in rows.order_by()
+    ]
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """Recompute stats from ``Review`` (for all users, or only ``user_ids``)."""
+    from services.models import Review
+
+    reviews = Review.objects.all()
+    stats = UserRatingStats.objects.all()
+    if user_ids is not None:
+        reviews = reviews.filter(reviewed_user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+
+    # Aggregate in the transaction that replaces the rows, so reviews committed meanwhile are not lost
+    with transaction.atomic():
+        rows = aggregate_reviews(reviews)
+        stats.delete()
+        UserRatingStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,302 @@
+"""Skill search over a maintained inverted index.
+
+Names and descriptions of ``UserSkill`` are tokenized (accents stripped and
+case folded, so "Programação" matches "programacao") into
+``SkillSearchToken`` postings, weighted by the field they came from.
+``SkillSearchTerm`` keeps the vocabulary with document counts, used for
+prefix autocomplete and IDF. Everything is plain indexed SQL, so it runs on
+SQLite without an external search service.
+
+Ranking blends text relevance (weighted TF-IDF over the matched terms) with
+a Bayesian average of the provider's rating from ``UserRatingStats``.
+"""
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import SkillSearchTerm, SkillSearchToken, UserSkill
+
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+MAX_TOKEN_LENGTH = 64
+MAX_WEIGHT = 32767
+
+# Above this many postings a term only contributes its heaviest matches;
+# keeps very common terms ("aulas") from dominating latency.
+POSTINGS_PER_TERM = 2000
+PREFIX_EXPANSIONS = 10
+
+# Bayesian prior: a provider without reviews is treated as RATING_PRIOR_MEAN
+# stars, and RATING_PRIOR_WEIGHT reviews are needed to move away from it.
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+
+STOPWORDS = frozenset(
+    "a o as os e de da do das dos em no na nos nas um uma uns umas para por com sem ao aos "
+    "the and of for to in on with".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Case-fold and strip accents: "Programação" -> "programacao"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in _TOKEN_RE.findall(normalize(text))
+        if token not in STOPWORDS
+    ]
+
+
+def skill_token_weights(name, description):
+    """Posting weights of a skill: field weight times term frequency."""
+    weights = Counter()
+    for token in tokenize(name):
+        weights[token] += NAME_WEIGHT
+    for token in tokenize(description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return {token: min(weight, MAX_WEIGHT) for token, weight in weights.items()}
+
+
+# -- index maintenance -------------------------------------------------------
+
+def _adjust_terms(added, removed):
+    if added:
+        SkillSearchTerm.objects.bulk_create(
+            [SkillSearchTerm(token=token) for token in added], ignore_conflicts=True
+        )
+        SkillSearchTerm.objects.filter(token__in=added).update(skill_count=F("skill_count") + 1)
+    if removed:
+        SkillSearchTerm.objects.filter(token__in=removed).update(skill_count=F("skill_count") - 1)
+        SkillSearchTerm.objects.filter(token__in=removed, skill_count__lte=0).delete()
+
+
+def _insert_postings(rows):
+    """Insert ``(token, skill_id, weight)`` tuples with a single executemany.
+
+    Used by the bulk paths: building millions of model instances for
+    ``bulk_create`` costs several times more than the INSERTs themselves.
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}, {}, {}) VALUES (%s, %s, %s)".format(
+        qn(SkillSearchToken._meta.db_table), qn("token"), qn("skill_id"), qn("weight")
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def index_skill(skill):
+    """(Re)index one skill; a no-op when its tokens did not change."""
+    new = skill_token_weights(skill.name, skill.description)
+    with transaction.atomic():
+        old = dict(SkillSearchToken.objects.filter(skill_id=skill.pk).values_list("token", "weight"))
+        if old == new:
+            return
+        SkillSearchToken.objects.filter(skill_id=skill.pk).delete()
+        SkillSearchToken.objects.bulk_create(
+            [SkillSearchToken(token=token, skill_id=skill.pk, weight=weight) for token, weight in new.items()]
+        )
+        _adjust_terms(added=new.keys() - old.keys(), removed=old.keys() - new.keys())
+    _stats_cache.clear()
+
+
+def unindex_skill(skill):
+    """Drop a skill's term counts; its postings go away with the FK cascade."""
+    tokens = list(SkillSearchToken.objects.filter(skill_id=skill.pk).values_list("token", flat=True))
+    _adjust_terms(added=(), removed=tokens)
+    _stats_cache.clear()
+
+
+def index_skills(skill_ids, batch_size=5000):
+    """Reindex many skills at once (bulk imports); returns postings written."""
+    skill_ids = list(skill_ids)
+    written = 0
+    for start in range(0, len(skill_ids), batch_size):
+        chunk = skill_ids[start : start + batch_size]
+        with transaction.atomic():
+            old_tokens = SkillSearchToken.objects.filter(skill_id__in=chunk).values_list("token", flat=True)
+            removed = Counter(old_tokens)
+            SkillSearchToken.objects.filter(skill_id__in=chunk).delete()
+            postings = []
+            added = Counter()
+            for pk, name, description in UserSkill.objects.filter(pk__in=chunk).values_list(
+                "pk", "name", "description"
+            ):
+                for token, weight in skill_token_weights(name, description).items():
+                    postings.append((token, pk, weight))
+                    added[token] += 1
+            _insert_postings(postings)
+            written += len(postings)
+            _apply_term_deltas(added, removed)
+    _stats_cache.clear()
+    return written
+
+
+def _apply_term_deltas(added, removed):
+    delta = Counter(added)
+    delta.subtract(removed)
+    SkillSearchTerm.objects.bulk_create(
+        [SkillSearchTerm(token=token) for token, n in delta.items() if n > 0], ignore_conflicts=True
+    )
+    by_amount = defaultdict(list)
+    for token, n in delta.items():
+        if n:
+            by_amount[n].append(token)
+    for n, tokens in by_amount.items():
+        SkillSearchTerm.objects.filter(token__in=tokens).update(skill_count=F("skill_count") + n)
+    SkillSearchTerm.objects.filter(skill_count__lte=0).delete()
+
+
+def rebuild_index(batch_size=5000):
+    """Rebuild postings and vocabulary from scratch; returns postings written."""
+    terms = Counter()
+    written = 0
+    with transaction.atomic():
+        SkillSearchToken.objects.all().delete()
+        SkillSearchTerm.objects.all().delete()
+        postings = []
+        rows = UserSkill.objects.values_list("pk", "name", "description").order_by("pk")
+        for pk, name, description in rows.iterator(chunk_size=batch_size):
+            for token, weight in skill_token_weights(name, description).items():
+                postings.append((token, pk, weight))
+                terms[token] += 1
+            if len(postings) >= batch_size:
+                _insert_postings(postings)
+                written += len(postings)
+                postings = []
+        _insert_postings(postings)
+        written += len(postings)
+        SkillSearchTerm.objects.bulk_create(
+            [SkillSearchTerm(token=token, skill_count=n) for token, n in terms.items()], batch_size=batch_size
+        )
+    _stats_cache.clear()
+    return written
+
+
+# -- querying ----------------------------------------------------------------
+
+_stats_cache = {}
+_STATS_TTL = 60.0
+
+
+def _total_skills():
+    cached = _stats_cache.get("total")
+    now = time.monotonic()
+    if cached and now - cached[1] < _STATS_TTL:
+        return cached[0]
+    total = UserSkill.objects.count()
+    _stats_cache["total"] = (total, now)
+    return total
+
+
+def _prefix_range(prefix):
+    # A range over the primary key uses the B-tree on every backend, unlike
+    # LIKE 'x%' which SQLite only optimizes under specific collations.
+    return {"token__gte": prefix, "token__lt": prefix + "\uffff"}
+
+
+def autocomplete(prefix, limit=10):
+    """Most common indexed tokens starting with ``prefix`` (after normalization)."""
+    tokens = tokenize(prefix)
+    if not tokens:
+        return []
+    return list(
+        SkillSearchTerm.objects.filter(**_prefix_range(tokens[-1]))
+        .order_by("-skill_count", "token")
+        .values_list("token", flat=True)[:limit]
+    )
+
+
+def _expand(term, prefix):
+    """Index tokens (with document counts) a query term stands for."""
+    if prefix:
+        return dict(
+            SkillSearchTerm.objects.filter(**_prefix_range(term))
+            .order_by("-skill_count")
+            .values_list("token", "skill_count")[:PREFIX_EXPANSIONS]
+        )
+    return dict(SkillSearchTerm.objects.filter(token=term).values_list("token", "skill_count"))
+
+
+def _rating_score(count, total):
+    count = count or 0
+    total = total or 0
+    bayes = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + total) / (RATING_PRIOR_WEIGHT + count)
+    return bayes / 5.0
+
+
+def search(query, limit=20, prefix=True):
+    """Ranked skills for ``query``; each result carries a ``search_score``.
+
+    With ``prefix`` the last query term also matches longer tokens, so
+    "jard" finds "Jardinagem" while the user is still typing. Skills matching
+    more query terms always rank first; within the same number of matches
+    the blended text/rating score decides.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    total = max(_total_skills(), 1)
+    matched = Counter()
+    text_scores = defaultdict(float)
+    ratings = {}
+    for position, term in enumerate(terms):
+        expansions = _expand(term, prefix and position == len(terms) - 1)
+        if not expansions:
+            continue
+        idf = {token: math.log(1 + total / (1 + df)) for token, df in expansions.items()}
+        # The provider rating rides along on the postings scan (two indexed
+        # joins per row) instead of a second query with a large IN list.
+        postings = (
+            SkillSearchToken.objects.filter(token__in=list(expansions))
+            .order_by("-weight")
+            .values_list(
+                "token", "skill_id", "weight", "skill__user__rating_stats__count", "skill__user__rating_stats__total"
+            )[:POSTINGS_PER_TERM]
+        )
+        best = {}
+        for token, skill_id, weight, count, rating_total in postings:
+            if skill_id not in ratings:
+                ratings[skill_id] = _rating_score(count, rating_total)
+            # Exact matches count fully, prefix expansions slightly less
+            score = weight * idf[token] * (1.0 if token == term else 0.8)
+            if score > best.get(skill_id, 0.0):
+                best[skill_id] = score
+        for skill_id, score in best.items():
+            matched[skill_id] += 1
+            text_scores[skill_id] += score
+
+    if not text_scores:
+        return []
+
+    # Blend every candidate with its provider rating, then load only the
+    # winners as full objects.
+    top_text = max(text_scores.values())
+    rating_weight = getattr(settings, "SKILL_SEARCH_RATING_WEIGHT", 0.3)
+    scores = {
+        pk: round((1 - rating_weight) * text / top_text + rating_weight * ratings[pk], 4)
+        for pk, text in text_scores.items()
+    }
+    ranked = sorted(scores, key=lambda pk: (matched[pk], scores[pk], -pk), reverse=True)[:limit]
+    skills = UserSkill.objects.select_related("user").in_bulk(ranked)
+
+    results = []
+    for pk in ranked:
+        skill = skills[pk]
+        skill.search_score = scores[pk]
+        results.append(skill)
+    return results
@@ -14,15 +14,45 @@ class UserSerializer(serializers.ModelSerializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    # Read from the denormalized UserRatingStats; the viewset select_related()s it
+    average_rating = serializers.FloatField(source="user.get_average_rating", read_only=True)
 
     class Meta:
         model = UserProfile
-        fields = ("id", "user", "bio", "location", "created_at")
+        fields = ("id", "user", "bio", "location", "average_rating", "created_at")
+
+
+# Maintained by services.skill_counters
+SKILL_COUNTER_FIELDS = (
+    "request_count", "pending_count", "accepted_count", "completed_count", "canceled_count", "review_count",
+)
 
 
 class UserSkillSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    rating_average = serializers.FloatField(read_only=True, allow_null=True)
 
     class Meta:
         model = UserSkill
-        fields = ("id", "user", "name", "description", "created_at")
+        fields = ("id", "user", "name", "description", "created_at") + SKILL_COUNTER_FIELDS + ("rating_average",)
+        read_only_fields = SKILL_COUNTER_FIELDS
+
+    def validate_name(self, name):
+        request = self.context.get("request")
+        # Bulk imports update the existing skill instead (users.skill_import)
+        if request is None or self.context.get("upsert"):
+            return name
+        owner = self.instance.user_id if self.instance else request.user.pk
+        others = UserSkill.objects.filter(user_id=owner, name=name)
+        if self.instance:
+            others = others.exclude(pk=self.instance.pk)
+        if others.exists():
+            raise serializers.ValidationError("You already have a skill with this name.")
+        return name
+
+
+class UserSkillSearchResultSerializer(UserSkillSerializer):
+    search_score = serializers.FloatField(read_only=True)
+
+    class Meta(UserSkillSerializer.Meta):
+        fields = UserSkillSerializer.Meta.fields + ("search_score",)
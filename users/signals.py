@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import profile_cache, ratings, search
+from .models import UserProfile, UserSkill
+
+# Sent by users.skill_import after a bulk upsert (which bypasses post_save):
+# sender=UserSkill, user_id, created, updated (row counts), created_ids (pks of
+# the skills created).
+skills_imported = Signal()
+
+
+@receiver(post_save, sender="services.Review")
+def update_rating_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata: fixtures are loaded as-is, run rebuild_rating_stats afterwards
+        return
+    ratings.review_saved(instance, created)
+
+
+@receiver(post_delete, sender="services.Review")
+def update_rating_stats_on_delete(sender, instance, **kwargs):
+    ratings.review_deleted(instance)
+
+
+@receiver(post_save, sender=UserSkill)
+def index_skill_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        # loaddata: run rebuild_skill_index afterwards
+        return
+    if update_fields is not None and not {"name", "description"} & set(update_fields):
+        return
+    search.index_skill(instance)
+
+
+@receiver(pre_delete, sender=UserSkill)
+def unindex_skill_on_delete(sender, instance, **kwargs):
+    search.unindex_skill(instance)
+
+
+# -- profile page cache invalidation ----------------------------------------
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_profile_on_user_change(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=UserSkill)
+def invalidate_profile_on_owner_change(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender="services.Review")
+def invalidate_profile_on_review_change(sender, instance, **kwargs):
+    # The average shown on the page changes for the old and the new reviewee
+    previous = instance.previous_values() or {}
+    profile_cache.invalidate(instance.reviewed_user_id, previous.get("reviewed_user_id"))
@@ -0,0 +1,100 @@
+"""Bulk create/update ("upsert") of a user's skills.
+
+Backs ``POST /users/api/skills/bulk/`` and the ``import_skills`` command.
+Rows are validated one by one with ``UserSkillSerializer`` and written in
+batches keyed by ``(user, name)`` (the ``userskill_user_name_uniq``
+constraint):
+
+- a new name is inserted, an existing one gets the new description (when
+  the row has one), and rows identical to what is stored are skipped;
+- inside a batch the last row for a name wins;
+- an invalid row is reported as ``{"row": <index>, "errors": {...}}`` and
+  does not stop the others.
+
+Each batch is one ``bulk_create(update_conflicts=True)`` plus a
+``search.index_skills`` of the rows written, in one transaction. Bulk
+writes send no ``post_save``, so the profile cache is invalidated here and
+``skills_imported`` tells the other apps (e.g. the matching engine).
+"""
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from . import profile_cache, search
+from .models import UserSkill
+from .serializers import UserSkillSerializer
+from .signals import skills_imported
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+    # Primary keys of the skills created, in import order (not part of the response)
+    created_ids: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {"created": self.created, "updated": self.updated, "unchanged": self.unchanged, "errors": self.errors}
+
+
+def import_skills(user, rows, batch_size=None):
+    """Upsert ``rows`` (mappings with ``name`` and optional ``description``) as skills of ``user``."""
+    if batch_size is None:
+        batch_size = getattr(settings, "SKILL_IMPORT_BATCH_SIZE", 1000)
+    result = ImportResult()
+    validator = UserSkillSerializer(context={"upsert": True})
+    rows = iter(rows)
+    index = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        # name -> description (None: keep the stored one); later rows override earlier ones
+        valid = {}
+        for row in batch:
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                result.errors.append({"row": index, "errors": exc.detail})
+            else:
+                valid[data["name"]] = data.get("description")
+            index += 1
+        if valid:
+            _write_batch(user, valid, result)
+
+    if result.created or result.updated:
+        profile_cache.invalidate(user.pk)
+        skills_imported.send(
+            sender=UserSkill,
+            user_id=user.pk,
+            created=result.created,
+            updated=result.updated,
+            created_ids=result.created_ids,
+        )
+    return result
+
+
+def _write_batch(user, valid, result):
+    stored = dict(UserSkill.objects.filter(user=user, name__in=list(valid)).values_list("name", "description"))
+    changed = [
+        UserSkill(user=user, name=name, description=description or "")
+        for name, description in valid.items()
+        if name not in stored or (description is not None and description != stored[name])
+    ]
+    result.unchanged += len(valid) - len(changed)
+    if not changed:
+        return
+    with transaction.atomic():
+        skills = UserSkill.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=["user", "name"], update_fields=["description"]
+        )
+        search.index_skills([skill.pk for skill in skills])
+    created_ids = [skill.pk for skill in skills if skill.name not in stored]
+    result.created_ids += created_ids
+    result.updated += len(changed) - len(created_ids)
+    result.created += len(created_ids)
@@ -1,3 +1,325 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.queries import QueryBudgetTestMixin
+from services.models import Review, ServiceRequest
+
+from . import profile_cache, search
+from .models import SkillSearchTerm, SkillSearchToken, UserProfile, UserRatingStats, UserSkill
+
+
+def make_users(count):
+    User = get_user_model()
+    return [User.objects.create_user(username=f"user{i}", password="x") for i in range(count)]
+
+
+class UserRatingStatsTests(TestCase):
+    def setUp(self):
+        self.users = make_users(5)
+        self.skills = [UserSkill.objects.create(user=u, name=f"Skill {u.username}") for u in self.users]
+
+    def _new_review(self, rng):
+        requester, provider = rng.sample(range(len(self.users)), 2)
+        request = ServiceRequest.objects.create(
+            requester=self.users[requester],
+            provider=self.users[provider],
+            offered_skill=self.skills[provider],
+            description="x",
+        )
+        return Review.objects.create(
+            transaction=request,
+            reviewer=self.users[requester],
+            reviewed_user=self.users[provider],
+            rating=rng.randint(1, 5),
+        )
+
+    def assertStatsMatchAggregates(self):
+        expected = {
+            row["reviewed_user"]: row
+            for row in Review.objects.values("reviewed_user").annotate(avg=Avg("rating"), n=Count("id")).order_by()
+        }
+        for user in get_user_model().objects.select_related("rating_stats"):
+            row = expected.get(user.pk)
+            self.assertEqual(user.get_average_rating(), float(round(row["avg"], 2)) if row else 0.0)
+            stats = UserRatingStats.objects.filter(user=user).first()
+            count = stats.count if stats else 0
+            self.assertEqual(count, row["n"] if row else 0)
+            if stats:
+                self.assertEqual(sum(stats.histogram.values()), stats.count)
+                self.assertEqual(sum(star * n for star, n in stats.histogram.items()), stats.total)
+
+    def test_stats_match_avg_after_random_mutations(self):
+        rng = random.Random(1234)
+        for _ in range(300):
+            reviews = list(Review.objects.all())
+            op = rng.random()
+            if not reviews or op < 0.4:
+                self._new_review(rng)
+            elif op < 0.6:
+                review = rng.choice(reviews)
+                review.rating = rng.randint(1, 5)
+                review.save()
+            elif op < 0.7:
+                review = rng.choice(reviews)
+                review.reviewed_user = rng.choice(self.users)
+                review.save()
+            elif op < 0.85:
+                rng.choice(reviews).delete()
+            else:
+                # Cascade delete through the ServiceRequest
+                rng.choice(reviews).transaction.delete()
+        self.assertStatsMatchAggregates()
+
+    def test_save_without_loading_rebuilds_user(self):
+        review = self._new_review(random.Random(1))
+        detached = Review(
+            pk=review.pk,
+            transaction_id=review.transaction_id,
+            reviewer_id=review.reviewer_id,
+            reviewed_user_id=review.reviewed_user_id,
+            rating=1 if review.rating != 1 else 2,
+            date=review.date,
+        )
+        detached.save()
+        self.assertStatsMatchAggregates()
+
+    def test_rebuild_command(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            self._new_review(rng)
+        UserRatingStats.objects.all().delete()
+        call_command("rebuild_rating_stats", stdout=StringIO())
+        self.assertStatsMatchAggregates()
+
+    def test_profile_page_reads_average_without_aggregate(self):
+        rng = random.Random(3)
+        for _ in range(5):
+            self._new_review(rng)
+        user = self.users[0]
+        UserProfile.objects.create(user=user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("users:user_profile", args=[user.username]))
+        self.assertFalse([q for q in ctx.captured_queries if "AVG(" in q["sql"].upper()])
+        self.assertEqual(response.context["average_rating"], user.get_average_rating())
+
+
+class SkillSearchTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_users(3)
+        self.python = UserSkill.objects.create(
+            user=self.alice, name="Programação Python", description="Aulas de programação para iniciantes"
+        )
+        self.garden = UserSkill.objects.create(
+            user=self.bob, name="Jardinagem", description="Manutenção de jardins e hortas"
+        )
+        self.design = UserSkill.objects.create(user=self.carol, name="Design", description="Logos e programação visual")
+
+    def _index_snapshot(self):
+        postings = sorted(SkillSearchToken.objects.values_list("token", "skill_id", "weight"))
+        terms = sorted(SkillSearchTerm.objects.values_list("token", "skill_count"))
+        return postings, terms
+
+    def test_tokenize_strips_accents_and_stopwords(self):
+        self.assertEqual(search.tokenize("Programação de Jardins"), ["programacao", "jardins"])
+
+    def test_accent_insensitive_match(self):
+        results = search.search("programacao", prefix=False)
+        self.assertEqual([s.pk for s in results], [self.python.pk, self.design.pk])
+
+    def test_prefix_matches_while_typing(self):
+        self.assertEqual([s.pk for s in search.search("jard")], [self.garden.pk])
+        self.assertEqual(search.autocomplete("Jard"), ["jardinagem", "jardins"])
+
+    def test_rating_breaks_text_ties(self):
+        twin = UserSkill.objects.create(user=self.bob, name="Design", description="Logos e programação visual")
+        UserRatingStats.objects.create(user=self.bob, count=10, total=50, stars_5=10)
+        self.assertEqual([s.pk for s in search.search("design")], [twin.pk, self.design.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.garden.name = "Paisagismo"
+        self.garden.save()
+        self.assertEqual(search.search("jardinagem"), [])
+        self.assertEqual([s.pk for s in search.search("paisagismo")], [self.garden.pk])
+
+        self.python.delete()
+        incremental = self._index_snapshot()
+        search.rebuild_index()
+        self.assertEqual(self._index_snapshot(), incremental)
+
+    def test_bulk_reindex_matches_rebuild(self):
+        UserSkill.objects.filter(pk=self.design.pk).update(name="Fotografia")
+        search.index_skills([self.design.pk, self.garden.pk])
+        incremental = self._index_snapshot()
+        search.rebuild_index()
+        self.assertEqual(self._index_snapshot(), incremental)
+
+    def test_search_api(self):
+        url = reverse("users:users-api:skills-search")
+        response = self.client.get(url, {"q": "jardinagem"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.garden.pk])
+        self.assertIn("search_score", response.data["results"][0])
+
+        response = self.client.get(reverse("users:users-api:skills-autocomplete"), {"q": "prog"})
+        self.assertEqual(response.data["suggestions"], ["programacao"])
+
+    def test_search_query_count_does_not_grow_with_results(self):
+        url = reverse("users:users-api:skills-search")
+        with self.assertNumQueries(4):
+            self.client.get(url, {"q": "programacao"})
+        for i in range(10):
+            user = get_user_model().objects.create_user(username=f"extra{i}", password="x")
+            UserSkill.objects.create(user=user, name=f"Programação {i}")
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.client.get(url, {"q": "programacao"}).data["results"]), 12)
+
+
+class ProfileCacheTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob = make_users(2)
+        self.profile = UserProfile.objects.create(user=self.alice, bio="Dev", location="São Paulo")
+        self.skill = UserSkill.objects.create(user=self.alice, name="Python")
+        self.url = reverse("users:user_profile", args=["user0"])
+
+    def _get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _review(self, rating):
+        request = ServiceRequest.objects.create(
+            requester=self.bob, provider=self.alice, offered_skill=self.skill, description="x"
+        )
+        return Review.objects.create(transaction=request, reviewer=self.bob, reviewed_user=self.alice, rating=rating)
+
+    def test_second_render_is_served_from_cache(self):
+        self._get()
+        with self.assertNumQueries(0):
+            response = self._get()
+        self.assertContains(response, "São Paulo")
+        self.assertEqual(profile_cache.stats()["hits"], 1)
+        self.assertEqual(profile_cache.stats()["misses"], 1)
+
+    def test_profile_skill_and_review_changes_invalidate(self):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.bio = "Mentora de Python"
+            self.profile.save()
+        self.assertContains(self._get(), "Mentora de Python")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSkill.objects.create(user=self.alice, name="Xadrez")
+        self.assertContains(self._get(), "Xadrez")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = self._review(4)
+        self.assertEqual(self._get().context["average_rating"], 4.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual(self._get().context["average_rating"], 0.0)
+        self.assertEqual(profile_cache.stats()["stale"], 4)
+
+    def test_unrelated_changes_keep_entry(self):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSkill.objects.create(user=self.bob, name="Jardinagem")
+        with self.assertNumQueries(0):
+            self._get()
+
+    def test_rename_and_missing_profile(self):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.username = "alice"
+            self.alice.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(reverse("users:user_profile", args=["alice"])).status_code, 200)
+        self.assertEqual(self.client.get(reverse("users:user_profile", args=["user1"])).status_code, 404)
+
+    def test_evicted_entry_is_counted(self):
+        self._get()
+        cache.delete(profile_cache._context_key(self.alice.pk))
+        self._get()
+        self.assertEqual(profile_cache.stats()["evictions"], 1)
+
+    def test_stats_endpoint_is_admin_only(self):
+        url = reverse("users:profile_cache_stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.bob.is_staff = True
+        self.bob.save()
+        self.client.force_login(self.bob)
+        self.assertEqual(set(self.client.get(url).json()), set(profile_cache.COUNTERS))
+
+
+class SkillImportTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_users(2)
+        self.python = UserSkill.objects.create(user=self.alice, name="Python", description="Lições antigas")
+        self.url = reverse("users:users-api:skills-bulk")
+        self.client.force_login(self.alice)
+
+    @override_settings(SKILL_IMPORT_BATCH_SIZE=2)
+    def test_bulk_upsert_across_batches_reports_invalid_rows(self):
+        rows = [
+            {"name": "Python", "description": "Django e asyncio"},
+            {"name": ""},
+            {"name": "Xadrez", "description": "Aberturas"},
+            "not an object",
+            {"name": "Xadrez", "description": "Finais"},
+            {"name": "Jardinagem"},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, rows, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["updated"], body["unchanged"]), (2, 2, 0))
+        self.assertEqual([error["row"] for error in body["errors"]], [1, 3])
+        self.assertIn("name", body["errors"][0]["errors"])
+
+        skills = dict(UserSkill.objects.filter(user=self.alice).values_list("name", "description"))
+        self.assertEqual(skills, {"Python": "Django e asyncio", "Xadrez": "Finais", "Jardinagem": ""})
+        self.assertEqual(UserSkill.objects.get(name="Python").pk, self.python.pk)
+        # The search index followed the bulk writes
+        self.assertEqual([s.name for s in search.search("finais")], ["Xadrez"])
+        self.assertEqual(search.search("antigas"), [])
+
+        response = self.client.post(self.url, rows[:1] + [{"name": "Xadrez"}], content_type="application/json")
+        self.assertEqual(response.json()["unchanged"], 2)
+
+    def test_bulk_rejects_non_lists_and_anonymous(self):
+        self.assertEqual(self.client.post(self.url, {"name": "x"}, content_type="application/json").status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url, [], content_type="application/json").status_code, 403)
+
+    def test_single_create_rejects_duplicate_name(self):
+        url = reverse("users:users-api:skills-list")
+        response = self.client.post(url, {"name": "Python"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("name", response.json())
+        # Another user may use the same name
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.post(url, {"name": "Python"}, content_type="application/json").status_code, 201)
+
+    def test_import_command_reads_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "skills.csv")
+            with open(path, "w", encoding="utf-8", newline="") as fh:
+                fh.write("name,description\nPython,Django e asyncio\nViolão,Acordes básicos\n,sem nome\n")
+            out, err = StringIO(), StringIO()
+            call_command("import_skills", path, "--user", "user0", stdout=out, stderr=err)
+        self.assertIn("1 created, 1 updated, 0 unchanged, 1 invalid", out.getvalue())
+        self.assertIn("row 2", err.getvalue())
+        self.assertEqual(UserSkill.objects.get(user=self.alice, name="Violão").description, "Acordes básicos")
@@ -19,6 +19,7 @@ router.register(r"skills", api.UserSkillViewSet, basename="skills")
 
 urlpatterns += [
     path("api/", include((router.urls, "users-api"))),
+    path("api/profile-cache/stats/", api.ProfileCacheStatsView.as_view(), name="profile_cache_stats"),
 ]
 
 # Basic CRUD UI for skills and profile edits
@@ -1,33 +1,22 @@
 from django.shortcuts import get_object_or_404, render
-from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
+from core.queries import query_budget
+
+from . import profile_cache
 from .models import UserProfile, UserSkill
 
 
+@query_budget(6)
 def user_profile_view(request, username: str):
-	"""Renderiza o perfil público de um usuário (mesmo comportamento anterior)."""
-	User = get_user_model()
-	user = get_object_or_404(User, username=username)
-	profile = get_object_or_404(UserProfile, user=user)
-	offered_skills = UserSkill.objects.filter(user=user)
-
-	avg_rating = 0.0
-	if hasattr(user, "get_average_rating"):
-		try:
-			avg_rating = user.get_average_rating()
-		except Exception:
-			avg_rating = 0.0
-
-	context = {
-		"profile_user": user,
-		"profile": profile,
-		"offered_skills": offered_skills,
-		"average_rating": avg_rating,
-	}
+	"""Renderiza o perfil público de um usuário (mesmo comportamento anterior).
 
+	O contexto montado (usuário, perfil, skills e média) vem do cache de
+	`users.profile_cache`, invalidado pelos signals quando algo exibido muda.
+	"""
+	context = profile_cache.get_profile_context(username)
 	return render(request, "users/profile.html", context)
 
 
@@ -40,7 +29,24 @@ class UserSkillListView(ListView):
 		return UserSkill.objects.filter(user=self.request.user)
 
 
-class UserSkillCreateView(LoginRequiredMixin, CreateView):
+class UniqueSkillNameMixin:
+	"""Recusa um nome já usado em outra skill do usuário.
+
+	O formulário não valida a restrição (user, name) sozinho, pois `user` não é
+	um dos seus campos.
+	"""
+
+	def form_valid(self, form):
+		others = UserSkill.objects.filter(user=self.request.user, name=form.cleaned_data["name"])
+		if form.instance.pk:
+			others = others.exclude(pk=form.instance.pk)
+		if others.exists():
+			form.add_error("name", "You already have a skill with this name.")
+			return self.form_invalid(form)
+		return super().form_valid(form)
+
+
+class UserSkillCreateView(LoginRequiredMixin, UniqueSkillNameMixin, CreateView):
 	model = UserSkill
 	fields = ["name", "description"]
 	template_name = "users/skill_form.html"
@@ -51,7 +57,7 @@ class UserSkillCreateView(LoginRequiredMixin, CreateView):
 		return super().form_valid(form)
 
 
-class UserSkillUpdateView(LoginRequiredMixin, UpdateView):
+class UserSkillUpdateView(LoginRequiredMixin, UniqueSkillNameMixin, UpdateView):
 	model = UserSkill
 	fields = ["name", "description"]
 	template_name = "users/skill_form.html"